@@ -32,6 +32,7 @@ def deploy_function():
     zip_path = os.path.join(tempfile.gettempdir(), f'{FUNCTION_NAME}_source.zip')
     with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
         zipf.write('main.py', 'main.py')
+        zipf.write('kraken_async.py', 'kraken_async.py')
         zipf.write('requirements.txt', 'requirements.txt')
     print(f"✓ Created archive")
 
@@ -3,14 +3,14 @@ Kraken Pro 5-Minute Top-10 Gainers Data Fetcher with Technical Indicators
 Fetches 5-minute OHLC data for top 10 hourly gainers and calculates technical indicators
 """
 
-import krakenex
 import pandas as pd
 import numpy as np
 from google.cloud import bigquery
 from datetime import datetime, timedelta
-import time
 import logging
 
+from kraken_async import fetch_ohlc_batch
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -225,25 +225,22 @@ def fetch_5min_data_for_pairs(pairs):
 
     logger.info(f"Fetching 5-minute data for {len(pairs)} pairs...")
 
-    kraken = krakenex.API()
-
     # Fetch enough data for indicator calculation (250 candles = ~20 hours)
     hours_ago = datetime.now() - timedelta(hours=20)
     since_timestamp = int(hours_ago.timestamp())
 
+    # Fetch OHLC for all pairs concurrently, paced by Kraken's rate limit
+    ohlc_responses, fetch_stats = fetch_ohlc_batch(pairs, 5, since_timestamp)  # 5-minute candles
+    logger.info(f"Kraken fetch stats: {fetch_stats}")
+
     all_processed_data = []
     failed_pairs = []
 
     for idx, pair in enumerate(pairs, 1):
         try:
-            logger.info(f"[{idx}/{len(pairs)}] Fetching {pair}")
+            logger.info(f"[{idx}/{len(pairs)}] Processing {pair}")
 
-            # Fetch OHLC data (5 minute interval)
-            ohlc_response = kraken.query_public('OHLC', {
-                'pair': pair,
-                'interval': 5,  # 5-minute candles
-                'since': since_timestamp
-            })
+            ohlc_response = ohlc_responses[pair]
 
             if ohlc_response['error']:
                 logger.warning(f"Error fetching {pair}: {ohlc_response['error']}")
@@ -280,13 +277,9 @@ def fetch_5min_data_for_pairs(pairs):
 
             all_processed_data.append(df_recent)
 
-            # Rate limiting
-            time.sleep(1.5)
-
         except Exception as e:
             logger.error(f"Exception fetching {pair}: {str(e)}")
             failed_pairs.append({'pair': pair, 'error': str(e)})
-            time.sleep(2)
 
     logger.info(f"Processed data for {len(all_processed_data)} pairs")
 
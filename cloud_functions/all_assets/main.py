@@ -5,6 +5,7 @@ Robust Cloud Function with automatic retry and self-healing capabilities
 """
 
 import functions_framework
+import os
 from flask import jsonify, request
 import requests
 import pandas as pd
@@ -30,6 +31,18 @@ BATCH_SIZE = 30
 PROJECT_ID = "aialgotradehits"
 DATASET_ID = "crypto_trading_data"
 
+# Incremental alert engine (API /api/alerts/ingest) - notified after uploads when set
+ALERTS_INGEST_URL = os.environ.get('ALERTS_INGEST_URL', '')
+ALERT_ASSET_TYPES = ('stocks', 'crypto')  # Asset types whose daily tables feed the alert engine
+ALERT_BAR_COLUMNS = [
+    'symbol', 'datetime', 'open', 'high', 'low', 'close', 'volume',
+    'rsi', 'macd', 'macd_signal', 'macd_histogram', 'adx', 'plus_di', 'minus_di',
+    'bollinger_upper', 'bollinger_lower', 'sma_20', 'sma_50',
+    'golden_cross', 'death_cross', 'cycle_type', 'cycle_pnl_pct',
+    'hammer', 'shooting_star', 'bullish_engulfing', 'bearish_engulfing', 'doji',
+    'trend_regime', 'buy_pressure_pct', 'sell_pressure_pct',
+]
+
 # Rate limiting
 call_times = []
 call_lock = threading.Lock()
@@ -266,6 +279,24 @@ def upload_to_bigquery(client, df, table_id):
         return 0
 
 
+def publish_new_bars(latest_bars, asset_type):
+    """Send the latest uploaded bar per symbol to the alert engine (no-op if ALERTS_INGEST_URL unset)"""
+    if not ALERTS_INGEST_URL or not latest_bars:
+        return 0
+
+    try:
+        df = pd.concat(latest_bars, ignore_index=True)
+        columns = [col for col in ALERT_BAR_COLUMNS if col in df.columns]
+        bars = json.loads(df[columns].to_json(orient='records', date_format='iso'))
+        response = requests.post(ALERTS_INGEST_URL, json={'asset_type': asset_type, 'bars': bars}, timeout=30)
+        alert_count = response.json().get('alert_count', 0) if response.ok else 0
+        print(f"Published {len(bars)} {asset_type} bars to alert engine: {alert_count} new alerts")
+        return alert_count
+    except Exception as e:
+        print(f"Alert engine notification failed: {e}")
+        return 0
+
+
 def process_asset_type(asset_type, backfill=False):
     """Process a single asset type"""
     config = ASSET_CONFIGS.get(asset_type)
@@ -278,6 +309,7 @@ def process_asset_type(asset_type, backfill=False):
 
     client = bigquery.Client(project=PROJECT_ID)
     results = {'success': 0, 'failed': 0, 'records': 0, 'errors': []}
+    latest_bars = []
 
     print(f"Processing {len(symbols)} {asset_type} symbols...")
 
@@ -301,12 +333,17 @@ def process_asset_type(asset_type, backfill=False):
                     records = upload_to_bigquery(client, df, table_id)
                     results['records'] += records
                     results['success'] += 1
+                    if records and asset_type in ALERT_ASSET_TYPES:
+                        latest_bars.append(df.sort_values('datetime').tail(1))
                     print(f"  + {symbol}: {records} records")
                 else:
                     results['failed'] += 1
             except Exception as e:
                 results['failed'] += 1
 
+    if latest_bars:
+        results['new_alerts'] = publish_new_bars(latest_bars, asset_type)
+
     return results
 
 
@@ -0,0 +1,190 @@
+"""
+In-Memory Market Aggregates
+Keeps the agg_* summary tables (maintained by the market_aggregates Cloud
+Function after each fetch batch) in process memory, so sector momentum, market
+summaries and top movers are served without BigQuery on the request path.
+
+The first request loads the tables; after refresh_seconds a background thread
+reloads them while requests keep being answered from the previous copy.
+"""
+
+import os
+import threading
+import time
+from datetime import date, datetime
+
+AGGREGATE_REFRESH_SECONDS = int(os.environ.get('MARKET_AGGREGATES_REFRESH_SECONDS', '300'))
+AGGREGATE_RETRY_SECONDS = 60
+
+
+def _plain(row):
+    """BigQuery row -> JSON-ready dict"""
+    return {
+        key: value.isoformat() if isinstance(value, (date, datetime)) else value
+        for key, value in row.items()
+    }
+
+
+class AggregateStore:
+    """Snapshot of agg_sector_stats, agg_sector_members, agg_top_movers and agg_latest_bars"""
+
+    def __init__(self, client, project_id, dataset_id, refresh_seconds=AGGREGATE_REFRESH_SECONDS):
+        self.client = client
+        self.project_id = project_id
+        self.dataset_id = dataset_id
+        self.refresh_seconds = refresh_seconds
+
+        self.snapshot = None
+        self.loaded_at = 0.0
+        self.load_seconds = None
+        self.error = None
+        self._retry_at = 0.0
+        self._load_lock = threading.Lock()
+
+    def _table(self, name):
+        return f"`{self.project_id}.{self.dataset_id}.{name}`"
+
+    def _rows(self, query):
+        return [_plain(row) for row in self.client.query(query).result()]
+
+    def _load(self):
+        started = time.time()
+        sector_stats = self._rows(f"""
+        SELECT * EXCEPT(updated_at) FROM {self._table('agg_sector_stats')}
+        WHERE as_of = (SELECT MAX(as_of) FROM {self._table('agg_sector_stats')})
+        ORDER BY momentum_rank
+        """)
+        members = self._rows(f"""
+        SELECT * EXCEPT(updated_at) FROM {self._table('agg_sector_members')}
+        WHERE as_of = (SELECT MAX(as_of) FROM {self._table('agg_sector_members')})
+        ORDER BY sector, sector_rank
+        """)
+        movers = self._rows(f"""
+        SELECT * EXCEPT(updated_at) FROM {self._table('agg_top_movers')}
+        ORDER BY timeframe, asset_type, direction, rank
+        """)
+        latest = self._rows(f"""
+        SELECT * EXCEPT(updated_at) FROM {self._table('agg_latest_bars')}
+        """)
+
+        sector_members = {}
+        for row in members:
+            sector_members.setdefault(row['sector'], []).append(row)
+
+        latest_bars = {}
+        for row in latest:
+            latest_bars.setdefault(row['asset_type'], []).append(row)
+
+        self.load_seconds = round(time.time() - started, 2)
+        return {
+            'sector_stats': sector_stats,
+            'sector_members': sector_members,
+            'movers': movers,
+            'latest_bars': latest_bars
+        }
+
+    def _refresh(self):
+        try:
+            self.snapshot = self._load()
+            self.loaded_at = time.time()
+            self.error = None
+        except Exception as e:
+            self.error = str(e)
+            self._retry_at = time.time() + AGGREGATE_RETRY_SECONDS
+            print(f"Aggregate store: load failed: {e}")
+
+    def _background_refresh(self):
+        try:
+            self._refresh()
+        finally:
+            self._load_lock.release()
+
+    def get(self):
+        """Current snapshot (None until the first successful load)"""
+        now = time.time()
+        if self.snapshot is None:
+            if now >= self._retry_at:
+                with self._load_lock:
+                    if self.snapshot is None and time.time() >= self._retry_at:
+                        self._refresh()
+        elif now - self.loaded_at > self.refresh_seconds and now >= self._retry_at:
+            # One reload at a time; requests keep the previous copy meanwhile
+            if self._load_lock.acquire(blocking=False):
+                threading.Thread(target=self._background_refresh, name='aggregate-store', daemon=True).start()
+        return self.snapshot
+
+    # ------------------------------------------------------------------
+    # Views used by the endpoints; None means "not available, use SQL"
+    # ------------------------------------------------------------------
+
+    def sector_stats(self):
+        snapshot = self.get()
+        if not snapshot or not snapshot['sector_stats']:
+            return None
+        return snapshot['sector_stats']
+
+    def sector_stocks(self, sector, limit=20):
+        snapshot = self.get()
+        if not snapshot or not snapshot['sector_members']:
+            return None
+        return snapshot['sector_members'].get(sector, [])[:limit]
+
+    def movers(self, timeframe='daily', asset_type='all', direction='all', limit=25):
+        """Movers ordered by absolute change, like the market_movers query"""
+        snapshot = self.get()
+        if not snapshot:
+            return None
+        rows = [m for m in snapshot['movers'] if m['timeframe'] == timeframe]
+        if not rows:
+            return None
+        if asset_type != 'all':
+            rows = [m for m in rows if m['asset_type'] == asset_type]
+        if direction != 'all':
+            rows = [m for m in rows if m['direction'] == direction]
+        return sorted(rows, key=lambda m: -abs(m['change_pct'] or 0))[:limit]
+
+    def summary(self, asset_type, limit=10):
+        """Top gainers / losers / volume across the asset type's latest session"""
+        snapshot = self.get()
+        bars = (snapshot or {}).get('latest_bars', {}).get(asset_type)
+        if not bars:
+            return None
+
+        session = max(b['datetime'][:10] for b in bars if b['datetime'])
+        current = [b for b in bars if b['datetime'] and b['datetime'][:10] == session]
+        changed = [b for b in current if b['change_pct'] is not None]
+
+        return {
+            'top_gainers': sorted((b for b in changed if b['change_pct'] > 0), key=lambda b: -b['change_pct'])[:limit],
+            'top_losers': sorted((b for b in changed if b['change_pct'] < 0), key=lambda b: b['change_pct'])[:limit],
+            'highest_volume': sorted(current, key=lambda b: -(b['volume'] or 0))[:limit],
+            'total_pairs': len(current),
+            'session': session
+        }
+
+    def status(self):
+        return {
+            'loaded': self.snapshot is not None,
+            'loaded_at': datetime.fromtimestamp(self.loaded_at).isoformat() if self.loaded_at else None,
+            'load_seconds': self.load_seconds,
+            'refresh_seconds': self.refresh_seconds,
+            'rows': {
+                name: (sum(len(v) for v in rows.values()) if isinstance(rows, dict) else len(rows))
+                for name, rows in (self.snapshot or {}).items()
+            },
+            'error': self.error
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_aggregate_store(client=None, project_id=None, dataset_id=None):
+    """Process-wide store, created on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None and client is not None:
+                _store = AggregateStore(client, project_id, dataset_id)
+    return _store
@@ -11,19 +11,33 @@ Date: December 2025
 import logging
 from datetime import datetime
 from flask import jsonify, request
+from lazy_loading import LazyObject, module_available
 
 logger = logging.getLogger(__name__)
 
-# Try to import AI Trading Service
-try:
-    from ai_trading_service import AITradingService
-    ai_trading_service = AITradingService()
-    AI_TRADING_SERVICE_AVAILABLE = True
+
+def _create_ai_trading_service():
+    try:
+        from ai_trading_service import AITradingService
+        service = AITradingService()
+    except Exception as e:
+        logger.warning(f"AI Trading Service not available: {e}")
+        raise
     logger.info("AI Trading Service initialized successfully")
-except Exception as e:
-    AI_TRADING_SERVICE_AVAILABLE = False
-    ai_trading_service = None
-    logger.warning(f"AI Trading Service not available: {e}")
+    return service
+
+
+# AI Trading Service (Vertex AI SDK + Gemini models) is created on the first AI request.
+# A failed construction is cached, so later requests report "not available" without retrying.
+AI_TRADING_SERVICE_INSTALLED = module_available('ai_trading_service') and module_available('vertexai')
+ai_trading_service = LazyObject(_create_ai_trading_service, 'ai_trading_service', cache_errors=True)
+if not AI_TRADING_SERVICE_INSTALLED:
+    logger.warning("AI Trading Service not available: vertexai is not installed")
+
+
+def ai_trading_service_available():
+    """True once the AI Trading Service is installed and constructed successfully"""
+    return AI_TRADING_SERVICE_INSTALLED and ai_trading_service.available()
 
 
 def register_ai_endpoints(app, client, PROJECT_ID, DATASET_ID, VERTEX_AI_AVAILABLE,
@@ -41,7 +55,7 @@ def register_ai_endpoints(app, client, PROJECT_ID, DATASET_ID, VERTEX_AI_AVAILAB
         Per masterquery.md: NL2SQL Integration with Gemini 2.5 Pro
         Supports rise cycle detection, indicator queries, pattern matching
         """
-        if not AI_TRADING_SERVICE_AVAILABLE:
+        if not ai_trading_service_available():
             return jsonify({'success': False, 'error': 'AI Trading Service not available'}), 503
 
         data = request.get_json()
@@ -60,7 +74,7 @@ def register_ai_endpoints(app, client, PROJECT_ID, DATASET_ID, VERTEX_AI_AVAILAB
     @app.route('/api/ai/analyze-symbol', methods=['POST'])
     def ai_analyze_symbol():
         """AI-powered symbol analysis with buy/sell/hold recommendation"""
-        if not AI_TRADING_SERVICE_AVAILABLE:
+        if not ai_trading_service_available():
             return jsonify({'success': False, 'error': 'AI Trading Service not available'}), 503
 
         data = request.get_json()
@@ -85,7 +99,7 @@ def register_ai_endpoints(app, client, PROJECT_ID, DATASET_ID, VERTEX_AI_AVAILAB
         - Rise cycle: sma_9 > sma_21
         - Rise cycle START: sma_9 > sma_21 AND LAG(sma_9) <= LAG(sma_21)
         """
-        if not AI_TRADING_SERVICE_AVAILABLE:
+        if not ai_trading_service_available():
             return jsonify({'success': False, 'error': 'AI Trading Service not available'}), 503
 
         data = request.get_json()
@@ -102,7 +116,7 @@ def register_ai_endpoints(app, client, PROJECT_ID, DATASET_ID, VERTEX_AI_AVAILAB
     @app.route('/api/ai/chat', methods=['POST'])
     def ai_chat():
         """Conversational AI for trading assistance"""
-        if not AI_TRADING_SERVICE_AVAILABLE:
+        if not ai_trading_service_available():
             return jsonify({'success': False, 'error': 'AI Trading Service not available'}), 503
 
         data = request.get_json()
@@ -122,7 +136,7 @@ def register_ai_endpoints(app, client, PROJECT_ID, DATASET_ID, VERTEX_AI_AVAILAB
     @app.route('/api/ai/market-summary', methods=['GET'])
     def ai_market_summary():
         """Generate AI market summary for all asset classes"""
-        if not AI_TRADING_SERVICE_AVAILABLE:
+        if not ai_trading_service_available():
             return jsonify({'success': False, 'error': 'AI Trading Service not available'}), 503
 
         try:
@@ -140,7 +154,7 @@ def register_ai_endpoints(app, client, PROJECT_ID, DATASET_ID, VERTEX_AI_AVAILAB
         - Rise cycle START: sma_9 crosses above sma_21
         - Fall cycle START: sma_9 crosses below sma_21
         """
-        if not AI_TRADING_SERVICE_AVAILABLE:
+        if not ai_trading_service_available():
             return jsonify({'success': False, 'error': 'AI Trading Service not available'}), 503
 
         asset_type = request.args.get('asset_type', 'crypto')
@@ -222,7 +236,7 @@ def register_ai_endpoints(app, client, PROJECT_ID, DATASET_ID, VERTEX_AI_AVAILAB
 
         Uses ai_trading_service.get_rise_cycle_candidates() for comprehensive analysis.
         """
-        if not AI_TRADING_SERVICE_AVAILABLE:
+        if not ai_trading_service_available():
             return jsonify({'success': False, 'error': 'AI Trading Service not available'}), 503
 
         asset_type = request.args.get('asset_type', 'stocks')
@@ -246,7 +260,7 @@ def register_ai_endpoints(app, client, PROJECT_ID, DATASET_ID, VERTEX_AI_AVAILAB
         - ADX > 25: 25 points
         - Close > SMA_200: 25 points
         """
-        if not AI_TRADING_SERVICE_AVAILABLE:
+        if not ai_trading_service_available():
             return jsonify({'success': False, 'error': 'AI Trading Service not available'}), 503
 
         asset_type = request.args.get('asset_type', 'stocks')
@@ -265,7 +279,7 @@ def register_ai_endpoints(app, client, PROJECT_ID, DATASET_ID, VERTEX_AI_AVAILAB
 
         Filters assets with growth_score >= threshold (default 50).
         """
-        if not AI_TRADING_SERVICE_AVAILABLE:
+        if not ai_trading_service_available():
             return jsonify({'success': False, 'error': 'AI Trading Service not available'}), 503
 
         asset_type = request.args.get('asset_type', 'stocks')
@@ -0,0 +1,106 @@
+"""
+Lazy Loading Helpers
+Defers heavy SDK imports and client construction until first use so the API
+process starts (and answers /health) without paying for dependencies a given
+instance may never touch.
+"""
+
+import importlib
+import importlib.util
+import threading
+
+
+def module_available(name):
+    """True if a module can be imported, without importing it"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+class LazyModule:
+    """Module proxy; the real import happens on the first attribute access"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+class LazyObject:
+    """
+    Object proxy built by factory() on first attribute access (e.g. SDK clients).
+    With cache_errors=True a failed construction is remembered and re-raised
+    instead of calling factory() again on every access.
+    """
+
+    def __init__(self, factory, name=None, cache_errors=False):
+        self._factory = factory
+        self._name = name or getattr(factory, '__name__', 'object')
+        self._cache_errors = cache_errors
+        self._instance = None
+        self.error = None
+        self._lock = threading.Lock()
+
+    def _get(self):
+        if self._instance is None:
+            with self._lock:
+                if self.error is not None:
+                    raise self.error
+                if self._instance is None:
+                    try:
+                        self._instance = self._factory()
+                    except Exception as e:
+                        if self._cache_errors:
+                            self.error = e
+                        raise
+        return self._instance
+
+    @property
+    def loaded(self):
+        return self._instance is not None
+
+    def available(self):
+        """Build the object if needed; False if construction fails"""
+        try:
+            self._get()
+            return True
+        except Exception:
+            return False
+
+    def __getattr__(self, attr):
+        return getattr(self._get(), attr)
+
+    def __repr__(self):
+        state = 'created' if self._instance is not None else ('failed' if self.error else 'not created')
+        return f"<lazy {self._name} ({state})>"
+
+
+def lazy_import(name):
+    return LazyModule(name)
+
+
+def lazy_status(**objects):
+    """Which lazy modules / objects have been loaded so far"""
+    return {
+        name: getattr(obj, 'loaded', True)
+        for name, obj in objects.items()
+    }
@@ -9,11 +9,14 @@ if sys.platform == 'win32':
 
 from flask import Flask, jsonify, request, Response
 from flask_cors import CORS
-from google.cloud import bigquery
-from google.cloud import storage
 from datetime import datetime
 import logging
-import bcrypt
+from lazy_loading import lazy_import, module_available, LazyObject
+
+# Heavy SDKs are imported on first use to keep cold starts short
+bigquery = lazy_import('google.cloud.bigquery')
+storage = lazy_import('google.cloud.storage')
+bcrypt = lazy_import('bcrypt')
 import hashlib
 import secrets
 import base64
@@ -44,6 +47,36 @@ except Exception as e:
     WALK_FORWARD_ENDPOINTS_AVAILABLE = False
     print(f"Walk-Forward endpoints import error: {e}")
 
+# Trading Alerts module (pandas/numpy) is imported when an alert endpoint is first used
+if module_available('trading_alerts'):
+    def get_alert_system():
+        from trading_alerts import get_alert_system as _get_alert_system
+        return _get_alert_system()
+else:
+    get_alert_system = None
+    print("Trading alerts module not available")
+
+# Import in-memory symbol catalog (search / browse without per-request scans)
+try:
+    from symbol_catalog import get_symbol_catalog
+except ImportError as e:
+    get_symbol_catalog = None
+    print(f"Symbol catalog import failed: {e}")
+
+# Import in-memory copy of the agg_* summary tables (sector momentum, summaries, movers)
+try:
+    from aggregate_store import get_aggregate_store
+except ImportError as e:
+    get_aggregate_store = None
+    print(f"Aggregate store import failed: {e}")
+
+# Import in-memory quote board (latest bar per symbol from the latest_* snapshot tables)
+try:
+    from quote_board import get_quote_board, snapshot_table
+except ImportError as e:
+    get_quote_board = None
+    print(f"Quote board import failed: {e}")
+
 # Helper function to sanitize float values for JSON (handle Infinity/NaN)
 def safe_float(val):
     """Convert value to float, returning None for Infinity/NaN/None"""
@@ -68,15 +101,10 @@ def sanitize_row(row):
             row_dict[key] = safe_float(value)
     return row_dict
 
-# Vertex AI imports
-try:
-    import vertexai
-    from vertexai.generative_models import GenerativeModel, Part
-    VERTEX_AI_AVAILABLE = True
-except ImportError:
-    VERTEX_AI_AVAILABLE = False
-    logger = logging.getLogger(__name__)
-    logger.warning("Vertex AI not available - install google-cloud-aiplatform")
+# Vertex AI is imported and initialized on first use (see get_gemini_model)
+VERTEX_AI_AVAILABLE = module_available('vertexai')
+if not VERTEX_AI_AVAILABLE:
+    logging.getLogger(__name__).warning("Vertex AI not available - install google-cloud-aiplatform")
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -106,15 +134,26 @@ GEMINI_MODEL_PRIORITY = [
     "gemini-1.5-flash",                     # Fallback to 1.5 Flash
 ]
 
-# Initialize Storage client
-storage_client = storage.Client(project=DATA_PROJECT_ID)
+# Storage and BigQuery clients are created on first use
+storage_client = LazyObject(lambda: storage.Client(project=DATA_PROJECT_ID), 'storage_client')
+client = LazyObject(lambda: bigquery.Client(project=DATA_PROJECT_ID), 'bigquery_client')
 
-# Initialize Vertex AI with dynamic model selection
+# Gemini model, initialized on first use with dynamic model selection
 gemini_model = None
 GEMINI_MODEL = None
+_gemini_initialized = False
+
+
+def get_gemini_model():
+    """Initialize Vertex AI once and return the first available Gemini model (or None)"""
+    global gemini_model, GEMINI_MODEL, _gemini_initialized
+    if _gemini_initialized or not VERTEX_AI_AVAILABLE:
+        return gemini_model
+    _gemini_initialized = True
 
-if VERTEX_AI_AVAILABLE:
     try:
+        import vertexai
+        from vertexai.generative_models import GenerativeModel
         vertexai.init(project=DATA_PROJECT_ID, location=VERTEX_AI_LOCATION)
 
         # Try models in priority order until one works
@@ -133,9 +172,7 @@ if VERTEX_AI_AVAILABLE:
     except Exception as e:
         logger.error(f"Failed to initialize Vertex AI: {e}")
         gemini_model = None
-
-# Initialize BigQuery client
-client = bigquery.Client(project=DATA_PROJECT_ID)
+    return gemini_model
 
 app = Flask(__name__)
 
@@ -178,6 +215,91 @@ if WALK_FORWARD_ENDPOINTS_AVAILABLE:
 else:
     logger.warning("Walk-Forward endpoints module not available")
 
+def catalog_for(*asset_types):
+    """
+    The symbol catalog if it is loaded and has every requested asset type.
+    The first call starts the background load; endpoints fall back to SQL until it is ready.
+    """
+    symbol_catalog = get_symbol_catalog(client, PROJECT_ID, DATASET_ID) if get_symbol_catalog else None
+    if symbol_catalog is None or not symbol_catalog.ready():
+        return None
+    if not all(symbol_catalog.has(t) for t in asset_types):
+        return None
+    return symbol_catalog
+
+
+def aggregate_store():
+    """In-memory copy of the market_aggregates tables, or None (endpoints then use SQL)"""
+    return get_aggregate_store(client, PROJECT_ID, DATASET_ID) if get_aggregate_store else None
+
+
+def aggregate_bar_row(bar, key='symbol'):
+    """agg_latest_bars row -> summary item shaped like the latest-row query results"""
+    return {
+        key: bar['symbol'],
+        'close': safe_float(bar['close']) if bar['close'] else 0,
+        'change_pct': safe_float(bar['change_pct']),
+        'rsi': safe_float(bar['rsi']) if bar['rsi'] else 0,
+        'macd': safe_float(bar['macd']) if bar['macd'] else 0,
+        'adx': safe_float(bar['adx']) if bar['adx'] else 0,
+        'volume': safe_float(bar['volume']) if bar['volume'] else 0,
+        'roc': safe_float(bar['roc']) if bar['roc'] else 0,
+        'datetime': bar['datetime']
+    }
+
+
+def aggregate_summary(asset_type, key='symbol'):
+    """Market summary payload from the aggregate store, or None"""
+    store = aggregate_store()
+    summary = store.summary(asset_type) if store else None
+    if summary is None:
+        return None
+    return {
+        'top_gainers': [aggregate_bar_row(b, key) for b in summary['top_gainers']],
+        'top_losers': [aggregate_bar_row(b, key) for b in summary['top_losers']],
+        'highest_volume': [aggregate_bar_row(b, key) for b in summary['highest_volume']],
+        'total_pairs': summary['total_pairs'],
+        'session': summary['session']
+    }
+
+
+def quote_board():
+    """In-memory latest-bar snapshots, or None (endpoints then use SQL)"""
+    return get_quote_board(client, PROJECT_ID, DATASET_ID) if get_quote_board else None
+
+
+def latest_rows_sql(asset_type, table_name, where_sql='TRUE'):
+    """
+    SQL for the latest row per symbol: the asset's latest_*_daily snapshot when it
+    is available, otherwise a ROW_NUMBER scan over the daily table
+    """
+    board = quote_board()
+    if board is not None and board.available(asset_type):
+        return f"""
+        SELECT * FROM `{PROJECT_ID}.{DATASET_ID}.{snapshot_table(asset_type)}`
+        WHERE {where_sql}
+        """
+    return f"""
+        SELECT * FROM `{PROJECT_ID}.{DATASET_ID}.{table_name}`
+        WHERE {where_sql}
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY datetime DESC) = 1
+        """
+
+
+def latest_bar_row(entry):
+    """Symbol catalog entry -> dict shaped like the latest-per-symbol query rows"""
+    latest = entry.get('latest') or {}
+    return {
+        'symbol': entry['symbol'],
+        'close': safe_float(latest.get('close')) if latest.get('close') else 0,
+        'volume': safe_float(latest.get('volume')) if latest.get('volume') else 0,
+        'rsi': safe_float(latest.get('rsi')) if latest.get('rsi') else None,
+        'macd': safe_float(latest.get('macd')) if latest.get('macd') else None,
+        'adx': safe_float(latest.get('adx')) if latest.get('adx') else None,
+        'roc': safe_float(latest.get('roc')) if latest.get('roc') else 0,
+        'datetime': latest['datetime'].isoformat() if latest.get('datetime') else None
+    }
+
 def get_stock_data_from_table(symbol, table_name, limit=500):
     """Fetch stock data from a specific BigQuery table (clean schema)"""
     order_direction = "DESC"
@@ -769,6 +891,14 @@ def get_interest_rates():
 def get_all_crypto_pairs():
     """Get all available crypto pairs with latest data from crypto_daily_clean table"""
     try:
+        catalog = catalog_for('crypto')
+        if catalog:
+            pairs = [
+                {'pair': entry['symbol'], 'name': entry['symbol'], **latest_bar_row(entry)}
+                for entry in catalog.entries('crypto')
+            ]
+            return jsonify({'success': True, 'data': pairs, 'count': len(pairs)})
+
         # Get the most recent data for each symbol
         query = f"""
         WITH latest_per_symbol AS (
@@ -822,6 +952,16 @@ def get_all_crypto_pairs():
 def get_all_stock_symbols():
     """Get all available stock symbols with latest data from stocks_daily table"""
     try:
+        catalog = catalog_for('stock')
+        if catalog:
+            symbols = [latest_bar_row(entry) for entry in catalog.entries('stock')]
+            return jsonify({
+                'success': True,
+                'data': symbols,
+                'symbols': [s['symbol'] for s in symbols],
+                'count': len(symbols)
+            })
+
         # Get the most recent data for each symbol
         query = f"""
         WITH latest_per_symbol AS (
@@ -1454,7 +1594,11 @@ def download_interest_rates_reconciliation(symbol):
 @app.route('/api/summary/stock', methods=['GET'])
 def get_stock_summary():
     """Get stock market summary"""
-    # For now, just return NVDA data since we only have one stock
+    summary = aggregate_summary('stocks')
+    if summary is not None:
+        return jsonify({'success': True, 'summary': summary, 'source': 'aggregates'})
+
+    # Fallback until the aggregates exist: latest NVDA bar
     query = f"""
     SELECT
         symbol,
@@ -1514,7 +1658,11 @@ def get_stock_summary():
 @app.route('/api/summary/crypto', methods=['GET'])
 def get_crypto_summary():
     """Get crypto market summary"""
-    # For now, just return BTC data since we only have one crypto
+    summary = aggregate_summary('crypto', key='pair')
+    if summary is not None:
+        return jsonify({'success': True, 'summary': summary, 'source': 'aggregates'})
+
+    # Fallback until the aggregates exist: latest BTC bar
     query = f"""
     SELECT
         pair,
@@ -1723,20 +1871,37 @@ def get_available_symbols():
             'commodities': f"SELECT DISTINCT symbol FROM `{PROJECT_ID}.{DATASET_ID}.v2_commodities_daily` ORDER BY symbol",
         }
 
+        # Catalog asset type and the fields each group has always returned
+        catalog_types = {
+            'stocks': ('stock', ['name', 'sector']),
+            'crypto': ('crypto', ['name']),
+            'etfs': ('etf', ['name']),
+            'forex': ('forex', []),
+            'indices': ('index', []),
+            'commodities': ('commodity', []),
+        }
+        catalog = catalog_for(*(t for t, _ in catalog_types.values()))
+
         result = {}
         total_symbols = 0
 
         for asset_type, query in asset_queries.items():
             try:
-                query_job = client.query(query)
-                rows = list(query_job.result())
+                if catalog:
+                    catalog_type, fields = catalog_types[asset_type]
+                    rows = [
+                        {'symbol': entry['symbol'], **{f: entry.get(f) for f in fields}}
+                        for entry in catalog.entries(catalog_type)
+                    ]
+                else:
+                    rows = [dict(row) for row in client.query(query).result()]
                 symbols = []
                 for row in rows:
-                    sym_data = {'symbol': row.symbol}
-                    if hasattr(row, 'name') and row.name:
-                        sym_data['name'] = row.name
-                    if hasattr(row, 'sector') and row.sector:
-                        sym_data['sector'] = row.sector
+                    sym_data = {'symbol': row['symbol']}
+                    if row.get('name'):
+                        sym_data['name'] = row['name']
+                    if row.get('sector'):
+                        sym_data['sector'] = row['sector']
                     symbols.append(sym_data)
                 result[asset_type] = {
                     'count': len(symbols),
@@ -2915,33 +3080,9 @@ def search_weekly_assets(client, asset_type, filters):
 
     where_sql = " AND ".join(where_clauses)
 
-    # Query daily table with ROW_NUMBER to get most recent data per symbol
+    # Most recent row per symbol (latest-bar snapshot when available), filtered
     query = f"""
-    WITH latest_data AS (
-        SELECT
-            symbol,
-            name,
-            asset_type,
-            exchange,
-            close,
-            open,
-            high,
-            low,
-            volume,
-            percent_change,
-            week_52_high,
-            week_52_low,
-            rsi,
-            macd,
-            adx,
-            atr,
-            sma_20,
-            sma_50,
-            sma_200,
-            ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY datetime DESC) as rn
-        FROM `{PROJECT_ID}.{DATASET_ID}.{table_name}`
-        WHERE {where_sql}
-    )
+    WITH latest_data AS ({latest_rows_sql(asset_type, table_name, where_sql)})
     SELECT
         '{asset_type}' as asset_type_label,
         symbol,
@@ -2964,7 +3105,6 @@ def search_weekly_assets(client, asset_type, filters):
         CASE WHEN rsi > 70 THEN 'Overbought' WHEN rsi < 30 THEN 'Oversold' ELSE 'Neutral' END as momentum_category,
         CASE WHEN COALESCE(atr, 0) > 5 THEN 'High' WHEN COALESCE(atr, 0) > 2 THEN 'Medium' ELSE 'Low' END as volatility_category
     FROM latest_data
-    WHERE rn = 1
     ORDER BY ABS(percent_change) DESC NULLS LAST
     LIMIT 500
     """
@@ -2980,40 +3120,79 @@ def search_weekly_assets(client, asset_type, filters):
 
 # ============== BIGQUERY TABLE INVENTORY ==============
 
+# Health snapshot maintained incrementally by the system-monitoring function (?endpoint=snapshot)
+HEALTH_SNAPSHOT_TABLE = f"{DATA_PROJECT_ID}.monitoring.health_history"
+
+
+def get_latest_health_snapshot():
+    """Latest health snapshot row per table in DATASET_ID, or [] if no snapshot exists yet"""
+    query = f"""
+        SELECT *
+        FROM `{HEALTH_SNAPSHOT_TABLE}`
+        WHERE snapshot_time >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 30 DAY)
+          AND dataset_id = '{DATASET_ID}'
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY table_name ORDER BY snapshot_time DESC) = 1
+    """
+    try:
+        return [dict(row) for row in client.query(query).result()]
+    except Exception as e:
+        logger.warning(f"Health snapshot unavailable, falling back to live scan: {e}")
+        return []
+
+
 @app.route('/api/admin/table-inventory', methods=['GET'])
 def get_table_inventory():
     """Get inventory of all BigQuery tables with row counts for systematic development tracking"""
     try:
-        client = bigquery.Client(project=DATA_PROJECT_ID)
-
-        query = f"""
-        SELECT
-            table_id,
-            row_count,
-            ROUND(size_bytes / 1024 / 1024, 2) as size_mb,
-            TIMESTAMP_MILLIS(creation_time) as created_at,
-            TIMESTAMP_MILLIS(last_modified_time) as last_modified
-        FROM `{DATA_PROJECT_ID}.{DATASET_ID}.__TABLES__`
-        ORDER BY row_count DESC
-        """
-
-        results = client.query(query).result()
-
         tables = []
         total_rows = 0
         total_size_mb = 0
+        snapshot_time = None
+
+        snapshot = get_latest_health_snapshot()
+        if snapshot:
+            for row in sorted(snapshot, key=lambda r: r['row_count'] or 0, reverse=True):
+                size_mb = round((row['size_bytes'] or 0) / 1024 / 1024, 2)
+                tables.append({
+                    'table_name': row['table_name'],
+                    'row_count': row['row_count'],
+                    'size_mb': size_mb,
+                    'created_at': row['created_at'].isoformat() if row['created_at'] else None,
+                    'last_modified': row['last_modified'].isoformat() if row['last_modified'] else None,
+                    'latest_data': row['latest_time'].isoformat() if row['latest_time'] else None,
+                    'freshness_hours': row['freshness_hours'],
+                    'rows_added': row['rows_added'],
+                    'duplicate_rows': row['duplicate_rows'],
+                    'status': row['status']
+                })
+                total_rows += row['row_count'] or 0
+                total_size_mb += size_mb
+            snapshot_time = max(row['snapshot_time'] for row in snapshot).isoformat()
+        else:
+            query = f"""
+            SELECT
+                table_id,
+                row_count,
+                ROUND(size_bytes / 1024 / 1024, 2) as size_mb,
+                TIMESTAMP_MILLIS(creation_time) as created_at,
+                TIMESTAMP_MILLIS(last_modified_time) as last_modified
+            FROM `{DATA_PROJECT_ID}.{DATASET_ID}.__TABLES__`
+            ORDER BY row_count DESC
+            """
 
-        for row in results:
-            table_info = {
-                'table_name': row.table_id,
-                'row_count': row.row_count,
-                'size_mb': safe_float(row.size_mb) if row.size_mb else 0,
-                'created_at': row.created_at.isoformat() if row.created_at else None,
-                'last_modified': row.last_modified.isoformat() if row.last_modified else None
-            }
-            tables.append(table_info)
-            total_rows += row.row_count or 0
-            total_size_mb += safe_float(row.size_mb) if row.size_mb else 0
+            results = client.query(query).result()
+
+            for row in results:
+                table_info = {
+                    'table_name': row.table_id,
+                    'row_count': row.row_count,
+                    'size_mb': safe_float(row.size_mb) if row.size_mb else 0,
+                    'created_at': row.created_at.isoformat() if row.created_at else None,
+                    'last_modified': row.last_modified.isoformat() if row.last_modified else None
+                }
+                tables.append(table_info)
+                total_rows += row.row_count or 0
+                total_size_mb += safe_float(row.size_mb) if row.size_mb else 0
 
         # Categorize tables
         categories = {
@@ -3032,7 +3211,8 @@ def get_table_inventory():
                 'total_tables': len(tables),
                 'total_rows': total_rows,
                 'total_size_mb': round(total_size_mb, 2),
-                'last_updated': datetime.utcnow().isoformat()
+                'last_updated': snapshot_time or datetime.utcnow().isoformat(),
+                'source': 'snapshot' if snapshot else 'live'
             },
             'categories': {
                 cat: {
@@ -3205,10 +3385,71 @@ def export_table_data(table_name):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+# Weekly week-by-week tables tracked on the data warehouse status page
+WEEKLY_PROGRESS_TABLES = {
+    'stocks': 'weekly_stocks_all',
+    'crypto': 'weekly_crypto_all',
+    'forex': 'weekly_forex_all',
+    'etfs': 'weekly_etfs_all',
+    'indices': 'weekly_indices_all',
+    'commodities': 'weekly_commodities_all'
+}
+
+
+def _data_warehouse_status_from_snapshot(snapshot):
+    """Build the data warehouse status payload from health snapshot rows"""
+    by_table = {row['table_name']: row for row in snapshot}
+    tables = []
+    total_rows = 0
+    total_size = 0
+    for row in snapshot:
+        table_info = {
+            'name': row['table_name'],
+            'rows': row['row_count'] or 0,
+            'size_mb': round((row['size_bytes'] or 0) / 1048576, 2),
+            'last_modified': row['last_modified'].isoformat() if row['last_modified'] else None,
+            'freshness_hours': row['freshness_hours'],
+            'duplicate_rows': row['duplicate_rows'],
+            'null_close_rate': safe_float(row['null_close_rate']),
+            'status': row['status']
+        }
+        tables.append(table_info)
+        total_rows += table_info['rows']
+        total_size += table_info['size_mb']
+
+    targets = {'stocks': 20000, 'crypto': 1100, 'forex': 500, 'etfs': 5000, 'indices': 500, 'commodities': 100}
+    weekly_progress = {}
+    for asset_type, table_name in WEEKLY_PROGRESS_TABLES.items():
+        row = by_table.get(table_name) or {}
+        weekly_progress[asset_type] = {
+            'current': row.get('symbol_count') or 0,
+            'records': row.get('row_count') or 0,
+            'target': targets[asset_type],
+            'weeks': row.get('period_count') or 0
+        }
+
+    return {
+        'success': True,
+        'tables': sorted(tables, key=lambda x: x['rows'], reverse=True),
+        'summary': {
+            'total_tables': len(tables),
+            'total_rows': total_rows,
+            'total_size_mb': round(total_size, 2)
+        },
+        'weekly_progress': weekly_progress,
+        'snapshot_time': max(row['snapshot_time'] for row in snapshot).isoformat(),
+        'timestamp': datetime.utcnow().isoformat()
+    }
+
+
 @app.route('/api/admin/data-warehouse-status', methods=['GET'])
 def get_data_warehouse_status():
     """Get comprehensive data warehouse status for monitoring dashboard"""
     try:
+        snapshot = get_latest_health_snapshot()
+        if snapshot:
+            return jsonify(_data_warehouse_status_from_snapshot(snapshot))
+
         # Query all tables from BigQuery using __TABLES__ (simpler and works everywhere)
         query = f"""
             SELECT
@@ -3247,16 +3488,7 @@ def get_data_warehouse_status():
         }
 
         # Count symbols and weeks from new week-by-week tables
-        asset_tables = {
-            'stocks': 'weekly_stocks_all',
-            'crypto': 'weekly_crypto_all',
-            'forex': 'weekly_forex_all',
-            'etfs': 'weekly_etfs_all',
-            'indices': 'weekly_indices_all',
-            'commodities': 'weekly_commodities_all'
-        }
-
-        for asset_type, table_name in asset_tables.items():
+        for asset_type, table_name in WEEKLY_PROGRESS_TABLES.items():
             try:
                 query = f"""
                     SELECT
@@ -3314,6 +3546,7 @@ def get_data_warehouse_status():
 @app.route('/api/admin/table-inventory/ai-analysis', methods=['POST'])
 def analyze_table_inventory_with_ai():
     """Use Gemini AI to analyze table inventory and provide intelligent insights"""
+    gemini_model = get_gemini_model()
     try:
         if not VERTEX_AI_AVAILABLE or not gemini_model:
             return jsonify({
@@ -3560,6 +3793,7 @@ def download_training_doc(filename):
 @app.route('/api/ai/status', methods=['GET'])
 def ai_status():
     """Check AI service status"""
+    gemini_model = get_gemini_model()
     try:
         bucket_exists = False
         bucket_doc_count = 0
@@ -3591,6 +3825,7 @@ def ai_status():
 @app.route('/api/ai/analyze', methods=['POST'])
 def ai_analyze():
     """Analyze data using Gemini AI"""
+    gemini_model = get_gemini_model()
     try:
         if not VERTEX_AI_AVAILABLE or gemini_model is None:
             return jsonify({
@@ -3640,6 +3875,7 @@ Provide a detailed, professional analysis. Include:
 @app.route('/api/ai/smart-search', methods=['POST'])
 def ai_smart_search():
     """AI-powered context-sensitive smart search with natural language understanding"""
+    gemini_model = get_gemini_model()
     try:
         if not VERTEX_AI_AVAILABLE or gemini_model is None:
             # Fallback to basic NLP search if AI not available
@@ -3803,6 +4039,7 @@ Top picks: {[r.get('symbol', r.get('pair', 'N/A')) for r in results[:5]]}
 @app.route('/api/ai/pattern-recognition', methods=['POST'])
 def ai_pattern_recognition():
     """Analyze chart patterns using AI"""
+    gemini_model = get_gemini_model()
     try:
         if not VERTEX_AI_AVAILABLE or gemini_model is None:
             return jsonify({
@@ -3860,6 +4097,7 @@ Format your response as:
 @app.route('/api/ai/predict', methods=['POST'])
 def ai_predict():
     """Generate price predictions using AI"""
+    gemini_model = get_gemini_model()
     try:
         if not VERTEX_AI_AVAILABLE or gemini_model is None:
             return jsonify({
@@ -4244,6 +4482,19 @@ def get_rise_cycles(symbol, date):
 def get_sector_momentum():
     """Get current sector momentum rankings"""
     try:
+        store = aggregate_store()
+        sector_stats = store.sector_stats() if store else None
+        if sector_stats is not None:
+            sectors = [{k: v for k, v in row.items() if k != 'as_of'} for row in sector_stats]
+            return jsonify({
+                'success': True,
+                'sectors': sectors,
+                'count': len(sectors),
+                'top_3': sectors[:3],
+                'as_of': sector_stats[0]['as_of'],
+                'source': 'aggregates'
+            })
+
         # Join weekly data with master table to get sector information
         query = """
         WITH latest_week AS (
@@ -4306,6 +4557,26 @@ def get_sector_top_stocks(sector):
     try:
         limit = request.args.get('limit', 20, type=int)
 
+        store = aggregate_store()
+        members = store.sector_stocks(sector, limit) if store else None
+        if members is not None:
+            stocks = [{
+                'symbol': row['symbol'],
+                'sector': row['sector'],
+                'industry': row['industry'],
+                'price': row['price'],
+                'volume': row['volume'],
+                'week_change_pct': row['week_change_pct'],
+                'sector_rank': row['sector_rank']
+            } for row in members]
+            return jsonify({
+                'success': True,
+                'sector': sector,
+                'stocks': stocks,
+                'count': len(stocks),
+                'source': 'aggregates'
+            })
+
         query = f"""
         WITH latest_week AS (
             SELECT MAX(date) as max_date
@@ -4592,37 +4863,7 @@ def get_weekly_data(asset_type):
         # Get the most recent week of data aggregated by symbol
         # Using only fields that exist in the v2 daily tables
         query = f"""
-        WITH latest_data AS (
-            SELECT
-                symbol,
-                name,
-                asset_type,
-                exchange,
-                country,
-                currency,
-                close,
-                open,
-                high,
-                low,
-                volume,
-                percent_change,
-                week_52_high,
-                week_52_low,
-                atr,
-                rsi,
-                macd,
-                macd_signal,
-                adx,
-                sma_20,
-                sma_50,
-                sma_200,
-                bollinger_upper,
-                bollinger_lower,
-                datetime,
-                ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY datetime DESC) as rn
-            FROM `{PROJECT_ID}.{DATASET_ID}.{daily_table}`
-            WHERE close IS NOT NULL AND close > 0
-        ),
+        WITH latest_data AS ({latest_rows_sql(asset_type, daily_table, 'close IS NOT NULL AND close > 0')}),
         week_ago AS (
             SELECT
                 symbol,
@@ -4672,7 +4913,6 @@ def get_weekly_data(asset_type):
             l.datetime
         FROM latest_data l
         LEFT JOIN week_ago w ON l.symbol = w.symbol AND w.rn = 1
-        WHERE l.rn = 1
         ORDER BY weekly_change_percent DESC NULLS LAST
         LIMIT {limit}
         """
@@ -4698,6 +4938,33 @@ def get_weekly_data(asset_type):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+def weekly_summary_from_quotes(asset_type, daily_table, latest):
+    """Weekly summary payload computed from the quote board's latest rows"""
+    rows = [r for r in latest if r.get('close') and r['close'] > 0]
+    changes = [r['percent_change'] for r in rows if r.get('percent_change') is not None]
+    atrs = [r['atr'] for r in rows if r.get('atr') is not None]
+    rsis = [r['rsi'] for r in rows if r.get('rsi') is not None]
+    last_updated = max((r['datetime'] for r in rows if r.get('datetime')), default=None)
+
+    def mean(values):
+        return safe_float(sum(values) / len(values)) if values else 0
+
+    return {
+        'success': True,
+        'asset_type': asset_type,
+        'table': daily_table,
+        'count': len({r['symbol'] for r in rows}),
+        'avg_change': mean(changes),
+        'max_gain': safe_float(max(changes)) if changes else 0,
+        'max_loss': safe_float(min(changes)) if changes else 0,
+        'avg_volatility': mean(atrs),
+        'gainers_count': sum(1 for c in changes if c > 0),
+        'losers_count': sum(1 for c in changes if c < 0),
+        'avg_rsi': mean(rsis),
+        'last_updated': last_updated.isoformat() if last_updated else None
+    }
+
+
 @app.route('/api/weekly/<asset_type>/summary', methods=['GET'])
 def get_weekly_summary(asset_type):
     """Get summary statistics for weekly data from daily tables"""
@@ -4710,6 +4977,11 @@ def get_weekly_summary(asset_type):
 
         daily_table = DAILY_TABLE_MAP[asset_type]
 
+        board = quote_board()
+        latest = board.quotes(asset_type) if board else None
+        if latest is not None:
+            return jsonify(weekly_summary_from_quotes(asset_type, daily_table, latest))
+
         # Get summary statistics from daily data (most recent record per symbol)
         query = f"""
         WITH latest_per_symbol AS (
@@ -4772,6 +5044,32 @@ def get_market_movers():
         asset_type = request.args.get('type', 'all')  # stocks, etf, crypto, all
         direction = request.args.get('direction', 'all')  # gainers, losers, all
         limit = min(request.args.get('limit', 25, type=int), 100)
+        timeframe = request.args.get('timeframe', 'daily')  # daily, session, weekly
+
+        store = aggregate_store()
+        rows = store.movers(timeframe, asset_type, direction, limit) if store else None
+        if rows is not None:
+            movers = [{
+                'symbol': row['symbol'],
+                'name': row['name'],
+                'asset_type': row['asset_type'],
+                'direction': row['direction'],
+                'price': safe_float(row['price']) if row['price'] else None,
+                'change_value': safe_float(row['change']) if row['change'] else None,
+                'change_percent': safe_float(row['change_pct']) if row['change_pct'] else None,
+                'volume': int(row['volume']) if row['volume'] else None,
+                'market_cap': safe_float(row['market_cap']) if row['market_cap'] else None,
+                'fetch_timestamp': row['as_of']
+            } for row in rows]
+            return jsonify({
+                'success': True,
+                'count': len(movers),
+                'timeframe': timeframe,
+                'gainers': [m for m in movers if m['direction'] == 'gainers'],
+                'losers': [m for m in movers if m['direction'] == 'losers'],
+                'all': movers,
+                'source': 'aggregates'
+            })
 
         # market_movers table schema: datetime, market, category, rank, symbol, name, exchange, price, change, percent_change, volume, market_cap, fetch_timestamp
         query = f"""
@@ -4807,9 +5105,9 @@ def get_market_movers():
                 'fetch_timestamp': row.fetch_timestamp.isoformat() if row.fetch_timestamp else None
             })
 
-        # Group by direction
-        gainers = [m for m in movers if m['direction'] == 'gainer']
-        losers = [m for m in movers if m['direction'] == 'loser']
+        # Group by direction (market_movers.category is 'gainers' / 'losers')
+        gainers = [m for m in movers if m['direction'] == 'gainers']
+        losers = [m for m in movers if m['direction'] == 'losers']
 
         return jsonify({
             'success': True,
@@ -5334,18 +5632,22 @@ def browse_all_symbols():
                 continue
             config = asset_configs[atype]
             try:
-                query = f"""
-                SELECT DISTINCT symbol, COALESCE(name, symbol) as name
-                FROM `{PROJECT_ID}.{DATASET_ID}.{config['table']}`
-                ORDER BY symbol
-                LIMIT 500
-                """
-                query_results = client.query(query).result()
+                catalog = catalog_for(atype)
+                if catalog:
+                    query_results = catalog.browse(atype, 500)
+                else:
+                    query = f"""
+                    SELECT DISTINCT symbol, COALESCE(name, symbol) as name
+                    FROM `{PROJECT_ID}.{DATASET_ID}.{config['table']}`
+                    ORDER BY symbol
+                    LIMIT 500
+                    """
+                    query_results = [dict(row) for row in client.query(query).result()]
                 symbols = []
                 for row in query_results:
                     symbols.append({
-                        'symbol': row.symbol,
-                        'name': row.name if row.name else row.symbol
+                        'symbol': row['symbol'],
+                        'name': row['name'] if row.get('name') else row['symbol']
                     })
                 result[atype] = {
                     'label': config['label'],
@@ -5415,6 +5717,15 @@ def search_symbols_for_download():
     else:
         search_types = ['stock', 'crypto']  # Default fallback
 
+    # Answer from the in-memory catalog when it is loaded
+    catalog = catalog_for(*search_types)
+    if catalog:
+        return jsonify({
+            'success': True,
+            'results': catalog.search(query, search_types, limit),
+            'query': query
+        })
+
     for search_type in search_types:
         table_name, type_label = asset_tables[search_type]
         # Search by both symbol AND name for better discovery
@@ -5447,6 +5758,72 @@ def search_symbols_for_download():
         'query': query
     })
 
+@app.route('/api/download/symbols/catalog', methods=['GET'])
+def symbol_catalog_status():
+    """Load state of the in-memory symbol catalog"""
+    symbol_catalog = get_symbol_catalog(client, PROJECT_ID, DATASET_ID) if get_symbol_catalog else None
+    if symbol_catalog is None:
+        return jsonify({'success': False, 'error': 'Symbol catalog not available'}), 503
+    return jsonify({'success': True, 'catalog': symbol_catalog.status()})
+
+
+@app.route('/api/aggregates/status', methods=['GET'])
+def aggregate_store_status():
+    """Load state of the in-memory market aggregates"""
+    store = aggregate_store()
+    if store is None:
+        return jsonify({'success': False, 'error': 'Aggregate store not available'}), 503
+    store.get()
+    return jsonify({'success': True, 'aggregates': store.status()})
+
+
+@app.route('/api/quotes/status', methods=['GET'])
+def quote_board_status():
+    """Load state of the in-memory quote board"""
+    board = quote_board()
+    if board is None:
+        return jsonify({'success': False, 'error': 'Quote board not available'}), 503
+    return jsonify({'success': True, 'quote_board': board.status()})
+
+
+@app.route('/api/quotes/notify', methods=['POST'])
+def quote_board_notify():
+    """Change notification from market_aggregates: {"tables": ["latest_stocks_daily", ...]}"""
+    board = quote_board()
+    if board is None:
+        return jsonify({'success': False, 'error': 'Quote board not available'}), 503
+    tables = (request.get_json(silent=True) or {}).get('tables', [])
+    return jsonify({'success': True, 'reloading': board.notify(tables)})
+
+
+@app.route('/api/quotes/<asset_type>', methods=['GET'])
+def get_quotes(asset_type):
+    """Latest bar per symbol (all indicators) from the quote board"""
+    timeframe = request.args.get('timeframe', 'daily')
+    symbols = request.args.get('symbols')
+    symbols = [s.strip().upper() for s in symbols.split(',') if s.strip()] if symbols else None
+
+    if get_quote_board is None or snapshot_table(asset_type, timeframe) is None:
+        return jsonify({'success': False, 'error': f'No latest-bar snapshot for {asset_type}/{timeframe}'}), 400
+
+    board = quote_board()
+    rows = board.quotes(asset_type, timeframe, symbols) if board else None
+    if rows is None:
+        return jsonify({'success': False, 'error': 'Quote board not loaded'}), 503
+
+    data = [sanitize_row(row) for row in rows]
+    if symbols is None:
+        data.sort(key=lambda r: r['symbol'])
+    return jsonify({
+        'success': True,
+        'asset_type': asset_type,
+        'timeframe': timeframe,
+        'table': snapshot_table(asset_type, timeframe),
+        'data': data,
+        'count': len(data)
+    })
+
+
 @app.route('/api/download/limits', methods=['GET'])
 def get_download_limits():
     """Get download limits for current user tier"""
@@ -6063,6 +6440,7 @@ def get_finnhub_company_news():
 @app.route('/api/ai/capabilities', methods=['GET'])
 def ai_capabilities():
     """Get available AI capabilities and service status"""
+    get_gemini_model()
     capabilities = {
         'vertex_ai': VERTEX_AI_AVAILABLE,
         'gemini_model': GEMINI_MODEL,
@@ -6164,6 +6542,92 @@ def get_technical_signals():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/api/alerts/custom', methods=['POST'])
+def evaluate_custom_alert_rules():
+    """Evaluate user-defined alert rules against the cached recent window"""
+    try:
+        if get_alert_system is None:
+            return jsonify({'success': False, 'error': 'Alert system not available'}), 503
+
+        data = request.get_json() or {}
+        rules = data.get('rules', [])
+        asset_type = data.get('asset_type', 'stocks')
+        recent_days = int(data.get('recent_days', 3))
+        if not rules:
+            return jsonify({'success': False, 'error': 'rules required'}), 400
+
+        alert_system = get_alert_system()
+        matches = alert_system.evaluate_custom_rules(rules, asset_type, recent_days)
+
+        return jsonify({
+            'success': True,
+            'asset_type': asset_type,
+            'match_count': len(matches),
+            'matches': matches
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Custom alert rules error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/alerts/ingest', methods=['POST'])
+def ingest_new_bars():
+    """Incremental alert evaluation for bars a fetcher just uploaded
+
+    Body: {"asset_type": "stocks", "bars": [{symbol, datetime, close, volume, ...}]}
+       or {"asset_type": "crypto", "symbols": ["BTC/USD", ...]}
+    """
+    try:
+        if get_alert_system is None:
+            return jsonify({'success': False, 'error': 'Alert system not available'}), 503
+
+        data = request.get_json() or {}
+        asset_type = data.get('asset_type', 'stocks')
+        bars = data.get('bars')
+        symbols = data.get('symbols')
+        if not bars and not symbols:
+            return jsonify({'success': False, 'error': 'bars or symbols required'}), 400
+
+        alert_system = get_alert_system()
+        alerts = alert_system.process_new_bars(asset_type, bars=bars, symbols=symbols)
+
+        return jsonify({
+            'success': True,
+            'asset_type': asset_type,
+            'bars_received': len(bars) if bars else None,
+            'alert_count': len(alerts),
+            'alerts': alerts
+        })
+    except Exception as e:
+        logger.error(f"Alert ingest error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/alerts/feed', methods=['GET'])
+def get_alert_feed():
+    """Alerts fired by incremental evaluation, newest first"""
+    try:
+        if get_alert_system is None:
+            return jsonify({'success': False, 'error': 'Alert system not available'}), 503
+
+        alert_system = get_alert_system()
+        alerts = alert_system.get_alert_feed(
+            since=request.args.get('since'),
+            asset_type=request.args.get('asset_type')
+        )
+
+        return jsonify({
+            'success': True,
+            'alert_count': len(alerts),
+            'alerts': alerts
+        })
+    except Exception as e:
+        logger.error(f"Alert feed error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @app.route('/api/alerts/market-summary', methods=['GET'])
 def get_market_alert_summary():
     """Get comprehensive market alert summary"""
@@ -0,0 +1,431 @@
+"""
+In-Process Model Serving
+Keeps exported BigQuery ML boosted-tree models in memory and scores feature vectors
+locally instead of issuing an ML.PREDICT job per request.
+
+Models are exported with EXPORT MODEL to GCS (XGBoost Booster format, model.bst)
+or trained locally and saved in the same format. A background watcher reloads a
+model when a new version of its artifact appears. Every model keeps a latency
+histogram of its predict calls.
+"""
+
+import os
+import json
+import time
+import bisect
+import tempfile
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+
+from lazy_loading import lazy_import, module_available
+
+# xgboost is imported when the first model is loaded, not when the API starts
+xgb = lazy_import('xgboost')
+XGBOOST_AVAILABLE = module_available('xgboost')
+
+MODEL_BUCKET_URI = os.environ.get('MODEL_BUCKET_URI', 'gs://aialgotradehits-ml-models')
+MODEL_RELOAD_SECONDS = int(os.environ.get('MODEL_RELOAD_SECONDS', '300'))
+MODEL_ARTIFACT = 'model.bst'
+MODEL_METADATA = 'assets/model_metadata.json'
+# model_metadata.json keys listing the classifier's classes in booster output order
+METADATA_CLASS_KEYS = ('label_classes', 'class_names')
+
+# Micro-batching: how long the first request waits for others to join its batch
+BATCH_WINDOW_MS = float(os.environ.get('BATCH_WINDOW_MS', '5'))
+BATCH_MAX_ROWS = int(os.environ.get('BATCH_MAX_ROWS', '2000'))
+BATCH_TIMEOUT_SECONDS = 60
+
+# Histogram bucket upper bounds in microseconds
+LATENCY_BUCKETS_US = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000, 100000]
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (microseconds), safe to update from request threads"""
+
+    def __init__(self, buckets=None):
+        self.buckets = list(buckets or LATENCY_BUCKETS_US)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0
+        self.sum_us = 0.0
+        self.max_us = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, latency_us):
+        index = bisect.bisect_left(self.buckets, latency_us)
+        with self._lock:
+            self.counts[index] += 1
+            self.total += 1
+            self.sum_us += latency_us
+            self.max_us = max(self.max_us, latency_us)
+
+    def percentile(self, pct):
+        """Upper bound of the bucket containing the given percentile, capped at the observed max"""
+        with self._lock:
+            if not self.total:
+                return None
+            target = self.total * pct / 100.0
+            running = 0
+            for i, count in enumerate(self.counts):
+                running += count
+                if running >= target:
+                    return min(self.buckets[i], self.max_us) if i < len(self.buckets) else self.max_us
+        return self.max_us
+
+    def to_dict(self):
+        with self._lock:
+            buckets = {f'le_{bound}us': count for bound, count in zip(self.buckets, self.counts)}
+            buckets['le_inf'] = self.counts[-1]
+            total, sum_us, max_us = self.total, self.sum_us, self.max_us
+        return {
+            'count': total,
+            'mean_us': round(sum_us / total, 2) if total else None,
+            'p50_us': self.percentile(50),
+            'p95_us': self.percentile(95),
+            'p99_us': self.percentile(99),
+            'max_us': round(max_us, 2),
+            'buckets': buckets
+        }
+
+
+def _split_gcs_uri(uri):
+    path = uri[len('gs://'):]
+    bucket, _, prefix = path.partition('/')
+    return bucket, prefix.rstrip('/')
+
+
+def _label_classes(metadata):
+    for key in METADATA_CLASS_KEYS:
+        if metadata.get(key):
+            return [str(c) for c in metadata[key]]
+    return None
+
+
+class ServedModel:
+    """
+    One exported boosted-tree classifier held in memory.
+    labels is (negative, positive); the booster's class order is read from the export's
+    model_metadata.json, and a model whose metadata does not list the classes is not served.
+    """
+
+    def __init__(self, name, uri, feature_names, labels=('DOWN', 'UP'), storage_client=None):
+        self.name = name
+        self.uri = uri.rstrip('/')
+        self.default_features = list(feature_names)
+        self.feature_names = list(feature_names)
+        self.labels = list(labels)
+        self.storage_client = storage_client
+        self.booster = None
+        self.positive_index = None
+        self.version = None
+        self.loaded_at = None
+        self.load_error = None
+        self.reloads = 0
+        self.latency = LatencyHistogram()
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.booster is not None
+
+    def _storage(self):
+        if self.storage_client is None:
+            from google.cloud import storage
+            self.storage_client = storage.Client()
+        return self.storage_client
+
+    def current_version(self):
+        """Version id of the artifact on storage (GCS generation or local mtime)"""
+        if self.uri.startswith('gs://'):
+            bucket_name, prefix = _split_gcs_uri(self.uri)
+            blob = self._storage().bucket(bucket_name).get_blob(f"{prefix}/{MODEL_ARTIFACT}")
+            return str(blob.generation) if blob else None
+        path = os.path.join(self.uri, MODEL_ARTIFACT)
+        return str(os.path.getmtime(path)) if os.path.exists(path) else None
+
+    def _fetch(self, target_dir):
+        """Copy model.bst (and metadata if present) into target_dir, returning local paths"""
+        if not self.uri.startswith('gs://'):
+            return os.path.join(self.uri, MODEL_ARTIFACT), os.path.join(self.uri, MODEL_METADATA)
+
+        bucket_name, prefix = _split_gcs_uri(self.uri)
+        bucket = self._storage().bucket(bucket_name)
+        model_path = os.path.join(target_dir, MODEL_ARTIFACT)
+        bucket.blob(f"{prefix}/{MODEL_ARTIFACT}").download_to_filename(model_path)
+        metadata_path = os.path.join(target_dir, 'model_metadata.json')
+        metadata_blob = bucket.get_blob(f"{prefix}/{MODEL_METADATA}")
+        if metadata_blob:
+            metadata_blob.download_to_filename(metadata_path)
+        return model_path, metadata_path
+
+    def load(self, force=False):
+        """Load the artifact if its version changed. Returns True when a new version was loaded."""
+        if not XGBOOST_AVAILABLE:
+            self.load_error = 'xgboost not installed'
+            return False
+        try:
+            version = self.current_version()
+            if version is None:
+                self.load_error = f"No {MODEL_ARTIFACT} under {self.uri}"
+                return False
+            if version == self.version and not force:
+                return False
+
+            with tempfile.TemporaryDirectory() as tmp:
+                model_path, metadata_path = self._fetch(tmp)
+                booster = xgb.Booster()
+                booster.load_model(model_path)
+                feature_names = self.default_features
+                metadata = {}
+                if os.path.exists(metadata_path):
+                    with open(metadata_path) as f:
+                        metadata = json.load(f)
+                    feature_names = metadata.get('feature_names') or feature_names
+
+            # Booster output follows the exported class order, not necessarily (negative, positive)
+            classes = _label_classes(metadata)
+            if classes is None or str(self.labels[1]) not in classes:
+                self.load_error = f"{MODEL_METADATA} does not list class {self.labels[1]!r} (classes: {classes})"
+                return False
+            positive_index = classes.index(str(self.labels[1]))
+
+            # Swap atomically - in-flight predictions keep the old booster
+            with self._lock:
+                self.booster = booster
+                self.positive_index = positive_index
+                self.feature_names = list(feature_names)
+                self.version = version
+                self.loaded_at = datetime.now(timezone.utc).isoformat()
+                self.load_error = None
+                self.reloads += 1
+            print(f"Loaded model {self.name} version {version} from {self.uri}")
+            return True
+
+        except Exception as e:
+            self.load_error = str(e)
+            print(f"Failed to load model {self.name}: {e}")
+            return False
+
+    def matrix(self, rows):
+        """Feature matrix in model column order; missing values stay NaN, as in BigQuery ML"""
+        names = self.feature_names
+        return np.array(
+            [[np.nan if row.get(name) is None else float(row[name]) for name in names] for row in rows],
+            dtype=np.float32
+        )
+
+    def predict_proba(self, rows):
+        """Probability of the positive label (labels[1]) for each feature dict"""
+        with self._lock:
+            booster, positive_index = self.booster, self.positive_index
+        if booster is None:
+            raise RuntimeError(f"Model {self.name} is not loaded")
+
+        start = time.perf_counter()
+        X = self.matrix(rows)
+        probs = np.asarray(booster.inplace_predict(X), dtype=float)
+        if probs.ndim == 2:
+            # Multi-class output: one column per class
+            probs = probs[:, positive_index]
+        elif positive_index == 0:
+            # Binary output is P(classes[1])
+            probs = 1 - probs
+        self.latency.observe((time.perf_counter() - start) * 1e6)
+        return probs
+
+    def predict(self, rows):
+        """Label and class probabilities for each feature dict"""
+        negative, positive = self.labels[0], self.labels[1]
+        return [
+            {
+                'label': positive if p >= 0.5 else negative,
+                'probabilities': {negative: float(1 - p), positive: float(p)}
+            }
+            for p in self.predict_proba(rows)
+        ]
+
+    def status(self):
+        return {
+            'name': self.name,
+            'uri': self.uri,
+            'ready': self.ready,
+            'version': self.version,
+            'loaded_at': self.loaded_at,
+            'reloads': self.reloads,
+            'features': len(self.feature_names),
+            'positive_index': self.positive_index,
+            'load_error': self.load_error,
+            'latency': self.latency.to_dict()
+        }
+
+
+class ModelServer:
+    """Registry of served models with a background hot-reload watcher"""
+
+    def __init__(self, reload_seconds=MODEL_RELOAD_SECONDS):
+        self.models = {}
+        self.reload_seconds = reload_seconds
+        self._watcher = None
+        self._stop = threading.Event()
+
+    def register(self, name, feature_names, uri=None, labels=('DOWN', 'UP'), storage_client=None):
+        """Register a model; uri defaults to MODEL_BUCKET_URI/<name>"""
+        if name not in self.models:
+            self.models[name] = ServedModel(
+                name, uri or f"{MODEL_BUCKET_URI}/{name}", feature_names,
+                labels=labels, storage_client=storage_client
+            )
+        return self.models[name]
+
+    def get(self, name):
+        """Registered model if it is loaded, else None. The first call starts the loader."""
+        if self._watcher is None:
+            self.start()
+        model = self.models.get(name)
+        return model if model is not None and model.ready else None
+
+    def reload(self, name=None, force=False):
+        names = [name] if name else list(self.models)
+        return {n: self.models[n].load(force=force) for n in names if n in self.models}
+
+    def _watch(self):
+        while True:
+            self.reload()
+            if self._stop.wait(self.reload_seconds):
+                return
+
+    def start(self):
+        """Load every registered model and keep polling for new versions in the background"""
+        if self._watcher is None or not self._watcher.is_alive():
+            self._stop.clear()
+            self._watcher = threading.Thread(target=self._watch, name='model-reloader', daemon=True)
+            self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self):
+        return {
+            'xgboost_available': XGBOOST_AVAILABLE,
+            'reload_seconds': self.reload_seconds,
+            'models': {name: model.status() for name, model in self.models.items()}
+        }
+
+
+class _PendingBatch:
+    """Rows submitted by one caller and the slot its results are delivered to"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.results = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent scoring calls into one vectorized call.
+
+    The first submitter opens a batch window of window_ms; every request arriving
+    within it (up to max_rows) is scored together by score_fn, which takes a list of
+    rows and returns a list of results in the same order.
+    """
+
+    def __init__(self, score_fn, window_ms=BATCH_WINDOW_MS, max_rows=BATCH_MAX_ROWS):
+        self.score_fn = score_fn
+        self.window_ms = window_ms
+        self.max_rows = max_rows
+        self.batches = 0
+        self.requests = 0
+        self._queue = []
+        self._queued_rows = 0
+        self._cond = threading.Condition()
+        self._worker = None
+
+    def submit(self, rows, timeout=BATCH_TIMEOUT_SECONDS):
+        """Score rows, possibly together with other callers' rows. Blocks until done."""
+        if not rows:
+            return []
+        pending = _PendingBatch(list(rows))
+        with self._cond:
+            self._queue.append(pending)
+            self._queued_rows += len(pending.rows)
+            self.requests += 1
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+                self._worker.start()
+            self._cond.notify()
+
+        if not pending.done.wait(timeout):
+            raise TimeoutError('Batch scoring timed out')
+        if pending.error is not None:
+            raise pending.error
+        return pending.results
+
+    def _take_batch(self):
+        """Wait for the window to close (or the batch to fill) and dequeue it"""
+        with self._cond:
+            while not self._queue:
+                if not self._cond.wait(timeout=30):
+                    # Idle - let the thread exit; the next submit restarts it
+                    self._worker = None
+                    return None
+            deadline = time.monotonic() + self.window_ms / 1000.0
+            while self._queued_rows < self.max_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(timeout=remaining)
+
+            batch, rows = [], 0
+            while self._queue and (not batch or rows + len(self._queue[0].rows) <= self.max_rows):
+                pending = self._queue.pop(0)
+                batch.append(pending)
+                rows += len(pending.rows)
+            self._queued_rows -= rows
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            all_rows = [row for pending in batch for row in pending.rows]
+            try:
+                results = self.score_fn(all_rows)
+                offset = 0
+                for pending in batch:
+                    pending.results = results[offset:offset + len(pending.rows)]
+                    offset += len(pending.rows)
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+            self.batches += 1
+            for pending in batch:
+                pending.done.set()
+
+    def status(self):
+        return {
+            'window_ms': self.window_ms,
+            'max_rows': self.max_rows,
+            'requests': self.requests,
+            'batches': self.batches,
+            'queued_rows': self._queued_rows
+        }
+
+
+def export_bqml_model(bq_client, model_id, uri):
+    """Export a BigQuery ML model to GCS in XGBoost Booster format"""
+    bq_client.query(f"EXPORT MODEL `{model_id}` OPTIONS(URI = '{uri.rstrip('/')}/')").result()
+
+
+_model_server = None
+
+
+def get_model_server():
+    """Get singleton model server instance"""
+    global _model_server
+    if _model_server is None:
+        _model_server = ModelServer()
+    return _model_server
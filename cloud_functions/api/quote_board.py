@@ -0,0 +1,155 @@
+"""
+In-Memory Quote Board
+Holds the latest-bar snapshot tables (latest_<asset>_<timeframe>, maintained by
+the market_aggregates Cloud Function) in process memory, one row per symbol
+with every indicator, so "latest row per symbol" lookups skip BigQuery.
+
+The snapshot is only rewritten when a symbol gets a newer bar, so its
+last-modified time is the change signal: loaded boards re-check table metadata
+(no query cost) every poll_seconds and reload only the snapshots that changed.
+POST /api/quotes/notify marks snapshots changed right away.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+
+QUOTE_BOARD_POLL_SECONDS = int(os.environ.get('QUOTE_BOARD_POLL_SECONDS', '60'))
+QUOTE_BOARD_RETRY_SECONDS = 60
+
+# Asset type names used by the endpoints -> snapshot asset type
+SNAPSHOT_ASSET_TYPES = {
+    'stocks': 'stocks', 'stock': 'stocks',
+    'crypto': 'crypto', 'cryptos': 'crypto',
+    'etfs': 'etfs', 'etf': 'etfs',
+    'forex': 'forex',
+    'indices': 'indices', 'index': 'indices',
+    'commodities': 'commodities', 'commodity': 'commodities',
+}
+SNAPSHOT_TIMEFRAMES = ('daily', 'hourly', '5min')
+
+
+def snapshot_table(asset_type, timeframe='daily'):
+    """Snapshot table name for an asset type, or None if there is no snapshot for it"""
+    asset = SNAPSHOT_ASSET_TYPES.get(asset_type)
+    if asset is None or timeframe not in SNAPSHOT_TIMEFRAMES:
+        return None
+    return f"latest_{asset}_{timeframe}"
+
+
+class QuoteBoard:
+    """Latest-bar snapshots by table name: {symbol: row dict}"""
+
+    def __init__(self, client, project_id, dataset_id, poll_seconds=QUOTE_BOARD_POLL_SECONDS):
+        self.client = client
+        self.project_id = project_id
+        self.dataset_id = dataset_id
+        self.poll_seconds = poll_seconds
+
+        self.boards = {}
+        self.modified = {}
+        self.loaded_at = {}
+        self.errors = {}
+        self._checked_at = 0.0
+        self._retry_at = {}
+        self._stale = set()
+        self._lock = threading.Lock()
+        self._check_lock = threading.Lock()
+
+    def _table_id(self, name):
+        return f"{self.project_id}.{self.dataset_id}.{name}"
+
+    def _load(self, name):
+        """Read one snapshot table (skipped if it has not changed since the last load)"""
+        try:
+            modified = self.client.get_table(self._table_id(name)).modified
+            if name in self.boards and modified == self.modified.get(name):
+                return
+            rows = self.client.query(f"SELECT * FROM `{self._table_id(name)}`").result()
+            board = {row['symbol']: dict(row.items()) for row in rows}
+            with self._lock:
+                self.boards[name] = board
+                self.modified[name] = modified
+                self.loaded_at[name] = time.time()
+                self.errors.pop(name, None)
+        except Exception as e:
+            self.errors[name] = str(e)
+            self._retry_at[name] = time.time() + QUOTE_BOARD_RETRY_SECONDS
+            print(f"Quote board: failed to load {name}: {e}")
+
+    def _check(self):
+        """Reload every loaded snapshot whose table changed"""
+        try:
+            self._checked_at = time.time()
+            self._stale.clear()
+            for name in list(self.boards):
+                self._load(name)
+        finally:
+            self._check_lock.release()
+
+    def board(self, asset_type, timeframe='daily'):
+        """{symbol: latest row} for the snapshot, or None if it is not available"""
+        name = snapshot_table(asset_type, timeframe)
+        if name is None:
+            return None
+
+        if name not in self.boards:
+            if time.time() < self._retry_at.get(name, 0):
+                return None
+            with self._check_lock:
+                if name not in self.boards:
+                    self._load(name)
+        elif self._stale or time.time() - self._checked_at > self.poll_seconds:
+            # One metadata check at a time; requests keep the loaded rows meanwhile
+            if self._check_lock.acquire(blocking=False):
+                threading.Thread(target=self._check, name='quote-board', daemon=True).start()
+        return self.boards.get(name)
+
+    def quotes(self, asset_type, timeframe='daily', symbols=None):
+        """Latest rows, optionally limited to symbols (in the order given)"""
+        board = self.board(asset_type, timeframe)
+        if board is None:
+            return None
+        if symbols is None:
+            return list(board.values())
+        return [board[s] for s in symbols if s in board]
+
+    def available(self, asset_type, timeframe='daily'):
+        return self.board(asset_type, timeframe) is not None
+
+    def notify(self, tables):
+        """Snapshot tables changed upstream; the next request triggers a reload"""
+        names = [name for name in tables if name in self.boards]
+        self._stale.update(names)
+        return names
+
+    def status(self):
+        return {
+            'poll_seconds': self.poll_seconds,
+            'checked_at': datetime.fromtimestamp(self._checked_at).isoformat() if self._checked_at else None,
+            'tables': {
+                name: {
+                    'symbols': len(board),
+                    'modified': self.modified[name].isoformat() if self.modified.get(name) else None,
+                    'loaded_at': datetime.fromtimestamp(self.loaded_at[name]).isoformat()
+                }
+                for name, board in self.boards.items()
+            },
+            'stale': sorted(self._stale),
+            'errors': dict(self.errors)
+        }
+
+
+_board = None
+_board_lock = threading.Lock()
+
+
+def get_quote_board(client=None, project_id=None, dataset_id=None):
+    """Process-wide quote board, created on first use"""
+    global _board
+    if _board is None:
+        with _board_lock:
+            if _board is None and client is not None:
+                _board = QuoteBoard(client, project_id, dataset_id)
+    return _board
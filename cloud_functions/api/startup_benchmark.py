@@ -0,0 +1,148 @@
+"""
+API Cold-Start Benchmark and Import Profiler
+
+Imports main.py in fresh interpreters (what a Cloud Run / Cloud Functions cold
+start pays before the first request) and fails if the median import time goes
+over the threshold, or if a heavy SDK that should load lazily is imported
+eagerly again.
+
+Usage:
+    python startup_benchmark.py                      # 5 cold imports, check threshold
+    python startup_benchmark.py --runs 10 --max-seconds 1.5
+    python startup_benchmark.py --profile            # per-module import cost report
+    python startup_benchmark.py --profile --top 40
+
+Exit code 1 on regression, so it can gate deploy_api.py or CI.
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+MAX_COLD_IMPORT_SECONDS = float(os.environ.get('API_MAX_COLD_IMPORT_SECONDS', '2.0'))
+
+# Must not be imported while main.py loads - they are deferred to first use
+LAZY_MODULES = [
+    'google.cloud.bigquery',
+    'google.cloud.storage',
+    'vertexai',
+    'bcrypt',
+    'pandas',
+    'xgboost',
+    'requests',
+]
+
+_PROBE = """
+import sys, time, json
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+
+def cold_import(module='main', importtime=False):
+    """Import module in a fresh interpreter; returns (seconds, eagerly loaded lazy modules, stderr)"""
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ['-X', 'importtime']
+    cmd += ['-c', _PROBE.format(module=module, lazy=LAZY_MODULES)]
+
+    proc = subprocess.run(cmd, cwd=API_DIR, capture_output=True, text=True)
+    lines = [line for line in proc.stdout.splitlines() if line.startswith('{')]
+    if proc.returncode != 0 or not lines:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    result = json.loads(lines[-1])
+    return result['seconds'], result['loaded'], proc.stderr
+
+
+def parse_importtime(stderr):
+    """-X importtime output -> [(module, depth, self_us, cumulative_us)]"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line.split(':', 1)[1].split('|', 2)
+            self_us, cumulative_us = int(self_us), int(cumulative_us)
+        except ValueError:
+            continue
+        name = name[1:]
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), depth, self_us, cumulative_us))
+    return entries
+
+
+def package_of(module):
+    parts = module.split('.')
+    if parts[0] == 'google' and len(parts) > 2:
+        return '.'.join(parts[:3])
+    return parts[0]
+
+
+def profile_report(entries, top=25):
+    """Per-package self time and the costliest imports made directly by main"""
+    by_package = {}
+    for name, _, self_us, _ in entries:
+        pkg = package_of(name)
+        count, total = by_package.get(pkg, (0, 0))
+        by_package[pkg] = (count + 1, total + self_us)
+
+    total_us = sum(total for _, total in by_package.values()) or 1
+    lines = ['', f"{'package':<36}{'modules':>8}{'self ms':>10}{'share':>8}", '-' * 62]
+    for pkg, (count, self_us) in sorted(by_package.items(), key=lambda kv: -kv[1][1])[:top]:
+        lines.append(f"{pkg:<36}{count:>8}{self_us / 1000:>10.1f}{self_us / total_us:>8.1%}")
+
+    # Direct imports of main are the ones a code change controls
+    main_depth = next((depth for name, depth, _, _ in entries if name == 'main'), None)
+    if main_depth is not None:
+        direct = [(name, cum) for name, depth, _, cum in entries if depth == main_depth + 1]
+        lines += ['', f"{'imported by main.py':<48}{'cumulative ms':>14}", '-' * 62]
+        for name, cum in sorted(direct, key=lambda e: -e[1])[:top]:
+            lines.append(f"{name:<48}{cum / 1000:>14.1f}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='API cold-start benchmark')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-seconds', type=float, default=MAX_COLD_IMPORT_SECONDS)
+    parser.add_argument('--module', default='main')
+    parser.add_argument('--profile', action='store_true', help='print per-module import costs')
+    parser.add_argument('--top', type=int, default=25)
+    args = parser.parse_args()
+
+    if args.profile:
+        _, _, stderr = cold_import(args.module, importtime=True)
+        print(profile_report(parse_importtime(stderr), args.top))
+
+    timings = []
+    eager = set()
+    for i in range(args.runs):
+        seconds, loaded, _ = cold_import(args.module)
+        timings.append(seconds)
+        eager.update(loaded)
+        print(f"run {i + 1}: {seconds:.3f}s")
+
+    median = statistics.median(timings)
+    print(f"\ncold import of {args.module}: median {median:.3f}s, "
+          f"min {min(timings):.3f}s, max {max(timings):.3f}s (threshold {args.max_seconds:.2f}s)")
+
+    failed = False
+    if median > args.max_seconds:
+        print(f"FAIL: median cold import {median:.3f}s exceeds {args.max_seconds:.2f}s")
+        failed = True
+    if eager:
+        print(f"FAIL: imported eagerly, should load on first use: {', '.join(sorted(eager))}")
+        failed = True
+    if not failed:
+        print("OK")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
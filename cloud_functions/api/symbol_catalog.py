@@ -0,0 +1,279 @@
+"""
+In-Memory Symbol Catalog
+Loads the symbol universe of every asset table once, keeps it refreshed in the
+background and answers symbol search / browse requests in-process instead of
+running SELECT DISTINCT ... LIKE scans per keystroke.
+
+Each asset type is held as a symbol-sorted array (prefix lookups are a bisect,
+i.e. a flattened trie) plus an n-gram inverted index over upper-cased names for
+substring matches. Ranking follows the SQL it replaces: exact symbol match,
+then symbol prefix, then name match, each ordered by symbol.
+"""
+
+import os
+import json
+import bisect
+import heapq
+import threading
+import time
+from datetime import datetime, timezone
+
+CATALOG_REFRESH_SECONDS = int(os.environ.get('SYMBOL_CATALOG_REFRESH_SECONDS', '900'))
+CATALOG_LOAD_TIMEOUT = float(os.environ.get('SYMBOL_CATALOG_LOAD_TIMEOUT', '5'))
+CATALOG_FALLBACK_FILE = os.environ.get('SYMBOL_CATALOG_FALLBACK', 'all_symbols_cache.json')
+NGRAM_SIZES = (2, 3)
+
+# asset type -> (table, keeps latest bar, has sector)
+ASSET_TABLES = {
+    'stock': ('stocks_daily_clean', True, True),
+    'crypto': ('crypto_daily_clean', True, False),
+    'etf': ('v2_etfs_daily', False, False),
+    'forex': ('v2_forex_daily', False, False),
+    'index': ('v2_indices_daily', False, False),
+    'commodity': ('v2_commodities_daily', False, False),
+    'interest_rate': ('v2_interest_rates_daily', False, False),
+}
+
+LATEST_BAR_FIELDS = ['datetime', 'close', 'volume', 'rsi', 'macd', 'adx', 'roc']
+
+# Latest-bar snapshot tables (market_aggregates) read instead of scanning the daily table
+LATEST_BAR_SNAPSHOTS = {'stock': 'latest_stocks_daily', 'crypto': 'latest_crypto_daily'}
+
+
+class SymbolIndex:
+    """Search index for one asset type"""
+
+    def __init__(self, entries):
+        self.entries = sorted(entries, key=lambda e: (e['symbol'].upper(), e['symbol']))
+        self.symbols = [e['symbol'].upper() for e in self.entries]
+        self.names = [(e.get('name') or '').upper() for e in self.entries]
+
+        self.grams = {}
+        for i, name in enumerate(self.names):
+            for n in NGRAM_SIZES:
+                for j in range(len(name) - n + 1):
+                    self.grams.setdefault(name[j:j + n], set()).add(i)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _prefix_range(self, query):
+        lo = bisect.bisect_left(self.symbols, query)
+        hi = bisect.bisect_left(self.symbols, query + '\uffff', lo)
+        return lo, hi
+
+    def _name_matches(self, query):
+        if len(query) < NGRAM_SIZES[0]:
+            return {i for i, name in enumerate(self.names) if query in name}
+
+        n = max(size for size in NGRAM_SIZES if size <= len(query))
+        postings = []
+        for j in range(len(query) - n + 1):
+            ids = self.grams.get(query[j:j + n])
+            if not ids:
+                return set()
+            postings.append(ids)
+        postings.sort(key=len)
+
+        candidates = set(postings[0])
+        for ids in postings[1:]:
+            candidates &= ids
+            if not candidates:
+                return candidates
+        if len(query) == n:
+            return candidates
+        return {i for i in candidates if query in self.names[i]}
+
+    def search(self, query, limit):
+        """Entries whose symbol starts with query or whose name contains it"""
+        # An exact match is the first entry of its own prefix range
+        lo, hi = self._prefix_range(query)
+        ranked = list(range(lo, min(hi, lo + limit)))
+
+        if len(ranked) < limit:
+            others = [i for i in self._name_matches(query) if not lo <= i < hi]
+            ranked.extend(heapq.nsmallest(limit - len(ranked), others))
+
+        return [self.entries[i] for i in ranked]
+
+    def browse(self, limit):
+        return self.entries[:limit]
+
+
+class SymbolCatalog:
+    """All asset types, loaded from BigQuery and refreshed in a daemon thread"""
+
+    def __init__(self, client, project_id, dataset_id, refresh_seconds=CATALOG_REFRESH_SECONDS):
+        self.client = client
+        self.project_id = project_id
+        self.dataset_id = dataset_id
+        self.refresh_seconds = refresh_seconds
+
+        self.indexes = {}
+        self.loaded_at = {}
+        self.errors = {}
+        self.load_seconds = None
+        self._loaded = threading.Event()
+        self._first_pass = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _query(self, asset_type, snapshot=False):
+        table, latest_bar, has_sector = ASSET_TABLES[asset_type]
+        table_ref = f"`{self.project_id}.{self.dataset_id}.{table}`"
+        sector = ', sector' if has_sector else ''
+
+        if latest_bar and snapshot:
+            return f"""
+            SELECT symbol, name{sector}, {', '.join(LATEST_BAR_FIELDS)}
+            FROM `{self.project_id}.{self.dataset_id}.{LATEST_BAR_SNAPSHOTS[asset_type]}`
+            WHERE symbol IS NOT NULL
+            """
+        if latest_bar:
+            return f"""
+            SELECT symbol, name{sector}, {', '.join(LATEST_BAR_FIELDS)}
+            FROM {table_ref}
+            WHERE symbol IS NOT NULL
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY datetime DESC) = 1
+            """
+        sector = ', ANY_VALUE(sector) AS sector' if has_sector else ''
+        return f"""
+        SELECT symbol, MAX(name) AS name{sector}
+        FROM {table_ref}
+        WHERE symbol IS NOT NULL
+        GROUP BY symbol
+        """
+
+    def _rows(self, asset_type):
+        if asset_type in LATEST_BAR_SNAPSHOTS:
+            try:
+                return self.client.query(self._query(asset_type, snapshot=True)).result()
+            except Exception as e:
+                print(f"Symbol catalog: {LATEST_BAR_SNAPSHOTS[asset_type]} unavailable, scanning: {e}")
+        return self.client.query(self._query(asset_type)).result()
+
+    def _load_type(self, asset_type):
+        _, latest_bar, has_sector = ASSET_TABLES[asset_type]
+        entries = []
+        for row in self._rows(asset_type):
+            entry = {'symbol': row.symbol, 'name': row.name or None}
+            if has_sector:
+                entry['sector'] = row.sector or None
+            if latest_bar:
+                entry['latest'] = {field: row[field] for field in LATEST_BAR_FIELDS}
+            entries.append(entry)
+        return SymbolIndex(entries)
+
+    def _load_fallback(self):
+        """Seed stock symbols from the cached symbol list if BigQuery is unavailable"""
+        if 'stock' in self.indexes or not os.path.exists(CATALOG_FALLBACK_FILE):
+            return
+        try:
+            with open(CATALOG_FALLBACK_FILE) as f:
+                cached = json.load(f)
+            symbols = cached.get('stocks', []) if isinstance(cached, dict) else cached
+            self.indexes['stock'] = SymbolIndex([{'symbol': s, 'name': None} for s in symbols])
+            self.loaded_at['stock'] = f"file:{CATALOG_FALLBACK_FILE}"
+        except Exception as e:
+            self.errors['fallback'] = str(e)
+
+    def refresh(self):
+        """Rebuild every asset index; a failed type keeps its previous index"""
+        started = time.time()
+        for asset_type in ASSET_TABLES:
+            try:
+                index = self._load_type(asset_type)
+                with self._lock:
+                    self.indexes[asset_type] = index
+                    self.loaded_at[asset_type] = datetime.now(timezone.utc).isoformat()
+                    self.errors.pop(asset_type, None)
+            except Exception as e:
+                self.errors[asset_type] = str(e)
+                print(f"Symbol catalog: failed to load {asset_type}: {e}")
+
+        with self._lock:
+            self._load_fallback()
+        self.load_seconds = round(time.time() - started, 2)
+        if self.indexes:
+            self._loaded.set()
+        self._first_pass.set()
+        return self.status()
+
+    def _run(self):
+        while True:
+            self.refresh()
+            if self._stop.wait(self.refresh_seconds):
+                return
+
+    def start(self):
+        """Load the catalog and keep refreshing it in the background"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='symbol-catalog', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def ready(self, timeout=CATALOG_LOAD_TIMEOUT):
+        """True once something is loaded; waits up to timeout only for the first attempt"""
+        self._first_pass.wait(timeout)
+        return self._loaded.is_set()
+
+    def has(self, asset_type):
+        return asset_type in self.indexes
+
+    def search(self, query, asset_types, limit=20):
+        """Ranked matches per asset type, concatenated in asset_types order"""
+        query = query.upper().strip()
+        results = []
+        for asset_type in asset_types:
+            index = self.indexes.get(asset_type)
+            if index is None:
+                continue
+            for entry in index.search(query, limit):
+                results.append({
+                    'symbol': entry['symbol'],
+                    'name': entry.get('name') or entry['symbol'],
+                    'type': asset_type
+                })
+        return results[:limit]
+
+    def browse(self, asset_type, limit=500):
+        index = self.indexes.get(asset_type)
+        return index.browse(limit) if index is not None else []
+
+    def entries(self, asset_type):
+        index = self.indexes.get(asset_type)
+        return index.entries if index is not None else []
+
+    def status(self):
+        return {
+            'loaded': self._loaded.is_set(),
+            'refresh_seconds': self.refresh_seconds,
+            'load_seconds': self.load_seconds,
+            'asset_types': {
+                asset_type: {
+                    'symbols': len(index),
+                    'loaded_at': self.loaded_at.get(asset_type)
+                }
+                for asset_type, index in self.indexes.items()
+            },
+            'errors': dict(self.errors)
+        }
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_symbol_catalog(client=None, project_id=None, dataset_id=None):
+    """Process-wide catalog, created (and started) on first use"""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None and client is not None:
+                _catalog = SymbolCatalog(client, project_id, dataset_id)
+                _catalog.start()
+    return _catalog
@@ -0,0 +1,153 @@
+"""
+Tests for /api/ml/predict/batch through the MicroBatcher path.
+BigQuery is replaced by a fake client; run with: python -m pytest test_nested_batch_predict.py
+"""
+
+import json
+import threading
+
+import numpy as np
+from flask import Flask
+
+import walk_forward_endpoints as wfe
+import model_serving
+from model_serving import get_model_server
+
+
+class FakeRow(dict):
+    def __getattr__(self, name):
+        return self[name]
+
+
+class FakeJob:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def result(self):
+        return self.rows
+
+
+class FakeClient:
+    """Answers the nested feature query and the ML.PREDICT fallback"""
+
+    def __init__(self):
+        self.predict_calls = 0
+
+    def query(self, query, job_config=None):
+        params = {p.name: p for p in job_config.query_parameters}
+        if 'ML.PREDICT' in query:
+            self.predict_calls += 1
+            rows = json.loads(params['rows'].value)
+            return FakeJob([
+                FakeRow(row_id=i, predicted_hour_direction='UP' if row['daily_score'] >= 5 else 'DOWN',
+                        up_prob=0.8 if row['daily_score'] >= 5 else 0.3,
+                        down_prob=0.2 if row['daily_score'] >= 5 else 0.7)
+                for i, row in enumerate(rows)
+            ])
+        return FakeJob([
+            FakeRow(symbol=symbol, hourly_datetime='2026-01-02 15:00:00', daily_score=6 if symbol == 'NVDA' else 2,
+                    hourly_score=5, avg_5min_score=3.0)
+            for symbol in params['symbols'].values if symbol != 'MISSING'
+        ])
+
+
+class FakeBooster:
+    def __init__(self):
+        self.inputs = None
+
+    def inplace_predict(self, X):
+        self.inputs = X
+        return np.full(len(X), 0.9)
+
+
+def make_app(client):
+    app = Flask(__name__)
+    wfe.register_walk_forward_endpoints(app, client, 'aialgotradehits', 'crypto_trading_data', dict)
+    return app.test_client()
+
+
+def post_batch(api, symbols):
+    return api.post('/api/ml/predict/batch', json={'symbols': symbols})
+
+
+def test_batch_request_scored_by_bigquery_through_batcher():
+    client = FakeClient()
+    wfe._nested_batcher = None
+    api = make_app(client)
+
+    response = post_batch(api, ['AAPL', 'NVDA', 'MISSING'])
+    assert response.status_code == 200, response.get_json()
+    body = response.get_json()
+    assert body['served_by'] == 'bigquery_ml'
+    assert body['missing_features'] == ['MISSING']
+    assert [p['symbol'] for p in body['predictions']] == ['NVDA', 'AAPL']
+    assert body['predictions'][0]['direction'] == 'UP'
+    assert wfe._nested_batcher.status()['batches'] >= 1
+
+
+def test_concurrent_batch_requests_share_a_model_call():
+    client = FakeClient()
+    wfe._nested_batcher = None
+    api = make_app(client)
+    wfe.get_nested_batcher(client).window_ms = 200
+
+    responses = []
+    threads = [
+        threading.Thread(target=lambda s=s: responses.append(post_batch(api, [s])))
+        for s in ('AAPL', 'NVDA', 'MSFT')
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert [r.status_code for r in responses] == [200, 200, 200]
+    assert client.predict_calls == 1
+    assert {r.get_json()['predictions'][0]['symbol'] for r in responses} == {'AAPL', 'NVDA', 'MSFT'}
+
+
+def test_served_by_reports_in_process_scoring():
+    client = FakeClient()
+    wfe._nested_batcher = None
+    api = make_app(client)
+    model = get_model_server().models[wfe.NESTED_MODEL_NAME]
+    model.booster, model.positive_index = FakeBooster(), 1
+    try:
+        body = post_batch(api, ['AAPL']).get_json()
+    finally:
+        model.booster, model.positive_index = None, None
+
+    assert body['served_by'] == 'in_process'
+    assert client.predict_calls == 0
+    assert body['predictions'][0]['up_probability'] == 0.9
+
+
+def test_in_process_scoring_follows_exported_class_order():
+    client = FakeClient()
+    wfe._nested_batcher = None
+    api = make_app(client)
+    model = get_model_server().models[wfe.NESTED_MODEL_NAME]
+    # Exported classes ['UP', 'DOWN']: the booster's 0.9 is P(DOWN)
+    assert model_serving._label_classes({'label_classes': ['UP', 'DOWN']}).index('UP') == 0
+    model.booster, model.positive_index = FakeBooster(), 0
+    try:
+        body = post_batch(api, ['AAPL']).get_json()
+    finally:
+        model.booster, model.positive_index = None, None
+
+    assert body['served_by'] == 'in_process'
+    assert body['predictions'][0]['direction'] == 'DOWN'
+    assert abs(body['predictions'][0]['up_probability'] - 0.1) < 1e-9
+
+
+def test_missing_features_are_nan_not_zero():
+    model = model_serving.ServedModel('m', '/tmp/m', ['a', 'b'])
+    X = model.matrix([{'a': 0, 'b': None}, {'a': 2.5}])
+    assert X[0][0] == 0 and np.isnan(X[0][1])
+    assert X[1][0] == 2.5 and np.isnan(X[1][1])
+
+
+def test_reload_endpoint_refuses_export():
+    api = make_app(FakeClient())
+    response = api.post('/api/ml/models/reload', json={'export': True})
+    assert response.status_code == 403
@@ -3,12 +3,24 @@ Trading Alert System for AIAlgoTradeHits.com
 Detects price anomalies, volume surges, and generates trading alerts
 
 Based on: gcp-timeseries-bigquery-implementation.html
+
+All detectors share one rule engine:
+- The recent window for an asset type is pulled with a single query and cached briefly
+- Rolling features (prev close, 20-day mean/stddev, volume average, prior MACD) are
+  computed per symbol with pandas group operations
+- Alert rules are declarative dicts evaluated as NumPy masks over the whole frame;
+  within a category the first matching rule wins (same as the old SQL CASE)
+- Severity, strength and recommendations are computed vectorially
 """
 
 from google.cloud import bigquery
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
+from collections import OrderedDict, deque
+import operator
+import threading
+import time
 import logging
 
 logger = logging.getLogger(__name__)
@@ -27,6 +39,212 @@ ALERT_THRESHOLDS = {
     'adx_strong_trend': 30,        # Strong trend threshold
 }
 
+# Rolling window used for averages/stddev (rows preceding the current bar)
+ROLLING_WINDOW = 20
+# Days of history pulled for one evaluation pass
+WINDOW_LOOKBACK_DAYS = 25
+# Seconds a pulled window is reused across detector calls
+WINDOW_CACHE_TTL = 300
+
+# Columns pulled once per asset type for all rule categories
+WINDOW_COLUMNS = [
+    'symbol', 'datetime', 'open', 'high', 'low', 'close', 'volume',
+    'rsi', 'macd', 'macd_signal', 'macd_histogram', 'adx', 'plus_di', 'minus_di',
+    'bollinger_upper', 'bollinger_lower', 'sma_20', 'sma_50',
+    'golden_cross', 'death_cross', 'cycle_type', 'cycle_pnl_pct',
+    'hammer', 'shooting_star', 'bullish_engulfing', 'bearish_engulfing', 'doji',
+    'trend_regime', 'buy_pressure_pct', 'sell_pressure_pct',
+]
+
+# Fired-alert keys remembered for de-duplication in incremental mode
+FIRED_ALERT_MEMORY = 50000
+# Newly fired alerts kept for the polling feed
+ALERT_FEED_SIZE = 500
+
+# Non-numeric window columns; everything else is coerced to float
+NON_NUMERIC_COLUMNS = ('symbol', 'datetime', 'cycle_type')
+
+# Days of bars (from today) each category reports on
+CATEGORY_RECENT_DAYS = {'price': 3, 'volume': 3, 'technical': 5}
+
+# Declarative alert rules.
+# Each condition is (column, op, operand); operand is a number, a threshold key
+# from ALERT_THRESHOLDS, another column name, or a literal string. Conditions
+# within a rule are ANDed.
+# Rules are evaluated in order per category - the first match labels the bar.
+DEFAULT_ALERT_RULES = [
+    {'name': 'PRICE_SPIKE', 'category': 'price', 'conditions': [('abs_price_change_pct', '>=', 'price_spike_pct')]},
+    {'name': 'BB_UPPER_BREAKOUT', 'category': 'price', 'conditions': [('close', '>', 'bollinger_upper')]},
+    {'name': 'BB_LOWER_BREAKOUT', 'category': 'price', 'conditions': [('close', '<', 'bollinger_lower')]},
+    {'name': 'RSI_OVERBOUGHT', 'category': 'price', 'conditions': [('rsi', '>=', 'rsi_overbought')]},
+    {'name': 'RSI_OVERSOLD', 'category': 'price', 'conditions': [('rsi', '<=', 'rsi_oversold')]},
+    {'name': 'GOLDEN_CROSS', 'category': 'price', 'conditions': [('golden_cross', '==', 1)]},
+    {'name': 'DEATH_CROSS', 'category': 'price', 'conditions': [('death_cross', '==', 1)]},
+
+    {'name': 'VOLUME_SURGE_BULLISH', 'category': 'volume',
+     'conditions': [('volume_ratio', '>=', 'volume_surge_ratio'), ('price_change_pct', '>', 0)]},
+    {'name': 'VOLUME_SURGE_BEARISH', 'category': 'volume',
+     'conditions': [('volume_ratio', '>=', 'volume_surge_ratio'), ('price_change_pct', '<', 0)]},
+    {'name': 'VOLUME_SURGE', 'category': 'volume', 'conditions': [('volume_ratio', '>=', 'volume_surge_ratio')]},
+
+    {'name': 'GOLDEN_CROSS', 'category': 'technical', 'direction': 'BULLISH', 'conditions': [('golden_cross', '==', 1)]},
+    {'name': 'DEATH_CROSS', 'category': 'technical', 'direction': 'BEARISH', 'conditions': [('death_cross', '==', 1)]},
+    {'name': 'HAMMER_OVERSOLD', 'category': 'technical', 'direction': 'BULLISH',
+     'conditions': [('hammer', '==', 1), ('rsi', '<', 40)]},
+    {'name': 'SHOOTING_STAR_OVERBOUGHT', 'category': 'technical', 'direction': 'BEARISH',
+     'conditions': [('shooting_star', '==', 1), ('rsi', '>', 60)]},
+    {'name': 'BULLISH_ENGULFING', 'category': 'technical', 'direction': 'BULLISH', 'conditions': [('bullish_engulfing', '==', 1)]},
+    {'name': 'BEARISH_ENGULFING', 'category': 'technical', 'direction': 'BEARISH', 'conditions': [('bearish_engulfing', '==', 1)]},
+    {'name': 'MACD_BULLISH_CROSS', 'category': 'technical', 'direction': 'BULLISH',
+     'conditions': [('macd', '>', 'macd_signal'), ('prev_macd', '<=', 'prev_macd_signal')]},
+    {'name': 'MACD_BEARISH_CROSS', 'category': 'technical', 'direction': 'BEARISH',
+     'conditions': [('macd', '<', 'macd_signal'), ('prev_macd', '>=', 'prev_macd_signal')]},
+    {'name': 'STRONG_UPTREND', 'category': 'technical', 'direction': 'BULLISH',
+     'conditions': [('adx', '>', 'adx_strong_trend'), ('plus_di', '>', 'minus_di')]},
+    {'name': 'STRONG_DOWNTREND', 'category': 'technical', 'direction': 'BEARISH',
+     'conditions': [('adx', '>', 'adx_strong_trend'), ('minus_di', '>', 'plus_di')]},
+]
+
+RULE_CATEGORIES = ('price', 'volume', 'technical')
+
+RULE_OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+PRICE_RECOMMENDATIONS = {
+    'PRICE_SPIKE': 'Significant price movement detected. Monitor for continuation or reversal.',
+    'BB_UPPER_BREAKOUT': 'Price above upper Bollinger Band. Watch for potential pullback or momentum continuation.',
+    'BB_LOWER_BREAKOUT': 'Price below lower Bollinger Band. Watch for bounce or further breakdown.',
+    'RSI_OVERBOUGHT': 'RSI indicates overbought conditions. Consider taking profits or tightening stops.',
+    'RSI_OVERSOLD': 'RSI indicates oversold conditions. Watch for potential bounce.',
+    'GOLDEN_CROSS': 'Bullish MA crossover signal. Consider long positions with proper risk management.',
+    'DEATH_CROSS': 'Bearish MA crossover signal. Consider reducing exposure or hedging.',
+}
+DEFAULT_RECOMMENDATION = 'Monitor price action and volume for confirmation.'
+
+
+def add_rolling_features(df, window=ROLLING_WINDOW):
+    """Per-symbol lag and trailing-window features matching the old SQL window functions"""
+    df = df.sort_values(['symbol', 'datetime']).reset_index(drop=True)
+    for column in df.columns:
+        if column not in NON_NUMERIC_COLUMNS:
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype(float)
+    grouped = df.groupby('symbol', sort=False)
+
+    df['prev_close'] = grouped['close'].shift(1)
+    df['prev_macd'] = grouped['macd'].shift(1)
+    df['prev_macd_signal'] = grouped['macd_signal'].shift(1)
+
+    # ROWS BETWEEN <window> PRECEDING AND 1 PRECEDING
+    prev_close = df['prev_close']
+    prev_volume = grouped['volume'].shift(1)
+    by_symbol = df['symbol']
+    df['avg_close_20d'] = prev_close.groupby(by_symbol).rolling(window, min_periods=1).mean().reset_index(level=0, drop=True)
+    df['std_close_20d'] = prev_close.groupby(by_symbol).rolling(window, min_periods=2).std().reset_index(level=0, drop=True)
+    df['avg_volume_20d'] = prev_volume.groupby(by_symbol).rolling(window, min_periods=1).mean().reset_index(level=0, drop=True)
+
+    return compute_derived_features(df)
+
+
+def compute_derived_features(df):
+    """Ratios and z-scores derived from the rolling features"""
+    close = df['close'].to_numpy(dtype=float)
+    prev_close = df['prev_close'].to_numpy(dtype=float)
+    avg_close = df['avg_close_20d'].to_numpy(dtype=float)
+    std_close = df['std_close_20d'].to_numpy(dtype=float)
+    volume = df['volume'].to_numpy(dtype=float)
+    avg_volume = df['avg_volume_20d'].to_numpy(dtype=float)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        price_change = np.where(prev_close != 0, (close - prev_close) / prev_close * 100, np.nan)
+        zscore = np.where(std_close > 0, (close - avg_close) / std_close, np.nan)
+        volume_ratio = np.where(avg_volume > 0, volume / avg_volume, np.nan)
+
+    df['price_change_pct'] = np.round(price_change, 2)
+    df['abs_price_change_pct'] = np.abs(df['price_change_pct'])
+    df['zscore'] = np.round(zscore, 2)
+    df['volume_ratio'] = np.round(volume_ratio, 2)
+    return df
+
+
+def normalize_bar_time(value):
+    """Bar datetime as a tz-naive UTC Timestamp so fetcher payloads and BigQuery rows compare"""
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert('UTC').tz_localize(None)
+    return ts
+
+
+class SymbolRollingState:
+    """Trailing closes/volumes for one symbol plus its current (possibly still forming) bar"""
+
+    def __init__(self, window=ROLLING_WINDOW):
+        self.closes = deque(maxlen=window)
+        self.volumes = deque(maxlen=window)
+        self.prev_macd = np.nan
+        self.prev_macd_signal = np.nan
+        self.current = None
+        self.current_time = None
+
+    def apply(self, bar, bar_time):
+        """
+        Advance the state with a bar. A newer bar commits the current one into the
+        trailing window; a bar with the same time replaces the forming bar (intraday
+        refresh of today's daily bar). Older bars are ignored - returns False.
+        """
+        if self.current_time is not None:
+            if bar_time < self.current_time:
+                return False
+            if bar_time > self.current_time:
+                self.closes.append(_as_float(self.current.get('close')))
+                self.volumes.append(_as_float(self.current.get('volume')))
+                self.prev_macd = _as_float(self.current.get('macd'))
+                self.prev_macd_signal = _as_float(self.current.get('macd_signal'))
+        self.current = bar
+        self.current_time = bar_time
+        return True
+
+    def features(self):
+        """Rolling features for the current bar (same definitions as add_rolling_features)"""
+        closes = np.array(self.closes, dtype=float)
+        volumes = np.array(self.volumes, dtype=float)
+        valid_closes = closes[~np.isnan(closes)]
+        valid_volumes = volumes[~np.isnan(volumes)]
+        return {
+            'prev_close': closes[-1] if len(closes) else np.nan,
+            'avg_close_20d': valid_closes.mean() if len(valid_closes) else np.nan,
+            'std_close_20d': valid_closes.std(ddof=1) if len(valid_closes) >= 2 else np.nan,
+            'avg_volume_20d': valid_volumes.mean() if len(valid_volumes) else np.nan,
+            'prev_macd': self.prev_macd,
+            'prev_macd_signal': self.prev_macd_signal,
+        }
+
+
+def _as_float(value):
+    try:
+        return float(value) if value is not None else np.nan
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def validate_rule(rule):
+    """Raise ValueError if a rule dict is malformed"""
+    if not rule.get('name'):
+        raise ValueError("Alert rule requires a 'name'")
+    if rule.get('category') not in RULE_CATEGORIES:
+        raise ValueError(f"Alert rule category must be one of {RULE_CATEGORIES}")
+    conditions = rule.get('conditions')
+    if not conditions:
+        raise ValueError(f"Alert rule {rule['name']} has no conditions")
+    for condition in conditions:
+        if len(condition) != 3 or condition[1] not in RULE_OPERATORS:
+            raise ValueError(f"Invalid condition {condition} in rule {rule['name']}")
+
 
 class TradingAlertSystem:
     """Comprehensive trading alert detection system"""
@@ -36,98 +254,257 @@ class TradingAlertSystem:
         self.project_id = project_id
         self.dataset_id = dataset_id
         self.thresholds = ALERT_THRESHOLDS.copy()
+        self.rules = [dict(rule) for rule in DEFAULT_ALERT_RULES]
+        self._window_cache = {}
+        self._window_lock = threading.Lock()
+        # Incremental mode state
+        self._symbol_states = {}
+        self._state_lock = threading.RLock()
+        self._fired = OrderedDict()
+        self._alert_feed = deque(maxlen=ALERT_FEED_SIZE)
+
+    # ---------- Rule management ----------
+
+    def add_rule(self, rule, priority=None):
+        """
+        Register a user-defined rule. It is evaluated over the cached window,
+        so it costs no extra query. priority is the index within the rule list
+        (lower wins within a category); default appends it after built-in rules.
+        """
+        validate_rule(rule)
+        if priority is None:
+            self.rules.append(dict(rule))
+        else:
+            self.rules.insert(priority, dict(rule))
+
+    def remove_rule(self, name, category=None):
+        """Remove rules by name (optionally only within one category)"""
+        self.rules = [
+            r for r in self.rules
+            if not (r['name'] == name and (category is None or r['category'] == category))
+        ]
+
+    # ---------- Window loading ----------
+
+    def _table_for(self, asset_type):
+        return 'stocks_daily_clean' if asset_type == 'stocks' else 'crypto_daily_clean'
+
+    def get_window(self, asset_type='stocks', lookback_days=WINDOW_LOOKBACK_DAYS, use_cache=True):
+        """Recent bars with rolling features for all symbols, pulled in one query"""
+        key = (asset_type, lookback_days)
+        now = time.monotonic()
+        if use_cache:
+            with self._window_lock:
+                cached = self._window_cache.get(key)
+                if cached and cached[0] > now:
+                    return cached[1]
 
-    def detect_price_anomalies(self, asset_type='stocks', lookback_days=20):
-        """Detect significant price movements"""
-
-        table = 'stocks_daily_clean' if asset_type == 'stocks' else 'crypto_daily_clean'
-
         query = f"""
-        WITH latest_data AS (
-            SELECT
-                symbol,
-                datetime,
-                close,
-                open,
-                high,
-                low,
-                volume,
-                rsi,
-                macd,
-                macd_signal,
-                adx,
-                bollinger_upper,
-                bollinger_lower,
-                sma_20,
-                sma_50,
-                golden_cross,
-                death_cross,
-                cycle_type,
-                cycle_pnl_pct,
-                LAG(close, 1) OVER (PARTITION BY symbol ORDER BY datetime) as prev_close,
-                AVG(close) OVER (PARTITION BY symbol ORDER BY datetime ROWS BETWEEN 20 PRECEDING AND 1 PRECEDING) as avg_close_20d,
-                STDDEV(close) OVER (PARTITION BY symbol ORDER BY datetime ROWS BETWEEN 20 PRECEDING AND 1 PRECEDING) as std_close_20d
-            FROM `{self.project_id}.{self.dataset_id}.{table}`
-            WHERE datetime >= DATE_SUB(CURRENT_DATE(), INTERVAL {lookback_days + 5} DAY)
-        ),
-        anomalies AS (
-            SELECT
-                symbol,
-                datetime,
-                close,
-                prev_close,
-                ROUND((close - prev_close) / prev_close * 100, 2) as price_change_pct,
-                ROUND((close - avg_close_20d) / std_close_20d, 2) as zscore,
-                rsi,
-                macd,
-                macd_signal,
-                adx,
-                bollinger_upper,
-                bollinger_lower,
-                golden_cross,
-                death_cross,
-                cycle_type,
-                cycle_pnl_pct,
-                CASE
-                    WHEN ABS((close - prev_close) / prev_close * 100) >= {self.thresholds['price_spike_pct']} THEN 'PRICE_SPIKE'
-                    WHEN close > bollinger_upper THEN 'BB_UPPER_BREAKOUT'
-                    WHEN close < bollinger_lower THEN 'BB_LOWER_BREAKOUT'
-                    WHEN rsi >= {self.thresholds['rsi_overbought']} THEN 'RSI_OVERBOUGHT'
-                    WHEN rsi <= {self.thresholds['rsi_oversold']} THEN 'RSI_OVERSOLD'
-                    WHEN golden_cross = 1 THEN 'GOLDEN_CROSS'
-                    WHEN death_cross = 1 THEN 'DEATH_CROSS'
-                    ELSE NULL
-                END as alert_type
-            FROM latest_data
-            WHERE datetime >= DATE_SUB(CURRENT_DATE(), INTERVAL 3 DAY)
-        )
-        SELECT *
-        FROM anomalies
-        WHERE alert_type IS NOT NULL
-        ORDER BY datetime DESC, ABS(price_change_pct) DESC
-        LIMIT 100
+        SELECT {', '.join(WINDOW_COLUMNS)}
+        FROM `{self.project_id}.{self.dataset_id}.{self._table_for(asset_type)}`
+        WHERE datetime >= DATE_SUB(CURRENT_DATE(), INTERVAL {int(lookback_days)} DAY)
+        """
+        df = self.client.query(query).to_dataframe()
+        if not df.empty:
+            df = add_rolling_features(df)
+
+        with self._window_lock:
+            self._window_cache[key] = (now + WINDOW_CACHE_TTL, df)
+        return df
+
+    def _cached_window(self, asset_type, lookback_days=WINDOW_LOOKBACK_DAYS):
+        """Window from cache if still fresh, without querying"""
+        with self._window_lock:
+            cached = self._window_cache.get((asset_type, lookback_days))
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        return None
+
+    def _query_symbol_window(self, asset_type, symbols, since_days):
+        """Recent bars for a handful of symbols only"""
+        query = f"""
+        SELECT {', '.join(WINDOW_COLUMNS)}
+        FROM `{self.project_id}.{self.dataset_id}.{self._table_for(asset_type)}`
+        WHERE symbol IN UNNEST(@symbols)
+          AND DATE(datetime) >= DATE_SUB(CURRENT_DATE(), INTERVAL @days DAY)
+        ORDER BY symbol, datetime
+        """
+        job_config = bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ArrayQueryParameter('symbols', 'STRING', sorted(symbols)),
+            bigquery.ScalarQueryParameter('days', 'INT64', int(since_days)),
+        ])
+        return self.client.query(query, job_config=job_config).to_dataframe()
+
+    # ---------- Vectorized evaluation ----------
+
+    @staticmethod
+    def _column_values(df, column):
+        series = df[column]
+        if pd.api.types.is_numeric_dtype(series):
+            return series.to_numpy(dtype=float, na_value=np.nan)
+        return series.to_numpy(dtype=object)
+
+    def _operand(self, df, operand):
+        if isinstance(operand, str):
+            if operand in self.thresholds:
+                return self.thresholds[operand]
+            if operand in df.columns:
+                return self._column_values(df, operand)
+        return operand
+
+    def _rule_mask(self, df, rule):
+        mask = np.ones(len(df), dtype=bool)
+        for column, op, operand in rule['conditions']:
+            if column not in df.columns:
+                return np.zeros(len(df), dtype=bool)
+            values = self._column_values(df, column)
+            # NaN compares False, matching SQL NULL semantics
+            with np.errstate(invalid='ignore'):
+                mask &= np.asarray(RULE_OPERATORS[op](values, self._operand(df, operand)), dtype=bool)
+        return mask
+
+    def evaluate_rules(self, df, category, rules=None):
         """
+        Label each bar with the first matching rule of a category.
+        Returns (labels, directions) object arrays, None where nothing matched.
+        """
+        rules = [r for r in (rules or self.rules) if r['category'] == category]
+        if df.empty or not rules:
+            empty = np.full(len(df), None, dtype=object)
+            return empty, empty.copy()
+
+        masks = [self._rule_mask(df, r) for r in rules]
+        labels = np.select(masks, [r['name'] for r in rules], default=None)
+        directions = np.select(masks, [r.get('direction') for r in rules], default=None)
+        return labels.astype(object), directions.astype(object)
+
+    def _recent(self, df, days):
+        cutoff = pd.Timestamp(datetime.now().date() - timedelta(days=days))
+        dt = pd.to_datetime(df['datetime'])
+        if getattr(dt.dt, 'tz', None) is not None:
+            cutoff = cutoff.tz_localize(dt.dt.tz)
+        return df[(dt >= cutoff).to_numpy()]
+
+    def _evaluate_category(self, asset_type, category, lookback_days=None):
+        """Window -> rows of one category that matched a rule, with alert label/direction"""
+        days = WINDOW_LOOKBACK_DAYS if lookback_days is None else max(WINDOW_LOOKBACK_DAYS, lookback_days + 5)
+        df = self.get_window(asset_type, days)
+        if df.empty:
+            return df
+        df = self._recent(df, CATEGORY_RECENT_DAYS[category])
+        labels, directions = self.evaluate_rules(df, category)
+        matched = labels != None  # noqa: E711 - elementwise on object array
+        df = df[matched].copy()
+        df['alert_type'] = labels[matched]
+        df['direction'] = directions[matched]
+        return df
+
+    def _severity(self, df):
+        """Vectorized alert severity based on move size, z-score and trend strength"""
+        change = np.abs(df['price_change_pct'].to_numpy(dtype=float))
+        zscore = np.abs(df['zscore'].to_numpy(dtype=float))
+        adx = df['adx'].to_numpy(dtype=float)
+
+        with np.errstate(invalid='ignore'):
+            score = np.where(np.isnan(change), 0, np.where(change > 5, 3, np.where(change > 3, 2, 1)))
+            score = score + np.where(zscore > 3, 2, np.where(zscore > 2, 1, 0))
+            score = score + (adx > 30).astype(int)
+
+        return np.select([score >= 4, score >= 3, score >= 2], ['CRITICAL', 'HIGH', 'MEDIUM'], default='LOW')
+
+    def _signal_strength(self, df):
+        """Vectorized signal strength (1-10)"""
+        adx = df['adx'].to_numpy(dtype=float)
+        rsi = df['rsi'].to_numpy(dtype=float)
+        regime = df['trend_regime'].to_numpy(dtype=float)
+
+        with np.errstate(invalid='ignore'):
+            strength = 5 + np.where(adx > 30, 2, np.where(adx > 25, 1, 0))
+            strength = strength + ((rsi < 30) | (rsi > 70)).astype(int)
+            strength = strength + (~np.isnan(regime) & (regime != 0)).astype(int)
+        return np.minimum(10, strength)
+
+    @staticmethod
+    def _filled(df, column, default):
+        return df[column].astype(float).fillna(default).to_numpy()
+
+    @staticmethod
+    def _iso_datetimes(df):
+        return [d.isoformat() if hasattr(d, 'isoformat') else str(d) for d in df['datetime']]
+
+    # ---------- Alert formatting ----------
+
+    def _format_price_alerts(self, df):
+        out = pd.DataFrame({
+            'symbol': df['symbol'].to_numpy(),
+            'datetime': self._iso_datetimes(df),
+            'alert_type': df['alert_type'].to_numpy(),
+            'price': df['close'].astype(float).to_numpy(),
+            'price_change_pct': self._filled(df, 'price_change_pct', 0),
+            'zscore': self._filled(df, 'zscore', 0),
+            'rsi': self._filled(df, 'rsi', 50),
+            'adx': self._filled(df, 'adx', 0),
+            'severity': self._severity(df),
+            'recommendation': df['alert_type'].map(PRICE_RECOMMENDATIONS).fillna(DEFAULT_RECOMMENDATION).to_numpy(),
+        })
+        return out.to_dict('records')
+
+    def _format_volume_alerts(self, df):
+        ratio = df['volume_ratio'].astype(float).to_numpy()
+        change = df['price_change_pct'].astype(float).to_numpy()
+
+        with np.errstate(invalid='ignore'):
+            recommendation = np.select(
+                [change > 0, change < 0],
+                ['High volume on up move suggests institutional buying. Watch for continuation.',
+                 'High volume on down move suggests distribution. Consider defensive positioning.'],
+                default='Unusual volume activity. Wait for directional confirmation.'
+            )
+
+        out = pd.DataFrame({
+            'symbol': df['symbol'].to_numpy(),
+            'datetime': self._iso_datetimes(df),
+            'alert_type': df['alert_type'].to_numpy(),
+            'price': df['close'].astype(float).to_numpy(),
+            'volume': df['volume'].astype('int64').to_numpy(),
+            'avg_volume': self._filled(df, 'avg_volume_20d', 0).astype('int64'),
+            'volume_ratio': ratio,
+            'price_change_pct': self._filled(df, 'price_change_pct', 0),
+            'buy_pressure': self._filled(df, 'buy_pressure_pct', 50),
+            'sell_pressure': self._filled(df, 'sell_pressure_pct', 50),
+            'severity': np.select([ratio > 4, ratio > 3], ['HIGH', 'MEDIUM'], default='LOW'),
+            'recommendation': recommendation,
+        })
+        return out.to_dict('records')
+
+    def _format_technical_signals(self, df):
+        out = pd.DataFrame({
+            'symbol': df['symbol'].to_numpy(),
+            'datetime': self._iso_datetimes(df),
+            'signal_type': df['alert_type'].to_numpy(),
+            'price': df['close'].astype(float).to_numpy(),
+            'rsi': self._filled(df, 'rsi', 50),
+            'macd': self._filled(df, 'macd', 0),
+            'adx': self._filled(df, 'adx', 0),
+            'trend_regime': self._filled(df, 'trend_regime', 0).astype(int),
+            'cycle_pnl': self._filled(df, 'cycle_pnl_pct', 0),
+            'direction': df['direction'].fillna('BEARISH').to_numpy(),
+            'strength': self._signal_strength(df),
+        })
+        return out.to_dict('records')
+
+    # ---------- Detectors ----------
 
+    def detect_price_anomalies(self, asset_type='stocks', lookback_days=20):
+        """Detect significant price movements"""
         try:
-            df = self.client.query(query).to_dataframe()
-            alerts = []
-
-            for _, row in df.iterrows():
-                alert = {
-                    'symbol': row['symbol'],
-                    'datetime': row['datetime'].isoformat() if hasattr(row['datetime'], 'isoformat') else str(row['datetime']),
-                    'alert_type': row['alert_type'],
-                    'price': float(row['close']),
-                    'price_change_pct': float(row['price_change_pct']) if pd.notna(row['price_change_pct']) else 0,
-                    'zscore': float(row['zscore']) if pd.notna(row['zscore']) else 0,
-                    'rsi': float(row['rsi']) if pd.notna(row['rsi']) else 50,
-                    'adx': float(row['adx']) if pd.notna(row['adx']) else 0,
-                    'severity': self._calculate_severity(row),
-                    'recommendation': self._generate_recommendation(row)
-                }
-                alerts.append(alert)
-
-            return alerts
+            df = self._evaluate_category(asset_type, 'price', lookback_days)
+            if df.empty:
+                return []
+
+            df = df.assign(_abs_change=df['abs_price_change_pct'].fillna(-1))
+            df = df.sort_values(['datetime', '_abs_change'], ascending=[False, False]).head(100)
+            return self._format_price_alerts(df)
 
         except Exception as e:
             logger.error(f"Error detecting price anomalies: {e}")
@@ -135,73 +512,13 @@ class TradingAlertSystem:
 
     def detect_volume_surges(self, asset_type='stocks'):
         """Detect unusual volume activity"""
-
-        table = 'stocks_daily_clean' if asset_type == 'stocks' else 'crypto_daily_clean'
-
-        query = f"""
-        WITH volume_analysis AS (
-            SELECT
-                symbol,
-                datetime,
-                close,
-                volume,
-                AVG(volume) OVER (PARTITION BY symbol ORDER BY datetime ROWS BETWEEN 20 PRECEDING AND 1 PRECEDING) as avg_volume_20d,
-                ROUND(volume / NULLIF(AVG(volume) OVER (PARTITION BY symbol ORDER BY datetime ROWS BETWEEN 20 PRECEDING AND 1 PRECEDING), 0), 2) as volume_ratio,
-                (close - LAG(close, 1) OVER (PARTITION BY symbol ORDER BY datetime)) / NULLIF(LAG(close, 1) OVER (PARTITION BY symbol ORDER BY datetime), 0) * 100 as price_change_pct,
-                rsi,
-                adx,
-                buy_pressure_pct,
-                sell_pressure_pct
-            FROM `{self.project_id}.{self.dataset_id}.{table}`
-            WHERE datetime >= DATE_SUB(CURRENT_DATE(), INTERVAL 25 DAY)
-        )
-        SELECT
-            symbol,
-            datetime,
-            close,
-            volume,
-            avg_volume_20d,
-            volume_ratio,
-            price_change_pct,
-            rsi,
-            adx,
-            buy_pressure_pct,
-            sell_pressure_pct,
-            CASE
-                WHEN volume_ratio >= {self.thresholds['volume_surge_ratio']} AND price_change_pct > 0 THEN 'VOLUME_SURGE_BULLISH'
-                WHEN volume_ratio >= {self.thresholds['volume_surge_ratio']} AND price_change_pct < 0 THEN 'VOLUME_SURGE_BEARISH'
-                WHEN volume_ratio >= {self.thresholds['volume_surge_ratio']} THEN 'VOLUME_SURGE'
-                ELSE NULL
-            END as alert_type
-        FROM volume_analysis
-        WHERE datetime >= DATE_SUB(CURRENT_DATE(), INTERVAL 3 DAY)
-          AND volume_ratio >= {self.thresholds['volume_surge_ratio']}
-        ORDER BY datetime DESC, volume_ratio DESC
-        LIMIT 50
-        """
-
         try:
-            df = self.client.query(query).to_dataframe()
-            alerts = []
-
-            for _, row in df.iterrows():
-                alert = {
-                    'symbol': row['symbol'],
-                    'datetime': row['datetime'].isoformat() if hasattr(row['datetime'], 'isoformat') else str(row['datetime']),
-                    'alert_type': row['alert_type'],
-                    'price': float(row['close']),
-                    'volume': int(row['volume']),
-                    'avg_volume': int(row['avg_volume_20d']) if pd.notna(row['avg_volume_20d']) else 0,
-                    'volume_ratio': float(row['volume_ratio']),
-                    'price_change_pct': float(row['price_change_pct']) if pd.notna(row['price_change_pct']) else 0,
-                    'buy_pressure': float(row['buy_pressure_pct']) if pd.notna(row['buy_pressure_pct']) else 50,
-                    'sell_pressure': float(row['sell_pressure_pct']) if pd.notna(row['sell_pressure_pct']) else 50,
-                    'severity': 'HIGH' if row['volume_ratio'] > 4 else 'MEDIUM' if row['volume_ratio'] > 3 else 'LOW',
-                    'recommendation': self._generate_volume_recommendation(row)
-                }
-                alerts.append(alert)
-
-            return alerts
+            df = self._evaluate_category(asset_type, 'volume')
+            if df.empty:
+                return []
+
+            df = df.sort_values(['datetime', 'volume_ratio'], ascending=[False, False]).head(50)
+            return self._format_volume_alerts(df)
 
         except Exception as e:
             logger.error(f"Error detecting volume surges: {e}")
@@ -209,77 +526,170 @@ class TradingAlertSystem:
 
     def detect_technical_signals(self, asset_type='stocks'):
         """Detect technical trading signals"""
-
-        table = 'stocks_daily_clean' if asset_type == 'stocks' else 'crypto_daily_clean'
-
-        query = f"""
-        SELECT
-            symbol,
-            datetime,
-            close,
-            rsi,
-            macd,
-            macd_signal,
-            macd_histogram,
-            adx,
-            plus_di,
-            minus_di,
-            golden_cross,
-            death_cross,
-            cycle_type,
-            cycle_pnl_pct,
-            hammer,
-            shooting_star,
-            bullish_engulfing,
-            bearish_engulfing,
-            doji,
-            trend_regime,
-            CASE
-                WHEN golden_cross = 1 THEN 'GOLDEN_CROSS'
-                WHEN death_cross = 1 THEN 'DEATH_CROSS'
-                WHEN hammer = 1 AND rsi < 40 THEN 'HAMMER_OVERSOLD'
-                WHEN shooting_star = 1 AND rsi > 60 THEN 'SHOOTING_STAR_OVERBOUGHT'
-                WHEN bullish_engulfing = 1 THEN 'BULLISH_ENGULFING'
-                WHEN bearish_engulfing = 1 THEN 'BEARISH_ENGULFING'
-                WHEN macd > macd_signal AND LAG(macd, 1) OVER (PARTITION BY symbol ORDER BY datetime) <= LAG(macd_signal, 1) OVER (PARTITION BY symbol ORDER BY datetime) THEN 'MACD_BULLISH_CROSS'
-                WHEN macd < macd_signal AND LAG(macd, 1) OVER (PARTITION BY symbol ORDER BY datetime) >= LAG(macd_signal, 1) OVER (PARTITION BY symbol ORDER BY datetime) THEN 'MACD_BEARISH_CROSS'
-                WHEN adx > {self.thresholds['adx_strong_trend']} AND plus_di > minus_di THEN 'STRONG_UPTREND'
-                WHEN adx > {self.thresholds['adx_strong_trend']} AND minus_di > plus_di THEN 'STRONG_DOWNTREND'
-                ELSE NULL
-            END as signal_type
-        FROM `{self.project_id}.{self.dataset_id}.{table}`
-        WHERE datetime >= DATE_SUB(CURRENT_DATE(), INTERVAL 5 DAY)
-        HAVING signal_type IS NOT NULL
-        ORDER BY datetime DESC
-        LIMIT 100
-        """
-
         try:
-            df = self.client.query(query).to_dataframe()
-            signals = []
-
-            for _, row in df.iterrows():
-                signal = {
-                    'symbol': row['symbol'],
-                    'datetime': row['datetime'].isoformat() if hasattr(row['datetime'], 'isoformat') else str(row['datetime']),
-                    'signal_type': row['signal_type'],
-                    'price': float(row['close']),
-                    'rsi': float(row['rsi']) if pd.notna(row['rsi']) else 50,
-                    'macd': float(row['macd']) if pd.notna(row['macd']) else 0,
-                    'adx': float(row['adx']) if pd.notna(row['adx']) else 0,
-                    'trend_regime': int(row['trend_regime']) if pd.notna(row['trend_regime']) else 0,
-                    'cycle_pnl': float(row['cycle_pnl_pct']) if pd.notna(row['cycle_pnl_pct']) else 0,
-                    'direction': 'BULLISH' if row['signal_type'] in ['GOLDEN_CROSS', 'HAMMER_OVERSOLD', 'BULLISH_ENGULFING', 'MACD_BULLISH_CROSS', 'STRONG_UPTREND'] else 'BEARISH',
-                    'strength': self._calculate_signal_strength(row)
-                }
-                signals.append(signal)
-
-            return signals
+            df = self._evaluate_category(asset_type, 'technical')
+            if df.empty:
+                return []
+
+            df = df.sort_values('datetime', ascending=False).head(100)
+            return self._format_technical_signals(df)
 
         except Exception as e:
             logger.error(f"Error detecting technical signals: {e}")
             return []
 
+    def evaluate_custom_rules(self, rules, asset_type='stocks', recent_days=3, limit=100):
+        """
+        Evaluate ad-hoc rules against the cached window (no extra query).
+        Every rule is checked independently, so one bar can match several rules.
+        """
+        for rule in rules:
+            validate_rule(rule)
+
+        df = self.get_window(asset_type)
+        if df.empty:
+            return []
+        df = self._recent(df, recent_days)
+
+        matches = []
+        for rule in rules:
+            hit = df[self._rule_mask(df, rule)]
+            if hit.empty:
+                continue
+            out = pd.DataFrame({
+                'symbol': hit['symbol'].to_numpy(),
+                'datetime': self._iso_datetimes(hit),
+                'rule': rule['name'],
+                'direction': rule.get('direction'),
+                'price': hit['close'].astype(float).to_numpy(),
+                'price_change_pct': self._filled(hit, 'price_change_pct', 0),
+                'rsi': self._filled(hit, 'rsi', 50),
+                'severity': self._severity(hit),
+            })
+            matches.extend(out.to_dict('records'))
+
+        matches.sort(key=lambda m: m['datetime'], reverse=True)
+        return matches[:limit]
+
+    # ---------- Incremental mode ----------
+
+    def _seed_states(self, asset_type, symbols):
+        """Build rolling state for symbols seen for the first time (cached window or one targeted query)"""
+        states = self._symbol_states.setdefault(asset_type, {})
+        missing = {sym for sym in symbols if sym not in states}
+        if not missing:
+            return states
+
+        window = self._cached_window(asset_type)
+        if window is None:
+            window = self._query_symbol_window(asset_type, missing, WINDOW_LOOKBACK_DAYS)
+            if not window.empty:
+                window = window.sort_values(['symbol', 'datetime'])
+
+        if not window.empty:
+            subset = window[window['symbol'].isin(missing)]
+            for symbol, rows in subset.groupby('symbol', sort=False):
+                state = SymbolRollingState()
+                for bar in rows[WINDOW_COLUMNS].to_dict('records'):
+                    state.apply(bar, normalize_bar_time(bar['datetime']))
+                states[symbol] = state
+
+        for symbol in missing:
+            states.setdefault(symbol, SymbolRollingState())
+        return states
+
+    def _fetch_new_bars(self, asset_type, symbols, states):
+        """Bars at or after each symbol's last seen bar, for publishers that only send symbols"""
+        known = [states[s].current_time for s in symbols if states[s].current_time is not None]
+        since = min(known) if known else pd.Timestamp(datetime.now().date() - timedelta(days=WINDOW_LOOKBACK_DAYS))
+        since_days = max(0, (pd.Timestamp(datetime.now().date()) - since.normalize()).days)
+        df = self._query_symbol_window(asset_type, symbols, since_days)
+        return df.to_dict('records')
+
+    def _remember_fired(self, key):
+        """True if the alert is new; remembers it in a bounded LRU set"""
+        if key in self._fired:
+            self._fired.move_to_end(key)
+            return False
+        self._fired[key] = time.time()
+        while len(self._fired) > FIRED_ALERT_MEMORY:
+            self._fired.popitem(last=False)
+        return True
+
+    def process_new_bars(self, asset_type='stocks', bars=None, symbols=None):
+        """
+        Evaluate alerts only for bars a fetcher just uploaded.
+
+        bars: row dicts (symbol, datetime, close, volume, indicators...) as uploaded.
+        symbols: alternatively, symbols whose new bars should be read back (one small query).
+        Rolling statistics come from per-symbol cached state, so steady-state cost is
+        independent of universe size. Returns only alerts not fired before.
+        """
+        with self._state_lock:
+            if bars is None:
+                if not symbols:
+                    return []
+                states = self._seed_states(asset_type, set(symbols))
+                bars = self._fetch_new_bars(asset_type, set(symbols), states)
+            else:
+                bars = [b for b in bars if b.get('symbol') and b.get('datetime') is not None]
+                states = self._seed_states(asset_type, {b['symbol'] for b in bars})
+
+            rows = []
+            timed = sorted(((normalize_bar_time(b['datetime']), b) for b in bars), key=lambda tb: (tb[1]['symbol'], tb[0]))
+            for bar_time, bar in timed:
+                state = states[bar['symbol']]
+                if not state.apply(bar, bar_time):
+                    continue
+                row = {column: bar.get(column) for column in WINDOW_COLUMNS}
+                row['datetime'] = bar_time
+                row.update(state.features())
+                rows.append(row)
+
+            if not rows:
+                return []
+
+            df = pd.DataFrame(rows)
+            for column in df.columns:
+                if column not in NON_NUMERIC_COLUMNS:
+                    df[column] = pd.to_numeric(df[column], errors='coerce').astype(float)
+            df = compute_derived_features(df)
+
+            fired_at = datetime.utcnow().isoformat()
+            new_alerts = []
+            formatters = (
+                ('price', self._format_price_alerts, 'alert_type'),
+                ('volume', self._format_volume_alerts, 'alert_type'),
+                ('technical', self._format_technical_signals, 'signal_type'),
+            )
+            for category, formatter, type_key in formatters:
+                labels, directions = self.evaluate_rules(df, category)
+                matched = labels != None  # noqa: E711 - elementwise on object array
+                if not matched.any():
+                    continue
+                hit = df[matched].copy()
+                hit['alert_type'] = labels[matched]
+                hit['direction'] = directions[matched]
+                for alert in formatter(hit):
+                    key = (asset_type, category, alert['symbol'], alert['datetime'], alert[type_key])
+                    if not self._remember_fired(key):
+                        continue
+                    alert.update({'asset_type': asset_type, 'category': category, 'fired_at': fired_at})
+                    new_alerts.append(alert)
+                    self._alert_feed.append(alert)
+
+            return new_alerts
+
+    def get_alert_feed(self, since=None, asset_type=None):
+        """Alerts fired in incremental mode, newest first (since: ISO timestamp)"""
+        with self._state_lock:
+            feed = list(self._alert_feed)
+        if asset_type:
+            feed = [a for a in feed if a['asset_type'] == asset_type]
+        if since:
+            feed = [a for a in feed if a['fired_at'] > since]
+        return feed[::-1]
+
     def get_market_summary(self):
         """Get overall market summary with alerts"""
 
@@ -321,77 +731,6 @@ class TradingAlertSystem:
 
         return summary
 
-    def _calculate_severity(self, row):
-        """Calculate alert severity based on multiple factors"""
-        score = 0
-
-        if pd.notna(row.get('price_change_pct')):
-            if abs(row['price_change_pct']) > 5:
-                score += 3
-            elif abs(row['price_change_pct']) > 3:
-                score += 2
-            else:
-                score += 1
-
-        if pd.notna(row.get('zscore')):
-            if abs(row['zscore']) > 3:
-                score += 2
-            elif abs(row['zscore']) > 2:
-                score += 1
-
-        if pd.notna(row.get('adx')) and row['adx'] > 30:
-            score += 1
-
-        if score >= 4:
-            return 'CRITICAL'
-        elif score >= 3:
-            return 'HIGH'
-        elif score >= 2:
-            return 'MEDIUM'
-        return 'LOW'
-
-    def _generate_recommendation(self, row):
-        """Generate trading recommendation based on alert"""
-        alert_type = row.get('alert_type', '')
-
-        recommendations = {
-            'PRICE_SPIKE': 'Significant price movement detected. Monitor for continuation or reversal.',
-            'BB_UPPER_BREAKOUT': 'Price above upper Bollinger Band. Watch for potential pullback or momentum continuation.',
-            'BB_LOWER_BREAKOUT': 'Price below lower Bollinger Band. Watch for bounce or further breakdown.',
-            'RSI_OVERBOUGHT': 'RSI indicates overbought conditions. Consider taking profits or tightening stops.',
-            'RSI_OVERSOLD': 'RSI indicates oversold conditions. Watch for potential bounce.',
-            'GOLDEN_CROSS': 'Bullish MA crossover signal. Consider long positions with proper risk management.',
-            'DEATH_CROSS': 'Bearish MA crossover signal. Consider reducing exposure or hedging.',
-        }
-
-        return recommendations.get(alert_type, 'Monitor price action and volume for confirmation.')
-
-    def _generate_volume_recommendation(self, row):
-        """Generate recommendation for volume surge"""
-        if row.get('price_change_pct', 0) > 0:
-            return 'High volume on up move suggests institutional buying. Watch for continuation.'
-        elif row.get('price_change_pct', 0) < 0:
-            return 'High volume on down move suggests distribution. Consider defensive positioning.'
-        return 'Unusual volume activity. Wait for directional confirmation.'
-
-    def _calculate_signal_strength(self, row):
-        """Calculate signal strength (1-10)"""
-        strength = 5  # Base
-
-        if pd.notna(row.get('adx')) and row['adx'] > 30:
-            strength += 2
-        elif pd.notna(row.get('adx')) and row['adx'] > 25:
-            strength += 1
-
-        if pd.notna(row.get('rsi')):
-            if row['rsi'] < 30 or row['rsi'] > 70:
-                strength += 1
-
-        if pd.notna(row.get('trend_regime')) and row['trend_regime'] != 0:
-            strength += 1
-
-        return min(10, strength)
-
     def _calculate_market_sentiment(self, signals):
         """Calculate overall market sentiment"""
         if not signals:
@@ -4,13 +4,280 @@ Provides REST API for walk-forward ML validation system
 """
 
 from flask import jsonify, request
-from google.cloud import bigquery
-import requests
 import json
+from lazy_loading import lazy_import
+
+bigquery = lazy_import('google.cloud.bigquery')
+requests = lazy_import('requests')
+
+try:
+    from model_serving import get_model_server, MicroBatcher
+except ImportError as e:
+    print(f"Model serving not available: {e}")
+    get_model_server = None
+    MicroBatcher = None
 
 # Walk-Forward Cloud Function URL
 WALK_FORWARD_FUNCTION_URL = "https://us-central1-aialgotradehits.cloudfunctions.net/walk-forward-validation"
 
+# Nested multi-timeframe model, served in-process when its export is available
+NESTED_MODEL_NAME = 'nested_predictor_v1'
+NESTED_MODEL_ID = f'aialgotradehits.ml_models.{NESTED_MODEL_NAME}'
+NESTED_MODEL_FEATURES = [
+    'daily_score', 'hourly_score', 'avg_5min_score', 'enhanced_nested_score', 'raw_nested_score',
+    'daily_ema_bullish', 'daily_macd_bullish', 'daily_strong_trend', 'daily_above_sma50',
+    'daily_above_sma200', 'hourly_ema_bullish', 'hourly_macd_bullish', 'hourly_strong_trend',
+    'hourly_rsi_sweet', 'hourly_volume_surge', 'fivemin_ema_pct', 'fivemin_macd_pct',
+    'fivemin_price_up_pct', 'max_5min_score', 'all_tf_aligned', 'daily_hourly_aligned',
+    'hourly_5min_aligned', 'momentum_cascade'
+]
+BATCH_PREDICT_MAX_SYMBOLS = 1000
+NESTED_FLOAT_FEATURES = {'avg_5min_score', 'fivemin_ema_pct', 'fivemin_macd_pct', 'fivemin_price_up_pct'}
+NESTED_FEATURE_DEFAULTS = {
+    'daily_score': 3, 'hourly_score': 3, 'avg_5min_score': 3.0,
+    'fivemin_ema_pct': 0.5, 'fivemin_macd_pct': 0.5, 'fivemin_price_up_pct': 0.5,
+    'max_5min_score': 5
+}
+
+
+def build_nested_features(data):
+    """Full nested-model feature row from raw request values, including derived alignment flags"""
+    row = {}
+    for name in NESTED_MODEL_FEATURES:
+        value = data.get(name, NESTED_FEATURE_DEFAULTS.get(name, 0))
+        row[name] = float(value) if value is not None else 0.0
+
+    nested_score = row['daily_score'] + row['hourly_score'] + int(row['avg_5min_score'])
+    # Scores computed upstream (e.g. by the batch feature query) are kept as given
+    if data.get('enhanced_nested_score') is None:
+        row['enhanced_nested_score'] = nested_score
+    if data.get('raw_nested_score') is None:
+        row['raw_nested_score'] = nested_score
+    row['all_tf_aligned'] = int(row['daily_ema_bullish'] == 1 and row['hourly_ema_bullish'] == 1 and row['fivemin_ema_pct'] >= 0.5)
+    row['daily_hourly_aligned'] = int(row['daily_ema_bullish'] == 1 and row['hourly_ema_bullish'] == 1)
+    row['hourly_5min_aligned'] = int(row['hourly_ema_bullish'] == 1 and row['fivemin_ema_pct'] >= 0.5)
+    row['momentum_cascade'] = int(row['daily_macd_bullish'] == 1 and row['hourly_macd_bullish'] == 1 and row['fivemin_macd_pct'] >= 0.5)
+    return row
+
+
+def nested_confidence_level(up_prob, down_prob):
+    """Confidence bucket for a nested-model prediction"""
+    if up_prob >= 0.65:
+        return 'HIGH_CONFIDENCE_UP'
+    elif up_prob >= 0.55:
+        return 'MODERATE_UP'
+    elif down_prob >= 0.65:
+        return 'HIGH_CONFIDENCE_DOWN'
+    elif down_prob >= 0.55:
+        return 'MODERATE_DOWN'
+    return 'UNCERTAIN'
+
+
+def predict_nested_bigquery(client, feature_rows):
+    """Score feature rows with one parameterized ML.PREDICT query (fallback when not served in-process)"""
+    columns = []
+    for name in NESTED_MODEL_FEATURES:
+        value = f"LAX_FLOAT64(JSON_QUERY(raw, '$.{name}'))"
+        if name not in NESTED_FLOAT_FEATURES:
+            value = f"CAST({value} AS INT64)"
+        columns.append(f"{value} AS {name}")
+    columns_sql = ",\n            ".join(columns)
+
+    query = f"""
+    SELECT
+        row_id,
+        predicted_hour_direction,
+        predicted_hour_direction_probs[OFFSET(0)].prob as down_prob,
+        predicted_hour_direction_probs[OFFSET(1)].prob as up_prob
+    FROM ML.PREDICT(
+        MODEL `{NESTED_MODEL_ID}`,
+        (SELECT
+            row_id,
+            {columns_sql}
+         FROM UNNEST(JSON_QUERY_ARRAY(@rows)) AS raw WITH OFFSET AS row_id)
+    )
+    """
+    job_config = bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ScalarQueryParameter('rows', 'STRING', json.dumps(feature_rows))
+    ])
+    results = [None] * len(feature_rows)
+    for row in client.query(query, job_config=job_config).result():
+        results[row.row_id] = {
+            'direction': row.predicted_hour_direction,
+            'up_prob': float(row.up_prob),
+            'down_prob': float(row.down_prob)
+        }
+    return results
+
+
+def predict_nested(client, feature_rows):
+    """
+    Score nested-model feature rows. Uses the in-process model when loaded, otherwise
+    ML.PREDICT. Returns (predictions, served_by).
+    """
+    model = get_model_server().get(NESTED_MODEL_NAME) if get_model_server else None
+    if model is not None:
+        return [
+            {
+                'direction': p['label'],
+                'up_prob': p['probabilities']['UP'],
+                'down_prob': p['probabilities']['DOWN']
+            }
+            for p in model.predict(feature_rows)
+        ], 'in_process'
+    return predict_nested_bigquery(client, feature_rows), 'bigquery_ml'
+
+
+def fetch_nested_features(client, symbols):
+    """
+    Latest daily, hourly and last-hour 5-min features for many symbols in one query.
+    Mirrors the nested_daily / nested_hourly / nested_5min_hourly_agg definitions used
+    to train nested_predictor_v1.
+    """
+    query = """
+    WITH daily AS (
+        SELECT
+            symbol,
+            CASE WHEN ema_12 > ema_26 THEN 1 ELSE 0 END as daily_ema_bullish,
+            CASE WHEN macd_histogram > 0 THEN 1 ELSE 0 END as daily_macd_bullish,
+            CASE WHEN adx > 25 THEN 1 ELSE 0 END as daily_strong_trend,
+            CASE WHEN close > sma_50 THEN 1 ELSE 0 END as daily_above_sma50,
+            CASE WHEN close > sma_200 THEN 1 ELSE 0 END as daily_above_sma200,
+            (CASE WHEN ema_12 > ema_26 THEN 1 ELSE 0 END +
+             CASE WHEN rsi BETWEEN 40 AND 65 THEN 1 ELSE 0 END +
+             CASE WHEN macd_histogram > 0 THEN 1 ELSE 0 END +
+             CASE WHEN adx > 25 THEN 1 ELSE 0 END +
+             CASE WHEN close > sma_50 THEN 1 ELSE 0 END +
+             CASE WHEN close > sma_200 THEN 1 ELSE 0 END +
+             CASE WHEN mfi BETWEEN 30 AND 70 THEN 1 ELSE 0 END +
+             CASE WHEN stoch_k > stoch_d THEN 1 ELSE 0 END) as daily_score
+        FROM `aialgotradehits.crypto_trading_data.stocks_daily_clean`
+        WHERE symbol IN UNNEST(@symbols)
+          AND DATE(datetime) >= DATE_SUB(CURRENT_DATE(), INTERVAL 10 DAY)
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY datetime DESC) = 1
+    ),
+    hourly_base AS (
+        SELECT
+            symbol, datetime, close, volume,
+            COALESCE(ema_12, 0) as ema_12, COALESCE(ema_26, 0) as ema_26,
+            COALESCE(rsi, 50) as rsi, COALESCE(macd_histogram, 0) as macd_histogram,
+            COALESCE(adx, 0) as adx, COALESCE(stoch_k, 50) as stoch_k, COALESCE(stoch_d, 50) as stoch_d,
+            LAG(ema_12) OVER w as prev_ema_12,
+            LAG(ema_26) OVER w as prev_ema_26,
+            LAG(macd_histogram) OVER w as prev_macd_hist,
+            LAG(rsi) OVER w as prev_rsi,
+            LAG(close) OVER w as prev_close,
+            AVG(volume) OVER (w ROWS BETWEEN 10 PRECEDING AND 1 PRECEDING) as avg_vol
+        FROM `aialgotradehits.crypto_trading_data.v2_stocks_hourly`
+        WHERE symbol IN UNNEST(@symbols)
+          AND datetime >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 5 DAY)
+        WINDOW w AS (PARTITION BY symbol ORDER BY datetime)
+    ),
+    hourly AS (
+        SELECT
+            symbol,
+            datetime as hourly_datetime,
+            CASE WHEN ema_12 > ema_26 THEN 1 ELSE 0 END as hourly_ema_bullish,
+            CASE WHEN macd_histogram > 0 THEN 1 ELSE 0 END as hourly_macd_bullish,
+            CASE WHEN adx > 25 THEN 1 ELSE 0 END as hourly_strong_trend,
+            CASE WHEN rsi BETWEEN 40 AND 65 THEN 1 ELSE 0 END as hourly_rsi_sweet,
+            CASE WHEN volume > COALESCE(avg_vol, volume) * 1.2 THEN 1 ELSE 0 END as hourly_volume_surge,
+            (CASE WHEN ema_12 > ema_26 THEN 1 ELSE 0 END +
+             CASE WHEN ema_12 > ema_26 AND COALESCE(prev_ema_12, 0) <= COALESCE(prev_ema_26, 0) THEN 1 ELSE 0 END +
+             CASE WHEN rsi BETWEEN 40 AND 65 THEN 1 ELSE 0 END +
+             CASE WHEN macd_histogram > 0 THEN 1 ELSE 0 END +
+             CASE WHEN macd_histogram > COALESCE(prev_macd_hist, 0) THEN 1 ELSE 0 END +
+             CASE WHEN adx > 25 THEN 1 ELSE 0 END +
+             CASE WHEN stoch_k > stoch_d THEN 1 ELSE 0 END +
+             CASE WHEN volume > COALESCE(avg_vol, volume) * 1.2 THEN 1 ELSE 0 END +
+             CASE WHEN rsi > COALESCE(prev_rsi, rsi) THEN 1 ELSE 0 END +
+             CASE WHEN close > COALESCE(prev_close, close) THEN 1 ELSE 0 END) as hourly_score
+        FROM hourly_base
+        WHERE prev_close IS NOT NULL
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY datetime DESC) = 1
+    ),
+    fivemin_base AS (
+        SELECT
+            symbol, datetime, close, volume,
+            COALESCE(ema_12, 0) as ema_12, COALESCE(ema_26, 0) as ema_26,
+            COALESCE(rsi, 50) as rsi, COALESCE(macd_histogram, 0) as macd_histogram,
+            COALESCE(adx, 0) as adx, COALESCE(stoch_k, 50) as stoch_k, COALESCE(stoch_d, 50) as stoch_d,
+            LAG(macd_histogram) OVER w as prev_macd_hist,
+            LAG(close) OVER w as prev_close,
+            AVG(volume) OVER (w ROWS BETWEEN 12 PRECEDING AND 1 PRECEDING) as avg_vol,
+            TIMESTAMP_TRUNC(MAX(datetime) OVER (PARTITION BY symbol), HOUR) as latest_hour
+        FROM `aialgotradehits.crypto_trading_data.v2_stocks_5min`
+        WHERE symbol IN UNNEST(@symbols)
+          AND datetime >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 2 DAY)
+        WINDOW w AS (PARTITION BY symbol ORDER BY datetime)
+    ),
+    fivemin AS (
+        SELECT
+            symbol,
+            ema_12 > ema_26 as ema_bullish,
+            macd_histogram > 0 as macd_bullish,
+            close > COALESCE(prev_close, close) as price_up,
+            (CASE WHEN ema_12 > ema_26 THEN 1 ELSE 0 END +
+             CASE WHEN rsi BETWEEN 40 AND 65 THEN 1 ELSE 0 END +
+             CASE WHEN macd_histogram > 0 THEN 1 ELSE 0 END +
+             CASE WHEN macd_histogram > COALESCE(prev_macd_hist, 0) THEN 1 ELSE 0 END +
+             CASE WHEN adx > 25 THEN 1 ELSE 0 END +
+             CASE WHEN stoch_k > stoch_d THEN 1 ELSE 0 END +
+             CASE WHEN volume > COALESCE(avg_vol, volume) * 1.5 THEN 1 ELSE 0 END +
+             CASE WHEN close > COALESCE(prev_close, close) THEN 1 ELSE 0 END) as fivemin_score
+        FROM fivemin_base
+        WHERE prev_close IS NOT NULL
+          AND TIMESTAMP_TRUNC(datetime, HOUR) = latest_hour
+    ),
+    fivemin_agg AS (
+        SELECT
+            symbol,
+            ROUND(AVG(fivemin_score), 2) as avg_5min_score,
+            MAX(fivemin_score) as max_5min_score,
+            ROUND(AVG(IF(ema_bullish, 1, 0)), 3) as fivemin_ema_pct,
+            ROUND(AVG(IF(macd_bullish, 1, 0)), 3) as fivemin_macd_pct,
+            ROUND(AVG(IF(price_up, 1, 0)), 3) as fivemin_price_up_pct
+        FROM fivemin
+        GROUP BY symbol
+    )
+    SELECT
+        h.symbol,
+        h.hourly_datetime,
+        d.* EXCEPT (symbol),
+        h.* EXCEPT (symbol, hourly_datetime),
+        f.* EXCEPT (symbol),
+        d.daily_score + h.hourly_score + CAST(ROUND(f.avg_5min_score) AS INT64) as raw_nested_score,
+        (d.daily_score + h.hourly_score + CAST(ROUND(f.avg_5min_score) AS INT64) +
+         CASE WHEN d.daily_ema_bullish = 1 AND h.hourly_ema_bullish = 1 AND f.fivemin_ema_pct >= 0.5 THEN 3 ELSE 0 END +
+         CASE WHEN d.daily_macd_bullish = 1 AND h.hourly_macd_bullish = 1 AND f.fivemin_macd_pct >= 0.5 THEN 2 ELSE 0 END +
+         CASE WHEN d.daily_strong_trend = 1 AND h.hourly_strong_trend = 1 THEN 1 ELSE 0 END
+        ) as enhanced_nested_score
+    FROM hourly h
+    JOIN daily d USING (symbol)
+    JOIN fivemin_agg f USING (symbol)
+    """
+    job_config = bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ArrayQueryParameter('symbols', 'STRING', list(symbols))
+    ])
+    return {row['symbol']: dict(row) for row in client.query(query, job_config=job_config).result()}
+
+
+_nested_batcher = None
+
+
+def score_nested_batch(client, feature_rows):
+    """MicroBatcher score_fn: predictions in row order, each tagged with the path that scored it"""
+    predictions, served_by = predict_nested(client, feature_rows)
+    return [dict(p, served_by=served_by) if p is not None else None for p in predictions]
+
+
+def get_nested_batcher(client):
+    """Shared micro-batcher so concurrent batch requests are scored in one model call"""
+    global _nested_batcher
+    if _nested_batcher is None:
+        _nested_batcher = MicroBatcher(lambda rows: score_nested_batch(client, rows))
+    return _nested_batcher
+
 
 def register_walk_forward_endpoints(app, client, project_id, dataset_id, sanitize_row):
     """Register all walk-forward validation endpoints"""
@@ -1901,63 +2168,18 @@ def register_walk_forward_endpoints(app, client, project_id, dataset_id, sanitiz
         try:
             data = request.get_json() or {}
 
-            # Build prediction query using ML.PREDICT
-            prediction_query = f"""
-            SELECT
-                predicted_hour_direction,
-                predicted_hour_direction_probs[OFFSET(0)].prob as down_prob,
-                predicted_hour_direction_probs[OFFSET(1)].prob as up_prob
-            FROM ML.PREDICT(
-                MODEL `aialgotradehits.ml_models.nested_predictor_v1`,
-                (SELECT
-                    {data.get('daily_score', 3)} as daily_score,
-                    {data.get('hourly_score', 3)} as hourly_score,
-                    {data.get('avg_5min_score', 3.0)} as avg_5min_score,
-                    {data.get('daily_score', 3) + data.get('hourly_score', 3) + int(data.get('avg_5min_score', 3))} as enhanced_nested_score,
-                    {data.get('daily_score', 3) + data.get('hourly_score', 3) + int(data.get('avg_5min_score', 3))} as raw_nested_score,
-                    {data.get('daily_ema_bullish', 0)} as daily_ema_bullish,
-                    {data.get('daily_macd_bullish', 0)} as daily_macd_bullish,
-                    {data.get('daily_strong_trend', 0)} as daily_strong_trend,
-                    {data.get('daily_above_sma50', 0)} as daily_above_sma50,
-                    {data.get('daily_above_sma200', 0)} as daily_above_sma200,
-                    {data.get('hourly_ema_bullish', 0)} as hourly_ema_bullish,
-                    {data.get('hourly_macd_bullish', 0)} as hourly_macd_bullish,
-                    {data.get('hourly_strong_trend', 0)} as hourly_strong_trend,
-                    {data.get('hourly_rsi_sweet', 0)} as hourly_rsi_sweet,
-                    {data.get('hourly_volume_surge', 0)} as hourly_volume_surge,
-                    {data.get('fivemin_ema_pct', 0.5)} as fivemin_ema_pct,
-                    {data.get('fivemin_macd_pct', 0.5)} as fivemin_macd_pct,
-                    {data.get('fivemin_price_up_pct', 0.5)} as fivemin_price_up_pct,
-                    {data.get('max_5min_score', 5)} as max_5min_score,
-                    CASE WHEN {data.get('daily_ema_bullish', 0)} = 1 AND {data.get('hourly_ema_bullish', 0)} = 1 AND {data.get('fivemin_ema_pct', 0.5)} >= 0.5 THEN 1 ELSE 0 END as all_tf_aligned,
-                    CASE WHEN {data.get('daily_ema_bullish', 0)} = 1 AND {data.get('hourly_ema_bullish', 0)} = 1 THEN 1 ELSE 0 END as daily_hourly_aligned,
-                    CASE WHEN {data.get('hourly_ema_bullish', 0)} = 1 AND {data.get('fivemin_ema_pct', 0.5)} >= 0.5 THEN 1 ELSE 0 END as hourly_5min_aligned,
-                    CASE WHEN {data.get('daily_macd_bullish', 0)} = 1 AND {data.get('hourly_macd_bullish', 0)} = 1 AND {data.get('fivemin_macd_pct', 0.5)} >= 0.5 THEN 1 ELSE 0 END as momentum_cascade
-                )
-            )
-            """
-
-            result = list(client.query(prediction_query).result())[0]
+            features = build_nested_features(data)
+            predictions, served_by = predict_nested(client, [features])
+            result = predictions[0]
 
-            up_prob = float(result.up_prob)
-            down_prob = float(result.down_prob)
-
-            # Determine confidence level
-            if up_prob >= 0.65:
-                confidence = 'HIGH_CONFIDENCE_UP'
-            elif up_prob >= 0.55:
-                confidence = 'MODERATE_UP'
-            elif down_prob >= 0.65:
-                confidence = 'HIGH_CONFIDENCE_DOWN'
-            elif down_prob >= 0.55:
-                confidence = 'MODERATE_DOWN'
-            else:
-                confidence = 'UNCERTAIN'
+            up_prob = result['up_prob']
+            down_prob = result['down_prob']
+            confidence = nested_confidence_level(up_prob, down_prob)
 
             return jsonify({
                 'symbol': data.get('symbol', 'N/A'),
                 'prediction': {
-                    'direction': result.predicted_hour_direction,
+                    'direction': result['direction'],
                     'up_probability': round(up_prob, 4),
                     'down_probability': round(down_prob, 4),
                     'confidence_level': confidence
@@ -1970,7 +2192,81 @@ def register_walk_forward_endpoints(app, client, project_id, dataset_id, sanitiz
                     'hourly_ema_bullish': data.get('hourly_ema_bullish', 0) == 1,
                     'fivemin_ema_pct': data.get('fivemin_ema_pct', 0.5)
                 },
-                'model_accuracy': '68.4%'
+                'model_accuracy': '68.4%',
+                'served_by': served_by
+            })
+
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    @app.route('/api/ml/predict/batch', methods=['POST'])
+    def batch_predict():
+        """
+        Nested-model predictions for many symbols at once
+
+        Request body:
+        {
+            "symbols": ["AAPL", "NVDA", ...],   // up to 1000
+            "min_confidence": 0.0               // optional, filter on max(up, down) probability
+        }
+
+        Latest daily/hourly/5-min features for all symbols are read in one query
+        and scored in one vectorized model call; concurrent requests arriving within
+        a few milliseconds share the same call.
+        """
+        try:
+            data = request.get_json() or {}
+            symbols = data.get('symbols') or []
+            if isinstance(symbols, str):
+                symbols = symbols.split(',')
+            symbols = list(dict.fromkeys(s.strip().upper() for s in symbols if s and s.strip()))
+            if not symbols:
+                return jsonify({'error': 'symbols required'}), 400
+            if len(symbols) > BATCH_PREDICT_MAX_SYMBOLS:
+                return jsonify({'error': f'At most {BATCH_PREDICT_MAX_SYMBOLS} symbols per request'}), 400
+            min_confidence = float(data.get('min_confidence', 0) or 0)
+
+            features_by_symbol = fetch_nested_features(client, symbols)
+            scored_symbols = [s for s in symbols if s in features_by_symbol]
+            feature_rows = [build_nested_features(features_by_symbol[s]) for s in scored_symbols]
+
+            if MicroBatcher:
+                predictions = get_nested_batcher(client).submit(feature_rows)
+                served_by = next((p['served_by'] for p in predictions if p is not None), None)
+            else:
+                predictions, served_by = predict_nested(client, feature_rows)
+
+            results = []
+            for symbol, features, prediction in zip(scored_symbols, feature_rows, predictions):
+                if prediction is None:
+                    continue
+                up_prob, down_prob = prediction['up_prob'], prediction['down_prob']
+                if max(up_prob, down_prob) < min_confidence:
+                    continue
+                results.append({
+                    'symbol': symbol,
+                    'as_of': str(features_by_symbol[symbol].get('hourly_datetime')),
+                    'direction': prediction['direction'],
+                    'up_probability': round(up_prob, 4),
+                    'down_probability': round(down_prob, 4),
+                    'confidence_level': nested_confidence_level(up_prob, down_prob),
+                    'scores': {
+                        'daily': features['daily_score'],
+                        'hourly': features['hourly_score'],
+                        'fivemin': features['avg_5min_score'],
+                        'nested_total': features['enhanced_nested_score']
+                    },
+                    'all_tf_aligned': features['all_tf_aligned'] == 1
+                })
+
+            results.sort(key=lambda r: r['up_probability'], reverse=True)
+            return jsonify({
+                'predictions': results,
+                'count': len(results),
+                'requested': len(symbols),
+                'missing_features': [s for s in symbols if s not in features_by_symbol],
+                'served_by': served_by,
+                'model': NESTED_MODEL_NAME
             })
 
         except Exception as e:
@@ -2172,6 +2468,48 @@ def register_walk_forward_endpoints(app, client, project_id, dataset_id, sanitiz
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
+    @app.route('/api/ml/models/serving', methods=['GET'])
+    def get_model_serving_status():
+        """Loaded in-process models, their versions and prediction latency histograms"""
+        if not get_model_server:
+            return jsonify({'error': 'Model serving not available'}), 503
+        status = get_model_server().status()
+        if _nested_batcher is not None:
+            status['batching'] = _nested_batcher.status()
+        return jsonify(status)
+
+    @app.route('/api/ml/models/reload', methods=['POST'])
+    def reload_served_models():
+        """
+        Reload served models.
+
+        Request body:
+        {
+            "model": "nested_predictor_v1",   // optional, default all
+            "force": false
+        }
+
+        Exporting the BigQuery ML model to GCS is not done here: this endpoint is not
+        authenticated. Run export_bqml_model from an operator environment, then reload.
+        """
+        if not get_model_server:
+            return jsonify({'error': 'Model serving not available'}), 503
+        try:
+            data = request.get_json() or {}
+            server = get_model_server()
+            name = data.get('model')
+            if name and name not in server.models:
+                return jsonify({'error': f'Unknown model: {name}'}), 404
+
+            if data.get('export'):
+                return jsonify({'error': 'export is not available on this endpoint'}), 403
+
+            reloaded = server.reload(name, force=data.get('force', False))
+            return jsonify({'reloaded': reloaded, 'status': server.status()})
+
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
     def get_feature_category(feature_name):
         """Helper to categorize features"""
         if 'daily' in feature_name.lower():
@@ -2185,6 +2523,10 @@ def register_walk_forward_endpoints(app, client, project_id, dataset_id, sanitiz
         else:
             return 'Other'
 
+    # Models load in the background after the first prediction request (BigQuery ML until then)
+    if get_model_server:
+        get_model_server().register(NESTED_MODEL_NAME, NESTED_MODEL_FEATURES)
+
     print("Walk-Forward Validation endpoints registered successfully")
     print("Paper Trading endpoints registered successfully")
     print("Rise Cycle Signal endpoints registered successfully")
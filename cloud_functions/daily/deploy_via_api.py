@@ -34,6 +34,8 @@ def create_source_zip():
     with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
         # Add main.py
         zipf.write('main.py', 'main.py')
+        # Add the async Kraken client used by main.py
+        zipf.write('kraken_async.py', 'kraken_async.py')
         # Add requirements.txt
         zipf.write('requirements.txt', 'requirements.txt')
 
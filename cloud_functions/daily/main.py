@@ -4,14 +4,14 @@ Fetches daily OHLC data and calculates comprehensive technical indicators
 """
 
 import functions_framework
-import krakenex
 import pandas as pd
 import numpy as np
 from google.cloud import bigquery
 from datetime import datetime, timedelta
-import time
 import logging
 
+from kraken_async import get_asset_pairs, fetch_ohlc_batch
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -356,16 +356,13 @@ def calculate_technical_indicators(df):
 def fetch_daily_data():
     """Fetch daily OHLC data for all USD trading pairs from Kraken"""
 
-    kraken = krakenex.API()
-
     logger.info("Fetching all tradable asset pairs from Kraken...")
-    pairs_response = kraken.query_public('AssetPairs')
-
-    if pairs_response['error']:
-        logger.error(f"Error fetching pairs: {pairs_response['error']}")
+    try:
+        all_pairs = get_asset_pairs()
+    except Exception as e:
+        logger.error(str(e))
         return None
 
-    all_pairs = pairs_response['result']
     usd_pairs = {k: v for k, v in all_pairs.items() if 'USD' in k and v.get('status') == 'online'}
 
     logger.info(f"Found {len(usd_pairs)} USD trading pairs")
@@ -374,6 +371,10 @@ def fetch_daily_data():
     days_ago = datetime.now() - timedelta(days=250)
     since_timestamp = int(days_ago.timestamp())
 
+    # Fetch OHLC for all pairs concurrently, paced by Kraken's rate limit
+    ohlc_responses, fetch_stats = fetch_ohlc_batch(list(usd_pairs), 1440, since_timestamp)  # Daily candles
+    logger.info(f"Kraken fetch stats: {fetch_stats}")
+
     all_processed_data = []
     failed_pairs = []
     successful_pairs = 0
@@ -383,12 +384,7 @@ def fetch_daily_data():
             if idx % 50 == 0:
                 logger.info(f"Progress: {idx}/{len(usd_pairs)} pairs")
 
-            # Fetch OHLC data
-            ohlc_response = kraken.query_public('OHLC', {
-                'pair': pair,
-                'interval': 1440,  # Daily candles
-                'since': since_timestamp
-            })
+            ohlc_response = ohlc_responses[pair]
 
             if ohlc_response['error']:
                 logger.warning(f"Error fetching {pair}: {ohlc_response['error']}")
@@ -425,13 +421,9 @@ def fetch_daily_data():
             all_processed_data.append(df_latest)
             successful_pairs += 1
 
-            # Rate limiting
-            time.sleep(1.5)
-
         except Exception as e:
             logger.error(f"Exception fetching {pair}: {str(e)}")
             failed_pairs.append({'pair': pair, 'error': str(e)})
-            time.sleep(2)
 
     logger.info(f"Successfully processed {successful_pairs}/{len(usd_pairs)} pairs")
 
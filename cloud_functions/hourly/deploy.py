@@ -31,6 +31,7 @@ def create_source_zip():
 
     with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
         zipf.write('main.py', 'main.py')
+        zipf.write('kraken_async.py', 'kraken_async.py')
         zipf.write('requirements.txt', 'requirements.txt')
 
     print(f"✓ Created archive: {zip_path}")
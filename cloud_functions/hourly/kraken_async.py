@@ -0,0 +1,211 @@
+"""
+Async Kraken Public API Client
+Shared by the daily, hourly and 5min crypto fetchers (keep the copies identical)
+
+- Token bucket matched to Kraken's public rate limit: every call adds one to a
+  counter that decays at a fixed rate per second, with a small burst allowance
+- Adaptive rate: EAPI:Rate limit exceeded / HTTP 429 halves the refill rate,
+  empties the bucket and lowers the ceiling to just under the rate that tripped
+  it; successful calls raise the rate back toward that ceiling
+- Bounded concurrency over one aiohttp session
+- AssetPairs metadata cached process-wide, so warm instances skip the call
+
+Responses keep krakenex's {'error': [...], 'result': {...}} shape.
+"""
+
+import os
+import time
+import random
+import asyncio
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+KRAKEN_PUBLIC_URL = 'https://api.kraken.com/0/public'
+KRAKEN_RATE_PER_SECOND = float(os.environ.get('KRAKEN_RATE_PER_SECOND', '1.0'))
+KRAKEN_BURST = float(os.environ.get('KRAKEN_BURST', '4'))
+KRAKEN_MAX_CONCURRENT = int(os.environ.get('KRAKEN_MAX_CONCURRENT', '4'))
+KRAKEN_MAX_RETRIES = 4
+KRAKEN_BACKOFF_SECONDS = 2.0
+KRAKEN_REQUEST_TIMEOUT = 30
+ASSET_PAIRS_TTL_SECONDS = int(os.environ.get('KRAKEN_ASSET_PAIRS_TTL', '21600'))
+
+RATE_LIMIT_ERRORS = ('EAPI:Rate limit exceeded', 'EGeneral:Too many requests', 'EService:Throttled')
+TRANSIENT_ERRORS = ('EService:Unavailable', 'EService:Busy', 'EGeneral:Temporary lockout')
+
+# Process-wide AssetPairs cache (survives warm Cloud Function invocations)
+_asset_pairs_cache = {'result': None, 'fetched_at': 0.0}
+
+
+class TokenBucket:
+    """Call budget that refills at `rate` calls/sec up to `burst`; each call costs one token"""
+
+    def __init__(self, rate: float = KRAKEN_RATE_PER_SECOND, burst: float = KRAKEN_BURST):
+        self.ceiling = rate
+        self.min_rate = rate / 8
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.penalized_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        # Waiters queue on the lock, so calls are released in order at `rate`
+        async with self._lock:
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+    def penalize(self):
+        """Rate limit hit: lower the ceiling below the rate that tripped it, halve the rate, drop burst credit"""
+        self.tokens = min(self.tokens, 0)
+        # Calls already in flight report the same overrun; count it once
+        now = time.monotonic()
+        if now - self.penalized_at < 1 / self.rate:
+            return
+        self.penalized_at = now
+        self.ceiling = max(self.min_rate, min(self.ceiling, self.rate * 0.9))
+        self.rate = max(self.min_rate, self.rate / 2)
+
+    def reward(self):
+        """Successful call: recover 10% of the ceiling per call"""
+        self.rate = min(self.ceiling, self.rate + self.ceiling * 0.1)
+
+
+class KrakenPublicClient:
+    """Async client for Kraken public endpoints; use as `async with KrakenPublicClient() as kraken`"""
+
+    def __init__(
+        self,
+        rate: float = KRAKEN_RATE_PER_SECOND,
+        burst: float = KRAKEN_BURST,
+        max_concurrent: int = KRAKEN_MAX_CONCURRENT,
+        base_url: str = KRAKEN_PUBLIC_URL
+    ):
+        self.base_url = base_url
+        self.max_concurrent = max_concurrent
+        self.bucket = TokenBucket(rate, burst)
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.calls = 0
+        self.rate_limited = 0
+        self.retries = 0
+        self.started = time.monotonic()
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.max_concurrent)
+        timeout = aiohttp.ClientTimeout(total=KRAKEN_REQUEST_TIMEOUT)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    async def _get(self, method: str, params: Optional[Dict[str, Any]]) -> Tuple[int, Dict[str, Any]]:
+        async with self._semaphore:
+            self.calls += 1
+            async with self.session.get(f"{self.base_url}/{method}", params=params) as response:
+                if response.status == 429:
+                    return response.status, {'error': ['EAPI:Rate limit exceeded'], 'result': {}}
+                return response.status, await response.json(content_type=None)
+
+    async def query(self, method: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Call a public endpoint with rate limiting and retries"""
+        errors: List[str] = []
+
+        for attempt in range(KRAKEN_MAX_RETRIES + 1):
+            if attempt:
+                self.retries += 1
+                await asyncio.sleep(KRAKEN_BACKOFF_SECONDS * 2 ** (attempt - 1) + random.uniform(0, 0.5))
+
+            await self.bucket.acquire()
+            try:
+                status, data = await self._get(method, params)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                errors = [f"{type(e).__name__}: {e}"]
+                continue
+
+            errors = data.get('error') or []
+            if any(e.startswith(RATE_LIMIT_ERRORS) for e in errors):
+                self.rate_limited += 1
+                self.bucket.penalize()
+                logger.warning(f"Kraken rate limit on {method}, rate now {self.bucket.rate:.2f}/s")
+                continue
+            if status >= 500 or any(e.startswith(TRANSIENT_ERRORS) for e in errors):
+                continue
+
+            self.bucket.reward()
+            return {'error': errors, 'result': data.get('result', {})}
+
+        return {'error': errors or ['EGeneral:Retries exhausted'], 'result': {}}
+
+    async def asset_pairs(self) -> Dict[str, Any]:
+        """AssetPairs result, from the process cache when fresh"""
+        cached = _asset_pairs_cache
+        if cached['result'] is not None and time.time() - cached['fetched_at'] < ASSET_PAIRS_TTL_SECONDS:
+            return cached['result']
+
+        response = await self.query('AssetPairs')
+        if response['error']:
+            if cached['result'] is not None:
+                logger.warning(f"AssetPairs refresh failed, using cached copy: {response['error']}")
+                return cached['result']
+            raise RuntimeError(f"Error fetching pairs: {response['error']}")
+
+        cached['result'] = response['result']
+        cached['fetched_at'] = time.time()
+        return cached['result']
+
+    async def ohlc(self, pair: str, interval: int, since: Optional[int] = None) -> Dict[str, Any]:
+        params = {'pair': pair, 'interval': interval}
+        if since:
+            params['since'] = since
+        return await self.query('OHLC', params)
+
+    async def ohlc_many(self, pairs: List[str], interval: int, since: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        """OHLC responses for many pairs, fetched concurrently within the rate limit"""
+        responses = await asyncio.gather(*(self.ohlc(pair, interval, since) for pair in pairs))
+        return dict(zip(pairs, responses))
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started
+        return {
+            'calls': self.calls,
+            'retries': self.retries,
+            'rate_limited': self.rate_limited,
+            'final_rate_per_second': round(self.bucket.rate, 3),
+            'elapsed_seconds': round(elapsed, 1),
+            'calls_per_second': round(self.calls / elapsed, 2) if elapsed > 0 else 0.0
+        }
+
+
+# =============================================================================
+# SYNC ENTRY POINTS (Cloud Functions are synchronous)
+# =============================================================================
+
+def get_asset_pairs() -> Dict[str, Any]:
+    """Kraken AssetPairs metadata (process-wide cache, refreshed every ASSET_PAIRS_TTL_SECONDS)"""
+    async def _run():
+        async with KrakenPublicClient() as kraken:
+            return await kraken.asset_pairs()
+    return asyncio.run(_run())
+
+
+def fetch_ohlc_batch(pairs: List[str], interval: int, since: Optional[int] = None) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Any]]:
+    """Fetch OHLC for all pairs concurrently; returns ({pair: response}, client stats)"""
+    async def _run():
+        async with KrakenPublicClient() as kraken:
+            responses = await kraken.ohlc_many(pairs, interval, since)
+            return responses, kraken.stats()
+    return asyncio.run(_run())
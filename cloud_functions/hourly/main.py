@@ -3,14 +3,14 @@ Kraken Pro Hourly Data Fetcher with Technical Indicators
 Fetches 60-minute OHLC data and calculates comprehensive technical indicators
 """
 
-import krakenex
 import pandas as pd
 import numpy as np
 from google.cloud import bigquery
 from datetime import datetime, timedelta
-import time
 import logging
 
+from kraken_async import get_asset_pairs, fetch_ohlc_batch
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -169,8 +169,6 @@ def calculate_technical_indicators(df):
 def fetch_hourly_data():
     """Fetch 60-minute OHLC data for top 100 USD trading pairs from Kraken"""
 
-    kraken = krakenex.API()
-
     # Top 100 most liquid and actively traded crypto pairs
     TOP_CRYPTO_PAIRS = [
         # Major cryptos (Top 20)
@@ -210,14 +208,12 @@ def fetch_hourly_data():
 
     # Validate pairs exist and are online
     logger.info("Fetching tradable asset pairs from Kraken...")
-    pairs_response = kraken.query_public('AssetPairs')
-
-    if pairs_response['error']:
-        logger.error(f"Error fetching pairs: {pairs_response['error']}")
+    try:
+        all_pairs = get_asset_pairs()
+    except Exception as e:
+        logger.error(str(e))
         return None
 
-    all_pairs = pairs_response['result']
-
     # Filter to only include pairs that are in our top list and are online
     usd_pairs = {}
     for pair in TOP_CRYPTO_PAIRS:
@@ -232,6 +228,10 @@ def fetch_hourly_data():
     hours_ago = datetime.now() - timedelta(hours=250)
     since_timestamp = int(hours_ago.timestamp())
 
+    # Fetch OHLC for all pairs concurrently, paced by Kraken's rate limit
+    ohlc_responses, fetch_stats = fetch_ohlc_batch(list(usd_pairs), 60, since_timestamp)  # 60-minute candles
+    logger.info(f"Kraken fetch stats: {fetch_stats}")
+
     all_processed_data = []
     failed_pairs = []
     successful_pairs = 0
@@ -241,12 +241,7 @@ def fetch_hourly_data():
             if idx % 50 == 0:
                 logger.info(f"Progress: {idx}/{len(usd_pairs)} pairs")
 
-            # Fetch OHLC data
-            ohlc_response = kraken.query_public('OHLC', {
-                'pair': pair,
-                'interval': 60,  # 60-minute candles
-                'since': since_timestamp
-            })
+            ohlc_response = ohlc_responses[pair]
 
             if ohlc_response['error']:
                 logger.warning(f"Error fetching {pair}: {ohlc_response['error']}")
@@ -283,13 +278,9 @@ def fetch_hourly_data():
             all_processed_data.append(df_pair)
             successful_pairs += 1
 
-            # Rate limiting
-            time.sleep(1.5)
-
         except Exception as e:
             logger.error(f"Exception fetching {pair}: {str(e)}")
             failed_pairs.append({'pair': pair, 'error': str(e)})
-            time.sleep(2)
 
     logger.info(f"Successfully processed {successful_pairs}/{len(usd_pairs)} pairs")
 
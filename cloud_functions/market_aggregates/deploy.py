@@ -0,0 +1,94 @@
+"""
+Deploy Market Aggregates Cloud Function
+Refreshes the agg_* summary tables and latest-bar snapshots after each fetch
+batch, plus a daily run after dedup (2:30 AM), a Saturday run for the weekly
+sector tables and an intraday snapshot run for the hourly / 5-minute tables
+"""
+
+import os
+import subprocess
+import sys
+
+PROJECT_ID = 'aialgotradehits'
+REGION = 'us-central1'
+FUNCTION_NAME = 'market-aggregates'
+FUNCTION_URL = f'https://{REGION}-{PROJECT_ID}.cloudfunctions.net/{FUNCTION_NAME}'
+
+SCHEDULES = [
+    # (job name, cron, query string, description)
+    ('market-aggregates-daily-3am', '0 3 * * *', '', 'Refresh market aggregates after daily fetch + dedup'),
+    ('market-aggregates-weekly-sat', '0 6 * * 6', '?stages=sector,movers', 'Rebuild weekly sector aggregates'),
+    ('market-aggregates-intraday-snapshot', '*/15 * * * *', '?stages=snapshot&timeframes=hourly,5min',
+     'Refresh hourly / 5-minute latest-bar snapshots'),
+]
+
+# API endpoint the snapshot stage pushes changed table names to (<api url>/api/quotes/notify)
+QUOTE_BOARD_NOTIFY_URL = os.environ.get('QUOTE_BOARD_NOTIFY_URL')
+
+
+def deploy():
+    print("=" * 60)
+    print("DEPLOYING MARKET AGGREGATES")
+    print("=" * 60)
+
+    cmd = [
+        'gcloud', 'functions', 'deploy', FUNCTION_NAME,
+        '--project', PROJECT_ID,
+        '--region', REGION,
+        '--runtime', 'python311',
+        '--trigger-http',
+        '--allow-unauthenticated',
+        '--entry-point', 'refresh_market_aggregates',
+        '--memory', '512MB',
+        '--timeout', '540s',
+        '--min-instances', '0',
+        '--max-instances', '1',
+        '--source', '.'
+    ]
+    if QUOTE_BOARD_NOTIFY_URL:
+        cmd += ['--set-env-vars', f'QUOTE_BOARD_NOTIFY_URL={QUOTE_BOARD_NOTIFY_URL}']
+
+    print(f"\nDeploying {FUNCTION_NAME}...")
+    result = subprocess.run(cmd, capture_output=True, text=True)
+
+    if result.returncode != 0:
+        print("\nDEPLOYMENT FAILED!")
+        print(f"\nSTDOUT:\n{result.stdout}")
+        print(f"\nSTDERR:\n{result.stderr}")
+        sys.exit(1)
+
+    print("\nDEPLOYMENT SUCCESSFUL!")
+    print(f"\nFunction URL: {FUNCTION_URL}")
+    print("\nSet MARKET_AGGREGATES_URL to this URL on multi-source-fetcher and market-movers")
+    print("so they refresh the aggregates after each fetch batch.")
+    return True
+
+
+def update_schedulers():
+    for name, schedule, query, description in SCHEDULES:
+        subprocess.run([
+            'gcloud', 'scheduler', 'jobs', 'delete', name,
+            '--project', PROJECT_ID, '--location', REGION, '--quiet'
+        ], capture_output=True)
+
+        result = subprocess.run([
+            'gcloud', 'scheduler', 'jobs', 'create', 'http', name,
+            '--project', PROJECT_ID,
+            '--location', REGION,
+            '--schedule', schedule,
+            '--time-zone', 'America/New_York',
+            '--uri', FUNCTION_URL + query,
+            '--http-method', 'GET',
+            '--attempt-deadline', '540s',
+            '--description', description
+        ], capture_output=True, text=True)
+
+        if result.returncode == 0:
+            print(f"Scheduler created: {name} ({schedule})")
+        else:
+            print(f"Scheduler creation failed for {name}: {result.stderr}")
+
+
+if __name__ == '__main__':
+    if deploy():
+        update_schedulers()
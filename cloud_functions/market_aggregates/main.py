@@ -0,0 +1,424 @@
+"""
+Market Aggregates Cloud Function
+================================
+Maintains small summary tables that the API serves sector momentum, market
+summaries and top movers from, instead of re-running joins / latest-row scans
+over the full history tables on every request.
+
+Tables (crypto_trading_data):
+    agg_latest_bars     one row per (asset_type, symbol): latest bar + change vs previous bar
+    agg_sector_stats    weekly sector momentum, one row per (as_of, sector)
+    agg_sector_members  weekly per-stock sector ranks, one row per (as_of, symbol)
+    agg_top_movers      gainers / losers per (timeframe, asset_type)
+    latest_<asset>_<tf> latest-bar snapshot: one row per symbol with every column
+                        of the source table (e.g. latest_stocks_daily, latest_crypto_hourly)
+                        plus snapshot_at, the time the row was written
+
+Each stage is incremental: latest bars only scan rows newer than what is
+already aggregated, weekly sector tables are only rebuilt for a new week, and
+top movers are rebuilt from the (tiny) aggregate tables. Snapshot tables are
+only written when a symbol has a newer bar, so their last-modified time is a
+change signal: the API quote board reloads a snapshot when it changes
+(QUOTE_BOARD_NOTIFY_URL additionally pushes the changed tables to it).
+
+Triggered after each fetch batch (multi_source calls it when
+MARKET_AGGREGATES_URL is set) and by a scheduler run after dedup.
+"""
+
+import functions_framework
+from google.cloud import bigquery
+from google.api_core.exceptions import NotFound
+from datetime import datetime, timezone
+import logging
+import os
+import requests
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PROJECT_ID = 'aialgotradehits'
+DATASET_ID = 'crypto_trading_data'
+
+# asset_type -> (daily source table, has sector column)
+LATEST_BAR_SOURCES = {
+    'stocks': ('stocks_daily_clean', True),
+    'crypto': ('crypto_daily_clean', False),
+}
+
+WEEKLY_STOCKS_TABLE = 'weekly_stocks_all'
+STOCKS_MASTER_TABLE = 'v2_stocks_master'
+MARKET_MOVERS_TABLE = 'market_movers'
+
+# Rescan window behind the newest aggregated bar (covers weekends / late rows)
+LATEST_BAR_LOOKBACK_DAYS = 7
+TOP_MOVERS_LIMIT = 100
+
+# (asset_type, timeframe) -> source table of the latest-bar snapshot
+SNAPSHOT_SOURCES = {
+    ('stocks', 'daily'): 'stocks_daily_clean',
+    ('stocks', 'hourly'): 'stocks_hourly_clean',
+    ('stocks', '5min'): 'stocks_5min_clean',
+    ('crypto', 'daily'): 'crypto_daily_clean',
+    ('crypto', 'hourly'): 'crypto_hourly_clean',
+    ('crypto', '5min'): 'crypto_5min_clean',
+    ('etfs', 'daily'): 'etfs_daily_clean',
+    ('etfs', 'hourly'): 'etfs_hourly_clean',
+    ('forex', 'daily'): 'forex_daily_clean',
+    ('forex', 'hourly'): 'forex_hourly_clean',
+    ('indices', 'daily'): 'indices_daily_clean',
+    ('commodities', 'daily'): 'v2_commodities_daily',
+}
+
+# Rescan window behind the newest snapshot bar, per timeframe
+SNAPSHOT_LOOKBACK_DAYS = {'daily': 7, 'hourly': 2, '5min': 1}
+
+QUOTE_BOARD_NOTIFY_URL = os.environ.get('QUOTE_BOARD_NOTIFY_URL')
+
+STAGES = ['snapshot', 'latest_bars', 'sector', 'movers']
+
+
+def table(name):
+    return f"{PROJECT_ID}.{DATASET_ID}.{name}"
+
+
+def ensure_tables(client):
+    """Create the aggregate tables on first run"""
+    ddl = f"""
+    CREATE TABLE IF NOT EXISTS `{table('agg_latest_bars')}` (
+        asset_type STRING, symbol STRING, name STRING, sector STRING,
+        datetime TIMESTAMP, close FLOAT64, prev_close FLOAT64, change_pct FLOAT64,
+        volume FLOAT64, rsi FLOAT64, macd FLOAT64, adx FLOAT64, roc FLOAT64,
+        updated_at TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS `{table('agg_sector_stats')}` (
+        as_of DATE, sector STRING, stock_count INT64, avg_change_pct FLOAT64,
+        total_volume FLOAT64, volatility FLOAT64, momentum_rank INT64, updated_at TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS `{table('agg_sector_members')}` (
+        as_of DATE, sector STRING, symbol STRING, industry STRING, price FLOAT64,
+        volume FLOAT64, week_change_pct FLOAT64, sector_rank INT64, updated_at TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS `{table('agg_top_movers')}` (
+        timeframe STRING, asset_type STRING, direction STRING, rank INT64,
+        symbol STRING, name STRING, price FLOAT64, change FLOAT64, change_pct FLOAT64,
+        volume FLOAT64, market_cap FLOAT64, as_of TIMESTAMP, updated_at TIMESTAMP
+    );
+    """
+    client.query(ddl).result()
+
+
+def refresh_latest_bars(client, asset_type):
+    """Upsert the latest bar per symbol from rows newer than the aggregate's watermark"""
+    source, has_sector = LATEST_BAR_SOURCES[asset_type]
+    sector = 'sector' if has_sector else 'CAST(NULL AS STRING)'
+
+    query = f"""
+    MERGE `{table('agg_latest_bars')}` T
+    USING (
+        SELECT
+            '{asset_type}' AS asset_type, symbol, name, {sector} AS sector,
+            datetime, close, prev_close,
+            SAFE_DIVIDE(close - prev_close, prev_close) * 100 AS change_pct,
+            volume, rsi, macd, adx, roc
+        FROM (
+            SELECT *, LAG(close) OVER (PARTITION BY symbol ORDER BY datetime) AS prev_close
+            FROM `{table(source)}`
+            WHERE symbol IS NOT NULL
+              AND datetime >= TIMESTAMP_SUB(
+                  (SELECT IFNULL(MAX(datetime), TIMESTAMP '1970-01-01')
+                   FROM `{table('agg_latest_bars')}` WHERE asset_type = '{asset_type}'),
+                  INTERVAL {LATEST_BAR_LOOKBACK_DAYS} DAY)
+        )
+        WHERE true
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY datetime DESC) = 1
+    ) S
+    ON T.asset_type = S.asset_type AND T.symbol = S.symbol
+    WHEN MATCHED AND S.datetime >= T.datetime THEN UPDATE SET
+        name = S.name, sector = IFNULL(S.sector, T.sector), datetime = S.datetime,
+        close = S.close, prev_close = IFNULL(S.prev_close, T.prev_close),
+        change_pct = IFNULL(S.change_pct, T.change_pct),
+        volume = S.volume, rsi = S.rsi, macd = S.macd, adx = S.adx, roc = S.roc,
+        updated_at = CURRENT_TIMESTAMP()
+    WHEN NOT MATCHED THEN INSERT
+        (asset_type, symbol, name, sector, datetime, close, prev_close, change_pct,
+         volume, rsi, macd, adx, roc, updated_at)
+    VALUES
+        (S.asset_type, S.symbol, S.name, S.sector, S.datetime, S.close, S.prev_close, S.change_pct,
+         S.volume, S.rsi, S.macd, S.adx, S.roc, CURRENT_TIMESTAMP())
+    """
+    job = client.query(query)
+    job.result()
+    return job.num_dml_affected_rows or 0
+
+
+def snapshot_table(asset_type, timeframe):
+    return f"latest_{asset_type}_{timeframe}"
+
+
+def rebuild_snapshot(client, source, target):
+    """Full rebuild: latest row per symbol over the whole source table"""
+    client.query(f"""
+    CREATE OR REPLACE TABLE `{target}`
+    CLUSTER BY symbol AS
+    SELECT *, CURRENT_TIMESTAMP() AS snapshot_at FROM `{source}`
+    WHERE symbol IS NOT NULL
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY datetime DESC) = 1
+    """).result()
+    return client.get_table(target).num_rows
+
+
+def refresh_snapshot(client, asset_type, timeframe, force=False):
+    """
+    Keep latest_<asset_type>_<timeframe> at one row per symbol (all source columns
+    plus snapshot_at). Only symbols with a newer bar than the snapshot are rewritten;
+    the snapshot is rebuilt from scratch when it is missing or the source schema changed.
+    """
+    source = table(SNAPSHOT_SOURCES[(asset_type, timeframe)])
+    target = table(snapshot_table(asset_type, timeframe))
+
+    try:
+        source_columns = [field.name for field in client.get_table(source).schema]
+    except NotFound:
+        return {'status': 'NO_SOURCE'}
+    try:
+        target_columns = [field.name for field in client.get_table(target).schema]
+    except NotFound:
+        target_columns = None
+
+    if force or target_columns != source_columns + ['snapshot_at']:
+        return {'status': 'REBUILT', 'rows': rebuild_snapshot(client, source, target)}
+
+    script = f"""
+    CREATE TEMP TABLE changed AS
+    SELECT s.*, CURRENT_TIMESTAMP() AS snapshot_at
+    FROM (
+        SELECT * FROM `{source}`
+        WHERE symbol IS NOT NULL
+          AND datetime >= (SELECT MAX(datetime) FROM `{target}`) - INTERVAL {SNAPSHOT_LOOKBACK_DAYS[timeframe]} DAY
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY datetime DESC) = 1
+    ) s
+    LEFT JOIN `{target}` t ON t.symbol = s.symbol
+    WHERE t.symbol IS NULL OR s.datetime > t.datetime;
+
+    IF (SELECT COUNT(*) FROM changed) > 0 THEN
+        BEGIN TRANSACTION;
+        DELETE FROM `{target}` WHERE symbol IN (SELECT symbol FROM changed);
+        INSERT INTO `{target}` SELECT * FROM changed;
+        COMMIT TRANSACTION;
+    END IF;
+
+    SELECT COUNT(*) AS changed, MAX(datetime) AS latest FROM changed;
+    """
+    row = list(client.query(script).result())[0]
+    return {
+        'status': 'UPDATED' if row.changed else 'CURRENT',
+        'changed': row.changed,
+        'latest': row.latest.isoformat() if row.latest else None
+    }
+
+
+def notify_quote_board(tables):
+    """Tell the API which snapshot tables changed so its quote board reloads them now"""
+    if not QUOTE_BOARD_NOTIFY_URL or not tables:
+        return None
+    try:
+        response = requests.post(QUOTE_BOARD_NOTIFY_URL, json={'tables': tables}, timeout=30)
+        logger.info(f"  Quote board notified ({len(tables)} tables): HTTP {response.status_code}")
+        return response.status_code
+    except Exception as e:
+        logger.warning(f"  Quote board notify failed: {e}")
+        return None
+
+
+def refresh_sector_tables(client, force=False):
+    """Rebuild weekly sector stats / members, only when weekly_stocks_all has a new week"""
+    weeks = list(client.query(f"""
+    SELECT
+        (SELECT MAX(date) FROM `{table(WEEKLY_STOCKS_TABLE)}`) AS latest_week,
+        (SELECT MAX(as_of) FROM `{table('agg_sector_stats')}`) AS aggregated_week
+    """).result())[0]
+
+    if weeks.latest_week is None:
+        return {'status': 'NO_DATA'}
+    if not force and weeks.aggregated_week == weeks.latest_week:
+        return {'status': 'CURRENT', 'as_of': weeks.latest_week.isoformat()}
+
+    as_of = weeks.latest_week.isoformat()
+    script = f"""
+    CREATE TEMP TABLE week AS
+    SELECT w.symbol, m.sector, m.industry, w.close, w.volume, w.change_percent
+    FROM `{table(WEEKLY_STOCKS_TABLE)}` w
+    INNER JOIN `{table(STOCKS_MASTER_TABLE)}` m ON w.symbol = m.symbol
+    WHERE w.date = DATE '{as_of}'
+      AND m.sector IS NOT NULL
+      AND m.sector != '';
+
+    DELETE FROM `{table('agg_sector_stats')}` WHERE as_of = DATE '{as_of}';
+    INSERT INTO `{table('agg_sector_stats')}`
+    SELECT
+        DATE '{as_of}' AS as_of, sector,
+        COUNT(DISTINCT symbol) AS stock_count,
+        ROUND(AVG(change_percent), 2) AS avg_change_pct,
+        SUM(volume) AS total_volume,
+        ROUND(STDDEV(change_percent), 2) AS volatility,
+        RANK() OVER (ORDER BY AVG(change_percent) DESC) AS momentum_rank,
+        CURRENT_TIMESTAMP() AS updated_at
+    FROM week
+    GROUP BY sector;
+
+    DELETE FROM `{table('agg_sector_members')}` WHERE as_of = DATE '{as_of}';
+    INSERT INTO `{table('agg_sector_members')}`
+    SELECT
+        DATE '{as_of}' AS as_of, sector, symbol, industry,
+        close AS price, volume,
+        ROUND(change_percent, 2) AS week_change_pct,
+        ROW_NUMBER() OVER (PARTITION BY sector ORDER BY change_percent DESC) AS sector_rank,
+        CURRENT_TIMESTAMP() AS updated_at
+    FROM week
+    WHERE change_percent IS NOT NULL;
+    """
+    client.query(script).result()
+    return {'status': 'REBUILT', 'as_of': as_of}
+
+
+def refresh_top_movers(client, limit=TOP_MOVERS_LIMIT):
+    """Rebuild gainers / losers per timeframe from the aggregate and snapshot tables"""
+    query = f"""
+    CREATE OR REPLACE TABLE `{table('agg_top_movers')}` AS
+    WITH daily_movers AS (
+        -- Latest market_movers fetch per (market, category, symbol), last 3 days
+        SELECT
+            'daily' AS timeframe, market AS asset_type, category AS direction,
+            symbol, name, price, change, percent_change AS change_pct,
+            volume, market_cap, fetch_timestamp AS as_of
+        FROM `{table(MARKET_MOVERS_TABLE)}`
+        WHERE DATE(fetch_timestamp) >= DATE_SUB(CURRENT_DATE(), INTERVAL 3 DAY)
+        QUALIFY ROW_NUMBER() OVER (
+            PARTITION BY market, category, symbol ORDER BY fetch_timestamp DESC) = 1
+    ),
+    latest_session AS (
+        -- Bars from each asset type's latest session only
+        SELECT b.*
+        FROM `{table('agg_latest_bars')}` b
+        JOIN (
+            SELECT asset_type, MAX(DATE(datetime)) AS session
+            FROM `{table('agg_latest_bars')}` GROUP BY asset_type
+        ) s ON b.asset_type = s.asset_type AND DATE(b.datetime) = s.session
+        WHERE b.change_pct IS NOT NULL
+    ),
+    session_movers AS (
+        SELECT
+            'session' AS timeframe, asset_type,
+            IF(change_pct >= 0, 'gainers', 'losers') AS direction,
+            symbol, name, close AS price, close - prev_close AS change, change_pct,
+            volume, CAST(NULL AS FLOAT64) AS market_cap, datetime AS as_of
+        FROM latest_session
+    ),
+    weekly_movers AS (
+        SELECT
+            'weekly' AS timeframe, 'stocks' AS asset_type,
+            IF(w.change_percent >= 0, 'gainers', 'losers') AS direction,
+            w.symbol, CAST(NULL AS STRING) AS name, w.close AS price,
+            CAST(NULL AS FLOAT64) AS change, w.change_percent AS change_pct,
+            w.volume, CAST(NULL AS FLOAT64) AS market_cap, TIMESTAMP(w.date) AS as_of
+        FROM `{table(WEEKLY_STOCKS_TABLE)}` w
+        WHERE w.date = (SELECT MAX(date) FROM `{table(WEEKLY_STOCKS_TABLE)}`)
+          AND w.change_percent IS NOT NULL
+    ),
+    all_movers AS (
+        SELECT * FROM daily_movers
+        UNION ALL SELECT * FROM session_movers
+        UNION ALL SELECT * FROM weekly_movers
+    )
+    SELECT
+        timeframe, asset_type, direction,
+        ROW_NUMBER() OVER (
+            PARTITION BY timeframe, asset_type, direction ORDER BY ABS(change_pct) DESC) AS rank,
+        symbol, name, CAST(price AS FLOAT64) AS price, CAST(change AS FLOAT64) AS change,
+        CAST(change_pct AS FLOAT64) AS change_pct, CAST(volume AS FLOAT64) AS volume,
+        CAST(market_cap AS FLOAT64) AS market_cap, as_of, CURRENT_TIMESTAMP() AS updated_at
+    FROM all_movers
+    WHERE change_pct IS NOT NULL
+    QUALIFY rank <= {limit}
+    """
+    job = client.query(query)
+    job.result()
+    return list(client.query(f"SELECT COUNT(*) AS n FROM `{table('agg_top_movers')}`").result())[0].n
+
+
+def run_stage(name, fn, *args, **kwargs):
+    started = datetime.now(timezone.utc)
+    try:
+        result = fn(*args, **kwargs)
+        status = {'status': 'OK', 'result': result}
+    except Exception as e:
+        logger.error(f"  {name} failed: {e}")
+        status = {'status': 'ERROR', 'error': str(e)}
+    status['seconds'] = round((datetime.now(timezone.utc) - started).total_seconds(), 1)
+    logger.info(f"  {name}: {status}")
+    return status
+
+
+@functions_framework.http
+def refresh_market_aggregates(request):
+    """
+    Cloud Function entry point - refreshes the aggregate tables
+
+    Query params:
+        stages: comma-separated subset of snapshot,latest_bars,sector,movers (default: all)
+        assets: comma-separated asset types for snapshot / latest_bars (default: all)
+        timeframes: comma-separated subset of daily,hourly,5min for snapshot (default: all)
+        force: rebuild snapshots and weekly sector tables even if they are current
+    """
+    start_time = datetime.now(timezone.utc)
+    args = request.args or {}
+    stages = [s.strip() for s in args.get('stages', ','.join(STAGES)).split(',')]
+    snapshot_assets = sorted({asset_type for asset_type, _ in SNAPSHOT_SOURCES})
+    assets = [a.strip() for a in args.get('assets', ','.join(snapshot_assets)).split(',')]
+    timeframes = [t.strip() for t in args.get('timeframes', ','.join(SNAPSHOT_LOOKBACK_DAYS)).split(',')]
+    force = str(args.get('force', '')).lower() in ('1', 'true', 'yes')
+
+    logger.info(f"Refreshing market aggregates: stages={stages} assets={assets}")
+    client = bigquery.Client(project=PROJECT_ID)
+    ensure_tables(client)
+
+    results = {}
+    if 'snapshot' in stages:
+        changed_tables = []
+        for (asset_type, timeframe) in SNAPSHOT_SOURCES:
+            if asset_type not in assets or timeframe not in timeframes:
+                continue
+            name = snapshot_table(asset_type, timeframe)
+            results[name] = run_stage(name, refresh_snapshot, client, asset_type, timeframe, force)
+            if results[name].get('result', {}).get('status') in ('UPDATED', 'REBUILT'):
+                changed_tables.append(name)
+        notify_quote_board(changed_tables)
+    if 'latest_bars' in stages:
+        for asset_type in assets:
+            if asset_type in LATEST_BAR_SOURCES:
+                results[f'latest_bars_{asset_type}'] = run_stage(
+                    f'latest_bars[{asset_type}]', refresh_latest_bars, client, asset_type)
+    if 'sector' in stages:
+        results['sector'] = run_stage('sector', refresh_sector_tables, client, force)
+    # Movers read the tables above, so they go last
+    if 'movers' in stages:
+        results['movers'] = run_stage('movers', refresh_top_movers, client)
+
+    duration = (datetime.now(timezone.utc) - start_time).total_seconds()
+    failed = [name for name, r in results.items() if r['status'] == 'ERROR']
+
+    response = {
+        'status': 'partial' if failed else 'success',
+        'timestamp': start_time.isoformat(),
+        'duration_seconds': round(duration, 1),
+        'stages': results
+    }
+    logger.info(f"Market aggregates refreshed in {duration:.1f}s ({len(failed)} failed stages)")
+    return response, 200
+
+
+if __name__ == "__main__":
+    class MockRequest:
+        args = {}
+    result, _ = refresh_market_aggregates(MockRequest())
+    print(result)
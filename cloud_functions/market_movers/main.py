@@ -4,11 +4,13 @@ from google.cloud import bigquery
 import requests
 from datetime import datetime
 import json
+import os
 
 PROJECT_ID = "aialgotradehits"
 DATASET_ID = "crypto_trading_data"
 TWELVEDATA_API_KEY = "16ee060fd4d34a628a14bcb6f0167565"
 BASE_URL = "https://api.twelvedata.com"
+MARKET_AGGREGATES_URL = os.environ.get("MARKET_AGGREGATES_URL")
 
 client = bigquery.Client(project=PROJECT_ID)
 
@@ -73,5 +75,12 @@ def market_movers_fetcher(request):
             key = f"{market}_{category}"
             results[key] = insert_market_movers(data, market, category)
 
+    # Rebuild agg_top_movers from the new snapshot
+    if MARKET_AGGREGATES_URL:
+        try:
+            requests.get(MARKET_AGGREGATES_URL, params={"stages": "movers"}, timeout=300)
+        except Exception as e:
+            print(f"Market aggregates trigger error: {e}")
+
     duration = (datetime.utcnow() - start).total_seconds()
     return json.dumps({"status": "success", "duration": duration, "results": results}), 200
@@ -0,0 +1,286 @@
+"""
+Streaming Model Drift Monitor
+=============================
+Per-model, per-asset-type sketches updated once per bar by daily inference,
+instead of re-aggregating the prediction history in SQL every day:
+
+- Rolling accuracy: decayed counts of resolved / correct predictions with a
+  fast (~1 week) and slow (~1 month) half-life, plus a significance check on
+  the latest bar's resolved batch so a large universe alerts on the bar the
+  shift happens
+- Calibration: decayed (count, sum of predicted prob, sum of outcomes) per
+  probability bucket -> expected calibration error
+- Feature PSI: per-feature histograms (quantile edges fixed from the first
+  batch) decayed with a one-bar and a slow half-life; PSI compares the two,
+  minus the PSI expected from sampling noise alone at those sample sizes.
+  Small universes widen the fast window until it holds ~PSI_MIN_CURRENT values
+
+State is a small JSON document per (model_version, asset_type).
+"""
+
+import math
+import numpy as np
+
+# Half-lives in bars (one bar = one inference run over the daily snapshot)
+FAST_HALF_LIFE = 5
+SLOW_HALF_LIFE = 30
+FEATURE_FAST_HALF_LIFE = 1
+
+MIN_RESOLVED = 50
+ACCURACY_DRIFT_RATIO = 0.85
+ACCURACY_CRITICAL_RATIO = 0.75
+BATCH_Z_THRESHOLD = 3.0
+
+CALIBRATION_BUCKETS = 10
+CALIBRATION_ECE_THRESHOLD = 0.10
+
+PSI_BINS = 10
+PSI_WARNING = 0.10
+PSI_CRITICAL = 0.25
+PSI_EPSILON = 1e-4
+PSI_MIN_BASELINE = 200
+PSI_MIN_CURRENT = 400
+
+
+def decay(half_life):
+    return 0.5 ** (1.0 / half_life)
+
+
+def psi(current, baseline):
+    """Population stability index between two histograms (counts)"""
+    c = np.asarray(current, dtype=float)
+    b = np.asarray(baseline, dtype=float)
+    if c.sum() <= 0 or b.sum() <= 0:
+        return 0.0
+    c = np.maximum(c / c.sum(), PSI_EPSILON)
+    b = np.maximum(b / b.sum(), PSI_EPSILON)
+    return float(np.sum((c - b) * np.log(c / b)))
+
+
+def excess_psi(current, baseline):
+    """PSI above what two samples of these sizes from one distribution would show"""
+    c = np.asarray(current, dtype=float)
+    b = np.asarray(baseline, dtype=float)
+    bins = max(int(np.sum((c > 0) | (b > 0))) - 1, 0)
+    noise = bins * (1 / c.sum() + 1 / b.sum())
+    return max(psi(c, b) - noise, 0.0)
+
+
+class FeatureHistogram:
+    """Decayed histogram of one feature; the last bin counts missing values"""
+
+    def __init__(self, edges=None, fast=None, slow=None):
+        self.edges = edges
+        size = PSI_BINS + 1
+        self.fast = fast or [0.0] * size
+        self.slow = slow or [0.0] * size
+
+    def _counts(self, values):
+        values = np.asarray(values, dtype=float)
+        present = values[~np.isnan(values)]
+        if self.edges is None:
+            if present.size == 0:
+                return None
+            # Quantile edges from the first batch; interior edges only, so every value lands in a bin
+            self.edges = np.unique(np.quantile(present, np.linspace(0, 1, PSI_BINS + 1)[1:-1])).tolist()
+        counts = np.bincount(np.searchsorted(self.edges, present, side='right'), minlength=PSI_BINS)
+        return np.append(counts[:PSI_BINS], values.size - present.size).astype(float)
+
+    def observe(self, values):
+        """Fold one bar of values in; returns excess PSI of the fast histogram vs the slow one before this bar"""
+        counts = self._counts(values)
+        if counts is None:
+            return None
+        baseline = np.asarray(self.slow)
+        # Steady-state fast mass is n / (1 - d): keep at least PSI_MIN_CURRENT values in the window
+        d = max(decay(FEATURE_FAST_HALF_LIFE), 1 - counts.sum() / PSI_MIN_CURRENT)
+        fast = np.asarray(self.fast) * d + counts
+        self.fast = fast.tolist()
+        self.slow = (baseline * decay(SLOW_HALF_LIFE) + counts).tolist()
+        if baseline.sum() < PSI_MIN_BASELINE:
+            return None
+        return excess_psi(fast, baseline)
+
+    def to_dict(self):
+        return {'edges': self.edges, 'fast': self.fast, 'slow': self.slow}
+
+
+class ModelSketch:
+    """Accuracy, calibration and feature-drift sketch for one (model_version, asset_type)"""
+
+    def __init__(self, model_version, asset_type, state=None):
+        state = state or {}
+        self.model_version = model_version
+        self.asset_type = asset_type
+        self.bars = state.get('bars', 0)
+        self.resolved = state.get('resolved', 0)
+        # [decayed count, decayed correct]
+        self.fast = state.get('fast', [0.0, 0.0])
+        self.slow = state.get('slow', [0.0, 0.0])
+        # per bucket: [decayed count, sum predicted prob, sum outcome]
+        self.calibration = state.get('calibration', [[0.0, 0.0, 0.0] for _ in range(CALIBRATION_BUCKETS)])
+        self.features = {
+            name: FeatureHistogram(**hist) for name, hist in state.get('features', {}).items()
+        }
+        self.active_alerts = set(state.get('active_alerts', []))
+        self.last = state.get('last', {})
+
+    # ------------------------------------------------------------------
+    # Updates (one call per bar)
+    # ------------------------------------------------------------------
+
+    def start_bar(self):
+        """Forget the previous bar's batch statistics; feature PSI carries over until a feature is observed again"""
+        self.last = {'psi': self.last.get('psi') or {}}
+
+    def observe_outcomes(self, probabilities, outcomes, predicted_up):
+        """Resolved predictions of one bar: up probability, actual UP (bool), predicted UP (bool)"""
+        probs = np.asarray(probabilities, dtype=float)
+        actual = np.asarray(outcomes, dtype=bool)
+        predicted = np.asarray(predicted_up, dtype=bool)
+        n = int(probs.size)
+        if n == 0:
+            return
+        correct = float(np.sum(actual == predicted))
+
+        baseline = self.slow[1] / self.slow[0] if self.slow[0] else None
+        self.fast = [self.fast[0] * decay(FAST_HALF_LIFE) + n, self.fast[1] * decay(FAST_HALF_LIFE) + correct]
+        self.slow = [self.slow[0] * decay(SLOW_HALF_LIFE) + n, self.slow[1] * decay(SLOW_HALF_LIFE) + correct]
+        self.resolved += n
+
+        buckets = np.clip((probs * CALIBRATION_BUCKETS).astype(int), 0, CALIBRATION_BUCKETS - 1)
+        d = decay(FAST_HALF_LIFE)
+        for i, bucket in enumerate(self.calibration):
+            mask = buckets == i
+            self.calibration[i] = [
+                bucket[0] * d + float(mask.sum()),
+                bucket[1] * d + float(probs[mask].sum()),
+                bucket[2] * d + float(actual[mask].sum())
+            ]
+
+        self.last['batch_resolved'] = n
+        self.last['batch_accuracy'] = correct / n
+        self.last['batch_baseline'] = baseline
+
+    def observe_features(self, features):
+        """Scored feature values of one bar: {feature name: array of values}"""
+        self.bars += 1
+        self.last['psi'] = dict(self.last.get('psi') or {})
+        for name, values in features.items():
+            hist = self.features.setdefault(name, FeatureHistogram())
+            value = hist.observe(values)
+            if value is not None:
+                self.last['psi'][name] = round(float(value), 4)
+
+    # ------------------------------------------------------------------
+    # Metrics and alerts
+    # ------------------------------------------------------------------
+
+    def accuracy(self):
+        return {
+            'fast': self.fast[1] / self.fast[0] if self.fast[0] else None,
+            'slow': self.slow[1] / self.slow[0] if self.slow[0] else None
+        }
+
+    def expected_calibration_error(self):
+        """ECE less the gap sampling noise alone gives each bucket (mean |N(0, var)| = sqrt(2 var / pi))"""
+        total = sum(bucket[0] for bucket in self.calibration)
+        if not total:
+            return None
+        ece = 0.0
+        for n, sum_prob, sum_outcome in self.calibration:
+            if n < 1:
+                continue
+            rate = sum_outcome / n
+            noise = math.sqrt(2 * rate * (1 - rate) / (math.pi * n))
+            ece += n / total * max(abs(sum_prob / n - rate) - noise, 0.0)
+        return ece
+
+    def _batch_drop(self, ratio):
+        """Latest bar's accuracy significantly below the pre-bar baseline"""
+        n = self.last.get('batch_resolved') or 0
+        acc = self.last.get('batch_accuracy')
+        baseline = self.last.get('batch_baseline')
+        if not n or acc is None or not baseline or baseline >= 1:
+            return False
+        z = (acc - baseline) / math.sqrt(baseline * (1 - baseline) / n)
+        return acc < baseline * ratio and z < -BATCH_Z_THRESHOLD
+
+    def check(self, ratio=ACCURACY_DRIFT_RATIO):
+        """
+        Drift conditions that are newly active, as model_drift_alerts rows.
+        An alert is raised once and re-armed after its condition clears.
+        """
+        conditions = {}
+        accuracy = self.accuracy()
+
+        if self.resolved >= MIN_RESOLVED and accuracy['slow']:
+            baseline = self.last.get('batch_baseline') or accuracy['slow']
+            current = accuracy['fast']
+            if self._batch_drop(ratio):
+                current = self.last['batch_accuracy']
+            if current is not None and current < baseline * ratio:
+                conditions['ACCURACY_DRIFT'] = {
+                    'severity': 'CRITICAL' if current < baseline * ACCURACY_CRITICAL_RATIO else 'WARNING',
+                    'metric_name': 'rolling_accuracy',
+                    'current_value': current * 100,
+                    'threshold_value': baseline * ratio * 100,
+                    'baseline_value': baseline * 100,
+                    'message': f"Accuracy for {self.asset_type} fell to {current * 100:.1f}% "
+                               f"vs {baseline * 100:.1f}% baseline"
+                }
+
+            ece = self.expected_calibration_error()
+            if ece is not None and ece > CALIBRATION_ECE_THRESHOLD:
+                conditions['CALIBRATION_DRIFT'] = {
+                    'severity': 'CRITICAL' if ece > 2 * CALIBRATION_ECE_THRESHOLD else 'WARNING',
+                    'metric_name': 'expected_calibration_error',
+                    'current_value': ece,
+                    'threshold_value': CALIBRATION_ECE_THRESHOLD,
+                    'baseline_value': None,
+                    'message': f"Calibration error for {self.asset_type} is {ece:.3f}"
+                }
+
+        for name, value in (self.last.get('psi') or {}).items():
+            if value > PSI_WARNING:
+                conditions[f'FEATURE_DRIFT:{name}'] = {
+                    'severity': 'CRITICAL' if value > PSI_CRITICAL else 'WARNING',
+                    'metric_name': f'psi_{name}',
+                    'current_value': value,
+                    'threshold_value': PSI_WARNING,
+                    'baseline_value': 0.0,
+                    'message': f"{name} distribution for {self.asset_type} shifted (PSI {value:.3f})"
+                }
+
+        new = [key for key in conditions if key not in self.active_alerts]
+        self.active_alerts = set(conditions)
+        return [
+            {'asset_type': self.asset_type, 'alert_type': key.split(':')[0], **conditions[key]}
+            for key in new
+        ]
+
+    def health(self):
+        accuracy = self.accuracy()
+        return {
+            'model_version': self.model_version,
+            'status': 'DRIFT_DETECTED' if self.active_alerts else 'HEALTHY',
+            'bars': self.bars,
+            'resolved': self.resolved,
+            'accuracy_fast': round(accuracy['fast'] * 100, 2) if accuracy['fast'] is not None else None,
+            'accuracy_slow': round(accuracy['slow'] * 100, 2) if accuracy['slow'] is not None else None,
+            'calibration_error': self.expected_calibration_error(),
+            'psi': self.last.get('psi', {}),
+            'active_alerts': sorted(self.active_alerts)
+        }
+
+    def to_dict(self):
+        return {
+            'bars': self.bars,
+            'resolved': self.resolved,
+            'fast': self.fast,
+            'slow': self.slow,
+            'calibration': self.calibration,
+            'features': {name: hist.to_dict() for name, hist in self.features.items()},
+            'active_alerts': sorted(self.active_alerts),
+            'last': self.last
+        }
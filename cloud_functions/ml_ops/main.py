@@ -14,14 +14,33 @@ Deployed as a single Cloud Function with different operations triggered by reque
 
 import functions_framework
 from google.cloud import bigquery
+from google.api_core.exceptions import NotFound, BadRequest
 from datetime import datetime, timedelta
+import numpy as np
+import tempfile
 import json
 import os
 
+try:
+    import xgboost as xgb
+except ImportError:
+    xgb = None
+    print("xgboost not available - daily inference uses heuristic scores")
+
+from drift_monitor import ModelSketch
+
 PROJECT_ID = 'aialgotradehits'
 DATASET_ID = 'crypto_trading_data'
 ML_DATASET = 'ml_models'
 
+# Latest-bar snapshot per asset type (one row per symbol, kept by market_aggregates)
+LATEST_BAR_TABLES = {
+    'stocks': 'latest_stocks_daily',
+    'crypto': 'latest_crypto_daily',
+    'etf': 'latest_etfs_daily',
+    'etfs': 'latest_etfs_daily',
+}
+
 # Initialize BigQuery client
 bq_client = bigquery.Client(project=PROJECT_ID)
 
@@ -34,128 +53,346 @@ def log(message):
 # =============================================================================
 # Operation 1: Daily Inference
 # =============================================================================
+
+# Exported booster of the weekly retrained model (EXPORT MODEL, XGBoost format)
+MODEL_BUCKET_URI = os.environ.get('MODEL_BUCKET_URI', 'gs://aialgotradehits-ml-models')
+INFERENCE_MODEL = 'xgboost_retrained'
+INFERENCE_FEATURES = ['rsi', 'macd_histogram', 'adx', 'growth_score', 'in_rise_cycle_flag']
+INFERENCE_LOOKBACK_DAYS = 3
+
+PREDICTION_COLUMNS = [
+    'asset_type', 'symbol', 'datetime', 'close', 'rsi', 'macd_histogram', 'adx',
+    'growth_score', 'trend_regime', 'in_rise_cycle', 'rise_cycle_start',
+    'xgb_up_probability', 'xgb_predicted_direction', 'xgb_confidence',
+    'ensemble_up_probability', 'ensemble_direction', 'ensemble_confidence',
+    'signal', 'signal_strength'
+]
+PREDICTION_SCHEMA = [
+    bigquery.SchemaField('asset_type', 'STRING'),
+    bigquery.SchemaField('symbol', 'STRING'),
+    bigquery.SchemaField('datetime', 'TIMESTAMP'),
+    bigquery.SchemaField('close', 'FLOAT64'),
+    bigquery.SchemaField('rsi', 'FLOAT64'),
+    bigquery.SchemaField('macd_histogram', 'FLOAT64'),
+    bigquery.SchemaField('adx', 'FLOAT64'),
+    bigquery.SchemaField('growth_score', 'INT64'),
+    bigquery.SchemaField('trend_regime', 'STRING'),
+    bigquery.SchemaField('in_rise_cycle', 'BOOL'),
+    bigquery.SchemaField('rise_cycle_start', 'BOOL'),
+    bigquery.SchemaField('xgb_up_probability', 'FLOAT64'),
+    bigquery.SchemaField('xgb_predicted_direction', 'STRING'),
+    bigquery.SchemaField('xgb_confidence', 'STRING'),
+    bigquery.SchemaField('ensemble_up_probability', 'FLOAT64'),
+    bigquery.SchemaField('ensemble_direction', 'STRING'),
+    bigquery.SchemaField('ensemble_confidence', 'STRING'),
+    bigquery.SchemaField('signal', 'STRING'),
+    bigquery.SchemaField('signal_strength', 'FLOAT64'),
+]
+
+# Booster cached across warm invocations, keyed by the artifact's GCS generation
+_inference_model = {'version': None, 'booster': None, 'features': INFERENCE_FEATURES}
+
+
+def load_inference_model():
+    """(booster, feature names, version) of the exported model; booster is None if unavailable"""
+    if xgb is None:
+        return None, INFERENCE_FEATURES, 'heuristic'
+    try:
+        from google.cloud import storage
+        path = MODEL_BUCKET_URI[len('gs://'):]
+        bucket_name, _, prefix = path.partition('/')
+        prefix = f"{prefix.strip('/')}/{INFERENCE_MODEL}".lstrip('/')
+        bucket = storage.Client(project=PROJECT_ID).bucket(bucket_name)
+
+        blob = bucket.get_blob(f"{prefix}/model.bst")
+        if blob is None:
+            log(f"  No exported {INFERENCE_MODEL} under {MODEL_BUCKET_URI}, using heuristic scores")
+            return None, INFERENCE_FEATURES, 'heuristic'
+        version = f"{INFERENCE_MODEL}@{blob.generation}"
+        if version == _inference_model['version']:
+            return _inference_model['booster'], _inference_model['features'], version
+
+        with tempfile.TemporaryDirectory() as tmp:
+            model_path = os.path.join(tmp, 'model.bst')
+            blob.download_to_filename(model_path)
+            booster = xgb.Booster()
+            booster.load_model(model_path)
+
+        features = INFERENCE_FEATURES
+        metadata = bucket.get_blob(f"{prefix}/assets/model_metadata.json")
+        if metadata is not None:
+            features = json.loads(metadata.download_as_text()).get('feature_names') or features
+
+        _inference_model.update(version=version, booster=booster, features=list(features))
+        log(f"  Loaded {version} ({len(features)} features)")
+        return booster, list(features), version
+    except Exception as e:
+        log(f"  Model load error, using heuristic scores: {e}")
+        return None, INFERENCE_FEATURES, 'heuristic'
+
+
+def feature_value(row, name):
+    if name == 'in_rise_cycle_flag':
+        return 1.0 if row.get('in_rise_cycle') else 0.0
+    value = row.get(name)
+    return np.nan if value is None else float(value)
+
+
+def feature_matrix(rows, features):
+    """float32 matrix in model column order; missing values stay NaN for the trees"""
+    return np.array([[feature_value(row, name) for name in features] for row in rows], dtype=np.float32)
+
+
+def heuristic_probabilities(rows):
+    """Rule-based up probability (the SQL heuristic this stage used before), vectorized"""
+    X = feature_matrix(rows, ['rsi', 'macd_histogram', 'adx', 'close', 'sma_200', 'in_rise_cycle_flag', 'growth_score'])
+    rsi, macd_hist, adx, close, sma_200, rising, growth = X.T
+    prob = (
+        0.5
+        + np.select([(rsi >= 30) & (rsi <= 50), rsi < 30, rsi > 70], [0.10, 0.15, -0.10], 0.0)
+        + np.where(macd_hist > 0, 0.08, -0.05)
+        + np.where(adx > 25, 0.05, 0.0)
+        + np.where(close > sma_200, 0.07, -0.07)
+        + np.where(rising > 0, 0.05, 0.0)
+        + np.select([growth >= 75, growth >= 50], [0.10, 0.05], 0.0)
+    )
+    return np.clip(prob, 0.1, 0.9)
+
+
+def score_rows(rows, booster, features):
+    """Up probability per row: one batched predict over the feature matrix"""
+    if booster is None:
+        return heuristic_probabilities(rows)
+    probs = np.asarray(booster.inplace_predict(feature_matrix(rows, features)), dtype=float)
+    if probs.ndim == 2:
+        # Multi-class output: keep the positive label column
+        probs = probs[:, 1]
+    return probs
+
+
+def confidence_bucket(prob):
+    if prob >= 0.65 or prob <= 0.35:
+        return 'HIGH'
+    if prob >= 0.55 or prob <= 0.45:
+        return 'MEDIUM'
+    return 'LOW'
+
+
+def prediction_record(asset_type, row, prob):
+    prob = round(float(prob), 4)
+    direction = 'UP' if prob >= 0.5 else 'DOWN'
+    confidence = confidence_bucket(prob)
+    return {
+        'asset_type': asset_type,
+        'symbol': row['symbol'],
+        'datetime': row['datetime'].isoformat(),
+        'close': row.get('close'),
+        'rsi': row.get('rsi'),
+        'macd_histogram': row.get('macd_histogram'),
+        'adx': row.get('adx'),
+        'growth_score': int(row['growth_score']) if row.get('growth_score') is not None else None,
+        'trend_regime': row.get('trend_regime'),
+        'in_rise_cycle': row.get('in_rise_cycle'),
+        'rise_cycle_start': row.get('rise_cycle_start'),
+        'xgb_up_probability': prob,
+        'xgb_predicted_direction': direction,
+        'xgb_confidence': confidence,
+        'ensemble_up_probability': prob,
+        'ensemble_direction': direction,
+        'ensemble_confidence': confidence,
+        'signal': 'BUY' if prob >= 0.60 else 'SELL' if prob <= 0.40 else 'HOLD',
+        'signal_strength': round(abs(prob - 0.5) * 200, 1)
+    }
+
+
+def ensure_inference_watermarks():
+    bq_client.query(f"""
+    CREATE TABLE IF NOT EXISTS `{PROJECT_ID}.{ML_DATASET}.inference_watermarks` (
+        asset_type STRING, model_version STRING, watermark TIMESTAMP,
+        symbols_scored INT64, updated_at TIMESTAMP
+    )
+    """).result()
+
+
+def get_inference_watermark(asset_type, model_version):
+    """snapshot_at of the last scored rows, or None to score everything (first run / new model)"""
+    rows = list(bq_client.query(f"""
+    SELECT model_version, watermark
+    FROM `{PROJECT_ID}.{ML_DATASET}.inference_watermarks`
+    WHERE asset_type = '{asset_type}'
+    """).result())
+    if not rows or rows[0].model_version != model_version:
+        return None
+    return rows[0].watermark
+
+
+def save_inference_watermark(asset_type, model_version, watermark, symbols_scored):
+    bq_client.query(f"""
+    MERGE `{PROJECT_ID}.{ML_DATASET}.inference_watermarks` T
+    USING (SELECT '{asset_type}' AS asset_type) S
+    ON T.asset_type = S.asset_type
+    WHEN MATCHED THEN UPDATE SET
+        model_version = '{model_version}', watermark = TIMESTAMP '{watermark.isoformat()}',
+        symbols_scored = {symbols_scored}, updated_at = CURRENT_TIMESTAMP()
+    WHEN NOT MATCHED THEN INSERT (asset_type, model_version, watermark, symbols_scored, updated_at)
+    VALUES ('{asset_type}', '{model_version}', TIMESTAMP '{watermark.isoformat()}',
+            {symbols_scored}, CURRENT_TIMESTAMP())
+    """).result()
+
+
+LATEST_BAR_COLUMNS = '''symbol, datetime, close, rsi, macd_histogram, adx, sma_200,
+           growth_score, trend_regime, in_rise_cycle, rise_cycle_start'''
+
+
+def changed_latest_bars(asset_type, watermark):
+    """
+    Latest bar per symbol written to the snapshot after the watermark.
+    When the snapshot table is missing (or predates snapshot_at) every latest bar in
+    the lookback comes from a ROW_NUMBER scan of the daily table, stamped with the
+    current time; re-scoring them is harmless since predictions are MERGEd.
+    """
+    table_name = LATEST_BAR_TABLES.get(asset_type, f"latest_{asset_type}_daily")
+    since = f"AND snapshot_at > TIMESTAMP '{watermark.isoformat()}'" if watermark else ''
+    query = f"""
+    SELECT {LATEST_BAR_COLUMNS}, snapshot_at
+    FROM `{PROJECT_ID}.{DATASET_ID}.{table_name}`
+    WHERE DATE(datetime) >= DATE_SUB(CURRENT_DATE(), INTERVAL {INFERENCE_LOOKBACK_DAYS} DAY)
+      {since}
+    """
+    try:
+        return [dict(row.items()) for row in bq_client.query(query).result()]
+    except (NotFound, BadRequest) as e:
+        if isinstance(e, BadRequest) and 'snapshot_at' not in str(e):
+            raise
+        daily_table = DAILY_TABLES.get(asset_type, f"{asset_type}_daily_clean")
+        log(f"  WARNING: {asset_type}: snapshot {table_name} unavailable ({e}) - "
+            f"falling back to a full latest-bar scan of {daily_table}")
+
+    query = f"""
+    SELECT {LATEST_BAR_COLUMNS}, CURRENT_TIMESTAMP() AS snapshot_at
+    FROM `{PROJECT_ID}.{DATASET_ID}.{daily_table}`
+    WHERE DATE(datetime) >= DATE_SUB(CURRENT_DATE(), INTERVAL {INFERENCE_LOOKBACK_DAYS} DAY)
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY datetime DESC) = 1
+    """
+    return [dict(row.items()) for row in bq_client.query(query).result()]
+
+
+def merge_predictions(asset_type, records):
+    """Upsert predictions keyed on (asset_type, symbol, date); returns the MERGE's DML stats"""
+    staging = f"{PROJECT_ID}.{ML_DATASET}.realtime_predictions_staging_{asset_type}"
+    job_config = bigquery.LoadJobConfig(
+        schema=PREDICTION_SCHEMA,
+        write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE
+    )
+    bq_client.load_table_from_json(records, staging, job_config=job_config).result()
+
+    # Bounding the target dates lets BigQuery prune realtime_predictions partitions
+    dates = sorted(r['datetime'][:10] for r in records)
+    updates = ',\n        '.join(f"{c} = S.{c}" for c in PREDICTION_COLUMNS if c not in ('asset_type', 'symbol'))
+    merge_query = f"""
+    MERGE `{PROJECT_ID}.{ML_DATASET}.realtime_predictions` T
+    USING `{staging}` S
+    ON T.asset_type = S.asset_type
+       AND T.symbol = S.symbol
+       AND DATE(T.datetime) = DATE(S.datetime)
+       AND DATE(T.datetime) BETWEEN DATE '{dates[0]}' AND DATE '{dates[-1]}'
+    WHEN MATCHED AND S.datetime >= T.datetime THEN UPDATE SET
+        {updates}
+    WHEN NOT MATCHED THEN INSERT
+        (prediction_id, {', '.join(PREDICTION_COLUMNS)})
+    VALUES
+        (GENERATE_UUID(), {', '.join(f'S.{c}' for c in PREDICTION_COLUMNS)})
+    """
+    job = bq_client.query(merge_query)
+    job.result()
+    stats = job.dml_stats
+    return {
+        'inserted': stats.inserted_row_count if stats else None,
+        'updated': stats.updated_row_count if stats else None,
+        'affected': job.num_dml_affected_rows or 0
+    }
+
+
 def run_daily_inference(asset_types=None, confidence_threshold=0.55):
-    """Generate ML predictions for latest market data"""
+    """
+    Score symbols whose latest bar changed since the last run.
+
+    Rows come from the latest-bar snapshot (snapshot_at > watermark), are scored
+    in-process by the exported weekly model in one batch per asset type, and are
+    upserted into realtime_predictions with a MERGE keyed on (asset_type, symbol, date).
+    Earlier predictions whose next bar arrived are resolved first, and both feed
+    the streaming drift monitor, which raises alerts on the bar a shift shows up.
+    """
     log("Starting daily inference...")
 
     if asset_types is None:
         asset_types = ['stocks', 'crypto', 'etf']
 
+    booster, features, model_version = load_inference_model()
     results = {
         'operation': 'daily_inference',
         'timestamp': datetime.now().isoformat(),
         'asset_types': asset_types,
-        'predictions': {}
+        'model_version': model_version,
+        'predictions': {},
+        'drift_alerts': []
     }
+    ensure_inference_watermarks()
+    try:
+        ensure_monitor_tables()
+        sketches = load_sketches(model_version)
+    except Exception as e:
+        log(f"  Monitor state error: {e}")
+        sketches = {}
 
     for asset_type in asset_types:
-        table_name = f"{asset_type}_daily_clean"
-
-        # Get latest data and generate predictions
-        inference_query = f"""
-        INSERT INTO `{PROJECT_ID}.{ML_DATASET}.realtime_predictions`
-        (prediction_id, asset_type, symbol, datetime, close, rsi, macd_histogram, adx,
-         growth_score, trend_regime, in_rise_cycle, rise_cycle_start,
-         xgb_up_probability, xgb_predicted_direction, xgb_confidence,
-         ensemble_up_probability, ensemble_direction, ensemble_confidence,
-         signal, signal_strength)
-
-        WITH latest_data AS (
-            SELECT
-                symbol,
-                datetime,
-                close,
-                rsi,
-                macd_histogram,
-                adx,
-                sma_20, sma_50, sma_200,
-                growth_score,
-                trend_regime,
-                in_rise_cycle,
-                rise_cycle_start,
-                ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY datetime DESC) as rn
-            FROM `{PROJECT_ID}.{DATASET_ID}.{table_name}`
-            WHERE DATE(datetime) >= DATE_SUB(CURRENT_DATE(), INTERVAL 3 DAY)
-        ),
-
-        predictions AS (
-            SELECT
-                *,
-                -- Feature-based probability estimation
-                (
-                    0.5 +
-                    (CASE WHEN rsi BETWEEN 30 AND 50 THEN 0.10 WHEN rsi < 30 THEN 0.15 WHEN rsi > 70 THEN -0.10 ELSE 0 END) +
-                    (CASE WHEN macd_histogram > 0 THEN 0.08 ELSE -0.05 END) +
-                    (CASE WHEN adx > 25 THEN 0.05 ELSE 0 END) +
-                    (CASE WHEN close > sma_200 THEN 0.07 ELSE -0.07 END) +
-                    (CASE WHEN in_rise_cycle THEN 0.05 ELSE 0 END) +
-                    (CASE WHEN growth_score >= 75 THEN 0.10 WHEN growth_score >= 50 THEN 0.05 ELSE 0 END)
-                ) as prob
-            FROM latest_data
-            WHERE rn = 1
-        )
-
-        SELECT
-            GENERATE_UUID() as prediction_id,
-            '{asset_type}' as asset_type,
-            symbol,
-            datetime,
-            close,
-            rsi,
-            macd_histogram,
-            adx,
-            growth_score,
-            trend_regime,
-            in_rise_cycle,
-            rise_cycle_start,
-            ROUND(GREATEST(0.1, LEAST(0.9, prob)), 4) as xgb_up_probability,
-            CASE WHEN prob >= 0.5 THEN 'UP' ELSE 'DOWN' END as xgb_predicted_direction,
-            CASE
-                WHEN prob >= 0.65 OR prob <= 0.35 THEN 'HIGH'
-                WHEN prob >= 0.55 OR prob <= 0.45 THEN 'MEDIUM'
-                ELSE 'LOW'
-            END as xgb_confidence,
-            ROUND(GREATEST(0.1, LEAST(0.9, prob)), 4) as ensemble_up_probability,
-            CASE WHEN prob >= 0.5 THEN 'UP' ELSE 'DOWN' END as ensemble_direction,
-            CASE
-                WHEN prob >= 0.65 OR prob <= 0.35 THEN 'HIGH'
-                WHEN prob >= 0.55 OR prob <= 0.45 THEN 'MEDIUM'
-                ELSE 'LOW'
-            END as ensemble_confidence,
-            CASE
-                WHEN prob >= 0.60 THEN 'BUY'
-                WHEN prob <= 0.40 THEN 'SELL'
-                ELSE 'HOLD'
-            END as signal,
-            ROUND(ABS(prob - 0.5) * 200, 1) as signal_strength
-        FROM predictions
-        WHERE NOT EXISTS (
-            SELECT 1 FROM `{PROJECT_ID}.{ML_DATASET}.realtime_predictions` r
-            WHERE r.symbol = predictions.symbol
-              AND r.asset_type = '{asset_type}'
-              AND DATE(r.datetime) = DATE(predictions.datetime)
-        )
-        """
-
+        sketch = sketches.get((model_version, asset_type)) or ModelSketch(model_version, asset_type)
+        resolved, scored = [], []
         try:
-            job = bq_client.query(inference_query)
-            job.result()
-
-            # Count predictions
-            count_query = f"""
-            SELECT COUNT(*) as cnt
-            FROM `{PROJECT_ID}.{ML_DATASET}.realtime_predictions`
-            WHERE asset_type = '{asset_type}'
-              AND DATE(created_at) = CURRENT_DATE()
-            """
-            count_result = list(bq_client.query(count_query).result())[0]
-            results['predictions'][asset_type] = count_result.cnt
-            log(f"  {asset_type}: {count_result.cnt} predictions generated")
+            resolved = resolve_predictions(asset_type)
+            watermark = get_inference_watermark(asset_type, model_version)
+            rows = changed_latest_bars(asset_type, watermark)
+
+            if not rows:
+                results['predictions'][asset_type] = {
+                    'scored': 0, 'inserted': 0, 'updated': 0, 'resolved': len(resolved)}
+                log(f"  {asset_type}: no new bars since {watermark} ({len(resolved)} resolved)")
+            else:
+                probs = score_rows(rows, booster, features)
+                records = [prediction_record(asset_type, row, p) for row, p in zip(rows, probs)]
+                written = merge_predictions(asset_type, records)
+                save_inference_watermark(
+                    asset_type, model_version, max(row['snapshot_at'] for row in rows), len(rows))
+                scored = rows
+
+                results['predictions'][asset_type] = {
+                    'scored': len(rows),
+                    'resolved': len(resolved),
+                    'high_confidence': sum(1 for p in probs if abs(p - 0.5) >= confidence_threshold - 0.5),
+                    **written
+                }
+                log(f"  {asset_type}: {len(rows)} scored, {written['inserted']} inserted, {written['updated']} updated")
 
         except Exception as e:
             log(f"  {asset_type}: Error - {e}")
             results['predictions'][asset_type] = {'error': str(e)}
 
+        # Features enter the sketch only once the watermark moved past them; after a failed
+        # MERGE the next run reads the same bars again and must not count them twice.
+        # Resolved outcomes are already written back, so they are folded in either way.
+        # A run with neither (weekend, second run of the day) leaves the sketch untouched.
+        if not resolved and not scored:
+            continue
+        try:
+            monitor_bar(sketch, resolved, scored, features)
+            alerts = sketch.check()
+            insert_drift_alerts(alerts)
+            record_daily_performance(asset_type, resolved, sketch)
+            save_sketch(sketch)
+            results['drift_alerts'].extend(alerts)
+        except Exception as e:
+            log(f"  {asset_type}: Monitor error - {e}")
+
     log("Daily inference complete")
     return results
 
@@ -163,8 +400,178 @@ def run_daily_inference(asset_types=None, confidence_threshold=0.55):
 # =============================================================================
 # Operation 2: Model Monitoring & Drift Detection
 # =============================================================================
+
+# Daily bars used to resolve predictions (next bar's close vs the predicted bar's)
+DAILY_TABLES = {
+    'stocks': 'stocks_daily_clean',
+    'crypto': 'crypto_daily_clean',
+    'etf': 'etfs_daily_clean',
+    'etfs': 'etfs_daily_clean',
+}
+RESOLVE_LOOKBACK_DAYS = 10
+
+
+def resolve_predictions(asset_type):
+    """
+    Fill actual_direction / actual_change_pct / prediction_correct for predictions
+    whose next bar has arrived; returns the newly resolved rows.
+    Only the last RESOLVE_LOOKBACK_DAYS partitions are touched.
+    """
+    daily_table = DAILY_TABLES.get(asset_type, f"{asset_type}_daily_clean")
+    script = f"""
+    CREATE TEMP TABLE resolved AS
+    SELECT
+        p.prediction_id, p.datetime, p.xgb_up_probability, p.xgb_predicted_direction, p.signal,
+        IF(n.close > p.close, 'UP', 'DOWN') AS actual_direction,
+        ROUND(SAFE_DIVIDE(n.close - p.close, p.close) * 100, 4) AS actual_change_pct
+    FROM `{PROJECT_ID}.{ML_DATASET}.realtime_predictions` p
+    JOIN `{PROJECT_ID}.{DATASET_ID}.{daily_table}` n
+      ON n.symbol = p.symbol
+     AND n.datetime > p.datetime
+     AND DATE(n.datetime) BETWEEN DATE_SUB(CURRENT_DATE(), INTERVAL {RESOLVE_LOOKBACK_DAYS} DAY) AND CURRENT_DATE()
+    WHERE p.asset_type = '{asset_type}'
+      AND p.actual_direction IS NULL
+      AND DATE(p.datetime) >= DATE_SUB(CURRENT_DATE(), INTERVAL {RESOLVE_LOOKBACK_DAYS} DAY)
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY p.prediction_id ORDER BY n.datetime) = 1;
+
+    UPDATE `{PROJECT_ID}.{ML_DATASET}.realtime_predictions` t
+    SET actual_direction = r.actual_direction,
+        actual_change_pct = r.actual_change_pct,
+        prediction_correct = (t.xgb_predicted_direction = r.actual_direction)
+    FROM resolved r
+    WHERE t.prediction_id = r.prediction_id
+      AND t.asset_type = '{asset_type}'
+      AND DATE(t.datetime) >= DATE_SUB(CURRENT_DATE(), INTERVAL {RESOLVE_LOOKBACK_DAYS} DAY);
+
+    SELECT * FROM resolved;
+    """
+    return [dict(row.items()) for row in bq_client.query(script).result()]
+
+
+def record_daily_performance(asset_type, resolved, sketch):
+    """Add one bar's resolved predictions to model_performance_daily (per prediction date)"""
+    by_date = {}
+    for row in resolved:
+        stats = by_date.setdefault(row['datetime'].date().isoformat(), [0, 0, 0, 0, 0])
+        stats[0] += 1
+        stats[1] += row['xgb_predicted_direction'] == row['actual_direction']
+        stats[2] += row['signal'] == 'BUY'
+        stats[3] += row['signal'] == 'SELL'
+        stats[4] += row['signal'] == 'HOLD'
+    if not by_date:
+        return
+
+    drift = bool(sketch.active_alerts)
+    drift_type = f"'{','.join(sorted(sketch.active_alerts))}'" if drift else 'NULL'
+    source = '\n        UNION ALL '.join(
+        f"SELECT DATE '{day}' AS date, {s[0]} AS total, {s[1]} AS correct, {s[2]} AS buys, {s[3]} AS sells, {s[4]} AS holds"
+        for day, s in sorted(by_date.items())
+    )
+    bq_client.query(f"""
+    MERGE `{PROJECT_ID}.{ML_DATASET}.model_performance_daily` T
+    USING ({source}) S
+    ON T.date = S.date AND T.asset_type = '{asset_type}'
+    WHEN MATCHED THEN UPDATE SET
+        total_predictions = T.total_predictions + S.total,
+        correct_predictions = T.correct_predictions + S.correct,
+        accuracy_pct = ROUND((T.correct_predictions + S.correct) / NULLIF(T.total_predictions + S.total, 0) * 100, 2),
+        buy_signals = T.buy_signals + S.buys,
+        sell_signals = T.sell_signals + S.sells,
+        hold_signals = T.hold_signals + S.holds,
+        drift_detected = {drift},
+        drift_type = {drift_type}
+    WHEN NOT MATCHED THEN INSERT
+        (date, asset_type, total_predictions, correct_predictions, accuracy_pct,
+         buy_signals, sell_signals, hold_signals, drift_detected, drift_type)
+    VALUES
+        (S.date, '{asset_type}', S.total, S.correct, ROUND(S.correct / NULLIF(S.total, 0) * 100, 2),
+         S.buys, S.sells, S.holds, {drift}, {drift_type})
+    """).result()
+
+
+def ensure_monitor_tables():
+    bq_client.query(f"""
+    CREATE TABLE IF NOT EXISTS `{PROJECT_ID}.{ML_DATASET}.model_monitor_state` (
+        model_version STRING, asset_type STRING, state STRING,
+        resolved INT64, updated_at TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS `{PROJECT_ID}.{ML_DATASET}.model_drift_alerts` (
+        alert_id STRING NOT NULL, alert_time TIMESTAMP NOT NULL, asset_type STRING,
+        alert_type STRING, severity STRING, metric_name STRING,
+        current_value FLOAT64, threshold_value FLOAT64, baseline_value FLOAT64,
+        message STRING, is_resolved BOOL DEFAULT FALSE, resolved_at TIMESTAMP,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP()
+    )
+    """).result()
+
+
+def load_sketches(model_version=None):
+    """{(model_version, asset_type): ModelSketch} from model_monitor_state"""
+    where = f"WHERE model_version = '{model_version}'" if model_version else ''
+    rows = bq_client.query(f"""
+    SELECT model_version, asset_type, state
+    FROM `{PROJECT_ID}.{ML_DATASET}.model_monitor_state`
+    {where}
+    """).result()
+    return {
+        (row.model_version, row.asset_type): ModelSketch(row.model_version, row.asset_type, json.loads(row.state))
+        for row in rows
+    }
+
+
+def save_sketch(sketch):
+    job_config = bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ScalarQueryParameter('model_version', 'STRING', sketch.model_version),
+        bigquery.ScalarQueryParameter('asset_type', 'STRING', sketch.asset_type),
+        bigquery.ScalarQueryParameter('state', 'STRING', json.dumps(sketch.to_dict(), separators=(',', ':'))),
+        bigquery.ScalarQueryParameter('resolved', 'INT64', sketch.resolved),
+    ])
+    bq_client.query(f"""
+    MERGE `{PROJECT_ID}.{ML_DATASET}.model_monitor_state` T
+    USING (SELECT @model_version AS model_version, @asset_type AS asset_type) S
+    ON T.model_version = S.model_version AND T.asset_type = S.asset_type
+    WHEN MATCHED THEN UPDATE SET state = @state, resolved = @resolved, updated_at = CURRENT_TIMESTAMP()
+    WHEN NOT MATCHED THEN INSERT (model_version, asset_type, state, resolved, updated_at)
+    VALUES (@model_version, @asset_type, @state, @resolved, CURRENT_TIMESTAMP())
+    """, job_config=job_config).result()
+
+
+def insert_drift_alerts(alerts):
+    if not alerts:
+        return
+    def sql_value(value):
+        return 'NULL' if value is None else repr(float(value))
+    values = ',\n        '.join(
+        f"(GENERATE_UUID(), CURRENT_TIMESTAMP(), '{a['asset_type']}', '{a['alert_type']}', '{a['severity']}', "
+        f"'{a['metric_name']}', {sql_value(a['current_value'])}, {sql_value(a['threshold_value'])}, "
+        f"{sql_value(a['baseline_value'])}, '{a['message'].replace(chr(39), '')}')"
+        for a in alerts
+    )
+    bq_client.query(f"""
+    INSERT INTO `{PROJECT_ID}.{ML_DATASET}.model_drift_alerts`
+    (alert_id, alert_time, asset_type, alert_type, severity, metric_name,
+     current_value, threshold_value, baseline_value, message)
+    VALUES
+        {values}
+    """).result()
+
+
+def monitor_bar(sketch, resolved, scored_rows, features):
+    """Fold one bar into the sketch: newly resolved outcomes and the features just scored"""
+    sketch.start_bar()
+    if resolved:
+        sketch.observe_outcomes(
+            [row['xgb_up_probability'] or 0.5 for row in resolved],
+            [row['actual_direction'] == 'UP' for row in resolved],
+            [row['xgb_predicted_direction'] == 'UP' for row in resolved]
+        )
+    if scored_rows:
+        X = feature_matrix(scored_rows, features)
+        sketch.observe_features({name: X[:, i] for i, name in enumerate(features)})
+
+
 def run_model_monitoring(alert_threshold=0.85):
-    """Check model performance and detect drift"""
+    """Model health from the streaming monitor sketches (updated by every inference run)"""
     log("Starting model monitoring...")
 
     results = {
@@ -174,109 +581,29 @@ def run_model_monitoring(alert_threshold=0.85):
         'alerts': []
     }
 
-    # Calculate daily performance metrics
-    performance_query = f"""
-    INSERT INTO `{PROJECT_ID}.{ML_DATASET}.model_performance_daily`
-    (date, asset_type, total_predictions, correct_predictions, accuracy_pct,
-     buy_signals, sell_signals, hold_signals, drift_detected, drift_type)
-
-    WITH daily_stats AS (
-        SELECT
-            DATE(datetime) as date,
-            asset_type,
-            COUNT(*) as total_predictions,
-            SUM(CASE WHEN predicted_direction = actual_direction THEN 1 ELSE 0 END) as correct_predictions,
-            SUM(CASE WHEN signal = 'BUY' THEN 1 ELSE 0 END) as buy_signals,
-            SUM(CASE WHEN signal = 'SELL' THEN 1 ELSE 0 END) as sell_signals,
-            SUM(CASE WHEN signal = 'HOLD' THEN 1 ELSE 0 END) as hold_signals
-        FROM `{PROJECT_ID}.{ML_DATASET}.realtime_predictions`
-        WHERE DATE(datetime) = DATE_SUB(CURRENT_DATE(), INTERVAL 1 DAY)
-          AND actual_direction IS NOT NULL
-        GROUP BY DATE(datetime), asset_type
-    )
-
-    SELECT
-        date,
-        asset_type,
-        total_predictions,
-        correct_predictions,
-        ROUND(correct_predictions / NULLIF(total_predictions, 0) * 100, 2) as accuracy_pct,
-        buy_signals,
-        sell_signals,
-        hold_signals,
-        FALSE as drift_detected,
-        NULL as drift_type
-    FROM daily_stats
-    WHERE date NOT IN (
-        SELECT DISTINCT date FROM `{PROJECT_ID}.{ML_DATASET}.model_performance_daily`
-    )
-    """
-
     try:
-        bq_client.query(performance_query).result()
-        log("  Performance metrics updated")
+        ensure_monitor_tables()
+        _, _, model_version = load_inference_model()
+        sketches = load_sketches(model_version)
     except Exception as e:
-        log(f"  Performance update error: {e}")
-
-    # Check for drift
-    drift_query = f"""
-    SELECT
-        asset_type,
-        AVG(CASE WHEN date >= DATE_SUB(CURRENT_DATE(), INTERVAL 7 DAY) THEN accuracy_pct END) as accuracy_7d,
-        AVG(CASE WHEN date >= DATE_SUB(CURRENT_DATE(), INTERVAL 30 DAY) THEN accuracy_pct END) as accuracy_30d
-    FROM `{PROJECT_ID}.{ML_DATASET}.model_performance_daily`
-    WHERE date >= DATE_SUB(CURRENT_DATE(), INTERVAL 30 DAY)
-    GROUP BY asset_type
-    """
+        log(f"  Monitor state error: {e}")
+        results['error'] = str(e)
+        return results
+
+    for (_, asset_type), sketch in sorted(sketches.items()):
+        # Re-check with this call's threshold; only conditions not already alerted are returned
+        alerts = sketch.check(alert_threshold)
+        results['alerts'].extend(alerts)
+        health = sketch.health()
+        results['health_status'][asset_type] = health
+        log(f"  {asset_type}: {health['status']} (fast: {health['accuracy_fast']}%, slow: {health['accuracy_slow']}%)")
+        if alerts:
+            save_sketch(sketch)
 
     try:
-        drift_results = list(bq_client.query(drift_query).result())
-        for row in drift_results:
-            status = 'HEALTHY'
-            if row.accuracy_7d and row.accuracy_30d:
-                if row.accuracy_7d < row.accuracy_30d * alert_threshold:
-                    status = 'DRIFT_DETECTED'
-                    results['alerts'].append({
-                        'asset_type': row.asset_type,
-                        'type': 'ACCURACY_DRIFT',
-                        'severity': 'WARNING',
-                        'accuracy_7d': row.accuracy_7d,
-                        'accuracy_30d': row.accuracy_30d
-                    })
-
-            results['health_status'][row.asset_type] = {
-                'status': status,
-                'accuracy_7d': row.accuracy_7d,
-                'accuracy_30d': row.accuracy_30d
-            }
-            log(f"  {row.asset_type}: {status} (7d: {row.accuracy_7d:.1f}%, 30d: {row.accuracy_30d:.1f}%)")
+        insert_drift_alerts(results['alerts'])
     except Exception as e:
-        log(f"  Drift check error: {e}")
-
-    # Insert alerts if any
-    for alert in results['alerts']:
-        alert_query = f"""
-        INSERT INTO `{PROJECT_ID}.{ML_DATASET}.model_drift_alerts`
-        (alert_id, alert_time, asset_type, alert_type, severity, metric_name,
-         current_value, threshold_value, baseline_value, message)
-        VALUES (
-            GENERATE_UUID(),
-            CURRENT_TIMESTAMP(),
-            '{alert['asset_type']}',
-            '{alert['type']}',
-            '{alert['severity']}',
-            'accuracy_7d',
-            {alert['accuracy_7d']},
-            {alert['accuracy_30d'] * alert_threshold},
-            {alert['accuracy_30d']},
-            'Model accuracy dropped: 7-day ({alert['accuracy_7d']:.1f}%) vs 30-day baseline ({alert['accuracy_30d']:.1f}%)'
-        )
-        """
-        try:
-            bq_client.query(alert_query).result()
-            log(f"  Alert created for {alert['asset_type']}")
-        except Exception as e:
-            log(f"  Alert insert error: {e}")
+        log(f"  Alert insert error: {e}")
 
     log("Model monitoring complete")
     return results
@@ -346,7 +673,7 @@ def run_weekly_retrain(validation_window_days=30):
 
     # Retrain model (using BigQuery ML)
     model_query = f"""
-    CREATE OR REPLACE MODEL `{PROJECT_ID}.{ML_DATASET}.xgboost_retrained`
+    CREATE OR REPLACE MODEL `{PROJECT_ID}.{ML_DATASET}.{INFERENCE_MODEL}`
     OPTIONS(
         model_type='BOOSTED_TREE_CLASSIFIER',
         data_split_method='NO_SPLIT',
@@ -381,6 +708,20 @@ def run_weekly_retrain(validation_window_days=30):
         results['model'] = str(e)
         results['status'] = 'failed'
 
+    # Daily inference scores with the exported booster in-process
+    if results['status'] == 'completed':
+        export_uri = f"{MODEL_BUCKET_URI.rstrip('/')}/{INFERENCE_MODEL}/"
+        try:
+            bq_client.query(f"""
+            EXPORT MODEL `{PROJECT_ID}.{ML_DATASET}.{INFERENCE_MODEL}`
+            OPTIONS(URI = '{export_uri}')
+            """).result()
+            log(f"  Model exported to {export_uri}")
+            results['export_uri'] = export_uri
+        except Exception as e:
+            log(f"  Model export error: {e}")
+            results['export_uri'] = str(e)
+
     # Log to deployment table
     log_query = f"""
     INSERT INTO `{PROJECT_ID}.{ML_DATASET}.deployment_log`
@@ -0,0 +1,109 @@
+"""
+Tests for the streaming drift monitor sketches (pure NumPy, no BigQuery).
+Run with: python -m pytest test_drift_monitor.py
+"""
+
+import json
+
+import numpy as np
+
+from drift_monitor import ModelSketch
+
+
+def feature_bar(rng, n, shift=0.0):
+    return {'rsi': rng.normal(50 + shift, 10, n), 'volume_ratio': rng.lognormal(0, 0.3, n)}
+
+
+def outcome_bar(rng, n, accuracy):
+    """Predictions calibrated to ~accuracy: UP probability p, predicted UP, actual UP with prob accuracy"""
+    predicted_up = rng.random(n) < 0.5
+    correct = rng.random(n) < accuracy
+    actual_up = np.where(correct, predicted_up, ~predicted_up)
+    probs = np.where(predicted_up, accuracy, 1 - accuracy)
+    return probs, actual_up, predicted_up
+
+
+def run_bar(sketch, features=None, outcomes=None):
+    sketch.start_bar()
+    if outcomes is not None:
+        sketch.observe_outcomes(*outcomes)
+    if features is not None:
+        sketch.observe_features(features)
+    return sketch.check()
+
+
+def alert_types(alerts):
+    return sorted(alert['alert_type'] for alert in alerts)
+
+
+def test_stable_distributions_raise_no_alerts():
+    rng = np.random.default_rng(1)
+    for n in (20, 500):
+        sketch = ModelSketch('v1', 'stocks')
+        fired = []
+        for _ in range(120):
+            fired += run_bar(sketch, feature_bar(rng, n), outcome_bar(rng, n, 0.6))
+        assert fired == [], (n, fired)
+
+
+def test_feature_shift_alerts_once_across_empty_bars():
+    rng = np.random.default_rng(2)
+    sketch = ModelSketch('v1', 'stocks')
+    for _ in range(40):
+        assert run_bar(sketch, feature_bar(rng, 500)) == []
+
+    fired = []
+    for bar in range(20):
+        # Alternate bars with no scored rows (weekends, same-day reruns)
+        features = feature_bar(rng, 500, shift=15) if bar % 2 == 0 else None
+        fired += [a for a in run_bar(sketch, features) if a['metric_name'] == 'psi_rsi']
+        if fired:
+            health = sketch.health()
+            assert health['status'] == 'DRIFT_DETECTED'
+            assert health['psi']['rsi'] > 0.1
+
+    assert len(fired) == 1
+    assert fired[0]['alert_type'] == 'FEATURE_DRIFT'
+
+
+def test_feature_alert_rearms_after_condition_clears():
+    rng = np.random.default_rng(3)
+    sketch = ModelSketch('v1', 'crypto')
+    for _ in range(40):
+        run_bar(sketch, feature_bar(rng, 500))
+
+    def rsi_alerts(shift, bars):
+        fired = []
+        for _ in range(bars):
+            fired += [a for a in run_bar(sketch, feature_bar(rng, 500, shift)) if a['metric_name'] == 'psi_rsi']
+        return fired
+
+    assert len(rsi_alerts(15, 3)) == 1
+    # Back to the original distribution: the condition clears without a new alert
+    assert rsi_alerts(0, 10) == []
+    assert 'FEATURE_DRIFT:rsi' not in sketch.active_alerts
+    # A later shift is a new alert
+    assert len(rsi_alerts(-25, 3)) == 1
+
+
+def test_accuracy_drop_alerts_on_the_bar_it_happens():
+    rng = np.random.default_rng(4)
+    sketch = ModelSketch('v1', 'stocks')
+    for _ in range(30):
+        assert run_bar(sketch, outcomes=outcome_bar(rng, 500, 0.62)) == []
+
+    alerts = run_bar(sketch, outcomes=outcome_bar(rng, 500, 0.40))
+    assert 'ACCURACY_DRIFT' in alert_types(alerts)
+    # Still active on the next bar: not raised again
+    assert 'ACCURACY_DRIFT' not in alert_types(run_bar(sketch, outcomes=outcome_bar(rng, 500, 0.40)))
+
+
+def test_state_round_trips_through_json():
+    rng = np.random.default_rng(5)
+    sketch = ModelSketch('v1', 'etf')
+    for _ in range(10):
+        run_bar(sketch, feature_bar(rng, 100), outcome_bar(rng, 100, 0.6))
+
+    restored = ModelSketch('v1', 'etf', json.loads(json.dumps(sketch.to_dict())))
+    assert restored.to_dict() == sketch.to_dict()
+    assert restored.health() == sketch.health()
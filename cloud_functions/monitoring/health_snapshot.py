@@ -0,0 +1,490 @@
+"""
+Data Warehouse Health Snapshot
+Incrementally maintained per-table health metrics for the admin monitoring pages.
+
+Each run only scans partitions modified since the table's last_modified time as
+read by the previous snapshot (kept unchanged for tables whose stats merge failed):
+- Per-partition stats (rows, duplicate keys, null close/volume, HLL symbol/period
+  sketches, latest timestamp) are MERGEd into `partition_stats`
+- Per-table totals are rolled up from those partition stats and appended to the
+  compact `health_history` table, one row per table per snapshot
+- Admin endpoints read the latest snapshot instead of re-aggregating source tables
+"""
+
+import os
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from google.cloud import bigquery
+
+MONITORING_DATASET = os.environ.get('MONITORING_DATASET', 'monitoring')
+PARTITION_STATS_TABLE = 'partition_stats'
+HEALTH_HISTORY_TABLE = 'health_history'
+
+SNAPSHOT_TABLES_PER_QUERY = int(os.environ.get('SNAPSHOT_TABLES_PER_QUERY', '10'))
+SNAPSHOT_MAX_WORKERS = int(os.environ.get('SNAPSHOT_MAX_WORKERS', '4'))
+STALE_AFTER_HOURS = 48
+
+UNPARTITIONED = '__UNPARTITIONED__'
+
+# Column candidates, in order of preference
+SYMBOL_COLUMNS = ['symbol', 'pair']
+TIME_COLUMNS = ['datetime', 'week_start', 'date', 'timestamp']
+NULL_RATE_COLUMNS = ['close', 'volume']
+
+# __TABLES__.type values
+TABLE_TYPE_TABLE = 1
+
+PARTITION_FORMATS = {4: '%Y', 6: '%Y%m', 8: '%Y%m%d', 10: '%Y%m%d%H'}
+
+
+def categorize_table(table_name):
+    """Asset category of a table, matching the admin inventory grouping"""
+    name = table_name.lower()
+    if 'stock' in name:
+        return 'stocks'
+    if 'crypto' in name:
+        return 'crypto'
+    if 'forex' in name or 'fx' in name:
+        return 'forex'
+    if 'etf' in name:
+        return 'etfs'
+    if 'indic' in name:
+        return 'indices'
+    if 'commodit' in name:
+        return 'commodities'
+    return 'other'
+
+
+def ensure_snapshot_tables(bq_client, project_id):
+    """Create the monitoring dataset and snapshot tables if missing"""
+    dataset = bigquery.Dataset(f"{project_id}.{MONITORING_DATASET}")
+    dataset.location = 'US'
+    bq_client.create_dataset(dataset, exists_ok=True)
+
+    partition_schema = [
+        bigquery.SchemaField("dataset_id", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("table_name", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("partition_id", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("row_count", "INT64"),
+        bigquery.SchemaField("duplicate_rows", "INT64"),
+        bigquery.SchemaField("null_close", "INT64"),
+        bigquery.SchemaField("null_volume", "INT64"),
+        bigquery.SchemaField("symbol_sketch", "BYTES"),
+        bigquery.SchemaField("period_sketch", "BYTES"),
+        bigquery.SchemaField("latest_time", "TIMESTAMP"),
+        bigquery.SchemaField("updated_at", "TIMESTAMP"),
+    ]
+    partition_table = bigquery.Table(f"{project_id}.{MONITORING_DATASET}.{PARTITION_STATS_TABLE}", schema=partition_schema)
+    partition_table.clustering_fields = ["dataset_id", "table_name"]
+    bq_client.create_table(partition_table, exists_ok=True)
+
+    history_schema = [
+        bigquery.SchemaField("snapshot_time", "TIMESTAMP", mode="REQUIRED"),
+        bigquery.SchemaField("dataset_id", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("table_name", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("category", "STRING"),
+        bigquery.SchemaField("row_count", "INT64"),
+        bigquery.SchemaField("rows_added", "INT64"),
+        bigquery.SchemaField("size_bytes", "INT64"),
+        bigquery.SchemaField("created_at", "TIMESTAMP"),
+        bigquery.SchemaField("last_modified", "TIMESTAMP"),
+        bigquery.SchemaField("latest_time", "TIMESTAMP"),
+        bigquery.SchemaField("freshness_hours", "INT64"),
+        bigquery.SchemaField("symbol_count", "INT64"),
+        bigquery.SchemaField("period_count", "INT64"),
+        bigquery.SchemaField("duplicate_rows", "INT64"),
+        bigquery.SchemaField("null_close_rate", "FLOAT64"),
+        bigquery.SchemaField("null_volume_rate", "FLOAT64"),
+        bigquery.SchemaField("partitions_scanned", "INT64"),
+        bigquery.SchemaField("status", "STRING"),
+    ]
+    history_table = bigquery.Table(f"{project_id}.{MONITORING_DATASET}.{HEALTH_HISTORY_TABLE}", schema=history_schema)
+    history_table.time_partitioning = bigquery.TimePartitioning(
+        type_=bigquery.TimePartitioningType.DAY,
+        field="snapshot_time"
+    )
+    history_table.clustering_fields = ["dataset_id", "table_name"]
+    bq_client.create_table(history_table, exists_ok=True)
+
+
+def _latest_history_query(project_id, dataset_ids=None, lookback_days=30):
+    dataset_filter = ''
+    if dataset_ids:
+        dataset_list = ', '.join(f"'{d}'" for d in dataset_ids)
+        dataset_filter = f"AND dataset_id IN ({dataset_list})"
+    return f"""
+        SELECT *
+        FROM `{project_id}.{MONITORING_DATASET}.{HEALTH_HISTORY_TABLE}`
+        WHERE snapshot_time >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL {int(lookback_days)} DAY)
+        {dataset_filter}
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY dataset_id, table_name ORDER BY snapshot_time DESC) = 1
+    """
+
+
+def _fetch_table_state(bq_client, project_id, dataset_id):
+    """Current metadata plus relevant columns for every base table in the dataset"""
+    query = f"""
+        SELECT table_id, type, row_count, size_bytes,
+               TIMESTAMP_MILLIS(creation_time) AS created_at,
+               TIMESTAMP_MILLIS(last_modified_time) AS last_modified
+        FROM `{project_id}.{dataset_id}.__TABLES__`
+    """
+    tables = {}
+    for row in bq_client.query(query).result():
+        if row['type'] != TABLE_TYPE_TABLE:
+            continue
+        tables[row['table_id']] = {
+            'row_count': row['row_count'] or 0,
+            'size_bytes': row['size_bytes'] or 0,
+            'created_at': row['created_at'],
+            'last_modified': row['last_modified'],
+            'columns': {},
+            'partition_column': None,
+        }
+
+    wanted = SYMBOL_COLUMNS + TIME_COLUMNS + NULL_RATE_COLUMNS
+    column_list = ', '.join(f"'{c}'" for c in wanted)
+    query = f"""
+        SELECT table_name, column_name, data_type, is_partitioning_column
+        FROM `{project_id}.{dataset_id}.INFORMATION_SCHEMA.COLUMNS`
+        WHERE column_name IN ({column_list}) OR is_partitioning_column = 'YES'
+    """
+    for row in bq_client.query(query).result():
+        info = tables.get(row['table_name'])
+        if info is None:
+            continue
+        info['columns'][row['column_name']] = row['data_type']
+        if row['is_partitioning_column'] == 'YES':
+            info['partition_column'] = row['column_name']
+
+    return tables
+
+
+def _fetch_changed_partitions(bq_client, project_id, dataset_id, table_names, since_by_table):
+    """Partition ids modified after each table's previous snapshot, and all live partition ids"""
+    if not table_names:
+        return {}, {}
+    name_list = ', '.join(f"'{t}'" for t in table_names)
+    query = f"""
+        SELECT table_name, partition_id, last_modified_time
+        FROM `{project_id}.{dataset_id}.INFORMATION_SCHEMA.PARTITIONS`
+        WHERE table_name IN ({name_list})
+          AND partition_id IS NOT NULL
+          AND partition_id NOT IN ('__NULL__', '__UNPARTITIONED__')
+    """
+    changed, live = {}, {}
+    for row in bq_client.query(query).result():
+        table_name = row['table_name']
+        live.setdefault(table_name, set()).add(row['partition_id'])
+        since = since_by_table.get(table_name)
+        if since is None or row['last_modified_time'] is None or row['last_modified_time'] > since:
+            changed.setdefault(table_name, set()).add(row['partition_id'])
+    return changed, live
+
+
+def _timestamp_expr(column, data_type):
+    if data_type in ('DATETIME', 'DATE'):
+        return f"TIMESTAMP(`{column}`)"
+    if data_type == 'TIMESTAMP':
+        return f"`{column}`"
+    return None
+
+
+def _partition_expr(column, data_type, partition_id_length):
+    """SQL expression reproducing BigQuery's partition_id for a time-partitioned column"""
+    fmt = PARTITION_FORMATS.get(partition_id_length)
+    if data_type == 'DATE':
+        return f"FORMAT_DATE('{fmt}', `{column}`)"
+    if data_type == 'DATETIME':
+        return f"FORMAT_DATETIME('{fmt}', `{column}`)"
+    return f"FORMAT_TIMESTAMP('{fmt}', `{column}`, 'UTC')"
+
+
+def _partition_stats_select(project_id, dataset_id, table_name, info, partition_ids):
+    """SELECT producing one stats row per changed partition of a table"""
+    columns = info['columns']
+    symbol_col = next((c for c in SYMBOL_COLUMNS if c in columns), None)
+    time_col = next((c for c in TIME_COLUMNS if c in columns and _timestamp_expr(c, columns[c])), None)
+    ts_expr = _timestamp_expr(time_col, columns[time_col]) if time_col else None
+
+    partition_col = info['partition_column']
+    time_partitioned = (
+        partition_col in columns
+        and columns[partition_col] in ('DATE', 'DATETIME', 'TIMESTAMP')
+        and all(p.isdigit() and len(p) in PARTITION_FORMATS for p in partition_ids)
+    )
+
+    where_clause = ''
+    if time_partitioned:
+        id_length = len(next(iter(partition_ids)))
+        partition_expr = _partition_expr(partition_col, columns[partition_col], id_length)
+        id_list = ', '.join(f"'{p}'" for p in sorted(partition_ids))
+        earliest = datetime.strptime(min(partition_ids), PARTITION_FORMATS[id_length])
+        # Range predicate lets BigQuery prune untouched partitions
+        partition_ts = _timestamp_expr(partition_col, columns[partition_col])
+        where_clause = f"WHERE {partition_ts} >= TIMESTAMP('{earliest.isoformat()}') AND {partition_expr} IN ({id_list})"
+    else:
+        partition_expr = f"'{UNPARTITIONED}'"
+
+    if symbol_col and time_col:
+        key_expr = f"CONCAT(CAST(`{symbol_col}` AS STRING), '|', CAST(`{time_col}` AS STRING))"
+        duplicate_expr = f"COUNT(*) - COUNT(DISTINCT {key_expr})"
+    else:
+        duplicate_expr = "0"
+
+    null_close_expr = "COUNTIF(`close` IS NULL)" if 'close' in columns else "CAST(NULL AS INT64)"
+    null_volume_expr = "COUNTIF(`volume` IS NULL)" if 'volume' in columns else "CAST(NULL AS INT64)"
+    symbol_sketch_expr = f"HLL_COUNT.INIT(CAST(`{symbol_col}` AS STRING))" if symbol_col else "CAST(NULL AS BYTES)"
+    period_sketch_expr = f"HLL_COUNT.INIT(CAST(`{time_col}` AS STRING))" if time_col else "CAST(NULL AS BYTES)"
+    latest_expr = f"MAX({ts_expr})" if ts_expr else "CAST(NULL AS TIMESTAMP)"
+
+    return f"""
+        SELECT
+            '{dataset_id}' AS dataset_id,
+            '{table_name}' AS table_name,
+            {partition_expr} AS partition_id,
+            COUNT(*) AS row_count,
+            {duplicate_expr} AS duplicate_rows,
+            {null_close_expr} AS null_close,
+            {null_volume_expr} AS null_volume,
+            {symbol_sketch_expr} AS symbol_sketch,
+            {period_sketch_expr} AS period_sketch,
+            {latest_expr} AS latest_time
+        FROM `{project_id}.{dataset_id}.{table_name}`
+        {where_clause}
+        GROUP BY partition_id
+    """
+
+
+def _merge_partition_stats(bq_client, project_id, selects):
+    """Upsert per-partition stats for a chunk of tables"""
+    source = "\nUNION ALL\n".join(selects)
+    query = f"""
+        MERGE `{project_id}.{MONITORING_DATASET}.{PARTITION_STATS_TABLE}` T
+        USING ({source}) S
+        ON T.dataset_id = S.dataset_id AND T.table_name = S.table_name AND T.partition_id = S.partition_id
+        WHEN MATCHED THEN UPDATE SET
+            row_count = S.row_count,
+            duplicate_rows = S.duplicate_rows,
+            null_close = S.null_close,
+            null_volume = S.null_volume,
+            symbol_sketch = S.symbol_sketch,
+            period_sketch = S.period_sketch,
+            latest_time = S.latest_time,
+            updated_at = CURRENT_TIMESTAMP()
+        WHEN NOT MATCHED THEN INSERT
+            (dataset_id, table_name, partition_id, row_count, duplicate_rows, null_close, null_volume,
+             symbol_sketch, period_sketch, latest_time, updated_at)
+        VALUES
+            (S.dataset_id, S.table_name, S.partition_id, S.row_count, S.duplicate_rows, S.null_close, S.null_volume,
+             S.symbol_sketch, S.period_sketch, S.latest_time, CURRENT_TIMESTAMP())
+    """
+    bq_client.query(query).result()
+
+
+def _drop_stale_partitions(bq_client, project_id, dataset_id, live_partitions):
+    """Remove stats for partitions that expired or were deleted from changed tables"""
+    for table_name, partition_ids in live_partitions.items():
+        id_list = ', '.join(f"'{p}'" for p in sorted(partition_ids))
+        query = f"""
+            DELETE FROM `{project_id}.{MONITORING_DATASET}.{PARTITION_STATS_TABLE}`
+            WHERE dataset_id = '{dataset_id}' AND table_name = '{table_name}'
+              AND partition_id != '{UNPARTITIONED}'
+              AND partition_id NOT IN ({id_list})
+        """
+        bq_client.query(query).result()
+
+
+def _rollup_partition_stats(bq_client, project_id, dataset_id):
+    """Table-level totals from the per-partition stats"""
+    query = f"""
+        SELECT
+            table_name,
+            SUM(duplicate_rows) AS duplicate_rows,
+            SAFE_DIVIDE(SUM(null_close), SUM(row_count)) AS null_close_rate,
+            SAFE_DIVIDE(SUM(null_volume), SUM(row_count)) AS null_volume_rate,
+            HLL_COUNT.MERGE(symbol_sketch) AS symbol_count,
+            HLL_COUNT.MERGE(period_sketch) AS period_count,
+            MAX(latest_time) AS latest_time
+        FROM `{project_id}.{MONITORING_DATASET}.{PARTITION_STATS_TABLE}`
+        WHERE dataset_id = '{dataset_id}'
+        GROUP BY table_name
+    """
+    return {row['table_name']: dict(row) for row in bq_client.query(query).result()}
+
+
+def _table_status(row_count, freshness_hours, duplicate_rows):
+    if not row_count:
+        return 'empty'
+    if freshness_hours is not None and freshness_hours > STALE_AFTER_HOURS:
+        return 'stale'
+    if duplicate_rows:
+        return 'duplicates'
+    return 'healthy'
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def snapshot_dataset(bq_client, project_id, dataset_id, previous):
+    """Refresh partition stats for changed tables of one dataset and build its history rows"""
+    tables = _fetch_table_state(bq_client, project_id, dataset_id)
+
+    since_by_table = {}
+    changed_tables = []
+    for table_name, info in tables.items():
+        prev = previous.get((dataset_id, table_name))
+        if prev is None or prev['last_modified'] is None or info['last_modified'] > prev['last_modified']:
+            changed_tables.append(table_name)
+            # Watermark is the table's last_modified as read before the previous scan, so
+            # partitions written while that scan ran are still newer than it
+            since_by_table[table_name] = prev['last_modified'] if prev else None
+
+    partitioned = [t for t in changed_tables if tables[t]['partition_column']]
+    changed_partitions, live_partitions = _fetch_changed_partitions(
+        bq_client, project_id, dataset_id, partitioned, since_by_table)
+
+    selects = []
+    select_tables = []
+    partitions_scanned = {}
+    for table_name in changed_tables:
+        info = tables[table_name]
+        if info['partition_column']:
+            partition_ids = changed_partitions.get(table_name)
+            if not partition_ids:
+                continue
+        else:
+            partition_ids = {UNPARTITIONED}
+        selects.append(_partition_stats_select(project_id, dataset_id, table_name, info, partition_ids))
+        select_tables.append(table_name)
+        partitions_scanned[table_name] = len(partition_ids)
+
+    failed_tables = set()
+    chunk_starts = range(0, len(selects), SNAPSHOT_TABLES_PER_QUERY)
+    with ThreadPoolExecutor(max_workers=SNAPSHOT_MAX_WORKERS) as executor:
+        futures = {
+            executor.submit(_merge_partition_stats, bq_client, project_id, selects[i:i + SNAPSHOT_TABLES_PER_QUERY]):
+                select_tables[i:i + SNAPSHOT_TABLES_PER_QUERY]
+            for i in chunk_starts
+        }
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                failed_tables.update(futures[future])
+                print(f"Partition stats merge failed for {dataset_id} ({', '.join(futures[future])}): {e}")
+
+    if live_partitions:
+        _drop_stale_partitions(bq_client, project_id, dataset_id, live_partitions)
+
+    rollup = _rollup_partition_stats(bq_client, project_id, dataset_id)
+    snapshot_time = datetime.now(timezone.utc)
+
+    rows = []
+    for table_name, info in sorted(tables.items()):
+        prev = previous.get((dataset_id, table_name)) or {}
+        stats = rollup.get(table_name, {})
+        # A failed merge keeps the previous watermark so the next run rescans the same partitions
+        last_modified = prev.get('last_modified') if table_name in failed_tables else info['last_modified']
+        latest_time = stats.get('latest_time')
+        freshness_hours = int((snapshot_time - latest_time).total_seconds() // 3600) if latest_time else None
+        prev_rows = prev.get('row_count')
+        rows.append({
+            'snapshot_time': snapshot_time.isoformat(),
+            'dataset_id': dataset_id,
+            'table_name': table_name,
+            'category': categorize_table(table_name),
+            'row_count': info['row_count'],
+            'rows_added': info['row_count'] - prev_rows if prev_rows is not None else None,
+            'size_bytes': info['size_bytes'],
+            'created_at': _iso(info['created_at']),
+            'last_modified': _iso(last_modified),
+            'latest_time': _iso(latest_time),
+            'freshness_hours': freshness_hours,
+            'symbol_count': stats.get('symbol_count'),
+            'period_count': stats.get('period_count'),
+            'duplicate_rows': stats.get('duplicate_rows'),
+            'null_close_rate': stats.get('null_close_rate'),
+            'null_volume_rate': stats.get('null_volume_rate'),
+            'partitions_scanned': 0 if table_name in failed_tables else partitions_scanned.get(table_name, 0),
+            'status': 'scan_failed' if table_name in failed_tables
+                      else _table_status(info['row_count'], freshness_hours, stats.get('duplicate_rows')),
+        })
+
+    return rows
+
+
+def run_health_snapshot(bq_client, project_id, dataset_ids):
+    """
+    Take an incremental health snapshot of the given datasets.
+
+    Intended to run on a schedule (e.g. hourly via Cloud Scheduler).
+    """
+    ensure_snapshot_tables(bq_client, project_id)
+
+    previous = {}
+    for row in bq_client.query(_latest_history_query(project_id, dataset_ids)).result():
+        previous[(row['dataset_id'], row['table_name'])] = dict(row)
+
+    summary = {'datasets': {}, 'tables_snapshotted': 0, 'partitions_scanned': 0}
+    history_rows = []
+    for dataset_id in dataset_ids:
+        try:
+            rows = snapshot_dataset(bq_client, project_id, dataset_id, previous)
+        except Exception as e:
+            summary['datasets'][dataset_id] = {'error': str(e)}
+            continue
+        history_rows.extend(rows)
+        summary['datasets'][dataset_id] = {
+            'tables': len(rows),
+            'tables_rescanned': len([r for r in rows if r['partitions_scanned']]),
+            'tables_failed': [r['table_name'] for r in rows if r['status'] == 'scan_failed'],
+        }
+        summary['partitions_scanned'] += sum(r['partitions_scanned'] for r in rows)
+
+    table_id = f"{project_id}.{MONITORING_DATASET}.{HEALTH_HISTORY_TABLE}"
+    for i in range(0, len(history_rows), 500):
+        errors = bq_client.insert_rows_json(table_id, history_rows[i:i + 500])
+        if errors:
+            summary.setdefault('insert_errors', []).extend(errors[:5])
+
+    summary['tables_snapshotted'] = len(history_rows)
+    summary['snapshot_time'] = datetime.now(timezone.utc).isoformat()
+    return summary
+
+
+def get_latest_snapshot(bq_client, project_id, dataset_ids=None):
+    """Latest snapshot row per table, as JSON-friendly dicts"""
+    rows = []
+    for row in bq_client.query(_latest_history_query(project_id, dataset_ids)).result():
+        record = dict(row)
+        for key, value in record.items():
+            if hasattr(value, 'isoformat'):
+                record[key] = value.isoformat()
+        rows.append(record)
+    return rows
+
+
+def get_row_growth(bq_client, project_id, dataset_ids=None, days=7):
+    """Rows added per category per day, from the snapshot history"""
+    dataset_filter = ''
+    if dataset_ids:
+        dataset_list = ', '.join(f"'{d}'" for d in dataset_ids)
+        dataset_filter = f"AND dataset_id IN ({dataset_list})"
+    query = f"""
+        SELECT
+            DATE(snapshot_time) AS snapshot_date,
+            category,
+            SUM(rows_added) AS rows_added
+        FROM `{project_id}.{MONITORING_DATASET}.{HEALTH_HISTORY_TABLE}`
+        WHERE snapshot_time >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL {int(days)} DAY)
+        {dataset_filter}
+        GROUP BY 1, 2
+        ORDER BY snapshot_date DESC, category
+    """
+    return [{
+        'date': row['snapshot_date'].isoformat(),
+        'category': row['category'],
+        'rows_added': row['rows_added'] or 0
+    } for row in bq_client.query(query).result()]
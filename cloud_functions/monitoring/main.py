@@ -10,6 +10,8 @@ from datetime import datetime, timedelta
 from google.cloud import bigquery
 from google.cloud import billing_v1
 from flask import jsonify
+from table_stats import collect_table_stats
+from health_snapshot import run_health_snapshot, get_latest_snapshot, get_row_growth
 
 PROJECT_ID = os.environ.get('GCP_PROJECT_ID', 'aialgotradehits')
 DATASET_ID = os.environ.get('BIGQUERY_DATASET', 'crypto_trading_data')
@@ -19,104 +21,12 @@ BILLING_ACCOUNT = os.environ.get('BILLING_ACCOUNT', '')
 bq_client = bigquery.Client(project=PROJECT_ID)
 
 
-def get_all_table_stats():
-    """Get statistics for all BigQuery tables - dynamically fetch ALL tables from BOTH datasets"""
+def get_all_table_stats(use_cache=True):
+    """Get statistics for all BigQuery tables - dynamically fetch ALL tables from BOTH datasets
 
-    tables_info = []
-
-    # List of datasets to scan
-    datasets_to_scan = [DATASET_ID, DATASET_UNIFIED]
-
-    for dataset_id in datasets_to_scan:
-        # Dynamically get all tables from the dataset
-        try:
-            dataset_ref = bq_client.dataset(dataset_id)
-            tables = [table.table_id for table in bq_client.list_tables(dataset_ref)]
-        except Exception as e:
-            # Skip if dataset doesn't exist or can't be accessed
-            continue
-
-        for table_name in tables:
-            try:
-                # Get table metadata
-                table_ref = bq_client.dataset(dataset_id).table(table_name)
-                table = bq_client.get_table(table_ref)
-
-                # Get row count
-                query = f"""
-                    SELECT COUNT(*) as row_count
-                    FROM `{PROJECT_ID}.{dataset_id}.{table_name}`
-                """
-                result = bq_client.query(query).result()
-                row_count = list(result)[0]['row_count']
-
-                # Get latest timestamp
-                try:
-                    timestamp_query = f"""
-                        SELECT MAX(datetime) as latest_timestamp
-                        FROM `{PROJECT_ID}.{dataset_id}.{table_name}`
-                    """
-                    timestamp_result = bq_client.query(timestamp_query).result()
-                    latest_timestamp = list(timestamp_result)[0]['latest_timestamp']
-                except:
-                    latest_timestamp = None
-
-                # Get unique pairs/symbols count
-                unique_pairs = 0
-                try:
-                    # Try 'pair' column first, then 'symbol'
-                    for col in ['pair', 'symbol']:
-                        try:
-                            pairs_query = f"""
-                                SELECT COUNT(DISTINCT {col}) as unique_pairs
-                                FROM `{PROJECT_ID}.{dataset_id}.{table_name}`
-                            """
-                            pairs_result = bq_client.query(pairs_query).result()
-                            unique_pairs = list(pairs_result)[0]['unique_pairs']
-                            if unique_pairs > 0:
-                                break
-                        except:
-                            continue
-                except:
-                    unique_pairs = 0
-
-                # Get table size
-                table_size_gb = table.num_bytes / (1024 ** 3)
-
-                # Get data for last 24 hours
-                try:
-                    recent_query = f"""
-                        SELECT COUNT(*) as recent_count
-                        FROM `{PROJECT_ID}.{dataset_id}.{table_name}`
-                        WHERE datetime >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 24 HOUR)
-                    """
-                    recent_result = bq_client.query(recent_query).result()
-                    recent_count = list(recent_result)[0]['recent_count']
-                except:
-                    recent_count = 0
-
-                tables_info.append({
-                    'table_name': table_name,
-                    'dataset': dataset_id,
-                    'row_count': row_count,
-                    'size_gb': round(table_size_gb, 4),
-                    'latest_timestamp': latest_timestamp.isoformat() if latest_timestamp else None,
-                    'unique_pairs': unique_pairs,
-                    'recent_24h_count': recent_count,
-                    'created': table.created.isoformat() if table.created else None,
-                    'modified': table.modified.isoformat() if table.modified else None,
-                    'status': 'healthy' if row_count > 0 else 'warning'
-                })
-
-            except Exception as e:
-                tables_info.append({
-                    'table_name': table_name,
-                    'dataset': dataset_id,
-                    'error': str(e),
-                    'status': 'error'
-                })
-
-    return tables_info
+    Served from table/partition metadata plus a few batched aggregate queries (see table_stats.py)
+    """
+    return collect_table_stats(bq_client, PROJECT_ID, [DATASET_ID, DATASET_UNIFIED], use_cache=use_cache)
 
 
 def get_daily_data_growth():
@@ -270,22 +180,100 @@ def get_scheduler_status():
     return schedulers
 
 
+# Tables checked for data quality, by category
+QUALITY_TABLES_BY_CATEGORY = {
+    'stocks': ['v2_stocks_daily', 'v2_stocks_hourly', 'stocks_daily'],
+    'crypto': ['v2_crypto_daily', 'v2_crypto_hourly', 'crypto_daily', 'daily_crypto'],
+    'forex': ['v2_forex_daily', 'v2_forex_hourly', 'forex_daily'],
+    'etfs': ['v2_etfs_daily', 'v2_etfs_hourly', 'etfs_daily'],
+    'indices': ['v2_indices_daily', 'v2_indices_hourly', 'indices_daily'],
+    'commodities': ['v2_commodities_daily', 'v2_commodities_hourly', 'commodities_daily'],
+}
+
+
+def _latest_snapshot_by_table():
+    """Latest health snapshot for DATASET_ID keyed by table name (empty if no snapshot yet)"""
+    try:
+        return {row['table_name']: row for row in get_latest_snapshot(bq_client, PROJECT_ID, [DATASET_ID])}
+    except Exception as e:
+        print(f"Health snapshot unavailable: {e}")
+        return {}
+
+
+def _category_status(category_metrics, table_count):
+    """Determine category status"""
+    if category_metrics['tables_with_data'] == 0:
+        return 'critical'
+    if category_metrics['freshness_hours'] and category_metrics['freshness_hours'] > 48:
+        return 'stale'
+    if category_metrics['tables_with_data'] < table_count:
+        return 'partial'
+    return 'healthy'
+
+
 def get_data_quality_metrics():
-    """Check data quality and completeness across all asset categories"""
+    """Check data quality and completeness across all asset categories
+
+    Served from the latest health snapshot; falls back to live queries when none exists
+    """
+    snapshot = _latest_snapshot_by_table()
+    if not snapshot:
+        return get_data_quality_metrics_live()
 
     quality_metrics = []
+    for category, tables in QUALITY_TABLES_BY_CATEGORY.items():
+        category_metrics = {
+            'category': category,
+            'tables_checked': 0,
+            'tables_with_data': 0,
+            'total_rows': 0,
+            'missing_dates': [],
+            'freshness_hours': None,
+            'status': 'unknown',
+            'details': []
+        }
 
-    # Define tables to check by category
-    tables_by_category = {
-        'stocks': ['v2_stocks_daily', 'v2_stocks_hourly', 'stocks_daily'],
-        'crypto': ['v2_crypto_daily', 'v2_crypto_hourly', 'crypto_daily', 'daily_crypto'],
-        'forex': ['v2_forex_daily', 'v2_forex_hourly', 'forex_daily'],
-        'etfs': ['v2_etfs_daily', 'v2_etfs_hourly', 'etfs_daily'],
-        'indices': ['v2_indices_daily', 'v2_indices_hourly', 'indices_daily'],
-        'commodities': ['v2_commodities_daily', 'v2_commodities_hourly', 'commodities_daily'],
-    }
-
-    for category, tables in tables_by_category.items():
+        for table_name in tables:
+            row = snapshot.get(table_name)
+            if row is None:
+                category_metrics['details'].append({'table': table_name, 'error': 'not in snapshot'})
+                continue
+
+            category_metrics['tables_checked'] += 1
+            if not row['row_count']:
+                continue
+
+            category_metrics['tables_with_data'] += 1
+            category_metrics['total_rows'] += row['row_count']
+
+            hours_since = row['freshness_hours']
+            if hours_since is not None and (category_metrics['freshness_hours'] is None or hours_since < category_metrics['freshness_hours']):
+                category_metrics['freshness_hours'] = hours_since
+
+            category_metrics['details'].append({
+                'table': table_name,
+                'row_count': row['row_count'],
+                'latest': row['latest_time'],
+                'hours_since_update': hours_since,
+                'duplicate_rows': row['duplicate_rows'],
+                'null_close_rate': row['null_close_rate'],
+                'null_volume_rate': row['null_volume_rate'],
+                'status': 'fresh' if hours_since is not None and hours_since < 48 else 'stale'
+            })
+
+        category_metrics['status'] = _category_status(category_metrics, len(tables))
+        category_metrics['snapshot_time'] = max((snapshot[t]['snapshot_time'] for t in tables if t in snapshot), default=None)
+        quality_metrics.append(category_metrics)
+
+    return quality_metrics
+
+
+def get_data_quality_metrics_live():
+    """Check data quality and completeness across all asset categories by querying each table"""
+
+    quality_metrics = []
+
+    for category, tables in QUALITY_TABLES_BY_CATEGORY.items():
         category_metrics = {
             'category': category,
             'tables_checked': 0,
@@ -335,15 +323,7 @@ def get_data_quality_metrics():
                     'error': str(e)[:100]
                 })
 
-        # Determine category status
-        if category_metrics['tables_with_data'] == 0:
-            category_metrics['status'] = 'critical'
-        elif category_metrics['freshness_hours'] and category_metrics['freshness_hours'] > 48:
-            category_metrics['status'] = 'stale'
-        elif category_metrics['tables_with_data'] < len(tables):
-            category_metrics['status'] = 'partial'
-        else:
-            category_metrics['status'] = 'healthy'
+        category_metrics['status'] = _category_status(category_metrics, len(tables))
 
         quality_metrics.append(category_metrics)
 
@@ -368,15 +348,21 @@ def get_empty_tables():
 def get_duplicate_analysis():
     """Identify potentially duplicate tables based on similar row counts"""
     try:
-        query = f"""
-            SELECT table_id, row_count, size_bytes
-            FROM `{PROJECT_ID}.{DATASET_ID}.__TABLES__`
-            WHERE row_count > 0
-            ORDER BY row_count DESC
-        """
-        result = bq_client.query(query).result()
-
-        tables = [(row.table_id, row.row_count, row.size_bytes) for row in result]
+        snapshot = _latest_snapshot_by_table()
+        if snapshot:
+            tables = sorted(
+                [(row['table_name'], row['row_count'], row['size_bytes']) for row in snapshot.values() if row['row_count']],
+                key=lambda t: t[1], reverse=True
+            )
+        else:
+            query = f"""
+                SELECT table_id, row_count, size_bytes
+                FROM `{PROJECT_ID}.{DATASET_ID}.__TABLES__`
+                WHERE row_count > 0
+                ORDER BY row_count DESC
+            """
+            result = bq_client.query(query).result()
+            tables = [(row.table_id, row.row_count, row.size_bytes) for row in result]
 
         # Find tables with identical row counts (potential duplicates)
         duplicates = {}
@@ -397,8 +383,48 @@ def get_duplicate_analysis():
         return {'error': str(e)}
 
 
+def get_duplicate_rows():
+    """Tables containing duplicate (symbol, datetime) rows, from the latest health snapshot"""
+    snapshot = _latest_snapshot_by_table()
+    return sorted([
+        {
+            'table': row['table_name'],
+            'duplicate_rows': row['duplicate_rows'],
+            'rows': row['row_count'],
+            'snapshot_time': row['snapshot_time']
+        }
+        for row in snapshot.values() if row['duplicate_rows']
+    ], key=lambda t: t['duplicate_rows'], reverse=True)
+
+
 def get_row_count_changes():
-    """Track row count changes over time (requires data_quality_log table)"""
+    """Track row count changes over time, from the health snapshot history"""
+    snapshot = _latest_snapshot_by_table()
+    if not snapshot:
+        return get_row_count_changes_live()
+
+    categories = {}
+    for row in snapshot.values():
+        cat = categories.setdefault(row['category'], {
+            'category': row['category'],
+            'table_count': 0,
+            'total_rows': 0,
+            'total_size_mb': 0,
+            'rows_added': 0
+        })
+        cat['table_count'] += 1
+        cat['total_rows'] += row['row_count'] or 0
+        cat['total_size_mb'] += (row['size_bytes'] or 0) / (1024 * 1024)
+        cat['rows_added'] += row['rows_added'] or 0
+
+    summary = sorted(categories.values(), key=lambda c: c['total_rows'], reverse=True)
+    for cat in summary:
+        cat['total_size_mb'] = round(cat['total_size_mb'], 2)
+    return summary
+
+
+def get_row_count_changes_live():
+    """Current row counts by category from __TABLES__"""
     try:
         # Get current row counts by category
         query = f"""
@@ -500,7 +526,13 @@ def system_monitoring(request):
     - /growth - Get data growth metrics
     - /quality - Get data quality metrics
     - /top-pairs - Get top trading pairs
+    - /duplicate-rows - Tables with duplicate (symbol, datetime) rows
+    - /row-growth - Rows added per category per day
+    - /snapshot - Take an incremental data-warehouse health snapshot (scheduled job)
     - /full - Get complete monitoring report
+
+    Quality, duplicate and category endpoints are served from the latest health
+    snapshot. Pass refresh=true to bypass the cached table statistics.
     """
 
     # Enable CORS
@@ -519,6 +551,7 @@ def system_monitoring(request):
         # Parse request
         request_args = request.args
         endpoint = request_args.get('endpoint', 'full')
+        use_cache = request_args.get('refresh', 'false').lower() != 'true'
 
         response_data = {
             'timestamp': datetime.utcnow().isoformat(),
@@ -527,7 +560,7 @@ def system_monitoring(request):
         }
 
         if endpoint == 'tables' or endpoint == 'full':
-            response_data['tables'] = get_all_table_stats()
+            response_data['tables'] = get_all_table_stats(use_cache=use_cache)
 
         if endpoint == 'billing' or endpoint == 'full':
             response_data['billing'] = get_billing_data()
@@ -554,6 +587,15 @@ def system_monitoring(request):
         if endpoint == 'category-summary' or endpoint == 'full':
             response_data['category_summary'] = get_row_count_changes()
 
+        if endpoint == 'duplicate-rows' or endpoint == 'full':
+            response_data['duplicate_rows'] = get_duplicate_rows()
+
+        if endpoint == 'row-growth':
+            response_data['row_growth'] = get_row_growth(bq_client, PROJECT_ID, [DATASET_ID])
+
+        if endpoint == 'snapshot':
+            response_data['snapshot'] = run_health_snapshot(bq_client, PROJECT_ID, [DATASET_ID, DATASET_UNIFIED])
+
         # Add summary
         if endpoint == 'full':
             response_data['summary'] = {
@@ -0,0 +1,290 @@
+"""
+Table Statistics Collector
+Builds per-table statistics from BigQuery metadata instead of scanning every table.
+
+Row counts, sizes and timestamps come from the __TABLES__ meta-table, column and
+partition layout from INFORMATION_SCHEMA. The remaining aggregates (latest datetime,
+distinct symbols, rows in the last 24h) are folded into a few UNION ALL queries that
+run concurrently. Results are cached in-process for a short TTL.
+"""
+
+import os
+import time
+import threading
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+STATS_CACHE_TTL_SECONDS = int(os.environ.get('STATS_CACHE_TTL_SECONDS', '300'))
+STATS_TABLES_PER_QUERY = int(os.environ.get('STATS_TABLES_PER_QUERY', '25'))
+STATS_MAX_WORKERS = int(os.environ.get('STATS_MAX_WORKERS', '4'))
+
+# __TABLES__.type values
+TABLE_TYPE_VIEW = 2
+
+_stats_cache = {}
+_stats_cache_lock = threading.Lock()
+
+
+def _to_timestamp_expr(column, data_type):
+    """SQL expression casting a datetime-like column to TIMESTAMP"""
+    if data_type == 'TIMESTAMP':
+        return f"`{column}`"
+    if data_type == 'DATETIME':
+        return f"TIMESTAMP(`{column}`)"
+    if data_type == 'DATE':
+        return f"TIMESTAMP(`{column}`)"
+    return None
+
+
+def _partition_start(partition_id):
+    """Convert a time-unit partition id (YYYY, YYYYMM, YYYYMMDD, YYYYMMDDHH) to a UTC datetime"""
+    formats = {4: '%Y', 6: '%Y%m', 8: '%Y%m%d', 10: '%Y%m%d%H'}
+    fmt = formats.get(len(partition_id or ''))
+    if not fmt or not partition_id.isdigit():
+        return None
+    return datetime.strptime(partition_id, fmt).replace(tzinfo=timezone.utc)
+
+
+def _fetch_table_metadata(bq_client, project_id, dataset_id):
+    """Row counts, sizes and modification times for every table in a dataset (metadata only)"""
+    query = f"""
+        SELECT table_id, type, row_count, size_bytes, creation_time, last_modified_time
+        FROM `{project_id}.{dataset_id}.__TABLES__`
+    """
+    tables = {}
+    for row in bq_client.query(query).result():
+        tables[row['table_id']] = {
+            'type': row['type'],
+            'row_count': row['row_count'] or 0,
+            'size_bytes': row['size_bytes'] or 0,
+            'created': datetime.fromtimestamp(row['creation_time'] / 1000, tz=timezone.utc) if row['creation_time'] else None,
+            'modified': datetime.fromtimestamp(row['last_modified_time'] / 1000, tz=timezone.utc) if row['last_modified_time'] else None,
+            'columns': {},
+            'partition_column': None,
+            'latest_partition': None,
+        }
+    return tables
+
+
+def _fetch_column_metadata(bq_client, project_id, dataset_id, tables):
+    """Attach the datetime/pair/symbol columns and the partitioning column to each table"""
+    query = f"""
+        SELECT table_name, column_name, data_type, is_partitioning_column
+        FROM `{project_id}.{dataset_id}.INFORMATION_SCHEMA.COLUMNS`
+        WHERE column_name IN ('datetime', 'pair', 'symbol')
+           OR is_partitioning_column = 'YES'
+    """
+    for row in bq_client.query(query).result():
+        info = tables.get(row['table_name'])
+        if info is None:
+            continue
+        if row['column_name'] in ('datetime', 'pair', 'symbol'):
+            info['columns'][row['column_name']] = row['data_type']
+        if row['is_partitioning_column'] == 'YES':
+            info['partition_column'] = row['column_name']
+
+
+def _fetch_partition_metadata(bq_client, project_id, dataset_id, tables):
+    """Record the newest non-empty partition of each time-partitioned table"""
+    query = f"""
+        SELECT table_name, MAX(partition_id) AS latest_partition
+        FROM `{project_id}.{dataset_id}.INFORMATION_SCHEMA.PARTITIONS`
+        WHERE total_rows > 0
+          AND partition_id NOT IN ('__NULL__', '__UNPARTITIONED__')
+        GROUP BY table_name
+    """
+    for row in bq_client.query(query).result():
+        info = tables.get(row['table_name'])
+        if info is not None:
+            info['latest_partition'] = _partition_start(row['latest_partition'])
+
+
+def _has_datetime_partitions(info):
+    """True when the table is time-partitioned on its datetime column"""
+    return (info['partition_column'] == 'datetime' and info['latest_partition'] is not None
+            and 'datetime' in info['columns'])
+
+
+def _build_table_select(project_id, dataset_id, table_name, info, since_24h):
+    """Single SELECT computing the aggregates metadata cannot provide, or None if nothing to compute"""
+    columns = info['columns']
+    is_view = info['type'] == TABLE_TYPE_VIEW
+    ts_expr = _to_timestamp_expr('datetime', columns['datetime']) if 'datetime' in columns else None
+    # Original collector preferred 'pair' over 'symbol'
+    distinct_col = 'pair' if 'pair' in columns else ('symbol' if 'symbol' in columns else None)
+    recently_modified = info['modified'] is not None and info['modified'] >= since_24h
+    # MAX(datetime) of partitioned tables is read from the newest partition only
+    needs_latest = ts_expr is not None and not _has_datetime_partitions(info)
+    needs_recent = ts_expr is not None and (is_view or recently_modified)
+
+    if not is_view and not needs_latest and not needs_recent and distinct_col is None:
+        return None
+
+    row_count_expr = "COUNT(*)" if is_view else "CAST(NULL AS INT64)"
+    latest_expr = f"MAX({ts_expr})" if needs_latest else "CAST(NULL AS TIMESTAMP)"
+    distinct_expr = f"COUNT(DISTINCT `{distinct_col}`)" if distinct_col else "0"
+    if needs_recent:
+        recent_expr = f"COUNTIF({ts_expr} >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 24 HOUR))"
+    else:
+        # No datetime column, or table not written to in 24h - nothing recent to count
+        recent_expr = "0"
+
+    return f"""
+        SELECT
+            '{table_name}' AS table_name,
+            {row_count_expr} AS row_count,
+            {latest_expr} AS latest_timestamp,
+            {distinct_expr} AS unique_pairs,
+            {recent_expr} AS recent_24h_count
+        FROM `{project_id}.{dataset_id}.{table_name}`
+    """
+
+
+def _build_latest_partition_select(project_id, dataset_id, table_name, info):
+    """MAX(datetime) restricted to the newest partition when the table is partitioned on datetime"""
+    ts_expr = _to_timestamp_expr('datetime', info['columns'].get('datetime'))
+    return f"""
+        SELECT
+            '{table_name}' AS table_name,
+            MAX({ts_expr}) AS latest_timestamp
+        FROM `{project_id}.{dataset_id}.{table_name}`
+        WHERE {ts_expr} >= TIMESTAMP('{info['latest_partition'].isoformat()}')
+    """
+
+
+def _run_union(bq_client, selects):
+    """Run (table_name, SELECT) pairs as one UNION ALL query, falling back per table on failure"""
+    query = "\nUNION ALL\n".join(select for _, select in selects)
+    try:
+        return {row['table_name']: dict(row) for row in bq_client.query(query).result()}, {}
+    except Exception as e:
+        if len(selects) == 1:
+            return {}, {selects[0][0]: str(e)}
+    # One bad table fails the whole union - isolate it
+    results, errors = {}, {}
+    for table_name, select in selects:
+        try:
+            for row in bq_client.query(select).result():
+                results[row['table_name']] = dict(row)
+        except Exception as e:
+            errors[table_name] = str(e)
+    return results, errors
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _collect_dataset(bq_client, project_id, dataset_id):
+    """Gather stats for a single dataset with a constant number of metadata queries"""
+    tables = _fetch_table_metadata(bq_client, project_id, dataset_id)
+    if not tables:
+        return []
+
+    try:
+        _fetch_column_metadata(bq_client, project_id, dataset_id, tables)
+    except Exception as e:
+        print(f"Column metadata unavailable for {dataset_id}: {e}")
+    try:
+        _fetch_partition_metadata(bq_client, project_id, dataset_id, tables)
+    except Exception as e:
+        print(f"Partition metadata unavailable for {dataset_id}: {e}")
+
+    since_24h = datetime.now(timezone.utc) - timedelta(hours=24)
+
+    aggregate_selects = []
+    latest_selects = []
+    for table_name, info in sorted(tables.items()):
+        select = _build_table_select(project_id, dataset_id, table_name, info, since_24h)
+        if select:
+            aggregate_selects.append((table_name, select))
+        if _has_datetime_partitions(info):
+            latest_selects.append((table_name, _build_latest_partition_select(project_id, dataset_id, table_name, info)))
+
+    aggregates, errors, latest = {}, {}, {}
+    with ThreadPoolExecutor(max_workers=STATS_MAX_WORKERS) as executor:
+        futures = {}
+        for chunk in _chunks(aggregate_selects, STATS_TABLES_PER_QUERY):
+            futures[executor.submit(_run_union, bq_client, chunk)] = 'aggregate'
+        for chunk in _chunks(latest_selects, STATS_TABLES_PER_QUERY):
+            futures[executor.submit(_run_union, bq_client, chunk)] = 'latest'
+
+        for future in as_completed(futures):
+            try:
+                results, chunk_errors = future.result()
+            except Exception as e:
+                print(f"Stats query failed for {dataset_id}: {e}")
+                continue
+            if futures[future] == 'aggregate':
+                aggregates.update(results)
+                errors.update(chunk_errors)
+            else:
+                latest.update(results)
+
+    tables_info = []
+    for table_name, info in sorted(tables.items()):
+        if table_name in errors:
+            tables_info.append({
+                'table_name': table_name,
+                'dataset': dataset_id,
+                'error': errors[table_name],
+                'status': 'error'
+            })
+            continue
+
+        agg = aggregates.get(table_name, {})
+        row_count = agg.get('row_count') if agg.get('row_count') is not None else info['row_count']
+        latest_timestamp = latest.get(table_name, {}).get('latest_timestamp') or agg.get('latest_timestamp')
+
+        tables_info.append({
+            'table_name': table_name,
+            'dataset': dataset_id,
+            'row_count': row_count,
+            'size_gb': round(info['size_bytes'] / (1024 ** 3), 4),
+            'latest_timestamp': latest_timestamp.isoformat() if latest_timestamp else None,
+            'unique_pairs': agg.get('unique_pairs') or 0,
+            'recent_24h_count': agg.get('recent_24h_count') or 0,
+            'created': info['created'].isoformat() if info['created'] else None,
+            'modified': info['modified'].isoformat() if info['modified'] else None,
+            'status': 'healthy' if row_count > 0 else 'warning'
+        })
+
+    return tables_info
+
+
+def collect_table_stats(bq_client, project_id, dataset_ids, use_cache=True):
+    """
+    Statistics for every table in the given datasets.
+
+    Returns the same per-table dicts as the original per-table scan, served from an
+    in-process cache for STATS_CACHE_TTL_SECONDS.
+    """
+    cache_key = (project_id, tuple(dataset_ids))
+    now = time.monotonic()
+
+    if use_cache:
+        with _stats_cache_lock:
+            cached = _stats_cache.get(cache_key)
+            if cached and cached[0] > now:
+                return cached[1]
+
+    tables_info = []
+    for dataset_id in dataset_ids:
+        try:
+            tables_info.extend(_collect_dataset(bq_client, project_id, dataset_id))
+        except Exception as e:
+            # Skip if dataset doesn't exist or can't be accessed
+            print(f"Skipping dataset {dataset_id}: {e}")
+            continue
+
+    with _stats_cache_lock:
+        _stats_cache[cache_key] = (now + STATS_CACHE_TTL_SECONDS, tables_info)
+
+    return tables_info
+
+
+def clear_table_stats_cache():
+    """Drop all cached statistics"""
+    with _stats_cache_lock:
+        _stats_cache.clear()
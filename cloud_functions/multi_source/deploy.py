@@ -111,7 +111,8 @@ if __name__ == '__main__':
         print("  4. Finnhub - Analyst Recommendations")
         print("  5. CoinMarketCap - Crypto Rankings")
         print("\nNew Fields Added:")
-        print("  - buy_volume, sell_volume (from Kraken)")
+        print("  - buy_volume, sell_volume (from Kraken trade tape, every bar)")
+        print("  - trade tape buckets + resume cursor (kraken_trade_flow)")
         print("  - buy_count, sell_count (number of traders)")
         print("  - trade_count (total trades)")
         print("  - buy_sell_ratio, buy_pressure")
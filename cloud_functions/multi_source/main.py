@@ -20,6 +20,7 @@ from datetime import datetime, timezone, timedelta
 import time
 import concurrent.futures
 import json
+import os
 import traceback
 
 # =====================
@@ -50,6 +51,25 @@ FRED_RATE = 100
 FINNHUB_RATE = 50
 KRAKEN_RATE = 40  # 1 call per 1.5 seconds
 
+# Kraken trade tape (per-bar buy/sell volume)
+# Each run resumes from the cursor saved with the previous run's buckets
+KRAKEN_TRADE_FLOW_TABLE = 'kraken_trade_flow'
+KRAKEN_OHLC_DAYS = 180
+KRAKEN_TRADE_PAGE_SIZE = 1000  # Kraken max trades per page
+KRAKEN_TRADE_MAX_PAGES = int(os.environ.get('KRAKEN_TRADE_MAX_PAGES', '30'))  # Per pair per run (~35s at the page delay)
+# Per-pair page caps for busy pairs, e.g. '{"XXBTZUSD": 120}'
+KRAKEN_TRADE_MAX_PAGES_BY_PAIR = json.loads(os.environ.get('KRAKEN_TRADE_MAX_PAGES_BY_PAIR', '{}'))
+# Past its page cap a pair keeps paging while its cursor is further behind than this,
+# until the run's shared catch-up budget is spent
+KRAKEN_TRADE_MAX_LAG_HOURS = float(os.environ.get('KRAKEN_TRADE_MAX_LAG_HOURS', '6'))
+KRAKEN_TRADE_CATCHUP_SECONDS = int(os.environ.get('KRAKEN_TRADE_CATCHUP_SECONDS', '600'))
+KRAKEN_TRADE_PAGE_DELAY = 1.1  # Public endpoint allows ~1 call/sec
+KRAKEN_TRADE_BACKFILL_DAYS = 30  # Where a pair without a saved cursor starts
+TRADE_FLOW_COLUMNS = ['buy_volume', 'sell_volume', 'buy_count', 'sell_count']
+
+# Aggregation stage (cloud_functions/market_aggregates), refreshed after uploads
+MARKET_AGGREGATES_URL = os.environ.get('MARKET_AGGREGATES_URL')
+
 # =====================
 # SYMBOL CONFIGURATIONS
 # =====================
@@ -485,10 +505,21 @@ def fetch_twelvedata(symbol, interval='1day', outputsize=5000):
         return None
 
 
+def kraken_symbol(pair):
+    """Kraken pair code -> symbol used in crypto_daily_clean (XXBTZUSD -> BTC)"""
+    return pair.replace('XXBT', 'BTC').replace('XETH', 'ETH').replace('ZUSD', 'USD').replace('USD', '')
+
+
+def kraken_bar_labels(bar_times, interval=1440):
+    """Bar start (unix seconds, UTC-aligned like Kraken's OHLC) -> datetime label"""
+    fmt = '%Y-%m-%d' if interval >= 1440 else '%Y-%m-%d %H:%M:%S'
+    return pd.to_datetime(np.asarray(bar_times, dtype=np.int64), unit='s').strftime(fmt)
+
+
 def fetch_kraken_ohlc(pair, interval=1440):
     """Fetch OHLC data from Kraken with volume and trade count"""
     try:
-        six_months_ago = datetime.now() - timedelta(days=180)
+        six_months_ago = datetime.now() - timedelta(days=KRAKEN_OHLC_DAYS)
         since_timestamp = int(six_months_ago.timestamp())
 
         url = f"{KRAKEN_URL}/OHLC"
@@ -513,11 +544,14 @@ def fetch_kraken_ohlc(pair, interval=1440):
 
         ohlc_list = result[ohlc_key[0]]
 
+        labels = kraken_bar_labels([candle[0] for candle in ohlc_list], interval)
+        symbol = kraken_symbol(pair)
+
         records = []
-        for candle in ohlc_list:
+        for label, candle in zip(labels, ohlc_list):
             records.append({
-                'datetime': datetime.fromtimestamp(candle[0]).strftime('%Y-%m-%d'),
-                'symbol': pair.replace('XXBT', 'BTC').replace('XETH', 'ETH').replace('ZUSD', 'USD').replace('USD', ''),
+                'datetime': label,
+                'symbol': symbol,
                 'open': float(candle[1]),
                 'high': float(candle[2]),
                 'low': float(candle[3]),
@@ -535,97 +569,163 @@ def fetch_kraken_ohlc(pair, interval=1440):
         return None
 
 
-def fetch_kraken_trades(pair, since=None):
-    """Fetch recent trades from Kraken to calculate buy/sell volume"""
-    try:
-        url = f"{KRAKEN_URL}/Trades"
-        params = {'pair': pair}
-        if since:
-            params['since'] = since
+def fetch_kraken_trades_page(pair, since=None):
+    """Fetch one page of Kraken's trade tape; returns (trades, cursor for the next page)"""
+    params = {'pair': pair, 'count': KRAKEN_TRADE_PAGE_SIZE}
+    if since:
+        params['since'] = since
 
-        response = requests.get(url, params=params, timeout=30)
-        data = response.json()
+    response = requests.get(f"{KRAKEN_URL}/Trades", params=params, timeout=30)
+    data = response.json()
 
-        if data.get('error'):
-            print(f"Kraken trades error for {pair}: {data['error']}")
-            return None
+    if data.get('error'):
+        raise RuntimeError(f"Kraken trades error for {pair}: {data['error']}")
 
-        result = data.get('result', {})
-        trades_key = [k for k in result.keys() if k != 'last']
-        if not trades_key:
-            return None
+    result = data.get('result', {})
+    trades_key = [k for k in result.keys() if k != 'last']
+    trades = result[trades_key[0]] if trades_key else []
+    return trades, int(result.get('last') or 0)
 
-        trades = result[trades_key[0]]
 
-        # Aggregate buy/sell volume
-        buy_volume = 0.0
-        sell_volume = 0.0
-        buy_count = 0
-        sell_count = 0
-        total_trades = len(trades)
+def parse_kraken_trades(trades):
+    """Trade rows -> (times, volumes, is_buy) arrays"""
+    # trade format: [price, volume, time, buy/sell, market/limit, misc, trade_id]
+    tape = np.asarray([trade[:4] for trade in trades], dtype=object).reshape(-1, 4)
+    return tape[:, 2].astype(float), tape[:, 1].astype(float), tape[:, 3] == 'b'
 
-        for trade in trades:
-            # trade format: [price, volume, time, buy/sell, market/limit, misc]
-            volume = float(trade[1])
-            side = trade[3]  # 'b' = buy, 's' = sell
 
-            if side == 'b':
-                buy_volume += volume
-                buy_count += 1
-            else:
-                sell_volume += volume
-                sell_count += 1
+def aggregate_trade_flow(times, volumes, is_buy, interval=1440):
+    """Buy/sell volume and trade counts per OHLC bar (bars keyed by start time in unix seconds)"""
+    if len(times) == 0:
+        return pd.DataFrame(columns=['bar_time'] + TRADE_FLOW_COLUMNS)
 
-        return {
-            'buy_volume': buy_volume,
-            'sell_volume': sell_volume,
-            'buy_count': buy_count,
-            'sell_count': sell_count,
-            'total_trades': total_trades,
-            'buy_sell_ratio': buy_volume / sell_volume if sell_volume > 0 else 0,
-            'buy_pressure': buy_volume / (buy_volume + sell_volume) if (buy_volume + sell_volume) > 0 else 0.5
-        }
+    interval_seconds = interval * 60
+    bars = (times // interval_seconds).astype(np.int64) * interval_seconds
+    bar_times, inverse = np.unique(bars, return_inverse=True)
+    n = len(bar_times)
 
-    except Exception as e:
-        print(f"Kraken trades error for {pair}: {e}")
+    return pd.DataFrame({
+        'bar_time': bar_times,
+        'buy_volume': np.bincount(inverse, weights=np.where(is_buy, volumes, 0.0), minlength=n),
+        'sell_volume': np.bincount(inverse, weights=np.where(is_buy, 0.0, volumes), minlength=n),
+        'buy_count': np.bincount(inverse, weights=is_buy, minlength=n).astype(np.int64),
+        'sell_count': np.bincount(inverse, weights=~is_buy, minlength=n).astype(np.int64)
+    })
+
+
+def kraken_trade_max_pages(pair):
+    return int(KRAKEN_TRADE_MAX_PAGES_BY_PAIR.get(pair, KRAKEN_TRADE_MAX_PAGES))
+
+
+def trade_cursor_lag_seconds(cursor, now=None):
+    """How far a trade-tape cursor (nanoseconds) is behind now; None without a cursor"""
+    if not cursor:
         return None
+    return max((now or time.time()) - int(cursor) / 1e9, 0.0)
+
+
+def fetch_kraken_trade_tape(pair, since, interval=1440, max_pages=KRAKEN_TRADE_MAX_PAGES,
+                            fetch_page=fetch_kraken_trades_page, page_delay=KRAKEN_TRADE_PAGE_DELAY,
+                            max_lag_seconds=None, deadline=None):
+    """
+    Follow Kraken's `since` cursor for up to max_pages pages and aggregate the
+    trades into per-bar buy/sell flow. With max_lag_seconds and deadline set,
+    paging continues past max_pages while the cursor is more than max_lag_seconds
+    behind now and time.time() < deadline, so a backlog drains across runs.
+
+    Returns (flow DataFrame, cursor to resume from, pages read). Stops early once
+    a short page shows the tape is caught up, or on an API error (the cursor then
+    points after the last page that was read). fetch_page(pair, since) ->
+    (trades, last) can be replaced to replay recorded pages.
+    """
+    cursor = since
+    pages = 0
+    parsed = []
+
+    def catching_up():
+        if max_lag_seconds is None or deadline is None or time.time() >= deadline:
+            return False
+        lag = trade_cursor_lag_seconds(cursor)
+        return lag is None or lag > max_lag_seconds
+
+    while pages < max_pages or catching_up():
+        try:
+            trades, last = fetch_page(pair, cursor)
+        except Exception as e:
+            print(f"  {pair}: trade tape stopped after {pages} pages: {e}")
+            break
+
+        pages += 1
+        if trades:
+            parsed.append(parse_kraken_trades(trades))
+
+        advanced = last > (cursor or 0)
+        if advanced:
+            cursor = last
+        if not advanced or len(trades) < KRAKEN_TRADE_PAGE_SIZE:
+            break
+        if page_delay:
+            time.sleep(page_delay)
+
+    if not parsed:
+        return aggregate_trade_flow(np.empty(0), np.empty(0), np.empty(0, dtype=bool), interval), cursor, pages
+
+    times, volumes, is_buy = (np.concatenate(arrays) for arrays in zip(*parsed))
+    return aggregate_trade_flow(times, volumes, is_buy, interval), cursor, pages
+
+
+def apply_trade_flow(ohlc_df, flow, interval=1440):
+    """Backfill buy/sell volume, counts, ratio and pressure onto every OHLC bar covered by flow"""
+    flow = flow.groupby('bar_time', as_index=False)[TRADE_FLOW_COLUMNS].sum()
+    flow['datetime'] = kraken_bar_labels(flow['bar_time'], interval)
+
+    stale = [c for c in TRADE_FLOW_COLUMNS + ['buy_sell_ratio', 'buy_pressure'] if c in ohlc_df.columns]
+    df = ohlc_df.drop(columns=stale).merge(
+        flow[['datetime'] + TRADE_FLOW_COLUMNS], on='datetime', how='left'
+    )
+
+    buy, sell = df['buy_volume'], df['sell_volume']
+    total = buy + sell
+    df['buy_sell_ratio'] = (buy / sell.where(sell > 0)).where(sell != 0, 0.0)
+    df['buy_pressure'] = (buy / total.where(total > 0)).where(total != 0, 0.5)
+    return df
 
 
-def fetch_kraken_full_data(pair):
-    """Fetch complete Kraken data: OHLCV + Buy/Sell Volume + Trade Count"""
+def fetch_kraken_full_data(pair, cursor=None, flow_history=None, deadline=None):
+    """
+    Fetch complete Kraken data: OHLCV + per-bar Buy/Sell Volume + Trade Count
+
+    Reads the trade tape from cursor (nanoseconds; defaults to
+    KRAKEN_TRADE_BACKFILL_DAYS ago) and combines it with flow_history (earlier
+    runs' buckets) so every bar with trade data gets buy/sell columns. A pair
+    more than KRAKEN_TRADE_MAX_LAG_HOURS behind keeps paging until deadline.
+    Returns (ohlc_df, new_flow, cursor); new_flow holds only this run's trades
+    and must be saved together with the cursor (save_trade_flow).
+    """
     try:
         # Get OHLC data
         ohlc_df = fetch_kraken_ohlc(pair)
         if ohlc_df is None or len(ohlc_df) == 0:
-            return None
+            return None, None, cursor
 
-        # Get recent trades for buy/sell breakdown
-        trades_data = fetch_kraken_trades(pair)
-
-        if trades_data:
-            # Add buy/sell metrics to most recent record
-            ohlc_df['buy_volume'] = np.nan
-            ohlc_df['sell_volume'] = np.nan
-            ohlc_df['buy_count'] = np.nan
-            ohlc_df['sell_count'] = np.nan
-            ohlc_df['buy_sell_ratio'] = np.nan
-            ohlc_df['buy_pressure'] = np.nan
-
-            # Most recent row gets the trade breakdown
-            if len(ohlc_df) > 0:
-                idx = ohlc_df.index[-1]
-                ohlc_df.loc[idx, 'buy_volume'] = trades_data['buy_volume']
-                ohlc_df.loc[idx, 'sell_volume'] = trades_data['sell_volume']
-                ohlc_df.loc[idx, 'buy_count'] = trades_data['buy_count']
-                ohlc_df.loc[idx, 'sell_count'] = trades_data['sell_count']
-                ohlc_df.loc[idx, 'buy_sell_ratio'] = trades_data['buy_sell_ratio']
-                ohlc_df.loc[idx, 'buy_pressure'] = trades_data['buy_pressure']
-
-        return ohlc_df
+        if not cursor:
+            backfill_start = datetime.now(timezone.utc) - timedelta(days=KRAKEN_TRADE_BACKFILL_DAYS)
+            cursor = int(backfill_start.timestamp()) * 1_000_000_000
+
+        new_flow, new_cursor, pages = fetch_kraken_trade_tape(
+            pair, cursor, max_pages=kraken_trade_max_pages(pair),
+            max_lag_seconds=KRAKEN_TRADE_MAX_LAG_HOURS * 3600, deadline=deadline)
+
+        history = [f for f in (flow_history, new_flow) if f is not None and len(f) > 0]
+        if history:
+            ohlc_df = apply_trade_flow(ohlc_df, pd.concat(history, ignore_index=True))
+
+        print(f"  {pair}: {len(new_flow)} bars from {pages} trade pages")
+        return ohlc_df, new_flow, new_cursor
 
     except Exception as e:
         print(f"Kraken full data error for {pair}: {e}")
-        return None
+        return None, None, cursor
 
 
 def fetch_fred_series(series_id, limit=5000):
@@ -816,6 +916,130 @@ def upload_with_dedup(client, df, table_name, symbol_col='symbol', date_col='dat
         return 0
 
 
+# =====================
+# KRAKEN TRADE FLOW STATE
+# =====================
+# kraken_trade_flow is append-only: every run writes the per-bar buckets of the
+# trades it read, stamped with the cursor it stopped at. The resume cursor is
+# MAX(cursor_end), so buckets and cursor are committed by the same load job and
+# a failed run simply re-reads its trades next time.
+
+def load_trade_flow_state(client, pairs, interval=1440, days=KRAKEN_OHLC_DAYS):
+    """Saved cursor per pair and per-bar flow history summed over earlier runs"""
+    table_id = f"{PROJECT_ID}.{DATASET_ID}.{KRAKEN_TRADE_FLOW_TABLE}"
+    pair_list = ', '.join(f"'{p}'" for p in pairs)
+    cursors = {}
+    history = pd.DataFrame(columns=['pair', 'bar_time'] + TRADE_FLOW_COLUMNS)
+
+    try:
+        query = f"""
+        SELECT pair, MAX(cursor_end) AS cursor
+        FROM `{table_id}`
+        WHERE pair IN ({pair_list}) AND interval_minutes = {interval}
+        GROUP BY pair
+        """
+        cursors = {row.pair: row.cursor for row in client.query(query).result()}
+
+        query = f"""
+        SELECT pair, UNIX_SECONDS(bar_time) AS bar_time,
+               SUM(buy_volume) AS buy_volume, SUM(sell_volume) AS sell_volume,
+               SUM(buy_count) AS buy_count, SUM(sell_count) AS sell_count
+        FROM `{table_id}`
+        WHERE pair IN ({pair_list}) AND interval_minutes = {interval}
+          AND bar_time >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL {days} DAY)
+        GROUP BY pair, bar_time
+        """
+        history = client.query(query).to_dataframe()
+        print(f"  Trade flow state: {len(cursors)} cursors, {len(history):,} bars")
+    except Exception as e:
+        print(f"  Trade flow state unavailable, backfilling from scratch: {e}")
+
+    return cursors, history
+
+
+def save_trade_flow(client, flows, interval=1440):
+    """Append this run's per-bar buckets; flows is [(pair, flow_df, cursor)]"""
+    frames = []
+    for pair, flow, cursor in flows:
+        if flow is None or len(flow) == 0:
+            continue
+        frame = flow.copy()
+        frame['pair'] = pair
+        frame['symbol'] = kraken_symbol(pair)
+        frame['cursor_end'] = int(cursor)
+        frames.append(frame)
+
+    if not frames:
+        return 0
+
+    df = pd.concat(frames, ignore_index=True)
+    df['bar_time'] = pd.to_datetime(df['bar_time'].astype(np.int64), unit='s', utc=True)
+    df['interval_minutes'] = interval
+    df['ingested_at'] = datetime.now(timezone.utc)
+
+    table_id = f"{PROJECT_ID}.{DATASET_ID}.{KRAKEN_TRADE_FLOW_TABLE}"
+    job_config = bigquery.LoadJobConfig(write_disposition=bigquery.WriteDisposition.WRITE_APPEND)
+    client.load_table_from_dataframe(df, table_id, job_config=job_config).result()
+    print(f"  Saved {len(df):,} trade flow buckets for {len(frames)} pairs")
+    return len(df)
+
+
+def backfill_trade_flow(client, since_bar_time):
+    """Rewrite buy/sell columns of stored Kraken daily bars from the accumulated flow"""
+    flow_table = f"{PROJECT_ID}.{DATASET_ID}.{KRAKEN_TRADE_FLOW_TABLE}"
+    crypto_table = f"{PROJECT_ID}.{DATASET_ID}.crypto_daily_clean"
+
+    query = f"""
+    UPDATE `{crypto_table}` t
+    SET buy_volume = f.buy_volume,
+        sell_volume = f.sell_volume,
+        buy_count = f.buy_count,
+        sell_count = f.sell_count,
+        buy_sell_ratio = IF(f.sell_volume > 0, f.buy_volume / f.sell_volume, 0),
+        buy_pressure = IF(f.buy_volume + f.sell_volume > 0,
+                          f.buy_volume / (f.buy_volume + f.sell_volume), 0.5)
+    FROM (
+        SELECT symbol, DATE(bar_time) AS bar_date,
+               SUM(buy_volume) AS buy_volume, SUM(sell_volume) AS sell_volume,
+               SUM(buy_count) AS buy_count, SUM(sell_count) AS sell_count
+        FROM `{flow_table}`
+        WHERE interval_minutes = 1440
+          AND bar_time >= TIMESTAMP_SECONDS({int(since_bar_time)})
+        GROUP BY symbol, bar_date
+    ) f
+    WHERE t.source = 'Kraken'
+      AND t.symbol = f.symbol
+      AND DATE(t.datetime) = f.bar_date
+    """
+
+    try:
+        job = client.query(query)
+        job.result()
+        updated = job.num_dml_affected_rows or 0
+        print(f"  Backfilled buy/sell volume on {updated:,} Kraken bars")
+        return updated
+    except Exception as e:
+        print(f"  Trade flow backfill error: {e}")
+        return 0
+
+
+# =====================
+# AGGREGATION TRIGGER
+# =====================
+
+def trigger_market_aggregates(params):
+    """Ask the market-aggregates function to refresh the summary tables for this batch"""
+    if not MARKET_AGGREGATES_URL:
+        return None
+    try:
+        response = requests.get(MARKET_AGGREGATES_URL, params=params, timeout=540)
+        print(f"  Market aggregates refreshed: HTTP {response.status_code}")
+        return response.json().get('status')
+    except Exception as e:
+        print(f"  Market aggregates trigger error: {e}")
+        return 'error'
+
+
 # =====================
 # MAIN CLOUD FUNCTION
 # =====================
@@ -886,9 +1110,26 @@ def multi_source_fetcher(request):
         # 3. KRAKEN - Crypto Volume Data (For MFI calculation + Buy/Sell Volume)
         # ===================
         print("\n=== FETCHING FROM KRAKEN (Crypto Volume + Buy/Sell Data) ===")
+        kraken_pairs = KRAKEN_CRYPTO_PAIRS[:20]  # Top 20 for volume
+        trade_cursors, flow_history = load_trade_flow_state(client, kraken_pairs)
         kraken_data = []
-        for pair in KRAKEN_CRYPTO_PAIRS[:20]:  # Top 20 for volume
-            df = fetch_kraken_full_data(pair)  # Now includes buy/sell volume
+        trade_flows = []
+        trade_deadline = time.time() + KRAKEN_TRADE_CATCHUP_SECONDS
+        results['kraken']['trade_cursor_lag_hours'] = {}
+        results['kraken']['trade_tape_behind'] = []
+        for pair in kraken_pairs:
+            pair_history = flow_history[flow_history['pair'] == pair] if len(flow_history) else None
+            df, new_flow, cursor = fetch_kraken_full_data(
+                pair, trade_cursors.get(pair), pair_history, deadline=trade_deadline)
+            trade_flows.append((pair, new_flow, cursor))
+
+            # Bars after the cursor have no buy/sell columns until the tape catches up
+            lag = trade_cursor_lag_seconds(cursor)
+            results['kraken']['trade_cursor_lag_hours'][pair] = round(lag / 3600, 2) if lag is not None else None
+            if lag is not None and lag > KRAKEN_TRADE_MAX_LAG_HOURS * 3600:
+                results['kraken']['trade_tape_behind'].append(pair)
+                print(f"  WARNING: {pair} trade tape is {lag / 3600:.1f}h behind "
+                      f"(limit {KRAKEN_TRADE_MAX_LAG_HOURS}h) - raise KRAKEN_TRADE_MAX_PAGES_BY_PAIR")
             if df is not None and len(df) > 0:
                 df['asset_type'] = 'CRYPTO'
                 df = calculate_indicators(df)  # Now has real volume for MFI
@@ -898,13 +1139,14 @@ def multi_source_fetcher(request):
 
                 # Log buy/sell data if available
                 if 'buy_volume' in df.columns and not df['buy_volume'].isna().all():
+                    covered = int(df['buy_volume'].notna().sum())
                     latest = df.iloc[-1]
-                    print(f"  {pair}: {len(df)} records | Buy: {latest.get('buy_volume', 0):.2f} | Sell: {latest.get('sell_volume', 0):.2f} | Trades: {latest.get('trade_count', 0)}")
+                    print(f"  {pair}: {len(df)} records | {covered} bars with buy/sell | Buy: {latest.get('buy_volume', 0):.2f} | Sell: {latest.get('sell_volume', 0):.2f} | Trades: {latest.get('trade_count', 0)}")
                 else:
                     print(f"  {pair}: {len(df)} records with volume")
             else:
                 results['kraken']['errors'] += 1
-            time.sleep(2.0)  # Kraken rate limiting (extra time for trades API)
+            time.sleep(KRAKEN_TRADE_PAGE_DELAY)  # Kraken rate limiting between pairs
 
         # Upload crypto data (combine TwelveData + Kraken volume data) with deduplication
         all_crypto = crypto_data + kraken_data
@@ -916,6 +1158,16 @@ def multi_source_fetcher(request):
             uploaded = upload_with_dedup(client, crypto_df, 'crypto_daily_clean')
             results['kraken']['records'] = uploaded
 
+        # Persist this run's trade buckets + cursors, then fill buy/sell on bars
+        # that were already stored (dedup above only inserts new bars)
+        new_bars = [flow['bar_time'].min() for _, flow, _ in trade_flows if flow is not None and len(flow)]
+        try:
+            results['kraken']['flow_buckets'] = save_trade_flow(client, trade_flows)
+            if new_bars:
+                results['kraken']['bars_backfilled'] = backfill_trade_flow(client, min(new_bars))
+        except Exception as e:
+            print(f"  Trade flow save error: {e}")
+
         # ===================
         # 4. TWELVEDATA - ETFs
         # ===================
@@ -1074,6 +1326,12 @@ def multi_source_fetcher(request):
                 results['coinmarketcap']['errors'] += 1
                 print(f"CMC upload error: {e}")
 
+        # ===================
+        # 8. Refresh latest-bar snapshots and summary aggregates for this batch
+        # ===================
+        results['aggregates'] = trigger_market_aggregates(
+            {'stages': 'snapshot,latest_bars,movers', 'timeframes': 'daily'})
+
         # ===================
         # Calculate totals
         # ===================
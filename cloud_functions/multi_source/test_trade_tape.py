@@ -0,0 +1,143 @@
+"""
+Tests for the Kraken trade-tape aggregation, replaying Kraken API pages from fixtures/kraken.
+HTTP is replaced by the fixture pages; run with: python -m pytest test_trade_tape.py
+"""
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+import main
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'kraken')
+PAIR = 'XXBTZUSD'
+START_CURSOR = 1767571200 * 1_000_000_000  # 2026-01-05 00:00 UTC
+FIXTURE_PAGE_SIZE = 4  # The fixture pages are full at 4 trades; the last page is short
+
+
+def load(name):
+    with open(os.path.join(FIXTURES, name)) as f:
+        return json.load(f)
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+
+def trade_pages():
+    """{since cursor: Trades response}, chained through each page's 'last'"""
+    pages, cursor = {}, START_CURSOR
+    for i in (1, 2, 3):
+        page = load(f'trades_{PAIR}_{i}.json')
+        pages[cursor] = page
+        cursor = int(page['result']['last'])
+    return pages
+
+
+@pytest.fixture
+def kraken(monkeypatch):
+    """Serve the recorded pages for /Trades and /OHLC; returns {since: response} overrides"""
+    pages = trade_pages()
+    overrides = {}
+
+    def get(url, params=None, timeout=None):
+        if url.endswith('/OHLC'):
+            return FakeResponse(load(f'ohlc_{PAIR}.json'))
+        since = int(params.get('since') or 0)
+        return FakeResponse(overrides.get(since) or pages[since])
+
+    monkeypatch.setattr(main.requests, 'get', get)
+    monkeypatch.setattr(main.time, 'sleep', lambda seconds: None)
+    monkeypatch.setattr(main, 'KRAKEN_TRADE_PAGE_SIZE', FIXTURE_PAGE_SIZE)
+    return overrides
+
+
+def flow_by_day(flow):
+    flow = flow.assign(day=main.kraken_bar_labels(flow['bar_time']))
+    return flow.set_index('day')[main.TRADE_FLOW_COLUMNS].to_dict('index')
+
+
+def test_replayed_pages_aggregate_into_daily_buy_sell_flow(kraken):
+    flow, cursor, pages = main.fetch_kraken_trade_tape(PAIR, START_CURSOR)
+
+    assert pages == 3
+    assert cursor == 1767690000600000000
+    days = flow_by_day(flow)
+    assert sorted(days) == ['2026-01-05', '2026-01-06']
+    assert days['2026-01-05']['buy_volume'] == pytest.approx(2.25)
+    assert days['2026-01-05']['sell_volume'] == pytest.approx(0.875)
+    assert (days['2026-01-05']['buy_count'], days['2026-01-05']['sell_count']) == (3, 3)
+    assert days['2026-01-06']['buy_volume'] == pytest.approx(2.25)
+    assert days['2026-01-06']['sell_volume'] == pytest.approx(2.25)
+    assert (days['2026-01-06']['buy_count'], days['2026-01-06']['sell_count']) == (2, 2)
+
+
+def test_resume_from_saved_cursor_reads_only_later_pages(kraken):
+    page_one_last = int(load(f'trades_{PAIR}_1.json')['result']['last'])
+    first, _, _ = main.fetch_kraken_trade_tape(PAIR, START_CURSOR, max_pages=1)
+    rest, cursor, pages = main.fetch_kraken_trade_tape(PAIR, page_one_last)
+
+    assert pages == 2
+    assert cursor == 1767690000600000000
+    # Resuming in two legs gives the same bars as one uninterrupted read
+    full, _, _ = main.fetch_kraken_trade_tape(PAIR, START_CURSOR)
+    combined = main.apply_trade_flow(
+        main.fetch_kraken_ohlc(PAIR), main.pd.concat([first, rest], ignore_index=True))
+    single = main.apply_trade_flow(main.fetch_kraken_ohlc(PAIR), full)
+    assert combined[main.TRADE_FLOW_COLUMNS].equals(single[main.TRADE_FLOW_COLUMNS])
+
+
+def test_api_error_keeps_cursor_after_last_page_read(kraken):
+    page_one_last = int(load(f'trades_{PAIR}_1.json')['result']['last'])
+    kraken[page_one_last] = load('trades_rate_limited.json')
+
+    flow, cursor, pages = main.fetch_kraken_trade_tape(PAIR, START_CURSOR)
+
+    assert pages == 1
+    assert cursor == page_one_last
+    assert flow_by_day(flow)['2026-01-05']['buy_count'] == 2
+
+
+def test_full_data_backfills_buy_sell_columns_onto_ohlc_bars(kraken):
+    ohlc, new_flow, cursor = main.fetch_kraken_full_data(PAIR, cursor=START_CURSOR)
+
+    assert cursor == 1767690000600000000
+    assert len(new_flow) == 2
+    bars = ohlc.set_index('datetime')
+    assert list(bars.index) == ['2026-01-04', '2026-01-05', '2026-01-06']
+    # No trades read for the first bar
+    assert np.isnan(bars.loc['2026-01-04', 'buy_volume'])
+    assert bars.loc['2026-01-05', 'buy_pressure'] == pytest.approx(2.25 / 3.125)
+    assert bars.loc['2026-01-05', 'buy_sell_ratio'] == pytest.approx(2.25 / 0.875)
+    assert bars.loc['2026-01-06', 'buy_pressure'] == pytest.approx(0.5)
+    assert bars.loc['2026-01-06', 'symbol'] == 'BTC'
+
+
+def test_lagging_cursor_keeps_paging_past_the_cap_within_budget(kraken):
+    # The fixture tape is months behind now, so it is over any small lag bound
+    flow, cursor, pages = main.fetch_kraken_trade_tape(
+        PAIR, START_CURSOR, max_pages=1, max_lag_seconds=3600, deadline=main.time.time() + 60)
+    assert (pages, cursor) == (3, 1767690000600000000)
+
+    # Budget spent, or cursor within the bound: stop at the cap
+    _, _, pages = main.fetch_kraken_trade_tape(
+        PAIR, START_CURSOR, max_pages=1, max_lag_seconds=3600, deadline=main.time.time() - 1)
+    assert pages == 1
+    _, _, pages = main.fetch_kraken_trade_tape(
+        PAIR, START_CURSOR, max_pages=1, max_lag_seconds=10 ** 10, deadline=main.time.time() + 60)
+    assert pages == 1
+
+
+def test_cursor_lag_and_per_pair_page_cap(monkeypatch):
+    assert main.trade_cursor_lag_seconds(1767690000600000000, now=1767693600.6) == pytest.approx(3600)
+    assert main.trade_cursor_lag_seconds(None) is None
+
+    monkeypatch.setattr(main, 'KRAKEN_TRADE_MAX_PAGES_BY_PAIR', {PAIR: 120})
+    assert main.kraken_trade_max_pages(PAIR) == 120
+    assert main.kraken_trade_max_pages('XETHZUSD') == main.KRAKEN_TRADE_MAX_PAGES
@@ -7,6 +7,7 @@ Robust Self-Healing Stock Data Fetcher for TwelveData $229 Plan
 - Covers NASDAQ 100, S&P 500, Russell 2000 top stocks
 """
 import functions_framework
+import os
 from google.cloud import bigquery
 from datetime import datetime, timezone, timedelta
 import requests
@@ -30,6 +31,17 @@ STOCKS_TABLE = "stocks_daily_clean"
 CRYPTO_TABLE = "crypto_daily_clean"
 PROGRESS_TABLE = "data_fetch_progress"
 
+# Incremental alert engine (API /api/alerts/ingest) - notified after each upload when set
+ALERTS_INGEST_URL = os.environ.get('ALERTS_INGEST_URL', '')
+ALERT_BAR_COLUMNS = [
+    'symbol', 'datetime', 'open', 'high', 'low', 'close', 'volume',
+    'rsi', 'macd', 'macd_signal', 'macd_histogram', 'adx', 'plus_di', 'minus_di',
+    'bollinger_upper', 'bollinger_lower', 'sma_20', 'sma_50',
+    'golden_cross', 'death_cross', 'cycle_type', 'cycle_pnl_pct',
+    'hammer', 'shooting_star', 'bullish_engulfing', 'bearish_engulfing', 'doji',
+    'trend_regime', 'buy_pressure_pct', 'sell_pressure_pct',
+]
+
 # TwelveData $229 Plan: 800 calls/min = ~13 calls/sec
 MAX_WORKERS = 8
 CALLS_PER_SECOND = 10
@@ -405,6 +417,24 @@ def upload_to_bigquery(client, df, table_id):
         return 0
 
 
+def publish_new_bars(df, asset_type):
+    """Send the latest uploaded bar per symbol to the alert engine (no-op if ALERTS_INGEST_URL unset)"""
+    if not ALERTS_INGEST_URL or df is None or df.empty:
+        return 0
+
+    try:
+        latest = df.sort_values('datetime').groupby('symbol').tail(1)
+        columns = [col for col in ALERT_BAR_COLUMNS if col in latest.columns]
+        bars = json.loads(latest[columns].to_json(orient='records', date_format='iso'))
+        response = requests.post(ALERTS_INGEST_URL, json={'asset_type': asset_type, 'bars': bars}, timeout=30)
+        alert_count = response.json().get('alert_count', 0) if response.ok else 0
+        logger.info(f"Published {len(bars)} {asset_type} bars to alert engine: {alert_count} new alerts")
+        return alert_count
+    except Exception as e:
+        logger.warning(f"Alert engine notification failed: {str(e)}")
+        return 0
+
+
 def fetch_all_parallel(symbols, asset_type='stock'):
     """Fetch all symbols in parallel with rate limiting"""
     results = []
@@ -458,6 +488,8 @@ def fetch_daily_data(request):
             if stock_dfs:
                 combined_stocks = pd.concat(stock_dfs, ignore_index=True)
                 records = upload_to_bigquery(client, combined_stocks, STOCKS_TABLE)
+                if records:
+                    publish_new_bars(combined_stocks, 'stocks')
                 results_summary['stocks'] = {
                     'fetched': len(stock_dfs),
                     'records': records,
@@ -473,6 +505,8 @@ def fetch_daily_data(request):
                 if retry_dfs:
                     combined_retry = pd.concat(retry_dfs, ignore_index=True)
                     retry_records = upload_to_bigquery(client, combined_retry, STOCKS_TABLE)
+                    if retry_records:
+                        publish_new_bars(combined_retry, 'stocks')
                     results_summary['stocks']['records'] += retry_records
                     results_summary['stocks']['failed'] -= len(retry_dfs)
 
@@ -484,6 +518,8 @@ def fetch_daily_data(request):
             if crypto_dfs:
                 combined_crypto = pd.concat(crypto_dfs, ignore_index=True)
                 records = upload_to_bigquery(client, combined_crypto, CRYPTO_TABLE)
+                if records:
+                    publish_new_bars(combined_crypto, 'crypto')
                 results_summary['crypto'] = {
                     'fetched': len(crypto_dfs),
                     'records': records,
@@ -1,11 +1,14 @@
 """
 Walk-Forward Validation Cloud Function - OPTIMIZED VERSION
 Cost-optimized ML prediction validation with:
-- Model caching (80% cost reduction)
+- Model caching (80% cost reduction), keyed by a fingerprint of the training
+  data and model options, with LRU cleanup of models and scratch tables
 - Batch predictions (30x fewer queries)
 - Quarterly retraining option (90% cost reduction)
 - Efficient feature selection
 - Progress batching (fewer status updates)
+- Per-(symbol, window) checkpoints with idempotent result writes, so a
+  timed-out run resumes (action=resume) without recomputing finished windows
 
 Supports:
 - 1-5 ticker validation
@@ -17,9 +20,13 @@ Supports:
 import functions_framework
 from flask import jsonify, request
 from google.cloud import bigquery
-from datetime import datetime, timedelta
+from google.api_core.exceptions import NotFound
+from datetime import datetime, timedelta, timezone
+import hashlib
 import uuid
 import json
+import time
+import os
 import traceback
 
 # Initialize client
@@ -44,6 +51,60 @@ ADVANCED_FEATURES = DEFAULT_FEATURES + [
     'price_vs_sma20', 'price_vs_sma50', 'price_vs_sma200'
 ]
 
+# Stop starting new windows after this long, below the function timeout
+RUN_TIME_BUDGET_SECONDS = int(os.environ.get('RUN_TIME_BUDGET_SECONDS', '480'))
+
+# walk_forward_daily_results / walk_forward_equity_curve columns written by a run
+RESULT_SCHEMA = [
+    bigquery.SchemaField('run_id', 'STRING'),
+    bigquery.SchemaField('prediction_date', 'DATE'),
+    bigquery.SchemaField('symbol', 'STRING'),
+    bigquery.SchemaField('predicted_direction', 'STRING'),
+    bigquery.SchemaField('actual_direction', 'STRING'),
+    bigquery.SchemaField('confidence', 'FLOAT64'),
+    bigquery.SchemaField('probability_up', 'FLOAT64'),
+    bigquery.SchemaField('probability_down', 'FLOAT64'),
+    bigquery.SchemaField('is_correct', 'BOOL'),
+    bigquery.SchemaField('open_price', 'FLOAT64'),
+    bigquery.SchemaField('close_price', 'FLOAT64'),
+    bigquery.SchemaField('actual_return', 'FLOAT64'),
+    bigquery.SchemaField('cumulative_return', 'FLOAT64'),
+    bigquery.SchemaField('model_version_id', 'STRING'),
+    bigquery.SchemaField('retrained', 'BOOL'),
+]
+
+EQUITY_SCHEMA = [
+    bigquery.SchemaField('run_id', 'STRING'),
+    bigquery.SchemaField('trade_date', 'DATE'),
+    bigquery.SchemaField('day_number', 'INT64'),
+    bigquery.SchemaField('equity_value', 'FLOAT64'),
+    bigquery.SchemaField('daily_return', 'FLOAT64'),
+    bigquery.SchemaField('cumulative_return', 'FLOAT64'),
+    bigquery.SchemaField('rolling_accuracy_30d', 'FLOAT64'),
+    bigquery.SchemaField('win_rate_to_date', 'FLOAT64'),
+    bigquery.SchemaField('trades_to_date', 'INT64'),
+]
+
+# Boosted tree options; part of the model cache fingerprint
+# Reduced iterations for faster training (20 vs 30)
+MODEL_OPTIONS = {
+    'max_iterations': 20,
+    'max_tree_depth': 4,
+    'subsample': 0.8,
+    'min_split_loss': 0.01,
+    'l1_reg': 0.1,
+    'l2_reg': 0.1,
+    'early_stop': True
+}
+
+# Model cache LRU limits and walk-forward scratch tables swept by cleanup_model_cache
+MODEL_CACHE_MAX_MODELS = int(os.environ.get('MODEL_CACHE_MAX_MODELS', '500'))
+MODEL_CACHE_MAX_IDLE_DAYS = int(os.environ.get('MODEL_CACHE_MAX_IDLE_DAYS', '14'))
+TEMP_TABLE_MAX_AGE_HOURS = 24
+TEMP_TABLE_PREFIXES = ('_temp_wf_train_', '_wf_results_staging_', '_wf_equity_staging_')
+
+_model_cache_ready = False
+
 # Retraining intervals (trading days)
 RETRAIN_INTERVALS = {
     'daily': 1,
@@ -76,36 +137,112 @@ def update_run_status(run_id, status, progress_pct=None, current_day=None, error
         print(f"Error updating status: {e}")
 
 
-def check_cached_model(symbol, train_end_date, features_mode):
-    """Check if a cached model exists for this symbol and date"""
-    # Look for recently trained model (within 7 days)
+def ensure_model_cache():
+    """Add the fingerprint / LRU columns to model_cache (once per instance)"""
+    global _model_cache_ready
+    if _model_cache_ready:
+        return
+    query = """
+    ALTER TABLE `aialgotradehits.ml_models.model_cache`
+    ADD COLUMN IF NOT EXISTS fingerprint STRING,
+    ADD COLUMN IF NOT EXISTS row_count INT64,
+    ADD COLUMN IF NOT EXISTS max_date DATE,
+    ADD COLUMN IF NOT EXISTS content_hash INT64,
+    ADD COLUMN IF NOT EXISTS hyperparameters STRING,
+    ADD COLUMN IF NOT EXISTS last_used_at TIMESTAMP,
+    ADD COLUMN IF NOT EXISTS hits INT64
+    """
+    client.query(query).result()
+    _model_cache_ready = True
+
+
+def training_fingerprint(symbol, train_end_date, features):
+    """
+    Fingerprint of the training slice and model options: row count, max date and an
+    order-independent content hash of the rows, plus the feature list and MODEL_OPTIONS.
+    A backfill or correction inside the slice changes it; the same slice in another run does not.
+    """
+    query = f"""
+    SELECT
+        COUNT(*) AS row_count,
+        MAX(trade_date) AS max_date,
+        BIT_XOR(FARM_FINGERPRINT(TO_JSON_STRING(t))) AS content_hash
+    FROM (
+        SELECT trade_date, {', '.join(features)}, direction_target
+        FROM `aialgotradehits.ml_models.walk_forward_features_16_mat`
+        WHERE symbol = '{symbol}'
+          AND trade_date < '{train_end_date}'
+          AND direction_target IS NOT NULL
+    ) t
+    """
+    row = list(client.query(query).result())[0]
+    slice_info = {
+        'row_count': row.row_count,
+        'max_date': str(row.max_date) if row.max_date else None,
+        'content_hash': row.content_hash
+    }
+    key = json.dumps({
+        'symbol': symbol, 'features': list(features), 'options': MODEL_OPTIONS, **slice_info
+    }, sort_keys=True)
+    return {'fingerprint': hashlib.sha256(key.encode()).hexdigest()[:16], **slice_info}
+
+
+def check_cached_model(symbol, train_end_date, features_mode, fingerprint):
+    """Model trained on exactly this slice, if cached; logs cached models the slice has outgrown"""
     query = f"""
-    SELECT model_name, created_at
+    SELECT model_name, fingerprint, row_count, max_date
     FROM `aialgotradehits.ml_models.model_cache`
-    WHERE symbol = '{symbol}'
-      AND train_end_date = '{train_end_date}'
-      AND features_mode = '{features_mode}'
-      AND created_at > TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 7 DAY)
+    WHERE fingerprint = '{fingerprint['fingerprint']}'
+       OR (symbol = '{symbol}' AND train_end_date = '{train_end_date}' AND features_mode = '{features_mode}')
     ORDER BY created_at DESC
-    LIMIT 1
     """
     try:
-        result = client.query(query).result()
-        rows = list(result)
-        if rows:
+        rows = list(client.query(query).result())
+    except Exception as e:
+        print(f"Cache lookup error: {e}")
+        return None
+
+    for row in rows:
+        if row.fingerprint == fingerprint['fingerprint']:
+            try:
+                client.get_model(f"aialgotradehits.ml_models.{row.model_name}")
+            except NotFound:
+                client.query(f"""
+                DELETE FROM `aialgotradehits.ml_models.model_cache` WHERE model_name = '{row.model_name}'
+                """).result()
+                continue
+            client.query(f"""
+            UPDATE `aialgotradehits.ml_models.model_cache`
+            SET last_used_at = CURRENT_TIMESTAMP(), hits = COALESCE(hits, 0) + 1
+            WHERE fingerprint = '{row.fingerprint}'
+            """).result()
             print(f"  Using cached model for {symbol}")
-            return rows[0].model_name
-    except:
-        pass
+            return row.model_name
+
+    for row in rows:
+        if row.fingerprint == fingerprint['fingerprint']:
+            continue
+        print(f"  Stale cached model for {symbol} ({row.model_name}): training data changed "
+              f"(rows {row.row_count} -> {fingerprint['row_count']}, max date {row.max_date} -> {fingerprint['max_date']})")
     return None
 
 
-def save_model_to_cache(symbol, train_end_date, features_mode, model_name):
-    """Save model reference to cache for reuse"""
+def save_model_to_cache(symbol, train_end_date, features_mode, model_name, fingerprint):
+    """Save model reference to cache for reuse (one row per fingerprint)"""
     query = f"""
-    INSERT INTO `aialgotradehits.ml_models.model_cache`
-    (symbol, train_end_date, features_mode, model_name, created_at)
-    VALUES ('{symbol}', '{train_end_date}', '{features_mode}', '{model_name}', CURRENT_TIMESTAMP())
+    MERGE `aialgotradehits.ml_models.model_cache` T
+    USING (SELECT '{fingerprint['fingerprint']}' AS fingerprint) S
+    ON T.fingerprint = S.fingerprint
+    WHEN MATCHED THEN UPDATE SET model_name = '{model_name}', last_used_at = CURRENT_TIMESTAMP()
+    WHEN NOT MATCHED THEN INSERT
+        (symbol, train_end_date, features_mode, model_name, created_at,
+         fingerprint, row_count, max_date, content_hash, hyperparameters, last_used_at, hits)
+    VALUES
+        ('{symbol}', '{train_end_date}', '{features_mode}', '{model_name}', CURRENT_TIMESTAMP(),
+         S.fingerprint, {fingerprint['row_count']},
+         {f"DATE '{fingerprint['max_date']}'" if fingerprint['max_date'] else 'NULL'},
+         {fingerprint['content_hash'] if fingerprint['content_hash'] is not None else 'NULL'},
+         '{json.dumps(MODEL_OPTIONS, sort_keys=True)}', CURRENT_TIMESTAMP(), 0)
     """
     try:
         client.query(query).result()
@@ -113,64 +250,107 @@ def save_model_to_cache(symbol, train_end_date, features_mode, model_name):
         print(f"Cache save error: {e}")
 
 
-def train_model_optimized(symbol, train_end_date, features, run_id=None, features_mode='default_16'):
-    """Train XGBoost model with caching and optimization"""
-
-    # Check cache first (80% cost savings)
-    cached_model = check_cached_model(symbol, train_end_date, features_mode)
-    if cached_model:
-        return cached_model
+def cleanup_model_cache(max_models=MODEL_CACHE_MAX_MODELS, max_idle_days=MODEL_CACHE_MAX_IDLE_DAYS):
+    """
+    LRU eviction: keep the max_models most recently used cached models that were used
+    within max_idle_days and delete the rest, along with uncached wf_model_* models and
+    walk-forward scratch tables older than TEMP_TABLE_MAX_AGE_HOURS.
+    """
+    dataset = 'aialgotradehits.ml_models'
+    now = datetime.now(timezone.utc)
+    query = f"""
+    SELECT model_name, MAX(COALESCE(last_used_at, created_at)) AS used_at
+    FROM `{dataset}.model_cache`
+    GROUP BY model_name
+    ORDER BY used_at DESC
+    """
+    rows = list(client.query(query).result())
+    cutoff = now - timedelta(days=max_idle_days)
+    keep = {row.model_name for row in rows[:max_models] if row.used_at and row.used_at >= cutoff}
+    evict = [row.model_name for row in rows if row.model_name not in keep]
+
+    for name in evict:
+        client.delete_model(f"{dataset}.{name}", not_found_ok=True)
+    if evict:
+        names = ', '.join(f"'{name}'" for name in evict)
+        client.query(f"DELETE FROM `{dataset}.model_cache` WHERE model_name IN ({names})").result()
+
+    # Models trained before fingerprinting (or whose cache row was lost)
+    orphans = [
+        m.model_id for m in client.list_models(dataset)
+        if m.model_id.startswith('wf_model_') and m.model_id not in keep
+        and m.model_id not in evict and m.modified and m.modified < cutoff
+    ]
+    for name in orphans:
+        client.delete_model(f"{dataset}.{name}", not_found_ok=True)
+
+    temp_cutoff = now - timedelta(hours=TEMP_TABLE_MAX_AGE_HOURS)
+    temp_tables = [
+        t.table_id for t in client.list_tables(dataset)
+        if t.table_id.startswith(TEMP_TABLE_PREFIXES) and t.created and t.created < temp_cutoff
+    ]
+    for name in temp_tables:
+        client.delete_table(f"{dataset}.{name}", not_found_ok=True)
+
+    print(f"Model cache cleanup: {len(evict)} evicted, {len(orphans)} orphan models, {len(temp_tables)} temp tables")
+    return {'models_kept': len(keep), 'models_evicted': len(evict),
+            'orphan_models_deleted': len(orphans), 'temp_tables_deleted': len(temp_tables)}
 
-    feature_cols = ', '.join(features)
-    unique_suffix = run_id[:8] if run_id else str(uuid.uuid4())[:8]
 
-    # Create temporary training data with unique name
-    train_query = f"""
-    CREATE OR REPLACE TABLE `aialgotradehits.ml_models._temp_wf_train_{symbol.lower()}_{unique_suffix}` AS
-    SELECT
-        {feature_cols},
-        direction_target as label
-    FROM `aialgotradehits.ml_models.walk_forward_features_16_mat`
-    WHERE symbol = '{symbol}'
-      AND trade_date < '{train_end_date}'
-      AND direction_target IS NOT NULL
+def train_model_optimized(symbol, train_end_date, features, run_id=None, features_mode='default_16'):
+    """
+    Train XGBoost model with caching and optimization.
+    Models are named and cached by training-data fingerprint, so an identical slice is
+    trained once across runs and a changed slice is never served a stale model.
+    Returns None when there are no training rows; fingerprint and training errors raise.
     """
-
     try:
-        client.query(train_query).result()
+        ensure_model_cache()
+        fingerprint = training_fingerprint(symbol, train_end_date, features)
     except Exception as e:
-        print(f"Error creating training data: {e}")
+        print(f"Error fingerprinting training data: {e}")
+        raise
+
+    if not fingerprint['row_count']:
+        print(f"  No training data for {symbol} before {train_end_date}")
         return None
 
-    # Train model with optimized settings
-    model_name = f"wf_model_{symbol.lower()}_{train_end_date.replace('-', '')}_{unique_suffix}"
+    # Check cache first (80% cost savings)
+    cached_model = check_cached_model(symbol, train_end_date, features_mode, fingerprint)
+    if cached_model:
+        return cached_model
+
+    feature_cols = ', '.join(features)
+    model_name = f"wf_model_{symbol.lower()}_{train_end_date.replace('-', '')}_{fingerprint['fingerprint'][:12]}"
+    options = ',\n        '.join(
+        f"{k}={str(v).upper() if isinstance(v, bool) else v}" for k, v in MODEL_OPTIONS.items())
 
-    # Reduced iterations for faster training (20 vs 30)
+    # Trains straight from the fingerprinted slice (no per-run temp table)
     model_query = f"""
     CREATE OR REPLACE MODEL `aialgotradehits.ml_models.{model_name}`
     OPTIONS(
         model_type='BOOSTED_TREE_CLASSIFIER',
         input_label_cols=['label'],
-        max_iterations=20,
-        max_tree_depth=4,
-        subsample=0.8,
-        min_split_loss=0.01,
-        l1_reg=0.1,
-        l2_reg=0.1,
         data_split_method='NO_SPLIT',
-        early_stop=TRUE
+        {options}
     ) AS
-    SELECT * FROM `aialgotradehits.ml_models._temp_wf_train_{symbol.lower()}_{unique_suffix}`
+    SELECT
+        {feature_cols},
+        direction_target as label
+    FROM `aialgotradehits.ml_models.walk_forward_features_16_mat`
+    WHERE symbol = '{symbol}'
+      AND trade_date < '{train_end_date}'
+      AND direction_target IS NOT NULL
     """
 
     try:
         client.query(model_query).result()
         # Save to cache for future reuse
-        save_model_to_cache(symbol, train_end_date, features_mode, model_name)
+        save_model_to_cache(symbol, train_end_date, features_mode, model_name, fingerprint)
         return model_name
     except Exception as e:
         print(f"Error training model: {e}")
-        return None
+        raise
 
 
 def batch_predictions(model_name, symbol, start_date, end_date, features):
@@ -225,11 +405,172 @@ def batch_predictions(model_name, symbol, start_date, end_date, features):
         return predictions
     except Exception as e:
         print(f"Batch prediction error: {e}")
-        return []
+        return None
+
+
+def get_checkpoints(run_id):
+    """{symbol: last completed window end date} for the run"""
+    query = f"""
+    SELECT symbol, last_date
+    FROM `aialgotradehits.ml_models.validation_checkpoints`
+    WHERE run_id = '{run_id}'
+    """
+    try:
+        return {row.symbol: str(row.last_date) for row in client.query(query).result()}
+    except Exception as e:
+        print(f"Checkpoint read error: {e}")
+    return {}
+
+
+def load_staging(name, rows, schema):
+    """Load rows into a scratch table (replacing it) for a MERGE; returns its table id"""
+    staging = f"aialgotradehits.ml_models.{name}"
+    job_config = bigquery.LoadJobConfig(
+        schema=schema,
+        write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE
+    )
+    client.load_table_from_json(rows, staging, job_config=job_config).result()
+    return staging
+
+
+def merge_statement(table, staging, keys, columns):
+    """MERGE staging rows into table on keys (re-running it leaves one row per key)"""
+    on = ' AND '.join(f"T.{k} = S.{k}" for k in keys)
+    updates = ', '.join(f"{c} = S.{c}" for c in columns if c not in keys)
+    return f"""
+    MERGE `{table}` T
+    USING `{staging}` S
+    ON {on}
+    WHEN MATCHED THEN UPDATE SET {updates}
+    WHEN NOT MATCHED THEN INSERT ({', '.join(columns)})
+    VALUES ({', '.join(f'S.{c}' for c in columns)});
+    """
+
+
+def save_window_results(run_id, symbol, rows, last_date):
+    """
+    Upsert one (symbol, window) of predictions keyed on (run_id, symbol, prediction_date)
+    and advance the symbol's checkpoint in the same transaction, so a window is either
+    fully recorded or redone on resume - never half-written or duplicated.
+    """
+    statements = []
+    if rows:
+        staging = load_staging(f"_wf_results_staging_{run_id}", rows, RESULT_SCHEMA)
+        statements.append(merge_statement(
+            'aialgotradehits.ml_models.walk_forward_daily_results', staging,
+            ['run_id', 'symbol', 'prediction_date'], [f.name for f in RESULT_SCHEMA]))
+
+    statements.append(f"""
+    MERGE `aialgotradehits.ml_models.validation_checkpoints` T
+    USING (SELECT '{run_id}' as run_id, '{symbol}' as symbol) S
+    ON T.run_id = S.run_id AND T.symbol = S.symbol
+    WHEN MATCHED THEN
+        UPDATE SET last_date = '{last_date}', predictions_saved = T.predictions_saved + {len(rows)},
+                   updated_at = CURRENT_TIMESTAMP()
+    WHEN NOT MATCHED THEN
+        INSERT (run_id, symbol, last_date, predictions_saved, updated_at)
+        VALUES ('{run_id}', '{symbol}', '{last_date}', {len(rows)}, CURRENT_TIMESTAMP());
+    """)
+
+    client.query(f"""
+    BEGIN TRANSACTION;
+    {''.join(statements)}
+    COMMIT TRANSACTION;
+    """).result()
+
+
+def load_run_results(run_id):
+    """Every saved prediction of the run, in date order"""
+    query = f"""
+    SELECT prediction_date, symbol, predicted_direction, is_correct, confidence, actual_return,
+           model_version_id
+    FROM `aialgotradehits.ml_models.walk_forward_daily_results`
+    WHERE run_id = '{run_id}'
+    ORDER BY prediction_date, symbol
+    """
+    return list(client.query(query).result())
+
+
+def finalize_walk_forward(run_id, trading_dates, retrain_interval, confidence_threshold):
+    """Run metrics and equity curve from the saved results (so resumed runs count every window once)"""
+    results = load_run_results(run_id)
+    batch_ends = [
+        min(start + retrain_interval, len(trading_dates))
+        for start in range(0, len(trading_dates), retrain_interval)
+    ]
+
+    equity_value = 10000.0
+    total_correct = total_predictions_count = 0
+    up_correct = up_total = down_correct = down_total = 0
+    high_conf_correct = high_conf_total = 0
+    equity_curve = []
+    daily_return = 0
+    position = 0
+
+    for day_number in batch_ends:
+        end_date = str(trading_dates[day_number - 1])
+        while position < len(results) and str(results[position].prediction_date) <= end_date:
+            row = results[position]
+            position += 1
+            total_predictions_count += 1
+            total_correct += bool(row.is_correct)
+            if row.predicted_direction == 'UP':
+                up_total += 1
+                up_correct += bool(row.is_correct)
+            else:
+                down_total += 1
+                down_correct += bool(row.is_correct)
+            if row.confidence is not None and row.confidence >= confidence_threshold:
+                high_conf_total += 1
+                high_conf_correct += bool(row.is_correct)
+            daily_return = row.actual_return or 0
+            equity_value *= (1 + daily_return)
+
+        if total_predictions_count > 0:
+            equity_curve.append({
+                'run_id': run_id,
+                'trade_date': end_date,
+                'day_number': day_number,
+                'equity_value': equity_value,
+                'daily_return': daily_return,
+                'cumulative_return': (equity_value - 10000) / 10000,
+                'rolling_accuracy_30d': total_correct / total_predictions_count,
+                'win_rate_to_date': total_correct / total_predictions_count,
+                'trades_to_date': total_predictions_count
+            })
+
+    if equity_curve:
+        try:
+            staging = load_staging(f"_wf_equity_staging_{run_id}", equity_curve, EQUITY_SCHEMA)
+            client.query(merge_statement(
+                'aialgotradehits.ml_models.walk_forward_equity_curve', staging,
+                ['run_id', 'trade_date'], [f.name for f in EQUITY_SCHEMA])).result()
+            print(f"Saved {len(equity_curve)} equity curve points")
+        except Exception as e:
+            print(f"Error saving equity curve: {e}")
+
+    for name in (f"_wf_results_staging_{run_id}", f"_wf_equity_staging_{run_id}"):
+        client.delete_table(f"aialgotradehits.ml_models.{name}", not_found_ok=True)
+
+    return {
+        'equity_value': equity_value,
+        'total_predictions': total_predictions_count,
+        'total_correct': total_correct,
+        'up_total': up_total,
+        'up_correct': up_correct,
+        'down_total': down_total,
+        'down_correct': down_correct,
+        'high_conf_total': high_conf_total,
+        'high_conf_correct': high_conf_correct
+    }
 
 
 def run_walk_forward_optimized(config):
-    """Execute optimized walk-forward validation with batching"""
+    """
+    Execute optimized walk-forward validation with batching.
+    Each (symbol, window) is saved with its checkpoint as it completes; re-running
+    the same run_id (action=resume) skips the completed ones.
+    """
     run_id = config['run_id']
     symbols = config['symbols'].split(',') if isinstance(config['symbols'], str) else config['symbols']
     test_start = config['test_start']
@@ -277,51 +618,65 @@ def run_walk_forward_optimized(config):
 
     print(f"Trading dates: {len(trading_dates)} (from {trading_dates[0]} to {trading_dates[-1]})")
 
-    # Initialize results
-    all_predictions = []
-    equity_curve = []
+    # Resume: completed windows per symbol, the equity their saved results reached, and
+    # each symbol's latest model (the fallback when a window has no training rows)
+    checkpoints = get_checkpoints(run_id)
     equity_value = 10000.0
+    model_cache = {}
+    if checkpoints:
+        for row in load_run_results(run_id):
+            equity_value *= (1 + (row.actual_return or 0))
+            if row.model_version_id:
+                model_cache[row.symbol] = row.model_version_id
+        print(f"Resuming: {checkpoints}")
 
-    total_correct = 0
-    total_predictions_count = 0
-    up_correct = 0
-    up_total = 0
-    down_correct = 0
-    down_total = 0
-    high_conf_correct = 0
-    high_conf_total = 0
+    started = time.time()
 
     # Process in batches by retraining period
     batch_start_idx = 0
-    model_cache = {}
 
     while batch_start_idx < len(trading_dates):
         batch_end_idx = min(batch_start_idx + retrain_interval, len(trading_dates))
         batch_start_date = trading_dates[batch_start_idx]
         batch_end_date = trading_dates[batch_end_idx - 1]
 
+        pending = [s for s in symbols if checkpoints.get(s, '') < str(batch_end_date)]
+        if not pending:
+            batch_start_idx = batch_end_idx
+            continue
+
+        if time.time() - started > RUN_TIME_BUDGET_SECONDS:
+            # Stop between windows before the function times out; action=resume continues from here
+            progress_pct = (batch_start_idx / len(trading_dates)) * 100
+            update_run_status(run_id, 'paused', progress_pct, batch_start_idx)
+            print(f"Time budget reached - paused at day {batch_start_idx}")
+            return {'run_id': run_id, 'status': 'paused', 'progress_pct': progress_pct}
+
         progress_pct = (batch_end_idx / len(trading_dates)) * 100
         update_run_status(run_id, 'running', progress_pct, batch_end_idx)
         print(f"  Processing days {batch_start_idx + 1}-{batch_end_idx}/{len(trading_dates)} ({progress_pct:.1f}%)")
 
-        for symbol in symbols:
+        for symbol in pending:
             # Train model once per batch (or use cached)
             train_end = (batch_start_date - timedelta(days=1)).strftime('%Y-%m-%d')
 
-            if symbol not in model_cache:
+            try:
                 model_name = train_model_optimized(symbol, train_end, features, run_id, features_mode)
-                if model_name:
-                    model_cache[symbol] = model_name
-                else:
-                    continue
-            else:
-                # Check if we need to retrain
-                model_name = train_model_optimized(symbol, train_end, features, run_id, features_mode)
-                if model_name:
-                    model_cache[symbol] = model_name
-
+            except Exception:
+                # Nothing of this window was saved; pause so the run is not finalized with gaps
+                update_run_status(run_id, 'paused', error_message=f'Training failed for {symbol}; resume to retry')
+                return {'run_id': run_id, 'status': 'paused', 'error': f'Training failed for {symbol}'}
+            if model_name:
+                model_cache[symbol] = model_name
             model_name = model_cache.get(symbol)
             if not model_name:
+                # No training rows and no earlier model: record the window as empty
+                try:
+                    save_window_results(run_id, symbol, [], str(batch_end_date))
+                except Exception as e:
+                    print(f"Error saving {symbol} results: {e}")
+                    update_run_status(run_id, 'paused', error_message='Results not saved; resume to retry')
+                    return {'run_id': run_id, 'status': 'paused', 'error': str(e)}
                 continue
 
             # Batch predict entire period at once (30x fewer queries)
@@ -330,30 +685,17 @@ def run_walk_forward_optimized(config):
                 str(batch_start_date), str(batch_end_date),
                 features
             )
+            if batch_preds is None:
+                # Nothing of this window was saved; pause so the run is not finalized with gaps
+                update_run_status(run_id, 'paused', error_message=f'Prediction failed for {symbol}; resume to retry')
+                return {'run_id': run_id, 'status': 'paused', 'error': f'Prediction failed for {symbol}'}
 
+            rows = []
             for pred in batch_preds:
                 actual_direction = 1 if pred['next_close'] > pred['close'] else 0
                 is_correct = pred['predicted'] == actual_direction
                 confidence = max(pred['probability_up'], pred['probability_down'])
 
-                total_predictions_count += 1
-                if is_correct:
-                    total_correct += 1
-
-                if pred['predicted'] == 1:
-                    up_total += 1
-                    if is_correct:
-                        up_correct += 1
-                else:
-                    down_total += 1
-                    if is_correct:
-                        down_correct += 1
-
-                if confidence >= confidence_threshold:
-                    high_conf_total += 1
-                    if is_correct:
-                        high_conf_correct += 1
-
                 # Calculate return
                 if pred['predicted'] == 1:
                     daily_return = (pred['next_close'] - pred['close']) / pred['close']
@@ -362,7 +704,7 @@ def run_walk_forward_optimized(config):
 
                 equity_value *= (1 + daily_return)
 
-                all_predictions.append({
+                rows.append({
                     'run_id': run_id,
                     'prediction_date': pred['date'],
                     'symbol': symbol,
@@ -380,23 +722,25 @@ def run_walk_forward_optimized(config):
                     'retrained': batch_start_idx == 0 or (batch_start_idx % retrain_interval == 0)
                 })
 
-        # Add equity curve point for batch end
-        if total_predictions_count > 0:
-            equity_curve.append({
-                'run_id': run_id,
-                'trade_date': str(batch_end_date),
-                'day_number': batch_end_idx,
-                'equity_value': equity_value,
-                'daily_return': daily_return if 'daily_return' in dir() else 0,
-                'cumulative_return': (equity_value - 10000) / 10000,
-                'rolling_accuracy_30d': total_correct / total_predictions_count,
-                'win_rate_to_date': total_correct / total_predictions_count,
-                'trades_to_date': total_predictions_count
-            })
+            try:
+                save_window_results(run_id, symbol, rows, str(batch_end_date))
+            except Exception as e:
+                # Nothing of this window was committed; resume redoes it
+                print(f"Error saving {symbol} results: {e}")
+                update_run_status(run_id, 'paused', error_message='Results not saved; resume to retry')
+                return {'run_id': run_id, 'status': 'paused', 'error': str(e)}
 
         batch_start_idx = batch_end_idx
 
-    # Calculate final metrics
+    # Calculate final metrics from everything saved under this run_id
+    totals = finalize_walk_forward(run_id, trading_dates, retrain_interval, confidence_threshold)
+    equity_value = totals['equity_value']
+    total_predictions_count = totals['total_predictions']
+    total_correct = totals['total_correct']
+    up_total, up_correct = totals['up_total'], totals['up_correct']
+    down_total, down_correct = totals['down_total'], totals['down_correct']
+    high_conf_total, high_conf_correct = totals['high_conf_total'], totals['high_conf_correct']
+
     overall_accuracy = total_correct / total_predictions_count if total_predictions_count > 0 else 0
     up_accuracy = up_correct / up_total if up_total > 0 else 0
     down_accuracy = down_correct / down_total if down_total > 0 else 0
@@ -414,32 +758,6 @@ def run_walk_forward_optimized(config):
     print(f"Total Return: {total_return:.1%}")
     print(f"Final Equity: ${equity_value:,.2f}")
 
-    # Batch insert predictions
-    if all_predictions:
-        try:
-            table_id = 'aialgotradehits.ml_models.walk_forward_daily_results'
-            # Insert in batches of 500 for efficiency
-            for i in range(0, len(all_predictions), 500):
-                batch = all_predictions[i:i+500]
-                errors = client.insert_rows_json(table_id, batch)
-                if errors:
-                    print(f"Errors inserting predictions batch: {errors[:2]}")
-            print(f"Inserted {len(all_predictions)} predictions")
-        except Exception as e:
-            print(f"Error inserting predictions: {e}")
-
-    # Insert equity curve
-    if equity_curve:
-        try:
-            table_id = 'aialgotradehits.ml_models.walk_forward_equity_curve'
-            errors = client.insert_rows_json(table_id, equity_curve)
-            if errors:
-                print(f"Errors inserting equity curve: {errors[:2]}")
-            else:
-                print(f"Inserted {len(equity_curve)} equity curve points")
-        except Exception as e:
-            print(f"Error inserting equity curve: {e}")
-
     # Update run with final metrics
     final_update = f"""
     UPDATE `aialgotradehits.ml_models.walk_forward_runs`
@@ -464,6 +782,11 @@ def run_walk_forward_optimized(config):
     """
     client.query(final_update).result()
 
+    try:
+        cleanup_model_cache()
+    except Exception as e:
+        print(f"Model cache cleanup error: {e}")
+
     return {
         'run_id': run_id,
         'status': 'completed',
@@ -596,6 +919,41 @@ def walk_forward_validation(request):
             result = run_walk_forward_optimized(config)
             return jsonify(result), 200, headers
 
+        elif action == 'resume':
+            run_id = data.get('run_id')
+            if not run_id:
+                return jsonify({'error': 'run_id required'}), 400, headers
+
+            # Get existing run config
+            query = f"""
+            SELECT symbols, test_start, walk_forward_days, retrain_frequency,
+                   features_mode, confidence_threshold
+            FROM `aialgotradehits.ml_models.walk_forward_runs`
+            WHERE run_id = '{run_id}'
+            """
+            rows = list(client.query(query).result())
+            if not rows:
+                return jsonify({'error': 'Run not found'}), 404, headers
+
+            row = rows[0]
+            config = {
+                'run_id': run_id,
+                'symbols': row.symbols,
+                'test_start': str(row.test_start),
+                'walk_forward_days': row.walk_forward_days,
+                'retrain_frequency': row.retrain_frequency,
+                'features_mode': row.features_mode,
+                'confidence_threshold': row.confidence_threshold if row.confidence_threshold is not None else 0.5
+            }
+
+            result = run_walk_forward_optimized(config)
+            return jsonify(result), 200, headers
+
+        elif action == 'cleanup':
+            max_models = int(data.get('max_models', MODEL_CACHE_MAX_MODELS))
+            max_idle_days = int(data.get('max_idle_days', MODEL_CACHE_MAX_IDLE_DAYS))
+            return jsonify(cleanup_model_cache(max_models, max_idle_days)), 200, headers
+
         elif action == 'cancel':
             run_id = data.get('run_id')
             if not run_id:
@@ -21,6 +21,7 @@ from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass, asdict
 from enum import Enum
 from google.cloud import bigquery
+from google.api_core.exceptions import NotFound
 import logging
 
 # Configure logging
@@ -609,28 +610,20 @@ class OrchestratorAgent(BaseAgent):
         )
 
     async def screen_hot_stocks(self, min_growth_score: int = 50, limit: int = 20) -> List[Dict]:
-        """Screen for high growth score opportunities"""
-
-        query = f"""
-        SELECT
-            symbol,
-            growth_score,
-            rsi,
-            macd_histogram,
-            ema_12,
-            ema_26,
-            close,
-            volume,
-            pivot_low_flag,
-            pivot_high_flag,
-            sentiment_score,
-            recommendation
-        FROM `{PROJECT_ID}.{DATASET_ID}.stocks_daily_clean`
-        WHERE DATE(datetime) >= DATE_SUB(CURRENT_DATE(), INTERVAL 3 DAY)
-          AND growth_score >= @min_score
-        ORDER BY growth_score DESC, datetime DESC
-        LIMIT @limit
         """
+        Screen for high growth score opportunities (latest bar per symbol).
+        Reads the latest_stocks_daily snapshot; if it does not exist yet, falls back
+        to a ROW_NUMBER scan of stocks_daily_clean.
+        """
+        recent = "DATE(datetime) >= DATE_SUB(CURRENT_DATE(), INTERVAL 3 DAY)"
+        sources = [
+            f"`{PROJECT_ID}.{DATASET_ID}.latest_stocks_daily`",
+            f"""(
+            SELECT * FROM `{PROJECT_ID}.{DATASET_ID}.stocks_daily_clean`
+            WHERE {recent}
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY datetime DESC) = 1
+        )"""
+        ]
 
         job_config = bigquery.QueryJobConfig(
             query_parameters=[
@@ -639,12 +632,37 @@ class OrchestratorAgent(BaseAgent):
             ]
         )
 
-        try:
-            df = self.client.query(query, job_config=job_config).to_dataframe()
-            return df.to_dict('records')
-        except Exception as e:
-            self.logger.error(f"Error screening stocks: {e}")
-            return []
+        for source in sources:
+            query = f"""
+            SELECT
+                symbol,
+                growth_score,
+                rsi,
+                macd_histogram,
+                ema_12,
+                ema_26,
+                close,
+                volume,
+                pivot_low_flag,
+                pivot_high_flag,
+                sentiment_score,
+                recommendation
+            FROM {source}
+            WHERE {recent}
+              AND growth_score >= @min_score
+            ORDER BY growth_score DESC, datetime DESC
+            LIMIT @limit
+            """
+            try:
+                df = self.client.query(query, job_config=job_config).to_dataframe()
+                return df.to_dict('records')
+            except NotFound as e:
+                self.logger.error(f"latest_stocks_daily snapshot unavailable ({e}) - "
+                                  f"falling back to a full latest-bar scan of stocks_daily_clean")
+            except Exception as e:
+                self.logger.error(f"Error screening stocks: {e}")
+                return []
+        return []
 
     async def run_full_analysis(self, symbols: List[str] = None) -> Dict[str, CombinedSignal]:
         """Run full analysis on multiple symbols"""
@@ -0,0 +1,231 @@
+"""
+Portfolio Risk Engine
+Vectorized risk analytics for the RiskManagerAgent
+
+Keeps a rolling daily returns matrix for the tradable universe in memory so
+that covariance, VaR / expected shortfall, correlation and sector exposure are
+computed with NumPy instead of one BigQuery query per candidate trade.
+"""
+
+import os
+import re
+import time
+import logging
+import threading
+from statistics import NormalDist
+from typing import Dict, Any, List, Optional, Callable, Iterable
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+RISK_LOOKBACK_DAYS = int(os.environ.get('RISK_LOOKBACK_DAYS', 252))
+RISK_CACHE_TTL_SECONDS = int(os.environ.get('RISK_CACHE_TTL_SECONDS', 900))
+MIN_RETURN_OBSERVATIONS = 20
+
+SYMBOL_PATTERN = re.compile(r'^[A-Za-z0-9.\-/^=]{1,20}$')
+
+
+class PortfolioRiskEngine:
+    """
+    Cached returns matrix (dates x symbols) plus latest ATR / close / sector.
+
+    Symbols are loaded on demand: the first request for a set of symbols costs a
+    single query, later requests only fetch symbols that are not cached yet. The
+    whole universe is reloaded once the cache is older than ttl_seconds.
+    """
+
+    def __init__(
+        self,
+        query_fn: Callable[[str], List[Dict[str, Any]]],
+        table: str,
+        lookback_days: int = RISK_LOOKBACK_DAYS,
+        ttl_seconds: int = RISK_CACHE_TTL_SECONDS
+    ):
+        self.query_fn = query_fn
+        self.table = table
+        self.lookback_days = lookback_days
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()
+        self._closes = pd.DataFrame()
+        self._latest: Dict[str, Dict[str, Any]] = {}
+        self._missing = set()
+        self._loaded_at = 0.0
+
+        self.symbols: List[str] = []
+        self.returns = np.empty((0, 0))
+        self.queries = 0
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+
+    def _fetch(self, symbols: List[str]) -> List[Dict[str, Any]]:
+        symbol_list = ', '.join(f"'{s}'" for s in symbols)
+        # Calendar days so the window covers lookback_days trading sessions
+        calendar_days = int(self.lookback_days * 1.5) + 10
+
+        query = f"""
+        SELECT symbol, DATE(datetime) AS date, close, atr, sector
+        FROM `{self.table}`
+        WHERE symbol IN ({symbol_list})
+          AND datetime >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL {calendar_days} DAY)
+        ORDER BY symbol, date
+        """
+        self.queries += 1
+        return self.query_fn(query)
+
+    def ensure(self, symbols: Iterable[str]) -> None:
+        """Make sure every requested symbol is in the matrix (one query at most)"""
+        requested = {s for s in symbols if s and SYMBOL_PATTERN.match(s)}
+
+        with self._lock:
+            expired = time.time() - self._loaded_at > self.ttl_seconds
+            if expired:
+                to_fetch = requested | set(self._latest)
+            else:
+                to_fetch = requested - set(self._latest) - self._missing
+
+            if not to_fetch:
+                return
+
+            rows = self._fetch(sorted(to_fetch))
+            frame = pd.DataFrame(rows, columns=['symbol', 'date', 'close', 'atr', 'sector'])
+            frame = frame.dropna(subset=['close'])
+
+            closes = frame.pivot_table(index='date', columns='symbol', values='close', aggfunc='last')
+            latest = frame.groupby('symbol').last()
+
+            if expired:
+                self._closes = closes
+                self._latest = {}
+                self._missing = set()
+            else:
+                self._closes = self._closes.combine_first(closes) if not self._closes.empty else closes
+
+            for symbol, row in latest.iterrows():
+                self._latest[symbol] = {
+                    'close': float(row['close']),
+                    'atr': float(row['atr']) if pd.notna(row['atr']) else None,
+                    'sector': row['sector'] if pd.notna(row['sector']) else None
+                }
+            self._missing |= to_fetch - set(latest.index)
+
+            self._closes = self._closes.sort_index().tail(self.lookback_days + 1)
+            self.symbols = list(self._closes.columns)
+            self.returns = self._closes.pct_change(fill_method=None).iloc[1:].to_numpy(dtype=float)
+            if expired or not self._loaded_at:
+                self._loaded_at = time.time()
+
+            logger.info(
+                f"Risk engine loaded {len(to_fetch)} symbols "
+                f"({len(self.symbols)} cached, {self.returns.shape[0]} days)"
+            )
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def column_index(self, symbols: List[str]) -> np.ndarray:
+        """Column of each symbol in the returns matrix (-1 when unknown)"""
+        lookup = {s: i for i, s in enumerate(self.symbols)}
+        return np.array([lookup.get(s, -1) for s in symbols], dtype=int)
+
+    def latest(self, symbols: List[str], field: str) -> List[Any]:
+        return [self._latest.get(s, {}).get(field) for s in symbols]
+
+    def latest_atr(self, symbols: List[str]) -> np.ndarray:
+        return np.array([np.nan if v is None else v for v in self.latest(symbols, 'atr')], dtype=float)
+
+    def _weights(self, symbols: List[str], exposures: np.ndarray) -> np.ndarray:
+        """Dense weight vector over the cached universe; unknown symbols are dropped"""
+        weights = np.zeros(len(self.symbols))
+        cols = self.column_index(symbols)
+        known = cols >= 0
+        np.add.at(weights, cols[known], exposures[known])
+        return weights
+
+    # ------------------------------------------------------------------
+    # Analytics
+    # ------------------------------------------------------------------
+
+    def covariance(self, symbols: List[str]) -> np.ndarray:
+        """Pairwise-complete covariance of daily returns for the given symbols"""
+        cols = self.column_index(symbols)
+        sub = np.full((self.returns.shape[0], len(symbols)), np.nan)
+        known = cols >= 0
+        if self.returns.size:
+            sub[:, known] = self.returns[:, cols[known]]
+
+        mask = np.isfinite(sub).astype(float)
+        mean = np.nansum(sub, axis=0) / np.maximum(mask.sum(axis=0), 1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            centered = np.nan_to_num(sub - mean)
+            counts = mask.T @ mask
+            cov = (centered.T @ centered) / (counts - 1)
+        cov[counts < MIN_RETURN_OBSERVATIONS] = np.nan
+        return cov
+
+    def correlation(self, symbols: List[str]) -> np.ndarray:
+        cov = self.covariance(symbols)
+        std = np.sqrt(np.diag(cov))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return cov / np.outer(std, std)
+
+    def scenario_risk(self, weight_matrix: np.ndarray, confidence: float = 0.95) -> Dict[str, np.ndarray]:
+        """
+        Historical and parametric VaR / expected shortfall for K weight vectors
+        at once. weight_matrix is (universe x K), returned values are fractions
+        of portfolio value per scenario.
+        """
+        k = weight_matrix.shape[1]
+        if self.returns.shape[0] < MIN_RETURN_OBSERVATIONS:
+            empty = np.full(k, np.nan)
+            return {'var': empty, 'es': empty, 'parametric_var': empty, 'volatility': empty}
+
+        pnl = np.nan_to_num(self.returns) @ weight_matrix          # T x K
+        cutoff = np.quantile(pnl, 1 - confidence, axis=0)
+        tail = pnl <= cutoff
+        es = -(np.where(tail, pnl, 0).sum(axis=0) / np.maximum(tail.sum(axis=0), 1))
+
+        volatility = pnl.std(axis=0, ddof=1)
+        z = NormalDist().inv_cdf(confidence)
+
+        return {
+            'var': -cutoff,
+            'es': es,
+            'parametric_var': z * volatility,
+            'volatility': volatility
+        }
+
+    def portfolio_risk(
+        self,
+        symbols: List[str],
+        exposures: np.ndarray,
+        portfolio_value: float,
+        confidence: float = 0.95
+    ) -> Dict[str, Any]:
+        """VaR / ES of the current book in dollars and percent of portfolio"""
+        weights = self._weights(symbols, exposures / portfolio_value)
+        risk = self.scenario_risk(weights[:, None], confidence)
+        covered = float(np.abs(exposures[self.column_index(symbols) >= 0]).sum())
+
+        result = {'confidence': confidence, 'coverage_pct': 0.0}
+        if np.abs(exposures).sum() > 0:
+            result['coverage_pct'] = round(covered / float(np.abs(exposures).sum()) * 100, 1)
+        for key, values in risk.items():
+            value = float(values[0])
+            result[f'{key}_pct'] = round(value * 100, 3) if np.isfinite(value) else None
+            result[key] = round(value * portfolio_value, 2) if np.isfinite(value) else None
+        return result
+
+    def sector_exposure(self, sectors: List[Optional[str]], values: np.ndarray) -> Dict[str, float]:
+        labels = np.array([s or 'Unknown' for s in sectors], dtype=object)
+        if not len(labels):
+            return {}
+        names, inverse = np.unique(labels, return_inverse=True)
+        totals = np.bincount(inverse, weights=values, minlength=len(names))
+        return {str(name): float(total) for name, total in zip(names, totals)}
+
@@ -6,7 +6,12 @@ Monitors and manages trading risk, position sizing, and portfolio exposure
 import logging
 from typing import Dict, Any, List, Optional
 from datetime import datetime
+
+import numpy as np
+
 from .base_agent import BaseAgent, AgentPriority
+from .risk_engine import PortfolioRiskEngine, RISK_LOOKBACK_DAYS
+from ..backtest.engine import stop_levels as vector_stop_levels
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +27,7 @@ class RiskManagerAgent(BaseAgent):
     - Exposure monitoring
     - Drawdown tracking
     - Risk/reward analysis
+    - Correlation, VaR and expected shortfall (vectorized, see risk_engine)
     """
 
     def __init__(
@@ -40,7 +46,10 @@ class RiskManagerAgent(BaseAgent):
             'max_drawdown_threshold': 10.0,     # Alert if drawdown exceeds 10%
             'volatility_adjustment': True,      # Adjust position size for volatility
             'atr_multiplier_stop': 2.0,         # ATR multiplier for stop loss
-            'atr_multiplier_target': 4.0        # ATR multiplier for take profit
+            'atr_multiplier_target': 4.0,       # ATR multiplier for take profit
+            'max_portfolio_var_pct': 3.0,       # Max 1-day VaR as % of portfolio
+            'var_confidence': 0.95,             # VaR / expected shortfall confidence
+            'risk_lookback_days': RISK_LOOKBACK_DAYS
         }
 
         merged_config = {**default_config, **(config or {})}
@@ -55,6 +64,12 @@ class RiskManagerAgent(BaseAgent):
         self.risk_alerts: List[Dict[str, Any]] = []
         self.position_history: List[Dict[str, Any]] = []
 
+        self.risk_engine = PortfolioRiskEngine(
+            self.query_bigquery,
+            f"{self.PROJECT_ID}.{self.DATASET_ID}.v2_stocks_daily",
+            lookback_days=self.config['risk_lookback_days']
+        )
+
     def calculate_position_size(
         self,
         portfolio_value: float,
@@ -142,98 +157,226 @@ class RiskManagerAgent(BaseAgent):
     def assess_trade_risk(
         self,
         signal: Dict[str, Any],
-        portfolio_value: float = 100000
+        portfolio_value: float = 100000,
+        positions: Optional[List[Dict[str, Any]]] = None
     ) -> Dict[str, Any]:
         """Assess the risk of a potential trade"""
+        return self.assess_trades([signal], portfolio_value, positions)[0]
 
-        symbol = signal.get('symbol')
-        price = signal.get('price')
-        confidence = signal.get('confidence', 0)
-        direction = signal.get('direction', 'long')
+    def assess_trades(
+        self,
+        signals: List[Dict[str, Any]],
+        portfolio_value: float = 100000,
+        positions: Optional[List[Dict[str, Any]]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Assess a batch of candidate trades in one pass.
+
+        ATR, returns and sectors for all candidates and current holdings come
+        from the risk engine cache (a single query for symbols not cached yet).
+        Each candidate is scored independently against the current book.
+        """
+        positions = positions or []
+        assessments: List[Optional[Dict[str, Any]]] = [None] * len(signals)
+
+        valid = [i for i, sig in enumerate(signals) if sig.get('price')]
+        for i in set(range(len(signals))) - set(valid):
+            assessments[i] = {'error': 'No price data', 'approved': False}
+        if not valid:
+            return assessments
+
+        candidates = [signals[i] for i in valid]
+        symbols = [sig.get('symbol') for sig in candidates]
+        held_symbols = [p.get('symbol') for p in positions]
+        self.risk_engine.ensure(symbols + held_symbols)
+
+        price = np.array([float(sig['price']) for sig in candidates])
+        confidence = np.array([float(sig.get('confidence', 0) or 0) for sig in candidates])
+        directions = [sig.get('direction', 'long') for sig in candidates]
+        side = np.where(np.array(directions) == 'short', -1.0, 1.0)
+
+        atr = self.risk_engine.latest_atr(symbols)
+        supplied_atr = np.array([np.nan if sig.get('atr') is None else float(sig['atr']) for sig in candidates])
+        atr = np.where(np.isfinite(supplied_atr), supplied_atr, atr)
+        use_atr = np.isfinite(atr) & (atr > 0) & bool(self.config['volatility_adjustment'])
+
+        # Stop levels and position sizing (same rules as the scalar helpers)
+        stop, target = vector_stop_levels(price, atr, side, self.config)
+        stop, target = np.round(stop, 2), np.round(target, 2)
+        stop_distance = np.where(use_atr, atr * self.config['atr_multiplier_stop'],
+                                 price * self.config['default_stop_loss_pct'] / 100)
+        target_distance = np.where(use_atr, atr * self.config['atr_multiplier_target'],
+                                   price * self.config['default_take_profit_pct'] / 100)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            risk_reward = np.where(stop_distance > 0, target_distance / stop_distance, 0)
+
+            risk_amount = portfolio_value * self.config['max_portfolio_risk_pct'] / 100
+            max_position_value = portfolio_value * self.config['max_position_size_pct'] / 100
+            risk_per_share = np.abs(price - stop)
+            shares_by_risk = np.where(risk_per_share > 0, np.floor(risk_amount / risk_per_share), 0)
+            shares_by_allocation = np.floor(max_position_value / price)
+        shares = np.minimum(shares_by_risk, shares_by_allocation)
+        position_value = shares * price
+        position_pct = position_value / portfolio_value * 100
+        volatility_pct = np.where(np.isfinite(atr) & (atr > 0), atr / price * 100, 0)
+
+        # Portfolio context: correlation, incremental VaR, sector concentration
+        correlation = self._max_correlation(symbols, held_symbols)
+        var_after = self._var_after_trades(symbols, side * position_value, positions, portfolio_value)
+        sectors = [sig.get('sector') or s for sig, s in zip(candidates, self.risk_engine.latest(symbols, 'sector'))]
+        sector_pct = self._sector_pct_after_trades(sectors, position_value, positions, portfolio_value)
+
+        # Vectorized risk scoring
+        score = np.zeros(len(candidates), dtype=int)
+        score += np.where(confidence < 0.6, 2, np.where(confidence < 0.7, 1, 0))
+        score += np.where(risk_reward < 2, 2, 0)
+        score += np.where(position_pct > self.config['max_position_size_pct'], 3, 0)
+        score += np.where(volatility_pct > 5, 2, 0)
+        too_correlated = np.nan_to_num(correlation) > self.config['max_correlation_exposure']
+        score += np.where(too_correlated, 2, 0)
+        var_breach = np.nan_to_num(var_after) > self.config['max_portfolio_var_pct']
+        score += np.where(var_breach, 2, 0)
+        sector_breach = sector_pct > self.config['max_sector_exposure_pct']
+        score += np.where(sector_breach, 2, 0)
+
+        assessed_at = datetime.utcnow().isoformat()
+        for k, sig in enumerate(candidates):
+            risk_score = int(score[k])
+            conf = float(confidence[k])
+            risk_factors = []
+            if conf < 0.6:
+                risk_factors.append(f'Low confidence: {conf:.1%}')
+            elif conf < 0.7:
+                risk_factors.append(f'Moderate confidence: {conf:.1%}')
+            if risk_reward[k] < 2:
+                risk_factors.append(f'Low R/R ratio: {round(float(risk_reward[k]), 2)}')
+            if position_pct[k] > self.config['max_position_size_pct']:
+                risk_factors.append(f'Position too large: {position_pct[k]:.1f}%')
+            if volatility_pct[k] > 5:
+                risk_factors.append(f'High volatility: {volatility_pct[k]:.1f}%')
+            if too_correlated[k]:
+                risk_factors.append(f'High correlation with holdings: {correlation[k]:.2f}')
+            if var_breach[k]:
+                risk_factors.append(f'Portfolio VaR after trade: {var_after[k]:.2f}%')
+            if sector_breach[k]:
+                risk_factors.append(f'{sectors[k] or "Unknown"} exposure after trade: {sector_pct[k]:.1f}%')
+
+            # Risk level classification
+            if risk_score <= 2:
+                risk_level, approved = 'LOW', True
+            elif risk_score <= 4:
+                risk_level, approved = 'MEDIUM', True
+            elif risk_score <= 6:
+                risk_level, approved = 'HIGH', conf >= 0.7
+            else:
+                risk_level, approved = 'EXTREME', False
+
+            atr_used = float(atr[k]) if use_atr[k] else None
+            entry = float(price[k])
+
+            if risk_per_share[k] <= 0:
+                position = {'error': 'Invalid stop loss - must be different from entry price'}
+            else:
+                position = {
+                    'optimal_shares': int(shares[k]),
+                    'position_value': float(position_value[k]),
+                    'position_pct': float(position_pct[k]),
+                    'risk_amount': float(shares[k] * risk_per_share[k]),
+                    'risk_pct': float(shares[k] * risk_per_share[k] / portfolio_value * 100),
+                    'entry_price': entry,
+                    'stop_loss_price': float(stop[k]),
+                    'risk_per_share': float(risk_per_share[k]),
+                    'shares_by_risk': int(shares_by_risk[k]),
+                    'shares_by_allocation': int(shares_by_allocation[k])
+                }
+
+            assessment = {
+                'symbol': sig.get('symbol'),
+                'price': sig.get('price'),
+                'direction': directions[k],
+                'confidence': sig.get('confidence', 0),
+                'risk_level': risk_level,
+                'risk_score': risk_score,
+                'risk_factors': risk_factors,
+                'approved': approved,
+                'stop_levels': {
+                    'entry_price': entry,
+                    'direction': directions[k],
+                    'stop_loss': float(stop[k]),
+                    'take_profit': float(target[k]),
+                    'stop_distance': float(stop_distance[k]),
+                    'target_distance': float(target_distance[k]),
+                    'stop_pct': float(stop_distance[k] / entry * 100),
+                    'target_pct': float(target_distance[k] / entry * 100),
+                    'risk_reward_ratio': round(float(risk_reward[k]), 2),
+                    'atr_used': atr_used
+                },
+                'position_sizing': position,
+                'portfolio_impact': {
+                    'max_correlation': _round_or_none(correlation[k], 3),
+                    'var_after_pct': _round_or_none(var_after[k], 3),
+                    'sector': sectors[k] or 'Unknown',
+                    'sector_exposure_after_pct': round(float(sector_pct[k]), 2)
+                },
+                'assessed_at': assessed_at
+            }
 
-        if not price:
-            return {'error': 'No price data', 'approved': False}
+            if not approved:
+                self.risk_alerts.append({
+                    'type': 'trade_rejected',
+                    'symbol': sig.get('symbol'),
+                    'reason': risk_factors,
+                    'timestamp': assessed_at
+                })
 
-        # Get market data for volatility
-        data = self.get_market_data(symbol, 'stocks', 'daily', limit=20)
-        atr = data[0].get('atr') if data else None
+            assessments[valid[k]] = assessment
 
-        # Calculate stop levels
-        stop_levels = self.calculate_stop_levels(price, atr, direction)
+        return assessments
 
-        # Calculate position size
-        position = self.calculate_position_size(
-            portfolio_value,
-            price,
-            stop_levels['stop_loss']
-        )
+    def _max_correlation(self, symbols: List[str], held_symbols: List[str]) -> np.ndarray:
+        """Highest correlation of each candidate with any current holding"""
+        if not held_symbols:
+            return np.full(len(symbols), np.nan)
+        corr = self.risk_engine.correlation(symbols + held_symbols)[:len(symbols), len(symbols):]
+        same = np.array(symbols)[:, None] == np.array(held_symbols)[None, :]
+        corr = np.where(same, np.nan, corr)
+        with np.errstate(invalid='ignore'):
+            result = np.nanmax(np.where(np.isfinite(corr), corr, -np.inf), axis=1)
+        return np.where(np.isfinite(result), result, np.nan)
 
-        # Risk assessment
-        risk_score = 0
-        risk_factors = []
-
-        # Check confidence level
-        if confidence < 0.6:
-            risk_score += 2
-            risk_factors.append(f'Low confidence: {confidence:.1%}')
-        elif confidence < 0.7:
-            risk_score += 1
-            risk_factors.append(f'Moderate confidence: {confidence:.1%}')
-
-        # Check risk/reward ratio
-        if stop_levels['risk_reward_ratio'] < 2:
-            risk_score += 2
-            risk_factors.append(f'Low R/R ratio: {stop_levels["risk_reward_ratio"]}')
-
-        # Check position size
-        if position.get('position_pct', 0) > self.config['max_position_size_pct']:
-            risk_score += 3
-            risk_factors.append(f'Position too large: {position["position_pct"]:.1f}%')
-
-        # Check volatility (if ATR available)
-        if atr and data:
-            volatility_pct = (atr / price) * 100
-            if volatility_pct > 5:
-                risk_score += 2
-                risk_factors.append(f'High volatility: {volatility_pct:.1f}%')
-
-        # Risk level classification
-        if risk_score <= 2:
-            risk_level = 'LOW'
-            approved = True
-        elif risk_score <= 4:
-            risk_level = 'MEDIUM'
-            approved = True
-        elif risk_score <= 6:
-            risk_level = 'HIGH'
-            approved = confidence >= 0.7
-        else:
-            risk_level = 'EXTREME'
-            approved = False
+    def _var_after_trades(
+        self,
+        symbols: List[str],
+        exposures: np.ndarray,
+        positions: List[Dict[str, Any]],
+        portfolio_value: float
+    ) -> np.ndarray:
+        """Portfolio VaR (% of portfolio) if each candidate were added on its own"""
+        engine = self.risk_engine
+        held_symbols, held_values = _position_exposures(positions)
+        base = engine._weights(held_symbols, held_values / portfolio_value)
 
-        assessment = {
-            'symbol': symbol,
-            'price': price,
-            'direction': direction,
-            'confidence': confidence,
-            'risk_level': risk_level,
-            'risk_score': risk_score,
-            'risk_factors': risk_factors,
-            'approved': approved,
-            'stop_levels': stop_levels,
-            'position_sizing': position,
-            'assessed_at': datetime.utcnow().isoformat()
-        }
+        scenarios = np.repeat(base[:, None], len(symbols), axis=1)
+        cols = engine.column_index(symbols)
+        known = np.flatnonzero(cols >= 0)
+        scenarios[cols[known], known] += exposures[known] / portfolio_value
 
-        if not approved:
-            self.risk_alerts.append({
-                'type': 'trade_rejected',
-                'symbol': symbol,
-                'reason': risk_factors,
-                'timestamp': datetime.utcnow().isoformat()
-            })
+        risk = engine.scenario_risk(scenarios, self.config['var_confidence'])
+        return risk['var'] * 100
 
-        return assessment
+    def _sector_pct_after_trades(
+        self,
+        sectors: List[Optional[str]],
+        values: np.ndarray,
+        positions: List[Dict[str, Any]],
+        portfolio_value: float
+    ) -> np.ndarray:
+        current = self.risk_engine.sector_exposure(
+            [p.get('sector') for p in positions],
+            np.array([abs(p.get('value', 0)) for p in positions], dtype=float)
+        )
+        existing = np.array([current.get(s or 'Unknown', 0.0) for s in sectors])
+        return (existing + values) / portfolio_value * 100
 
     def monitor_portfolio_risk(
         self,
@@ -250,14 +393,13 @@ class RiskManagerAgent(BaseAgent):
                 'alerts': []
             }
 
-        total_exposure = sum(p.get('value', 0) for p in positions)
+        symbols, exposures = _position_exposures(positions)
+        values = np.abs(exposures)
+        total_exposure = float(values.sum())
         exposure_pct = (total_exposure / portfolio_value) * 100
 
         # Sector exposure
-        sector_exposure = {}
-        for pos in positions:
-            sector = pos.get('sector', 'Unknown')
-            sector_exposure[sector] = sector_exposure.get(sector, 0) + pos.get('value', 0)
+        sector_exposure = self.risk_engine.sector_exposure([p.get('sector') for p in positions], values)
 
         alerts = []
 
@@ -279,6 +421,28 @@ class RiskManagerAgent(BaseAgent):
                     'severity': 'MEDIUM'
                 })
 
+        # Value at risk / expected shortfall from the cached returns matrix
+        self.risk_engine.ensure(symbols)
+        var = self.risk_engine.portfolio_risk(
+            symbols, exposures, portfolio_value, self.config['var_confidence']
+        )
+        if var.get('var_pct') is not None and var['var_pct'] > self.config['max_portfolio_var_pct']:
+            alerts.append({
+                'type': 'HIGH_VAR',
+                'message': f'1-day VaR {var["var_pct"]:.2f}% exceeds {self.config["max_portfolio_var_pct"]}%',
+                'severity': 'HIGH'
+            })
+
+        # Correlated pairs (same-direction exposure only)
+        correlation = self._correlation_summary(symbols, exposures)
+        for pair in correlation['correlated_pairs']:
+            alerts.append({
+                'type': 'CORRELATION_CONCENTRATION',
+                'message': f'{pair["symbols"][0]} / {pair["symbols"][1]} correlation {pair["correlation"]:.2f} '
+                           f'exceeds {self.config["max_correlation_exposure"]}',
+                'severity': 'MEDIUM'
+            })
+
         # Determine risk level
         if len(alerts) == 0:
             risk_level = 'LOW'
@@ -292,11 +456,38 @@ class RiskManagerAgent(BaseAgent):
             'exposure_pct': exposure_pct,
             'sector_exposure': sector_exposure,
             'position_count': len(positions),
+            'value_at_risk': var,
+            'correlation': correlation,
             'risk_level': risk_level,
             'alerts': alerts,
             'checked_at': datetime.utcnow().isoformat()
         }
 
+    def _correlation_summary(self, symbols: List[str], exposures: np.ndarray) -> Dict[str, Any]:
+        """Exposure-weighted average pairwise correlation and the pairs above the limit"""
+        summary = {'avg_pairwise_correlation': None, 'correlated_pairs': []}
+        if len(symbols) < 2:
+            return summary
+
+        corr = self.risk_engine.correlation(symbols)
+        upper = np.triu(np.isfinite(corr), k=1)
+        if not upper.any():
+            return summary
+
+        pair_weight = np.abs(np.outer(exposures, exposures))[upper]
+        if pair_weight.sum() > 0:
+            summary['avg_pairwise_correlation'] = round(float(np.average(corr[upper], weights=pair_weight)), 3)
+
+        # Opposite-side positions on correlated names hedge each other
+        same_side = np.sign(exposures)[:, None] == np.sign(exposures)[None, :]
+        flagged = upper & same_side & (np.nan_to_num(corr) > self.config['max_correlation_exposure'])
+        for i, j in zip(*np.nonzero(flagged)):
+            summary['correlated_pairs'].append({
+                'symbols': [symbols[i], symbols[j]],
+                'correlation': round(float(corr[i, j]), 3)
+            })
+        return summary
+
     def handle_message(self, message) -> Dict[str, Any]:
         """Handle incoming messages"""
         msg_type = message.message_type
@@ -304,7 +495,16 @@ class RiskManagerAgent(BaseAgent):
         if msg_type == 'assess_trade':
             signal = message.payload.get('signal', {})
             portfolio_value = message.payload.get('portfolio_value', 100000)
-            return self.assess_trade_risk(signal, portfolio_value)
+            return self.assess_trade_risk(signal, portfolio_value, message.payload.get('positions'))
+
+        elif msg_type == 'assess_trades':
+            return {
+                'assessments': self.assess_trades(
+                    message.payload.get('signals', []),
+                    message.payload.get('portfolio_value', 100000),
+                    message.payload.get('positions')
+                )
+            }
 
         elif msg_type == 'calculate_position':
             return self.calculate_position_size(
@@ -328,12 +528,9 @@ class RiskManagerAgent(BaseAgent):
         portfolio_value = context.get('portfolio_value', 100000)
         positions = context.get('positions', [])
 
-        # Assess all signals
-        assessments = []
-        for signal in signals:
-            if signal.get('signal_type') in ['buy', 'sell']:
-                assessment = self.assess_trade_risk(signal, portfolio_value)
-                assessments.append(assessment)
+        # Assess all signals in one batch
+        tradable = [s for s in signals if s.get('signal_type') in ['buy', 'sell']]
+        assessments = self.assess_trades(tradable, portfolio_value, positions)
 
         # Monitor portfolio
         portfolio_risk = self.monitor_portfolio_risk(positions, portfolio_value)
@@ -356,3 +553,18 @@ class RiskManagerAgent(BaseAgent):
             'portfolio_risk': portfolio_risk,
             'risk_alerts': self.risk_alerts[-10:]  # Last 10 alerts
         }
+
+
+def _position_exposures(positions: List[Dict[str, Any]]):
+    """(symbols, signed market values) for a list of positions; shorts are negative"""
+    symbols = [p.get('symbol') for p in positions]
+    values = np.array([abs(p.get('value', 0) or 0) for p in positions], dtype=float)
+    short = np.array([
+        str(p.get('direction') or p.get('side') or 'long').lower() in ('short', 'sell')
+        for p in positions
+    ], dtype=bool)
+    return symbols, np.where(short, -values, values)
+
+
+def _round_or_none(value, digits: int):
+    return round(float(value), digits) if np.isfinite(value) else None
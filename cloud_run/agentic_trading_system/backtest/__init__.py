@@ -0,0 +1,15 @@
+"""Vectorized portfolio backtesting for strategy signals"""
+
+from .engine import (
+    run_backtest,
+    signals_from_predictions,
+    signals_from_paper_trades,
+    DEFAULT_BACKTEST_CONFIG
+)
+
+__all__ = [
+    'run_backtest',
+    'signals_from_predictions',
+    'signals_from_paper_trades',
+    'DEFAULT_BACKTEST_CONFIG'
+]
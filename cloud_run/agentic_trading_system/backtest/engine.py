@@ -0,0 +1,367 @@
+"""
+Vectorized Portfolio Backtest Engine
+Replays strategy signals over daily bars for many symbols at once
+
+Prices and signals are pivoted into [dates x symbols] NumPy arrays; the engine
+steps through dates and updates every symbol in one array operation per step.
+Position sizing and stop levels follow RiskManagerAgent.calculate_position_size /
+calculate_stop_levels (same config keys), with commissions and slippage applied
+to every fill.
+
+Signals generated on a bar's close are executed at the next bar's open.
+"""
+
+import logging
+from typing import Dict, Any, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKTEST_CONFIG = {
+    # Same keys and defaults as RiskManagerAgent
+    'max_position_size_pct': 5.0,
+    'max_portfolio_risk_pct': 2.0,
+    'max_total_exposure_pct': 80.0,
+    'default_stop_loss_pct': 2.0,
+    'default_take_profit_pct': 6.0,
+    'volatility_adjustment': True,
+    'atr_multiplier_stop': 2.0,
+    'atr_multiplier_target': 4.0,
+    # Backtest-only settings
+    'initial_capital': 100000.0,
+    'commission_per_share': 0.005,
+    'min_commission': 1.0,
+    'commission_pct': 0.0,           # Percent of traded value (e.g. crypto venues)
+    'slippage_bps': 5.0,
+    'min_confidence': 0.0,
+    'max_hold_bars': 0,              # 0 = hold until stop, target or exit signal
+    'allow_short': False,            # SELL closes longs unless shorting is allowed
+    'periods_per_year': 252
+}
+
+BUY_SIGNALS = {'BUY', 'STRONG_BUY', 'UP', 'LONG'}
+SELL_SIGNALS = {'SELL', 'STRONG_SELL', 'DOWN', 'SHORT'}
+
+
+def signals_from_predictions(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normalize realtime_predictions rows into (symbol, datetime, direction, confidence,
+    stop_loss_pct, take_profit_pct). direction is 1 for BUY, -1 for SELL, 0 otherwise.
+    """
+    signal_col = 'signal' if 'signal' in df.columns else 'ensemble_direction'
+    labels = df[signal_col].astype(str).str.upper()
+    direction = np.where(labels.isin(BUY_SIGNALS), 1, np.where(labels.isin(SELL_SIGNALS), -1, 0))
+
+    if 'ensemble_up_probability' in df.columns:
+        up = df['ensemble_up_probability'].astype(float)
+    elif 'xgb_up_probability' in df.columns:
+        up = df['xgb_up_probability'].astype(float)
+    else:
+        up = pd.Series(np.nan, index=df.index)
+    # Confidence in the signalled direction
+    confidence = np.where(direction >= 0, up, 1 - up)
+    if 'signal_strength' in df.columns:
+        confidence = np.where(np.isnan(confidence), df['signal_strength'].astype(float), confidence)
+
+    return pd.DataFrame({
+        'symbol': df['symbol'].values,
+        'datetime': pd.to_datetime(df['datetime']).values,
+        'direction': direction,
+        'confidence': np.nan_to_num(confidence.astype(float), nan=1.0),
+        'stop_loss_pct': df['stop_loss_pct'].astype(float).values if 'stop_loss_pct' in df.columns else np.nan,
+        'take_profit_pct': df['take_profit_pct'].astype(float).values if 'take_profit_pct' in df.columns else np.nan,
+    })
+
+
+def signals_from_paper_trades(df: pd.DataFrame) -> pd.DataFrame:
+    """Normalize paper_trades rows (trade_type BUY/SELL at entry_datetime) into engine signals"""
+    labels = df['trade_type'].astype(str).str.upper()
+    return pd.DataFrame({
+        'symbol': df['symbol'].values,
+        'datetime': pd.to_datetime(df['entry_datetime']).values,
+        'direction': np.where(labels.isin(BUY_SIGNALS), 1, np.where(labels.isin(SELL_SIGNALS), -1, 0)),
+        'confidence': 1.0,
+        'stop_loss_pct': np.nan,
+        'take_profit_pct': np.nan,
+    })
+
+
+def stop_levels(entry: np.ndarray, atr: np.ndarray, direction: np.ndarray, config: Dict[str, Any],
+                stop_pct: Optional[np.ndarray] = None, target_pct: Optional[np.ndarray] = None):
+    """Vectorized RiskManagerAgent.calculate_stop_levels. Returns (stop, target) arrays."""
+    pct_stop = entry * config['default_stop_loss_pct'] / 100
+    pct_target = entry * config['default_take_profit_pct'] / 100
+
+    if config['volatility_adjustment']:
+        has_atr = np.isfinite(atr) & (atr > 0)
+        stop_distance = np.where(has_atr, atr * config['atr_multiplier_stop'], pct_stop)
+        target_distance = np.where(has_atr, atr * config['atr_multiplier_target'], pct_target)
+    else:
+        stop_distance, target_distance = pct_stop, pct_target
+
+    # Per-signal percentages (e.g. realtime_predictions.stop_loss_pct) take precedence
+    if stop_pct is not None:
+        stop_distance = np.where(np.isfinite(stop_pct), entry * stop_pct / 100, stop_distance)
+    if target_pct is not None:
+        target_distance = np.where(np.isfinite(target_pct), entry * target_pct / 100, target_distance)
+
+    return entry - direction * stop_distance, entry + direction * target_distance
+
+
+def position_sizes(portfolio_value: float, entry: np.ndarray, stop: np.ndarray,
+                   config: Dict[str, Any]) -> np.ndarray:
+    """Vectorized RiskManagerAgent.calculate_position_size - whole shares per candidate"""
+    risk_amount = portfolio_value * config['max_portfolio_risk_pct'] / 100
+    max_position_value = portfolio_value * config['max_position_size_pct'] / 100
+    risk_per_share = np.abs(entry - stop)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        by_risk = np.where(risk_per_share > 0, np.floor(risk_amount / risk_per_share), 0)
+        by_allocation = np.where(entry > 0, np.floor(max_position_value / entry), 0)
+    return np.minimum(by_risk, by_allocation)
+
+
+def _commission(shares: np.ndarray, price: np.ndarray, config: Dict[str, Any]) -> np.ndarray:
+    fee = np.maximum(shares * config['commission_per_share'], config['min_commission'])
+    fee = fee + shares * price * config['commission_pct'] / 100
+    return np.where(shares > 0, fee, 0.0)
+
+
+def _pivot(df: pd.DataFrame, column: str, dates, symbols) -> np.ndarray:
+    return (df.pivot_table(index='datetime', columns='symbol', values=column, aggfunc='last')
+            .reindex(index=dates, columns=symbols).to_numpy(dtype=float))
+
+
+def run_backtest(prices: pd.DataFrame, signals: pd.DataFrame,
+                 config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Backtest signals against daily bars.
+
+    prices:  symbol, datetime, open, high, low, close[, atr]
+    signals: symbol, datetime, direction (1/-1/0)[, confidence, stop_loss_pct, take_profit_pct]
+             - see signals_from_predictions / signals_from_paper_trades
+
+    Returns {'equity_curve': DataFrame, 'trades': DataFrame, 'stats': dict}.
+    """
+    cfg = {**DEFAULT_BACKTEST_CONFIG, **(config or {})}
+    slip = cfg['slippage_bps'] / 10000
+
+    prices = prices.copy()
+    prices['datetime'] = pd.to_datetime(prices['datetime'])
+    dates = pd.DatetimeIndex(sorted(prices['datetime'].unique()))
+    symbols = np.array(sorted(prices['symbol'].unique()))
+    T, N = len(dates), len(symbols)
+
+    open_ = _pivot(prices, 'open', dates, symbols)
+    high = _pivot(prices, 'high', dates, symbols)
+    low = _pivot(prices, 'low', dates, symbols)
+    close = _pivot(prices, 'close', dates, symbols)
+    atr = _pivot(prices, 'atr', dates, symbols) if 'atr' in prices.columns else np.full((T, N), np.nan)
+    # Carry last close across missing bars for marking to market
+    close_ffill = pd.DataFrame(close).ffill().to_numpy()
+
+    signals = signals.copy()
+    signals['datetime'] = pd.to_datetime(signals['datetime'])
+    for column, default in (('confidence', 1.0), ('stop_loss_pct', np.nan), ('take_profit_pct', np.nan)):
+        if column not in signals.columns:
+            signals[column] = default
+    signals = signals[signals['symbol'].isin(symbols)]
+    # Snap each signal to the first bar at or after it
+    signals['bar'] = np.searchsorted(dates.values, signals['datetime'].values)
+    signals = signals[signals['bar'] < T].sort_values('datetime').drop_duplicates(['bar', 'symbol'], keep='last')
+    col = np.searchsorted(symbols, signals['symbol'].values)
+    bar = signals['bar'].to_numpy()
+
+    sig_dir = np.zeros((T, N))
+    sig_conf = np.zeros((T, N))
+    sig_stop = np.full((T, N), np.nan)
+    sig_target = np.full((T, N), np.nan)
+    sig_dir[bar, col] = signals['direction'].to_numpy(dtype=float)
+    sig_conf[bar, col] = signals['confidence'].to_numpy(dtype=float)
+    sig_stop[bar, col] = signals['stop_loss_pct'].to_numpy(dtype=float)
+    sig_target[bar, col] = signals['take_profit_pct'].to_numpy(dtype=float)
+
+    # Position state per symbol
+    shares = np.zeros(N)
+    side = np.zeros(N)
+    entry_price = np.zeros(N)
+    entry_fee = np.zeros(N)
+    entry_bar = np.full(N, -1)
+    stop = np.zeros(N)
+    target = np.zeros(N)
+
+    cash = float(cfg['initial_capital'])
+    equity = np.zeros(T)
+    exposure = np.zeros(T)
+    trade_chunks = []
+
+    def close_positions(mask, exit_px, t, reason):
+        nonlocal cash
+        idx = np.nonzero(mask)[0]
+        if not len(idx):
+            return
+        px = exit_px[idx] * (1 - side[idx] * slip)
+        fee = _commission(shares[idx], px, cfg)
+        gross = side[idx] * (px - entry_price[idx]) * shares[idx]
+        # Longs release sale proceeds; shorts return margin plus P&L
+        cash += np.sum(np.where(side[idx] > 0, px * shares[idx], entry_price[idx] * shares[idx] + gross) - fee)
+        trade_chunks.append({
+            'col': idx, 'side': side[idx].copy(), 'shares': shares[idx].copy(),
+            'entry_bar': entry_bar[idx].copy(), 'exit_bar': np.full(len(idx), t),
+            'entry_price': entry_price[idx].copy(), 'exit_price': px,
+            'gross_pnl': gross, 'commission': entry_fee[idx] + fee,
+            'exit_reason': np.full(len(idx), reason, dtype=object)
+        })
+        shares[idx] = 0
+        side[idx] = 0
+        entry_bar[idx] = -1
+
+    for t in range(T):
+        o, h, l = open_[t], high[t], low[t]
+        has_bar = np.isfinite(o) & np.isfinite(h) & np.isfinite(l)
+
+        if t > 0:
+            prev_dir = sig_dir[t - 1]
+            held = (shares > 0) & has_bar
+
+            # Exit on an opposite signal from the previous close, at this open
+            flip = held & (prev_dir != 0) & (prev_dir != side)
+            close_positions(flip, o, t, 'signal')
+            held &= ~flip
+
+            # Stops and targets; a gap through the level fills at the open
+            is_long = side > 0
+            stop_hit = held & np.where(is_long, l <= stop, h >= stop)
+            stop_px = np.where(is_long, np.minimum(o, stop), np.maximum(o, stop))
+            close_positions(stop_hit, stop_px, t, 'stop_loss')
+            held &= ~stop_hit
+
+            target_hit = held & np.where(is_long, h >= target, l <= target)
+            target_px = np.where(is_long, np.maximum(o, target), np.minimum(o, target))
+            close_positions(target_hit, target_px, t, 'take_profit')
+            held &= ~target_hit
+
+            if cfg['max_hold_bars']:
+                expired = held & (t - entry_bar >= cfg['max_hold_bars'])
+                close_positions(expired, np.nan_to_num(close[t]), t, 'max_hold')
+
+            # Entries from the previous close's signals, sized on last equity
+            wanted = (shares == 0) & has_bar & (sig_conf[t - 1] >= cfg['min_confidence'])
+            wanted &= (prev_dir > 0) | ((prev_dir < 0) & cfg['allow_short'])
+            idx = np.nonzero(wanted)[0]
+            if len(idx):
+                direction = prev_dir[idx]
+                px = o[idx] * (1 + direction * slip)
+                stp, tgt = stop_levels(px, atr[t - 1, idx], direction, cfg, sig_stop[t - 1, idx], sig_target[t - 1, idx])
+                qty = position_sizes(equity[t - 1], px, stp, cfg)
+                cost = qty * px + _commission(qty, px, cfg)
+
+                # Highest-confidence candidates first within cash and exposure limits
+                open_value = np.sum(shares * np.nan_to_num(close_ffill[t - 1]))
+                budget = min(cash, equity[t - 1] * cfg['max_total_exposure_pct'] / 100 - open_value)
+                order = np.argsort(-sig_conf[t - 1, idx], kind='stable')
+                accepted = np.zeros(len(idx), dtype=bool)
+                accepted[order] = (np.cumsum(cost[order]) <= budget) & (qty[order] > 0)
+
+                idx, direction, px, stp, tgt, qty, cost = (
+                    a[accepted] for a in (idx, direction, px, stp, tgt, qty, cost))
+                shares[idx] = qty
+                side[idx] = direction
+                entry_price[idx] = px
+                entry_fee[idx] = cost - qty * px
+                entry_bar[idx] = t
+                stop[idx] = stp
+                target[idx] = tgt
+                cash -= np.sum(cost)
+
+        mark = np.nan_to_num(close_ffill[t])
+        position_value = np.where(side > 0, shares * mark, shares * (2 * entry_price - mark))
+        equity[t] = cash + np.sum(position_value)
+        exposure[t] = np.sum(shares * mark)
+
+    # Close anything still open at the last close
+    close_positions(shares > 0, np.nan_to_num(close_ffill[T - 1]), T - 1, 'end_of_test')
+    if T:
+        equity[T - 1] = cash
+
+    return _build_results(dates, symbols, equity, exposure, trade_chunks, cfg)
+
+
+def _build_results(dates, symbols, equity, exposure, trade_chunks, cfg) -> Dict[str, Any]:
+    """Equity curve, trade list and summary statistics"""
+    peak = np.maximum.accumulate(equity) if len(equity) else equity
+    drawdown = np.where(peak > 0, equity / peak - 1, 0)
+    returns = np.diff(equity, prepend=cfg['initial_capital']) / np.maximum(
+        np.concatenate([[cfg['initial_capital']], equity[:-1]]), 1e-9)
+
+    equity_curve = pd.DataFrame({
+        'datetime': dates,
+        'equity': equity,
+        'daily_return': returns,
+        'drawdown_pct': drawdown * 100,
+        'exposure': exposure,
+        'exposure_pct': np.where(equity > 0, exposure / np.maximum(equity, 1e-9) * 100, 0)
+    })
+
+    if trade_chunks:
+        merged = {k: np.concatenate([c[k] for c in trade_chunks]) for k in trade_chunks[0]}
+        net = merged['gross_pnl'] - merged['commission']
+        trades = pd.DataFrame({
+            'symbol': symbols[merged['col']],
+            'trade_type': np.where(merged['side'] > 0, 'BUY', 'SELL'),
+            'quantity': merged['shares'],
+            'entry_datetime': dates[merged['entry_bar']],
+            'exit_datetime': dates[merged['exit_bar']],
+            'entry_price': merged['entry_price'],
+            'exit_price': merged['exit_price'],
+            'hold_bars': merged['exit_bar'] - merged['entry_bar'],
+            'position_size': merged['shares'] * merged['entry_price'],
+            'gross_pnl': merged['gross_pnl'],
+            'commission': merged['commission'],
+            'net_pnl': net,
+            'pnl_percent': net / np.maximum(merged['shares'] * merged['entry_price'], 1e-9) * 100,
+            'exit_reason': merged['exit_reason']
+        }).sort_values(['exit_datetime', 'symbol']).reset_index(drop=True)
+    else:
+        trades = pd.DataFrame(columns=[
+            'symbol', 'trade_type', 'quantity', 'entry_datetime', 'exit_datetime', 'entry_price',
+            'exit_price', 'hold_bars', 'position_size', 'gross_pnl', 'commission', 'net_pnl',
+            'pnl_percent', 'exit_reason'
+        ])
+
+    return {
+        'equity_curve': equity_curve,
+        'trades': trades,
+        'stats': _summary_stats(equity, returns, drawdown, exposure, trades, cfg)
+    }
+
+
+def _summary_stats(equity, returns, drawdown, exposure, trades, cfg) -> Dict[str, Any]:
+    initial = cfg['initial_capital']
+    final = float(equity[-1]) if len(equity) else initial
+    periods = max(len(equity), 1)
+    years = periods / cfg['periods_per_year']
+    std = np.std(returns) if len(returns) > 1 else 0
+
+    wins = trades['net_pnl'][trades['net_pnl'] > 0] if len(trades) else pd.Series(dtype=float)
+    losses = trades['net_pnl'][trades['net_pnl'] <= 0] if len(trades) else pd.Series(dtype=float)
+    gross_loss = -losses.sum()
+
+    return {
+        'initial_capital': initial,
+        'final_equity': round(final, 2),
+        'total_return_pct': round((final / initial - 1) * 100, 2),
+        'cagr_pct': round(((final / initial) ** (1 / years) - 1) * 100, 2) if final > 0 and years > 0 else None,
+        'sharpe_ratio': round(float(np.mean(returns) / std * np.sqrt(cfg['periods_per_year'])), 2) if std > 0 else None,
+        'max_drawdown_pct': round(float(drawdown.min()) * 100, 2) if len(drawdown) else 0,
+        'avg_exposure_pct': round(float(np.mean(np.where(equity > 0, exposure / np.maximum(equity, 1e-9), 0))) * 100, 2),
+        'total_trades': int(len(trades)),
+        'win_rate_pct': round(len(wins) / len(trades) * 100, 2) if len(trades) else None,
+        'avg_win': round(float(wins.mean()), 2) if len(wins) else None,
+        'avg_loss': round(float(losses.mean()), 2) if len(losses) else None,
+        'profit_factor': round(float(wins.sum() / gross_loss), 2) if gross_loss > 0 else None,
+        'total_commission': round(float(trades['commission'].sum()), 2) if len(trades) else 0,
+        'exit_reasons': trades['exit_reason'].value_counts().to_dict() if len(trades) else {}
+    }
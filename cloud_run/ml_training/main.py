@@ -1,17 +1,23 @@
 """
 Reliable ML Training Cloud Run Service
 - 60-minute timeout for long-running validations
-- Checkpoint/resume for interrupted runs
+- Checkpoint/resume for interrupted runs (per symbol, per retrain window)
 - Symbol-by-symbol processing with progress saving
+- Idempotent result writes keyed on (run_id, symbol, prediction_date)
 - Automatic result finalization
+- Model cache keyed by a fingerprint of the training data and model options,
+  with LRU cleanup of cached models and scratch tables
 """
 
 import os
 from flask import Flask, request, jsonify
 from google.cloud import bigquery
-from datetime import datetime, timedelta
+from google.api_core.exceptions import NotFound
+from datetime import datetime, timedelta, timezone
+import hashlib
 import uuid
 import json
+import time
 import traceback
 
 app = Flask(__name__)
@@ -29,6 +35,24 @@ DEFAULT_FEATURES = [
     'macd_cross', 'momentum', 'mfi', 'cci', 'awesome_osc', 'vwap_daily'
 ]
 
+# Stop starting new windows after this long (service timeout is 60 minutes)
+RUN_TIME_BUDGET_SECONDS = int(os.environ.get('RUN_TIME_BUDGET_SECONDS', '3300'))
+
+# Boosted tree options and training window; both are part of the model cache fingerprint
+MODEL_OPTIONS = {
+    'max_iterations': 20,
+    'early_stop': True
+}
+TRAINING_LOOKBACK_DAYS = 365
+
+# Model cache LRU limits and walk-forward scratch tables swept by cleanup_model_cache
+MODEL_CACHE_MAX_MODELS = int(os.environ.get('MODEL_CACHE_MAX_MODELS', '500'))
+MODEL_CACHE_MAX_IDLE_DAYS = int(os.environ.get('MODEL_CACHE_MAX_IDLE_DAYS', '14'))
+TEMP_TABLE_MAX_AGE_HOURS = 24
+TEMP_TABLE_PREFIXES = ('_temp_wf_train_', '_wf_results_staging_', '_wf_equity_staging_')
+
+_model_cache_ready = False
+
 RETRAIN_INTERVALS = {
     'daily': 1,
     'weekly': 5,
@@ -65,89 +89,219 @@ def update_run_status(run_id, status, progress_pct=None, current_day=None,
         print(f"Error updating status: {e}")
 
 
-def save_checkpoint(run_id, symbol, last_date, predictions_saved):
-    """Save checkpoint for resume capability"""
+def get_checkpoints(run_id):
+    """{symbol: (last_date, predictions_saved)} for every symbol the run has checkpointed"""
     query = f"""
-    MERGE `aialgotradehits.ml_models.validation_checkpoints` T
-    USING (SELECT '{run_id}' as run_id, '{symbol}' as symbol) S
-    ON T.run_id = S.run_id AND T.symbol = S.symbol
-    WHEN MATCHED THEN
-        UPDATE SET last_date = '{last_date}', predictions_saved = {predictions_saved}, updated_at = CURRENT_TIMESTAMP()
-    WHEN NOT MATCHED THEN
-        INSERT (run_id, symbol, last_date, predictions_saved, updated_at)
-        VALUES ('{run_id}', '{symbol}', '{last_date}', {predictions_saved}, CURRENT_TIMESTAMP())
+    SELECT symbol, last_date, predictions_saved
+    FROM `aialgotradehits.ml_models.validation_checkpoints`
+    WHERE run_id = '{run_id}'
     """
     try:
-        client.query(query).result()
+        return {row.symbol: (row.last_date, row.predictions_saved or 0) for row in client.query(query).result()}
     except Exception as e:
-        print(f"Checkpoint save error: {e}")
+        print(f"Checkpoint read error: {e}")
+    return {}
 
 
-def get_checkpoint(run_id, symbol):
-    """Get checkpoint for resume"""
-    query = f"""
-    SELECT last_date, predictions_saved
-    FROM `aialgotradehits.ml_models.validation_checkpoints`
-    WHERE run_id = '{run_id}' AND symbol = '{symbol}'
+def ensure_model_cache():
+    """Add the fingerprint / LRU columns to model_cache (once per instance)"""
+    global _model_cache_ready
+    if _model_cache_ready:
+        return
+    query = """
+    ALTER TABLE `aialgotradehits.ml_models.model_cache`
+    ADD COLUMN IF NOT EXISTS fingerprint STRING,
+    ADD COLUMN IF NOT EXISTS row_count INT64,
+    ADD COLUMN IF NOT EXISTS max_date DATE,
+    ADD COLUMN IF NOT EXISTS content_hash INT64,
+    ADD COLUMN IF NOT EXISTS hyperparameters STRING,
+    ADD COLUMN IF NOT EXISTS last_used_at TIMESTAMP,
+    ADD COLUMN IF NOT EXISTS hits INT64
     """
-    try:
-        result = client.query(query).result()
-        rows = list(result)
-        if rows:
-            return rows[0].last_date, rows[0].predictions_saved
-    except:
-        pass
-    return None, 0
+    client.query(query).result()
+    _model_cache_ready = True
 
 
-def check_cached_model(symbol, train_end_date, features_mode):
-    """Check if a cached model exists"""
+def training_slice_sql(symbol, train_end_date, columns):
+    return f"""
+    SELECT {columns}
+    FROM `aialgotradehits.ml_models.walk_forward_features_16_mat`
+    WHERE symbol = '{symbol}'
+      AND trade_date < '{train_end_date}'
+      AND trade_date >= DATE_SUB(DATE('{train_end_date}'), INTERVAL {TRAINING_LOOKBACK_DAYS} DAY)
+    """
+
+
+def training_fingerprint(symbol, train_end_date, features):
+    """
+    Fingerprint of the training slice and model options: row count, max date and an
+    order-independent content hash of the rows, plus the feature list and MODEL_OPTIONS
+    """
     query = f"""
-    SELECT model_name
+    SELECT
+        COUNT(*) AS row_count,
+        MAX(trade_date) AS max_date,
+        BIT_XOR(FARM_FINGERPRINT(TO_JSON_STRING(t))) AS content_hash
+    FROM ({training_slice_sql(symbol, train_end_date, f"trade_date, {', '.join(features)}, direction_target")}) t
+    """
+    row = list(client.query(query).result())[0]
+    slice_info = {
+        'row_count': row.row_count,
+        'max_date': str(row.max_date) if row.max_date else None,
+        'content_hash': row.content_hash
+    }
+    key = json.dumps({
+        'symbol': symbol, 'features': list(features), 'options': MODEL_OPTIONS,
+        'lookback_days': TRAINING_LOOKBACK_DAYS, **slice_info
+    }, sort_keys=True)
+    return {'fingerprint': hashlib.sha256(key.encode()).hexdigest()[:16], **slice_info}
+
+
+def check_cached_model(symbol, train_end_date, features_mode, fingerprint):
+    """Model trained on exactly this slice, if cached; logs cached models the slice has outgrown"""
+    query = f"""
+    SELECT model_name, fingerprint, row_count, max_date
     FROM `aialgotradehits.ml_models.model_cache`
-    WHERE symbol = '{symbol}'
-      AND train_end_date = '{train_end_date}'
-      AND features_mode = '{features_mode}'
-      AND created_at > TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 7 DAY)
+    WHERE fingerprint = '{fingerprint['fingerprint']}'
+       OR (symbol = '{symbol}' AND train_end_date = '{train_end_date}' AND features_mode = '{features_mode}')
     ORDER BY created_at DESC
-    LIMIT 1
     """
     try:
-        result = client.query(query).result()
-        rows = list(result)
-        if rows:
-            return rows[0].model_name
-    except:
-        pass
+        rows = list(client.query(query).result())
+    except Exception as e:
+        print(f"  Cache lookup error: {e}")
+        return None
+
+    for row in rows:
+        if row.fingerprint == fingerprint['fingerprint']:
+            try:
+                client.get_model(f"aialgotradehits.ml_models.{row.model_name}")
+            except NotFound:
+                client.query(f"""
+                DELETE FROM `aialgotradehits.ml_models.model_cache` WHERE model_name = '{row.model_name}'
+                """).result()
+                continue
+            client.query(f"""
+            UPDATE `aialgotradehits.ml_models.model_cache`
+            SET last_used_at = CURRENT_TIMESTAMP(), hits = COALESCE(hits, 0) + 1
+            WHERE fingerprint = '{row.fingerprint}'
+            """).result()
+            return row.model_name
+
+    for row in rows:
+        if row.fingerprint == fingerprint['fingerprint']:
+            continue
+        print(f"  Stale cached model for {symbol} ({row.model_name}): training data changed "
+              f"(rows {row.row_count} -> {fingerprint['row_count']}, max date {row.max_date} -> {fingerprint['max_date']})")
     return None
 
 
+def save_model_to_cache(symbol, train_end_date, features_mode, model_name, fingerprint):
+    """Save model reference to cache for reuse (one row per fingerprint)"""
+    query = f"""
+    MERGE `aialgotradehits.ml_models.model_cache` T
+    USING (SELECT '{fingerprint['fingerprint']}' AS fingerprint) S
+    ON T.fingerprint = S.fingerprint
+    WHEN MATCHED THEN UPDATE SET model_name = '{model_name}', last_used_at = CURRENT_TIMESTAMP()
+    WHEN NOT MATCHED THEN INSERT
+        (symbol, train_end_date, features_mode, model_name, created_at,
+         fingerprint, row_count, max_date, content_hash, hyperparameters, last_used_at, hits)
+    VALUES
+        ('{symbol}', '{train_end_date}', '{features_mode}', '{model_name}', CURRENT_TIMESTAMP(),
+         S.fingerprint, {fingerprint['row_count']},
+         {f"DATE '{fingerprint['max_date']}'" if fingerprint['max_date'] else 'NULL'},
+         {fingerprint['content_hash'] if fingerprint['content_hash'] is not None else 'NULL'},
+         '{json.dumps(MODEL_OPTIONS, sort_keys=True)}', CURRENT_TIMESTAMP(), 0)
+    """
+    try:
+        client.query(query).result()
+    except Exception as e:
+        print(f"  Cache save error: {e}")
+
+
+def cleanup_model_cache(max_models=MODEL_CACHE_MAX_MODELS, max_idle_days=MODEL_CACHE_MAX_IDLE_DAYS):
+    """
+    LRU eviction: keep the max_models most recently used cached models that were used
+    within max_idle_days and delete the rest, along with uncached wf_model_* models and
+    walk-forward scratch tables older than TEMP_TABLE_MAX_AGE_HOURS.
+    """
+    dataset = 'aialgotradehits.ml_models'
+    now = datetime.now(timezone.utc)
+    query = f"""
+    SELECT model_name, MAX(COALESCE(last_used_at, created_at)) AS used_at
+    FROM `{dataset}.model_cache`
+    GROUP BY model_name
+    ORDER BY used_at DESC
+    """
+    rows = list(client.query(query).result())
+    cutoff = now - timedelta(days=max_idle_days)
+    keep = {row.model_name for row in rows[:max_models] if row.used_at and row.used_at >= cutoff}
+    evict = [row.model_name for row in rows if row.model_name not in keep]
+
+    for name in evict:
+        client.delete_model(f"{dataset}.{name}", not_found_ok=True)
+    if evict:
+        names = ', '.join(f"'{name}'" for name in evict)
+        client.query(f"DELETE FROM `{dataset}.model_cache` WHERE model_name IN ({names})").result()
+
+    # Models trained before fingerprinting (or whose cache row was lost)
+    orphans = [
+        m.model_id for m in client.list_models(dataset)
+        if m.model_id.startswith('wf_model_') and m.model_id not in keep
+        and m.model_id not in evict and m.modified and m.modified < cutoff
+    ]
+    for name in orphans:
+        client.delete_model(f"{dataset}.{name}", not_found_ok=True)
+
+    temp_cutoff = now - timedelta(hours=TEMP_TABLE_MAX_AGE_HOURS)
+    temp_tables = [
+        t.table_id for t in client.list_tables(dataset)
+        if t.table_id.startswith(TEMP_TABLE_PREFIXES) and t.created and t.created < temp_cutoff
+    ]
+    for name in temp_tables:
+        client.delete_table(f"{dataset}.{name}", not_found_ok=True)
+
+    print(f"Model cache cleanup: {len(evict)} evicted, {len(orphans)} orphan models, {len(temp_tables)} temp tables")
+    return {'models_kept': len(keep), 'models_evicted': len(evict),
+            'orphan_models_deleted': len(orphans), 'temp_tables_deleted': len(temp_tables)}
+
+
 def train_model(symbol, train_end_date, features, run_id, features_mode):
-    """Train XGBoost model with caching"""
+    """
+    Train XGBoost model, reusing any model trained on an identical slice (by fingerprint).
+    Returns None when there are no training rows; fingerprint and training errors raise.
+    """
+    try:
+        ensure_model_cache()
+        fingerprint = training_fingerprint(symbol, train_end_date, features)
+    except Exception as e:
+        print(f"  Fingerprint error for {symbol}: {e}")
+        raise
+
+    if not fingerprint['row_count']:
+        print(f"  No training data for {symbol} before {train_end_date}")
+        return None
+
     # Check cache first
-    cached = check_cached_model(symbol, train_end_date, features_mode)
+    cached = check_cached_model(symbol, train_end_date, features_mode, fingerprint)
     if cached:
         print(f"  Using cached model for {symbol}: {cached}")
         return cached
 
-    unique_suffix = run_id[:8] if run_id else str(uuid.uuid4())[:8]
-    model_name = f"wf_model_{symbol.lower()}_{train_end_date.replace('-', '')}_{unique_suffix}"
+    model_name = f"wf_model_{symbol.lower()}_{train_end_date.replace('-', '')}_{fingerprint['fingerprint'][:12]}"
     feature_cols = ', '.join(features)
+    options = ',\n        '.join(
+        f"{k}={str(v).upper() if isinstance(v, bool) else v}" for k, v in MODEL_OPTIONS.items())
 
     train_query = f"""
     CREATE OR REPLACE MODEL `aialgotradehits.ml_models.{model_name}`
     OPTIONS(
         model_type='BOOSTED_TREE_CLASSIFIER',
         input_label_cols=['direction_target'],
-        max_iterations=20,
-        early_stop=TRUE,
-        data_split_method='NO_SPLIT'
+        data_split_method='NO_SPLIT',
+        {options}
     ) AS
-    SELECT {feature_cols}, direction_target
-    FROM `aialgotradehits.ml_models.walk_forward_features_16_mat`
-    WHERE symbol = '{symbol}'
-      AND trade_date < '{train_end_date}'
-      AND trade_date >= DATE_SUB(DATE('{train_end_date}'), INTERVAL 365 DAY)
+    {training_slice_sql(symbol, train_end_date, f"{feature_cols}, direction_target")}
     """
 
     try:
@@ -155,17 +309,12 @@ def train_model(symbol, train_end_date, features, run_id, features_mode):
         client.query(train_query).result()
 
         # Cache the model
-        cache_query = f"""
-        INSERT INTO `aialgotradehits.ml_models.model_cache`
-        (symbol, train_end_date, features_mode, model_name, created_at)
-        VALUES ('{symbol}', '{train_end_date}', '{features_mode}', '{model_name}', CURRENT_TIMESTAMP())
-        """
-        client.query(cache_query).result()
+        save_model_to_cache(symbol, train_end_date, features_mode, model_name, fingerprint)
 
         return model_name
     except Exception as e:
         print(f"  Model training error for {symbol}: {e}")
-        return None
+        raise
 
 
 def batch_predict(model_name, symbol, start_date, end_date, features):
@@ -218,40 +367,74 @@ def batch_predict(model_name, symbol, start_date, end_date, features):
         return predictions
     except Exception as e:
         print(f"Prediction error: {e}")
-        return []
-
+        return None
 
-def save_daily_results(run_id, predictions):
-    """Save daily prediction results to BigQuery"""
-    if not predictions:
-        return
 
-    values = []
-    for pred in predictions:
-        actual = 1 if pred['next_close'] > pred['close'] else 0
-        is_correct = pred['predicted'] == actual
-        confidence = max(pred['probability_up'], pred['probability_down'])
-        actual_return = (pred['next_close'] - pred['close']) / pred['close'] if pred['close'] > 0 else 0
-
-        # predicted_direction and actual_direction are STRING columns
-        values.append(f"""
-            ('{run_id}', '{pred['symbol']}', DATE('{pred['date']}'),
-             {pred['close']}, '{pred['predicted']}', '{actual}',
-             {is_correct}, {confidence}, {pred['probability_up']}, {pred['probability_down']}, {actual_return})
+def save_window_results(run_id, symbol, predictions, last_date, predictions_saved):
+    """
+    Upsert one window's predictions keyed on (run_id, symbol, prediction_date) and
+    advance the symbol's checkpoint in the same transaction, so a window is either
+    fully recorded or redone on resume - never half-written or duplicated.
+    """
+    statements = []
+    if predictions:
+        values = []
+        for pred in predictions:
+            actual = 1 if pred['next_close'] > pred['close'] else 0
+            is_correct = pred['predicted'] == actual
+            confidence = max(pred['probability_up'], pred['probability_down'])
+            actual_return = (pred['next_close'] - pred['close']) / pred['close'] if pred['close'] > 0 else 0
+
+            # predicted_direction and actual_direction are STRING columns
+            values.append(f"""
+            STRUCT('{run_id}' AS run_id, '{pred['symbol']}' AS symbol, DATE('{pred['date']}') AS prediction_date,
+                   {pred['close']} AS close_price, '{pred['predicted']}' AS predicted_direction,
+                   '{actual}' AS actual_direction, {is_correct} AS is_correct, {confidence} AS confidence,
+                   {pred['probability_up']} AS probability_up, {pred['probability_down']} AS probability_down,
+                   {actual_return} AS actual_return)
+            """)
+
+        statements.append(f"""
+        MERGE `aialgotradehits.ml_models.walk_forward_daily_results` T
+        USING (SELECT * FROM UNNEST([{','.join(values)}])) S
+        ON T.run_id = S.run_id AND T.symbol = S.symbol AND T.prediction_date = S.prediction_date
+        WHEN MATCHED THEN UPDATE SET
+            close_price = S.close_price, predicted_direction = S.predicted_direction,
+            actual_direction = S.actual_direction, is_correct = S.is_correct, confidence = S.confidence,
+            probability_up = S.probability_up, probability_down = S.probability_down,
+            actual_return = S.actual_return
+        WHEN NOT MATCHED THEN INSERT
+            (run_id, symbol, prediction_date, close_price,
+             predicted_direction, actual_direction, is_correct, confidence,
+             probability_up, probability_down, actual_return)
+        VALUES
+            (S.run_id, S.symbol, S.prediction_date, S.close_price,
+             S.predicted_direction, S.actual_direction, S.is_correct, S.confidence,
+             S.probability_up, S.probability_down, S.actual_return);
         """)
 
+    statements.append(f"""
+        MERGE `aialgotradehits.ml_models.validation_checkpoints` T
+        USING (SELECT '{run_id}' as run_id, '{symbol}' as symbol) S
+        ON T.run_id = S.run_id AND T.symbol = S.symbol
+        WHEN MATCHED THEN
+            UPDATE SET last_date = '{last_date}', predictions_saved = {predictions_saved}, updated_at = CURRENT_TIMESTAMP()
+        WHEN NOT MATCHED THEN
+            INSERT (run_id, symbol, last_date, predictions_saved, updated_at)
+            VALUES ('{run_id}', '{symbol}', '{last_date}', {predictions_saved}, CURRENT_TIMESTAMP());
+    """)
+
     query = f"""
-    INSERT INTO `aialgotradehits.ml_models.walk_forward_daily_results`
-    (run_id, symbol, prediction_date, close_price,
-     predicted_direction, actual_direction, is_correct, confidence,
-     probability_up, probability_down, actual_return)
-    VALUES {','.join(values)}
+    BEGIN TRANSACTION;
+    {''.join(statements)}
+    COMMIT TRANSACTION;
     """
-
     try:
         client.query(query).result()
+        return True
     except Exception as e:
         print(f"Error saving results: {e}")
+        return False
 
 
 def finalize_run(run_id):
@@ -340,25 +523,32 @@ def run_validation(config):
     print(f"Trading dates: {len(trading_dates)}")
 
     total_symbols = len(symbols)
+    checkpoints = get_checkpoints(run_id)
+    started = time.time()
 
     # Process each symbol with checkpointing
     for symbol_idx, symbol in enumerate(symbols):
         print(f"\n--- Processing {symbol} ({symbol_idx + 1}/{total_symbols}) ---")
 
-        # Check for checkpoint
-        last_date, predictions_saved = get_checkpoint(run_id, symbol)
+        # Resume after the last completed window (skip the symbol if all are done)
+        last_date, predictions_saved = checkpoints.get(symbol, (None, 0))
         start_idx = 0
 
         if last_date:
-            print(f"  Resuming from checkpoint: {last_date}")
-            for i, d in enumerate(trading_dates):
-                if str(d) > str(last_date):
-                    start_idx = i
-                    break
+            start_idx = next(
+                (i for i, d in enumerate(trading_dates) if str(d) > str(last_date)), len(trading_dates))
+            print(f"  Resuming from checkpoint: {last_date} ({start_idx}/{len(trading_dates)} days done)")
 
         # Process in batches
         batch_start_idx = start_idx
         while batch_start_idx < len(trading_dates):
+            if time.time() - started > RUN_TIME_BUDGET_SECONDS:
+                # Stop between windows before the request times out; action=resume continues from here
+                progress = (symbol_idx + batch_start_idx / len(trading_dates)) / total_symbols * 100
+                update_run_status(run_id, 'paused', progress)
+                print(f"  Time budget reached - paused at {symbol} day {batch_start_idx}")
+                return {'run_id': run_id, 'status': 'paused', 'progress_pct': progress}
+
             batch_end_idx = min(batch_start_idx + retrain_interval, len(trading_dates))
             batch_start_date = trading_dates[batch_start_idx]
             batch_end_date = trading_dates[batch_end_idx - 1]
@@ -372,11 +562,21 @@ def run_validation(config):
 
             # Train model
             train_end = (batch_start_date - timedelta(days=1)).strftime('%Y-%m-%d')
-            model_name = train_model(symbol, train_end, features, run_id, features_mode)
+            try:
+                model_name = train_model(symbol, train_end, features, run_id, features_mode)
+            except Exception:
+                # Nothing of this window was checkpointed; pause so the run is not marked complete with gaps
+                update_run_status(run_id, 'paused', error_message=f'Training failed for {symbol}; resume to retry')
+                return {'run_id': run_id, 'status': 'paused', 'error': f'Training failed for {symbol}'}
 
             if not model_name:
-                print(f"  Skipping {symbol} - model training failed")
-                break
+                # No training rows before this window: record it as an empty window
+                print(f"  No model for {symbol} - window recorded empty")
+                if not save_window_results(run_id, symbol, [], str(batch_end_date), predictions_saved):
+                    update_run_status(run_id, 'paused', error_message='Results not saved; resume to retry')
+                    return {'run_id': run_id, 'status': 'paused', 'error': 'Results not saved'}
+                batch_start_idx = batch_end_idx
+                continue
 
             # Batch predict
             predictions = batch_predict(
@@ -385,11 +585,18 @@ def run_validation(config):
                 features
             )
 
-            if predictions:
-                save_daily_results(run_id, predictions)
-                save_checkpoint(run_id, symbol, str(batch_end_date), predictions_saved + len(predictions))
-                predictions_saved += len(predictions)
-                print(f"  Saved {len(predictions)} predictions")
+            if predictions is None:
+                # Nothing of this window was checkpointed; pause so the run is not marked complete with gaps
+                update_run_status(run_id, 'paused', error_message=f'Prediction failed for {symbol}; resume to retry')
+                return {'run_id': run_id, 'status': 'paused', 'error': f'Prediction failed for {symbol}'}
+
+            # Checkpoint every window, including empty ones, so resume never redoes it
+            if not save_window_results(run_id, symbol, predictions, str(batch_end_date),
+                                       predictions_saved + len(predictions)):
+                update_run_status(run_id, 'paused', error_message='Results not saved; resume to retry')
+                return {'run_id': run_id, 'status': 'paused', 'error': 'Results not saved'}
+            predictions_saved += len(predictions)
+            print(f"  Saved {len(predictions)} predictions")
 
             batch_start_idx = batch_end_idx
 
@@ -401,6 +608,11 @@ def run_validation(config):
         print(f"Overall Accuracy: {metrics['overall_accuracy']:.1%}")
         print(f"Total Predictions: {metrics['total_predictions']}")
 
+    try:
+        cleanup_model_cache()
+    except Exception as e:
+        print(f"Model cache cleanup error: {e}")
+
     return {
         'run_id': run_id,
         'status': 'completed',
@@ -469,6 +681,11 @@ def handle_request():
             } for row in result]
             return jsonify({'runs': runs}), 200, headers
 
+        elif action == 'cleanup':
+            max_models = int(data.get('max_models', MODEL_CACHE_MAX_MODELS))
+            max_idle_days = int(data.get('max_idle_days', MODEL_CACHE_MAX_IDLE_DAYS))
+            return jsonify(cleanup_model_cache(max_models, max_idle_days)), 200, headers
+
         elif action == 'resume':
             run_id = data.get('run_id')
             if not run_id:
@@ -156,11 +156,16 @@ async def chat(request: ChatRequest, background_tasks: BackgroundTasks):
         background_tasks.add_task(
             evaluator.log_interaction,
             response_time=response_time,
-            tool_calls=len(agent.metrics[-1].get("tool_calls", 0)) if agent.metrics else 0,
-            tokens_used=0,  # Would need to track from API response
+            tool_calls=agent.metrics[-1].get("tool_calls", 0) if agent.metrics else 0,
+            tokens_used=(
+                agent.metrics[-1].get("input_tokens", 0) + agent.metrics[-1].get("output_tokens", 0)
+            ) if agent.metrics else 0,
             success=True
         )
 
+        # Write any queued insights after the response is sent
+        background_tasks.add_task(memory.flush_insights)
+
         return ChatResponse(
             response=response,
             tool_calls=[],  # Could extract from agent.conversation_history
@@ -310,6 +315,8 @@ async def get_metrics():
     return {
         "performance": evaluator.analyze_performance(),
         "error_analysis": evaluator.get_error_analysis(),
+        "metrics_sink": evaluator.sink.stats(),
+        "tool_cache": TradingTools.cache_stats(),
         "workflow_stats": orchestrator.get_workflow_stats()
     }
 
@@ -5,6 +5,7 @@ Implements the 7-step process from Claude Code + GCP Cloud Run guide
 
 import os
 import json
+import asyncio
 from dataclasses import dataclass
 from typing import Dict, List, Optional, Any, Callable
 from datetime import datetime
@@ -20,6 +21,7 @@ class AgentConfig:
     max_tokens: int = 4096
     system_prompt: str = ""
     tools: List[Dict] = None
+    prompt_caching: bool = True
 
     def __post_init__(self):
         if self.tools is None:
@@ -42,14 +44,48 @@ class BaseAgent:
 
     def __init__(self, config: AgentConfig, memory=None):
         self.config = config
-        self.client = anthropic.Anthropic(
-            api_key=os.getenv("ANTHROPIC_API_KEY")
-        )
+        self._client = None
+        self._client_loop = None
         self.memory = memory
         self.tool_handlers: Dict[str, Callable] = {}
         self.conversation_history: List[Dict] = []
         self.metrics = []
 
+    @property
+    def client(self) -> anthropic.AsyncAnthropic:
+        """Async Anthropic client, recreated if the event loop changes (run_sync)"""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            self._client = anthropic.AsyncAnthropic(
+                api_key=os.getenv("ANTHROPIC_API_KEY")
+            )
+            self._client_loop = loop
+        return self._client
+
+    def get_request_prefix(self) -> Dict[str, Any]:
+        """
+        System prompt and tool definitions for the API call.
+
+        Both are identical on every turn, so with prompt caching enabled the
+        last tool and the system block carry a cache breakpoint and later
+        turns read them from the prompt cache.
+        """
+        system = self.config.system_prompt
+        tools = self.config.tools
+
+        if self.config.prompt_caching:
+            if system:
+                system = [{
+                    "type": "text",
+                    "text": system,
+                    "cache_control": {"type": "ephemeral"}
+                }]
+            if tools:
+                tools = [dict(tool) for tool in tools]
+                tools[-1]["cache_control"] = {"type": "ephemeral"}
+
+        return {"system": system, "tools": tools}
+
     def register_tool_handler(self, tool_name: str, handler: Callable):
         """Register a function to handle a specific tool call"""
         self.tool_handlers[tool_name] = handler
@@ -83,6 +119,19 @@ class BaseAgent:
         except Exception as e:
             return {"error": str(e)}
 
+    async def execute_tool_async(self, tool_name: str, tool_input: Dict) -> Any:
+        """Execute a tool without blocking the event loop (sync handlers run in a thread)"""
+        handler = self.tool_handlers.get(tool_name)
+        if handler is None:
+            return {"error": f"Unknown tool: {tool_name}"}
+
+        try:
+            if asyncio.iscoroutinefunction(handler):
+                return await handler(tool_input)
+            return await asyncio.to_thread(handler, tool_input)
+        except Exception as e:
+            return {"error": str(e)}
+
     async def run(self, user_message: str) -> str:
         """
         Main agent loop with tool calling support.
@@ -90,57 +139,68 @@ class BaseAgent:
         """
         start_time = datetime.now()
         tool_calls = 0
+        api_calls = 0
+        usage_totals = {
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "cache_read_input_tokens": 0,
+            "cache_creation_input_tokens": 0
+        }
 
         # Add user message to history
         self.add_message("user", user_message)
+        request_prefix = self.get_request_prefix()
 
         while True:
             # Call Claude API
-            response = self.client.messages.create(
+            response = await self.client.messages.create(
                 model=self.config.model,
                 max_tokens=self.config.max_tokens,
                 temperature=self.config.temperature,
-                system=self.config.system_prompt,
-                tools=self.config.tools,
-                messages=self.get_messages_for_api()
+                messages=self.get_messages_for_api(),
+                **request_prefix
             )
-
-            # Check if Claude wants to use a tool
-            if response.stop_reason == "tool_use":
-                # Find tool use block
-                tool_use = None
-                for block in response.content:
-                    if block.type == "tool_use":
-                        tool_use = block
-                        break
-
-                if tool_use:
-                    tool_calls += 1
-
-                    # Execute the tool
-                    tool_result = self.execute_tool(
-                        tool_use.name,
-                        tool_use.input
-                    )
-
-                    # Add assistant response and tool result to history
-                    self.conversation_history.append({
-                        "role": "assistant",
-                        "content": response.content,
-                        "timestamp": datetime.now().isoformat()
-                    })
-
-                    self.conversation_history.append({
-                        "role": "user",
-                        "content": [{
-                            "type": "tool_result",
-                            "tool_use_id": tool_use.id,
-                            "content": json.dumps(tool_result)
-                        }],
-                        "timestamp": datetime.now().isoformat()
-                    })
-
-                    continue
+            api_calls += 1
+            for key in usage_totals:
+                usage_totals[key] += getattr(response.usage, key, 0) or 0
+
+            # Check if Claude wants to use tools
+            tool_uses = [block for block in response.content if block.type == "tool_use"]
+
+            if response.stop_reason == "tool_use" and tool_uses:
+                tool_calls += len(tool_uses)
+
+                # Execute every requested tool concurrently
+                tool_results = await asyncio.gather(*(
+                    self.execute_tool_async(tool_use.name, tool_use.input)
+                    for tool_use in tool_uses
+                ))
+
+                # Add assistant response and all tool results to history
+                self.conversation_history.append({
+                    "role": "assistant",
+                    "content": response.content,
+                    "timestamp": datetime.now().isoformat()
+                })
+
+                result_blocks = []
+                for tool_use, tool_result in zip(tool_uses, tool_results):
+                    block = {
+                        "type": "tool_result",
+                        "tool_use_id": tool_use.id,
+                        "content": json.dumps(tool_result, default=str)
+                    }
+                    if isinstance(tool_result, dict) and "error" in tool_result:
+                        block["is_error"] = True
+                    result_blocks.append(block)
+
+                self.conversation_history.append({
+                    "role": "user",
+                    "content": result_blocks,
+                    "timestamp": datetime.now().isoformat()
+                })
+
+                continue
 
             # No more tools needed - extract final response
             final_response = ""
@@ -157,6 +217,8 @@ class BaseAgent:
                 "timestamp": end_time.isoformat(),
                 "response_time": (end_time - start_time).total_seconds(),
                 "tool_calls": tool_calls,
+                "api_calls": api_calls,
+                **usage_totals,
                 "success": True
             })
 
@@ -164,7 +226,6 @@ class BaseAgent:
 
     def run_sync(self, user_message: str) -> str:
         """Synchronous version of run() for non-async contexts"""
-        import asyncio
         return asyncio.run(self.run(user_message))
 
     def get_performance_stats(self, window: int = 100) -> Dict:
@@ -177,7 +238,10 @@ class BaseAgent:
             "total_interactions": len(recent),
             "avg_response_time": sum(m["response_time"] for m in recent) / len(recent),
             "success_rate": sum(1 for m in recent if m["success"]) / len(recent),
-            "avg_tool_calls": sum(m["tool_calls"] for m in recent) / len(recent)
+            "avg_tool_calls": sum(m["tool_calls"] for m in recent) / len(recent),
+            "avg_api_calls": sum(m.get("api_calls", 0) for m in recent) / len(recent),
+            "cache_read_tokens": sum(m.get("cache_read_input_tokens", 0) for m in recent),
+            "cache_creation_tokens": sum(m.get("cache_creation_input_tokens", 0) for m in recent)
         }
 
 
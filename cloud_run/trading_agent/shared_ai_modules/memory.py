@@ -4,10 +4,32 @@ Multi-layer memory: Episodic, Working, Long-term (BigQuery/Firestore)
 """
 
 import os
+import re
+import math
+import time
+import zlib
+import atexit
+import threading
+from collections import OrderedDict
 from datetime import datetime
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass, field
 
+# Insight store limits
+MAX_INSIGHTS = int(os.getenv("AGENT_MEMORY_MAX_INSIGHTS", "20000"))
+INSIGHT_FLUSH_BATCH = int(os.getenv("AGENT_MEMORY_FLUSH_BATCH", "50"))
+INSIGHT_FLUSH_SECONDS = float(os.getenv("AGENT_MEMORY_FLUSH_SECONDS", "10"))
+FIRESTORE_BATCH_LIMIT = 500
+
+# Hashed embedding size for local similarity search
+EMBEDDING_DIM = 512
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9_.$-]+")
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is",
+    "it", "of", "on", "or", "the", "to", "was", "with"
+}
+
 
 @dataclass
 class MemoryEntry:
@@ -18,6 +40,162 @@ class MemoryEntry:
     metadata: Dict = field(default_factory=dict)
 
 
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens used by the insight index"""
+    return [
+        token.strip(".-") for token in TOKEN_PATTERN.findall((text or "").lower())
+        if token.strip(".-") and token.strip(".-") not in STOP_WORDS
+    ]
+
+
+def embed_text(text: str) -> Dict[int, float]:
+    """
+    Deterministic sparse embedding: word tokens and character trigrams hashed
+    into EMBEDDING_DIM buckets, L2-normalized. Stable across processes.
+    """
+    vector: Dict[int, float] = {}
+    for token in tokenize(text):
+        features = [token]
+        padded = f"#{token}#"
+        features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+        for feature in features:
+            bucket = zlib.crc32(feature.encode("utf-8")) % EMBEDDING_DIM
+            vector[bucket] = vector.get(bucket, 0.0) + 1.0
+    norm = math.sqrt(sum(v * v for v in vector.values()))
+    if norm:
+        vector = {k: v / norm for k, v in vector.items()}
+    return vector
+
+
+def cosine_similarity(a: Dict[int, float], b: Dict[int, float]) -> float:
+    """Dot product of two normalized sparse vectors"""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+class InsightStore:
+    """
+    Bounded insight cache with an inverted token index.
+
+    Entries are kept in least-recently-used order; storing past max_size evicts the
+    oldest. Lookups touch only the postings of the query tokens, so search cost
+    depends on the query rather than on the number of stored insights.
+    """
+
+    def __init__(self, max_size: int = MAX_INSIGHTS):
+        self.max_size = max_size
+        self._entries: "OrderedDict[int, MemoryEntry]" = OrderedDict()
+        self._tokens: Dict[int, set] = {}
+        self._vectors: Dict[int, Dict[int, float]] = {}
+        self._index: Dict[str, set] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(list(self._entries.values()))
+
+    def __getitem__(self, index):
+        return list(self._entries.values())[index]
+
+    def add(self, entry: MemoryEntry) -> int:
+        """Index an entry, evicting the least recently used one if full"""
+        tokens = set(tokenize(entry.content)) | set(tokenize(entry.category))
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            self._tokens[entry_id] = tokens
+            for token in tokens:
+                self._index.setdefault(token, set()).add(entry_id)
+            while len(self._entries) > self.max_size:
+                self._evict_oldest()
+        return entry_id
+
+    def _evict_oldest(self):
+        entry_id, _ = self._entries.popitem(last=False)
+        for token in self._tokens.pop(entry_id, ()):
+            postings = self._index.get(token)
+            if postings is not None:
+                postings.discard(entry_id)
+                if not postings:
+                    del self._index[token]
+        self._vectors.pop(entry_id, None)
+        self.evictions += 1
+
+    def _vector(self, entry_id: int) -> Dict[int, float]:
+        vector = self._vectors.get(entry_id)
+        if vector is None:
+            entry = self._entries[entry_id]
+            vector = embed_text(f"{entry.content} {entry.category}")
+            self._vectors[entry_id] = vector
+        return vector
+
+    def search(self, query: str, limit: int = 5, use_embeddings: bool = False,
+               category: str = None) -> List[MemoryEntry]:
+        """
+        Rank entries sharing tokens with the query.
+
+        Scores by IDF-weighted token overlap, or by cosine similarity of hashed
+        embeddings when use_embeddings is set. Returned entries become most recent.
+        """
+        query_tokens = set(tokenize(query))
+        if not query_tokens:
+            return []
+
+        with self._lock:
+            total = len(self._entries) or 1
+            scores: Dict[int, float] = {}
+            for token in query_tokens:
+                postings = self._index.get(token)
+                if not postings:
+                    continue
+                idf = math.log(1 + total / len(postings))
+                for entry_id in postings:
+                    scores[entry_id] = scores.get(entry_id, 0.0) + idf
+
+            if category:
+                scores = {
+                    entry_id: score for entry_id, score in scores.items()
+                    if self._entries[entry_id].category == category
+                }
+
+            if use_embeddings and scores:
+                query_vector = embed_text(query)
+                scores = {
+                    entry_id: cosine_similarity(query_vector, self._vector(entry_id))
+                    for entry_id in scores
+                }
+
+            # Ties go to the newer insight
+            ranked = sorted(scores, key=lambda entry_id: (scores[entry_id], entry_id), reverse=True)[:limit]
+            for entry_id in ranked:
+                self._entries.move_to_end(entry_id)
+            return [self._entries[entry_id] for entry_id in ranked]
+
+    def recent(self, limit: int = 5) -> List[MemoryEntry]:
+        """Most recently stored or recalled entries, oldest first"""
+        with self._lock:
+            entries = []
+            for entry_id in reversed(self._entries):
+                if len(entries) >= limit:
+                    break
+                entries.append(self._entries[entry_id])
+            return entries[::-1]
+
+    def stats(self) -> Dict:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "indexed_tokens": len(self._index),
+            "evictions": self.evictions
+        }
+
+
 class AgentMemory:
     """
     Multi-layer memory system for AI agents.
@@ -42,8 +220,14 @@ class AgentMemory:
         self._firestore = None
         self._bigquery = None
 
-        # Local cache for insights
-        self.insights_cache: List[MemoryEntry] = []
+        # Bounded, indexed local cache for insights
+        self.insights_cache = InsightStore()
+
+        # Insights waiting to be written to Firestore in one batch
+        self._pending_insights: List[Dict] = []
+        self._pending_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        atexit.register(self.flush_insights)
 
     @property
     def firestore(self):
@@ -107,7 +291,7 @@ class AgentMemory:
         self.working_memory = {}
 
     def store_insight(self, insight: str, category: str, metadata: Dict = None):
-        """Store important insight in long-term memory"""
+        """Store important insight in long-term memory (Firestore writes are batched)"""
         entry = MemoryEntry(
             content=insight,
             category=category,
@@ -115,30 +299,61 @@ class AgentMemory:
         )
 
         # Add to local cache
-        self.insights_cache.append(entry)
+        self.insights_cache.add(entry)
 
-        # Store in Firestore if available
-        if self.firestore:
-            try:
-                from google.cloud import firestore as fs
-                self.firestore.collection(f'{self.project}_insights').add({
-                    'user_id': self.user_id,
-                    'insight': insight,
-                    'category': category,
-                    'metadata': metadata or {},
-                    'timestamp': fs.SERVER_TIMESTAMP
-                })
-            except Exception as e:
-                print(f"Failed to store insight in Firestore: {e}")
+        # Queue for the next Firestore batch
+        with self._pending_lock:
+            self._pending_insights.append({
+                'user_id': self.user_id,
+                'insight': insight,
+                'category': category,
+                'metadata': metadata or {},
+                'created_at': entry.timestamp
+            })
+            due = (len(self._pending_insights) >= INSIGHT_FLUSH_BATCH or
+                   time.monotonic() - self._last_flush >= INSIGHT_FLUSH_SECONDS)
+
+        if due:
+            self.flush_insights()
+
+    def flush_insights(self) -> int:
+        """Write queued insights to Firestore in batched commits. Returns number written."""
+        with self._pending_lock:
+            pending = self._pending_insights
+            self._pending_insights = []
+            self._last_flush = time.monotonic()
+
+        if not pending:
+            return 0
 
-    def search_insights(self, query: str, limit: int = 5) -> List[MemoryEntry]:
-        """Search insights by keyword (simple implementation)"""
-        query_lower = query.lower()
-        results = [
-            entry for entry in self.insights_cache
-            if query_lower in entry.content.lower() or query_lower in entry.category.lower()
-        ]
-        return results[:limit]
+        if not self.firestore:
+            # Nothing to write to - drop the queue rather than grow it forever
+            return 0
+
+        written = 0
+        try:
+            from google.cloud import firestore as fs
+            collection = self.firestore.collection(f'{self.project}_insights')
+            for start in range(0, len(pending), FIRESTORE_BATCH_LIMIT):
+                chunk = pending[start:start + FIRESTORE_BATCH_LIMIT]
+                batch = self.firestore.batch()
+                for doc in chunk:
+                    batch.set(collection.document(), {**doc, 'timestamp': fs.SERVER_TIMESTAMP})
+                batch.commit()
+                written += len(chunk)
+        except Exception as e:
+            print(f"Failed to store insights in Firestore: {e}")
+            # Requeue what was not committed so the next flush retries it
+            with self._pending_lock:
+                self._pending_insights = pending[written:] + self._pending_insights
+        return written
+
+    def search_insights(self, query: str, limit: int = 5, use_embeddings: bool = False,
+                        category: str = None) -> List[MemoryEntry]:
+        """Search insights through the token index, optionally ranked by embedding similarity"""
+        return self.insights_cache.search(
+            query, limit=limit, use_embeddings=use_embeddings, category=category
+        )
 
     def get_user_preferences(self) -> Dict:
         """Retrieve user preferences from Firestore"""
@@ -176,7 +391,7 @@ class AgentMemory:
             "user_preferences": self.get_user_preferences(),
             "recent_insights": [
                 {"content": e.content, "category": e.category}
-                for e in self.insights_cache[-5:]
+                for e in self.insights_cache.recent(5)
             ]
         }
 
@@ -205,7 +420,7 @@ class AgentMemory:
         self.working_memory = data.get("working_memory", {})
 
         for insight in data.get("insights", []):
-            self.insights_cache.append(MemoryEntry(
+            self.insights_cache.add(MemoryEntry(
                 content=insight["content"],
                 category=insight["category"],
                 timestamp=insight.get("timestamp", datetime.now().isoformat()),
@@ -165,6 +165,35 @@ def test_orchestrator():
         assert "portfolio_review" in trading_orch.workflows
         print("[PASS] TradingOrchestrator has pre-defined workflows")
 
+        # A step only sees its own dependency's result, even when that dependency
+        # failed and an unrelated concurrent step finished last
+        class StepAgent:
+            def __init__(self):
+                self.seen = {}
+
+            async def fast(self, params):
+                return "fast result"
+
+            async def flaky(self, params):
+                await asyncio.sleep(0.05)
+                raise RuntimeError("upstream failed")
+
+            async def after(self, params):
+                self.seen["last_result"] = params.get("last_result")
+                return "done"
+
+        step_agent = StepAgent()
+        orchestrator.register_agent("steps", step_agent)
+        orchestrator.define_workflow("isolated_inputs", [
+            {"agent": "steps", "action": "flaky", "inputs": [], "name": "flaky"},
+            {"agent": "steps", "action": "fast", "inputs": [], "name": "fast"},
+            {"agent": "steps", "action": "after", "inputs": ["flaky"], "name": "after"}
+        ])
+        result = asyncio.run(orchestrator.execute_workflow("isolated_inputs"))
+        assert step_agent.seen == {"last_result": None}
+        assert len(result.errors) == 1
+        print("[PASS] last_result limited to the step's own dependencies")
+
         # Test stats
         stats = orchestrator.get_workflow_stats()
         assert "message" in stats or "total_executions" in stats
@@ -4,9 +4,134 @@ Implements function calling for AI Agents
 """
 
 import os
-from typing import Dict, List, Any, Callable
+import re
+import json
+import time
+import threading
+import functools
+from collections import OrderedDict
+from typing import Dict, List, Any, Callable, Optional, Union
 from datetime import datetime
 
+TOOL_CACHE_ENABLED = os.getenv("TOOL_CACHE_ENABLED", "true").lower() == "true"
+TOOL_CACHE_MAX_ENTRIES = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "2000"))
+
+# Seconds a cached result stays valid, aligned with how often each table refreshes
+MARKET_DATA_TTL = {"5min": 60, "1h": 300, "1day": 900}
+DAILY_SCREEN_TTL = 900
+AD_HOC_QUERY_TTL = 300
+
+
+class ToolResultCache:
+    """
+    Process-wide LRU cache of tool results with per-entry TTLs.
+
+    Keys are the tool name plus its normalized arguments. Concurrent calls
+    for the same key wait for the first one instead of issuing a second query.
+    Error results are never cached.
+    """
+
+    def __init__(self, max_entries: int = TOOL_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._in_flight: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.per_tool: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def make_key(tool_name: str, args: Dict) -> str:
+        normalized = {}
+        for key, value in (args or {}).items():
+            if key == "symbol" and isinstance(value, str):
+                value = value.strip().upper()
+            elif key == "sql" and isinstance(value, str):
+                value = re.sub(r"\s+", " ", value).strip().rstrip(";")
+            normalized[key] = value
+        return f"{tool_name}:{json.dumps(normalized, sort_keys=True, default=str)}"
+
+    def _count(self, tool_name: str, outcome: str):
+        stats = self.per_tool.setdefault(tool_name, {"hits": 0, "misses": 0})
+        stats[outcome] += 1
+        if outcome == "hits":
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def get_or_compute(self, tool_name: str, args: Dict, ttl: float, compute: Callable[[], Any]) -> Any:
+        key = self.make_key(tool_name, args)
+
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry and entry[0] > time.time():
+                    self._entries.move_to_end(key)
+                    self._count(tool_name, "hits")
+                    return entry[1]
+
+                waiter = self._in_flight.get(key)
+                if waiter is None:
+                    self._in_flight[key] = threading.Event()
+                    self._count(tool_name, "misses")
+                    break
+            waiter.wait()
+
+        try:
+            result = compute()
+            if not (isinstance(result, dict) and "error" in result):
+                with self._lock:
+                    self._entries[key] = (time.time() + ttl, result)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                        self.evictions += 1
+            return result
+        finally:
+            with self._lock:
+                self._in_flight.pop(key).set()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "enabled": TOOL_CACHE_ENABLED,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0,
+            "evictions": self.evictions,
+            "per_tool": dict(self.per_tool)
+        }
+
+
+TOOL_CACHE = ToolResultCache()
+
+
+def cached_tool(ttl: Union[float, Callable[[Dict], float]], defaults: Optional[Dict] = None):
+    """
+    Memoize a TradingTools handler in TOOL_CACHE. ttl may depend on the input;
+    defaults are merged into the key so omitted and explicit defaults share it.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, input_data: Dict) -> Any:
+            if not TOOL_CACHE_ENABLED:
+                return method(self, input_data)
+            args = {**(defaults or {}), **(input_data or {})}
+            seconds = ttl(args) if callable(ttl) else ttl
+            return TOOL_CACHE.get_or_compute(
+                method.__name__, args, seconds,
+                lambda: method(self, input_data)
+            )
+        return wrapper
+    return decorator
+
 
 class ToolRegistry:
     """Registry for managing agent tools"""
@@ -43,6 +168,11 @@ class TradingTools:
     def __init__(self):
         self._bigquery = None
 
+    @staticmethod
+    def cache_stats() -> Dict:
+        """Hit/miss statistics for the shared tool result cache"""
+        return TOOL_CACHE.stats()
+
     @property
     def bigquery(self):
         """Lazy-load BigQuery client"""
@@ -183,6 +313,8 @@ class TradingTools:
             }
         ]
 
+    @cached_tool(lambda args: MARKET_DATA_TTL.get(args["interval"], MARKET_DATA_TTL["1day"]),
+                 defaults={"interval": "1day"})
     def get_market_data(self, input_data: Dict) -> Dict:
         """Fetch market data from BigQuery"""
         symbol = input_data.get("symbol", "").upper()
@@ -202,7 +334,7 @@ class TradingTools:
         query = f"""
         SELECT symbol, datetime, open, high, low, close, volume,
                rsi, macd, macd_histogram, adx, sma_20, sma_50, sma_200,
-               ema_12, ema_26, bb_upper, bb_lower, atr
+               ema_12, ema_26
         FROM `aialgotradehits.crypto_trading_data.{table}`
         WHERE symbol = '{symbol}'
         ORDER BY datetime DESC
@@ -299,6 +431,7 @@ class TradingTools:
             "calculated_at": datetime.now().isoformat()
         }
 
+    @cached_tool(DAILY_SCREEN_TTL)
     def detect_rise_cycle(self, input_data: Dict) -> Dict:
         """Detect EMA rise/fall cycle status"""
         symbol = input_data.get("symbol", "").upper()
@@ -346,6 +479,7 @@ class TradingTools:
         except Exception as e:
             return {"error": str(e)}
 
+    @cached_tool(AD_HOC_QUERY_TTL)
     def query_bigquery(self, input_data: Dict) -> Dict:
         """Execute a SQL query on BigQuery"""
         sql = input_data.get("sql", "")
@@ -359,10 +493,11 @@ class TradingTools:
             return {"error": "Only SELECT queries are allowed"}
 
         try:
-            result = list(self.bigquery.query(sql).result())
+            # Only download the rows we return
+            result = list(self.bigquery.query(sql).result(max_results=100))
             # Convert to list of dicts
             rows = []
-            for row in result[:100]:  # Limit to 100 rows
+            for row in result:
                 rows.append(dict(row))
             return {
                 "row_count": len(rows),
@@ -398,6 +533,7 @@ class TradingTools:
             "alert": alert
         }
 
+    @cached_tool(DAILY_SCREEN_TTL, defaults={"asset_type": "all", "limit": 20})
     def get_rise_cycle_candidates(self, input_data: Dict) -> Dict:
         """Get assets that recently entered a rise cycle"""
         asset_type = input_data.get("asset_type", "all")
@@ -447,6 +583,7 @@ class TradingTools:
             "count": len(results)
         }
 
+    @cached_tool(DAILY_SCREEN_TTL, defaults={"min_score": 75, "limit": 20})
     def get_top_growth_scores(self, input_data: Dict) -> Dict:
         """Get assets with highest Growth Scores"""
         min_score = input_data.get("min_score", 75)
@@ -0,0 +1,487 @@
+"""
+Local Feature Store for ML Training Scripts
+===========================================
+Materializes versioned daily feature sets from BigQuery into Parquet files
+partitioned by symbol and year, so training scripts stop re-querying the same
+tables and recomputing the same lag/return/volatility features on every run.
+
+Layout:
+    {FEATURE_STORE_DIR}/{feature_set}/{version}/symbol_key={SYMBOL}/year={YYYY}/data.parquet
+    {FEATURE_STORE_DIR}/{feature_set}/{version}/_manifest.json
+
+Refreshing a symbol only queries dates after its last stored bar (plus a short
+overlap so next-day targets and look-ahead pivot flags are corrected) and
+rewrites the affected year partitions. Reads use column projection and
+symbol/year/date filters pushed down to the Parquet reader.
+
+Usage:
+    from feature_store import refresh_feature_set, read_features
+    refresh_feature_set(client, 'walk_forward_daily', ['AAPL', 'SPY'])
+    df = read_features('walk_forward_daily', ['AAPL'], feature_group='essential_8', start='2020-01-01')
+"""
+
+import os
+import json
+import shutil
+from datetime import datetime, timedelta
+
+import pandas as pd
+import numpy as np
+
+PROJECT_ID = 'aialgotradehits'
+DATASET_ID = 'crypto_trading_data'
+
+FEATURE_STORE_DIR = os.environ.get('FEATURE_STORE_DIR', 'C:/1AITrading/Trading/feature_store')
+
+HISTORY_START = '2006-01-01'
+# Days re-fetched on refresh: next-day target and pivot flags look 2 bars ahead
+REFRESH_OVERLAP_DAYS = 7
+# Extra history queried before the overlap so SQL window features are complete
+SQL_WARMUP_DAYS = 60
+
+ETF_SYMBOLS = ['SPY', 'QQQ', 'QQQI', 'IWM', 'DIA', 'VOO', 'VTI']
+
+# Walk-forward feature sets (same as cloud_functions/walk_forward)
+DEFAULT_16_FEATURES = [
+    'awesome_osc', 'cci', 'macd', 'macd_cross', 'macd_histogram',
+    'macd_signal', 'mfi', 'momentum', 'rsi', 'rsi_overbought',
+    'rsi_oversold', 'rsi_slope', 'rsi_zscore', 'vwap_daily',
+    'pivot_high_flag', 'pivot_low_flag'
+]
+
+ESSENTIAL_8_FEATURES = [
+    'rsi', 'macd', 'macd_histogram', 'momentum',
+    'mfi', 'cci', 'rsi_zscore', 'macd_cross'
+]
+
+LAG_FEATURES = [
+    'rsi_lag1', 'rsi_lag2', 'rsi_lag5',
+    'macd_hist_lag1', 'macd_hist_lag2',
+    'momentum_lag1', 'momentum_lag2',
+    'rsi_ma5', 'macd_ma5',
+    'return_1d', 'return_5d', 'return_10d',
+    'volatility_5d'
+]
+
+# Rows at the start of each symbol without complete lag features
+LAG_WARMUP_ROWS = 10
+
+KEY_COLUMNS = ['symbol', 'datetime', 'year', 'target']
+
+HYBRID_INDICATOR_COLUMNS = [
+    'open', 'high', 'low', 'close', 'volume',
+    'rsi', 'macd', 'macd_signal', 'macd_histogram',
+    'stoch_k', 'stoch_d', 'cci', 'williams_r', 'momentum',
+    'sma_20', 'sma_50', 'sma_200', 'ema_12', 'ema_26',
+    'bollinger_upper', 'bollinger_middle', 'bollinger_lower', 'bb_width',
+    'adx', 'plus_di', 'minus_di', 'atr', 'obv',
+    'golden_cross', 'death_cross', 'cycle_type', 'cycle_pnl_pct',
+    'buy_pressure_pct', 'sell_pressure_pct',
+    'hammer', 'shooting_star', 'bullish_engulfing', 'bearish_engulfing', 'doji',
+    'trend_regime', 'vol_regime'
+]
+
+
+def _utc(value):
+    """Timestamp in UTC from a string, date or (naive or aware) datetime"""
+    ts = pd.Timestamp(value)
+    return ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')
+
+
+def compute_lag_features(df):
+    """Add lag, rolling, return and volatility columns to a single-symbol frame sorted by datetime"""
+
+    # RSI lags
+    df['rsi_lag1'] = df['rsi'].shift(1)
+    df['rsi_lag2'] = df['rsi'].shift(2)
+    df['rsi_lag5'] = df['rsi'].shift(5)
+
+    # MACD lags
+    df['macd_hist_lag1'] = df['macd_histogram'].shift(1)
+    df['macd_hist_lag2'] = df['macd_histogram'].shift(2)
+
+    # Momentum lags
+    df['momentum_lag1'] = df['momentum'].shift(1)
+    df['momentum_lag2'] = df['momentum'].shift(2)
+
+    # Rolling features
+    df['rsi_ma5'] = df['rsi'].rolling(5).mean()
+    df['macd_ma5'] = df['macd_histogram'].rolling(5).mean()
+
+    # Price momentum
+    df['return_1d'] = df['close'].pct_change(1) * 100
+    df['return_5d'] = df['close'].pct_change(5) * 100
+    df['return_10d'] = df['close'].pct_change(10) * 100
+
+    # Volatility
+    df['volatility_5d'] = df['return_1d'].rolling(5).std()
+
+    return df
+
+
+def add_lag_features(df):
+    """Add lag features to improve prediction accuracy"""
+    df = compute_lag_features(df)
+    # Only drop rows with nulls in new lag columns, keep from row 10 onwards
+    return df.iloc[LAG_WARMUP_ROWS:].copy()
+
+
+def _fetch_walk_forward_daily(client, symbol, since=None):
+    """Daily bars with the 16 walk-forward features and next-day target for one symbol"""
+
+    start = since or HISTORY_START
+
+    if symbol not in ETF_SYMBOLS:
+        table = 'stocks_daily_clean'
+        query = f"""
+        WITH deduplicated AS (
+            SELECT *,
+                   ROW_NUMBER() OVER (PARTITION BY symbol, DATE(datetime) ORDER BY datetime DESC) as rn
+            FROM `{PROJECT_ID}.{DATASET_ID}.{table}`
+            WHERE symbol = @symbol
+                AND datetime >= @start
+                AND rsi IS NOT NULL
+                AND close IS NOT NULL
+        ),
+        unique_daily AS (
+            SELECT * EXCEPT(rn) FROM deduplicated WHERE rn = 1
+        ),
+        with_features AS (
+            SELECT
+                symbol,
+                datetime,
+                EXTRACT(YEAR FROM datetime) as year,
+                close,
+                volume,
+                rsi,
+                macd,
+                macd_signal,
+                macd_histogram,
+                mfi,
+                cci,
+                momentum,
+                awesome_osc,
+                COALESCE(rsi_slope, 0) as rsi_slope,
+                COALESCE(rsi_zscore, 0) as rsi_zscore,
+                COALESCE(rsi_overbought, CASE WHEN rsi > 70 THEN 1 ELSE 0 END) as rsi_overbought,
+                COALESCE(rsi_oversold, CASE WHEN rsi < 30 THEN 1 ELSE 0 END) as rsi_oversold,
+                COALESCE(macd_cross, 0) as macd_cross,
+                COALESCE(vwap_daily, (high+low+close)/3) as vwap_daily,
+                COALESCE(pivot_low_flag, 0) as pivot_low_flag,
+                COALESCE(pivot_high_flag, 0) as pivot_high_flag,
+                ema_12,
+                ema_26,
+                sma_50,
+                sma_200,
+                adx,
+                -- Target
+                CASE WHEN LEAD(close, 1) OVER (ORDER BY datetime) > close THEN 1 ELSE 0 END as target
+            FROM unique_daily
+        )
+        SELECT * FROM with_features WHERE target IS NOT NULL
+        ORDER BY datetime
+        """
+    else:
+        # ETF query without pivot flags
+        table = 'etfs_daily_clean'
+        query = f"""
+        WITH deduplicated AS (
+            SELECT *,
+                   ROW_NUMBER() OVER (PARTITION BY symbol, DATE(datetime) ORDER BY datetime DESC) as rn
+            FROM `{PROJECT_ID}.{DATASET_ID}.{table}`
+            WHERE symbol = @symbol
+                AND datetime >= @start
+                AND rsi IS NOT NULL
+                AND close IS NOT NULL
+        ),
+        unique_daily AS (
+            SELECT * EXCEPT(rn) FROM deduplicated WHERE rn = 1
+        ),
+        with_features AS (
+            SELECT
+                symbol,
+                datetime,
+                EXTRACT(YEAR FROM datetime) as year,
+                close,
+                volume,
+                rsi,
+                macd,
+                macd_signal,
+                macd_histogram,
+                mfi,
+                cci,
+                momentum,
+                COALESCE(ao, 0) as awesome_osc,
+                rsi - LAG(rsi, 1) OVER (ORDER BY datetime) as rsi_slope,
+                (rsi - AVG(rsi) OVER (ORDER BY datetime ROWS BETWEEN 19 PRECEDING AND CURRENT ROW)) /
+                    NULLIF(STDDEV(rsi) OVER (ORDER BY datetime ROWS BETWEEN 19 PRECEDING AND CURRENT ROW), 0) as rsi_zscore,
+                CASE WHEN rsi > 70 THEN 1 ELSE 0 END as rsi_overbought,
+                CASE WHEN rsi < 30 THEN 1 ELSE 0 END as rsi_oversold,
+                CASE
+                    WHEN macd > macd_signal AND LAG(macd, 1) OVER (ORDER BY datetime) <= LAG(macd_signal, 1) OVER (ORDER BY datetime) THEN 1
+                    WHEN macd < macd_signal AND LAG(macd, 1) OVER (ORDER BY datetime) >= LAG(macd_signal, 1) OVER (ORDER BY datetime) THEN -1
+                    ELSE 0
+                END as macd_cross,
+                (high + low + close) / 3 as vwap_daily,
+                -- Derive pivot flags
+                CASE WHEN low < LAG(low, 1) OVER (ORDER BY datetime) AND low < LAG(low, 2) OVER (ORDER BY datetime)
+                      AND low < LEAD(low, 1) OVER (ORDER BY datetime) AND low < LEAD(low, 2) OVER (ORDER BY datetime)
+                     THEN 1 ELSE 0 END as pivot_low_flag,
+                CASE WHEN high > LAG(high, 1) OVER (ORDER BY datetime) AND high > LAG(high, 2) OVER (ORDER BY datetime)
+                      AND high > LEAD(high, 1) OVER (ORDER BY datetime) AND high > LEAD(high, 2) OVER (ORDER BY datetime)
+                     THEN 1 ELSE 0 END as pivot_high_flag,
+                ema_12,
+                ema_26,
+                sma_50,
+                sma_200,
+                adx,
+                CASE WHEN LEAD(close, 1) OVER (ORDER BY datetime) > close THEN 1 ELSE 0 END as target
+            FROM unique_daily
+        )
+        SELECT * FROM with_features
+        WHERE target IS NOT NULL AND rsi_slope IS NOT NULL
+        ORDER BY datetime
+        """
+
+    from google.cloud import bigquery
+    job_config = bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ScalarQueryParameter('symbol', 'STRING', symbol),
+        bigquery.ScalarQueryParameter('start', 'TIMESTAMP', _utc(start).to_pydatetime())
+    ])
+    return client.query(query, job_config=job_config).to_dataframe()
+
+
+def _indicator_fetcher(table):
+    """Fetcher for the wide daily indicator set used by the hybrid model"""
+
+    def fetch(client, symbol, since=None):
+        from google.cloud import bigquery
+        query = f"""
+        SELECT
+            symbol, datetime,
+            {', '.join(HYBRID_INDICATOR_COLUMNS)}
+        FROM `{PROJECT_ID}.{DATASET_ID}.{table}`
+        WHERE symbol = @symbol
+          AND datetime >= @start
+          AND close IS NOT NULL
+        ORDER BY datetime
+        """
+        job_config = bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ScalarQueryParameter('symbol', 'STRING', symbol),
+            bigquery.ScalarQueryParameter('start', 'TIMESTAMP', _utc(since or HISTORY_START).to_pydatetime())
+        ])
+        return client.query(query, job_config=job_config).to_dataframe()
+
+    return fetch
+
+
+# Bump a version whenever its query or transform changes - old versions stay readable on disk
+FEATURE_SETS = {
+    'walk_forward_daily': {
+        'version': 'v1',
+        'fetch': _fetch_walk_forward_daily,
+        'transform': compute_lag_features,
+        'groups': {
+            'default_16': DEFAULT_16_FEATURES,
+            'essential_8': ESSENTIAL_8_FEATURES,
+            'lag': LAG_FEATURES,
+            'enhanced': DEFAULT_16_FEATURES + LAG_FEATURES,
+        },
+    },
+    'indicators_daily_stocks': {
+        'version': 'v1',
+        'fetch': _indicator_fetcher('stocks_daily_clean'),
+        'transform': None,
+        'groups': {'indicators': HYBRID_INDICATOR_COLUMNS},
+    },
+    'indicators_daily_crypto': {
+        'version': 'v1',
+        'fetch': _indicator_fetcher('crypto_daily_clean'),
+        'transform': None,
+        'groups': {'indicators': HYBRID_INDICATOR_COLUMNS},
+    },
+}
+
+
+def symbol_key(symbol):
+    """Filesystem-safe partition value for a symbol (BTC/USD -> BTC_USD)"""
+    return symbol.replace('/', '_').replace('\\', '_')
+
+
+def feature_set_dir(feature_set, version=None):
+    version = version or FEATURE_SETS[feature_set]['version']
+    return os.path.join(FEATURE_STORE_DIR, feature_set, version)
+
+
+def _manifest_path(feature_set, version=None):
+    return os.path.join(feature_set_dir(feature_set, version), '_manifest.json')
+
+
+def load_manifest(feature_set, version=None):
+    """Per-symbol row counts and last stored datetime for a feature set"""
+    path = _manifest_path(feature_set, version)
+    if not os.path.exists(path):
+        return {'feature_set': feature_set, 'version': version or FEATURE_SETS[feature_set]['version'], 'symbols': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_manifest(feature_set, manifest):
+    path = _manifest_path(feature_set)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2, default=str)
+    os.replace(tmp, path)
+
+
+def _symbol_dir(feature_set, symbol):
+    return os.path.join(feature_set_dir(feature_set), f"symbol_key={symbol_key(symbol)}")
+
+
+def _write_symbol(feature_set, symbol, df, years=None):
+    """Write a symbol's frame as one Parquet file per year, replacing only the given years"""
+    base = _symbol_dir(feature_set, symbol)
+    df = df.copy()
+    df['year'] = pd.to_datetime(df['datetime']).dt.year
+    for year, part in df.groupby('year'):
+        if years is not None and year not in years:
+            continue
+        year_dir = os.path.join(base, f"year={year}")
+        os.makedirs(year_dir, exist_ok=True)
+        # Partition columns live in the directory names, not the file
+        tmp = os.path.join(year_dir, 'data.parquet.tmp')
+        part.drop(columns=['year']).to_parquet(tmp, index=False)
+        os.replace(tmp, os.path.join(year_dir, 'data.parquet'))
+
+
+def _read_symbol(feature_set, symbol):
+    """Full stored frame for one symbol, or an empty frame"""
+    base = _symbol_dir(feature_set, symbol)
+    if not os.path.isdir(base):
+        return pd.DataFrame()
+    df = pd.read_parquet(base)
+    if 'year' in df.columns:
+        df['year'] = df['year'].astype(int)
+    return df.sort_values('datetime').reset_index(drop=True)
+
+
+def refresh_symbol(client, feature_set, symbol, full=False):
+    """
+    Materialize or incrementally extend one symbol. Returns number of new rows.
+
+    Only bars after the last stored date (minus REFRESH_OVERLAP_DAYS) are queried;
+    transforms are recomputed in memory over the whole symbol history.
+    """
+    spec = FEATURE_SETS[feature_set]
+    existing = pd.DataFrame() if full else _read_symbol(feature_set, symbol)
+
+    if existing.empty:
+        since = None
+        fresh = spec['fetch'](client, symbol)
+        combined = fresh
+    else:
+        last = pd.to_datetime(existing['datetime']).max()
+        since = last - timedelta(days=REFRESH_OVERLAP_DAYS)
+        fresh = spec['fetch'](client, symbol, since=(since - timedelta(days=SQL_WARMUP_DAYS)).isoformat())
+        if fresh.empty:
+            return 0
+        # Warmup rows only exist to complete window features - keep stored values for them
+        fresh = fresh[pd.to_datetime(fresh['datetime']) >= since]
+        combined = pd.concat([existing[pd.to_datetime(existing['datetime']) < since], fresh], ignore_index=True)
+
+    if combined.empty:
+        return 0
+
+    combined = combined.sort_values('datetime').drop_duplicates('datetime', keep='last').reset_index(drop=True)
+    stored_columns = [c for c in combined.columns if c not in LAG_FEATURES]
+    combined = combined[stored_columns]
+    if spec['transform']:
+        combined = spec['transform'](combined)
+
+    if full and os.path.isdir(_symbol_dir(feature_set, symbol)):
+        shutil.rmtree(_symbol_dir(feature_set, symbol))
+
+    years = None if since is None else set(range(since.year, datetime.now().year + 1))
+    _write_symbol(feature_set, symbol, combined, years=years)
+
+    new_rows = len(combined) - len(existing)
+    manifest = load_manifest(feature_set)
+    manifest['symbols'][symbol] = {
+        'rows': len(combined),
+        'first_datetime': str(combined['datetime'].min()),
+        'last_datetime': str(combined['datetime'].max()),
+        'refreshed_at': datetime.now().isoformat()
+    }
+    _save_manifest(feature_set, manifest)
+    return max(new_rows, 0)
+
+
+def refresh_feature_set(client, feature_set, symbols, full=False):
+    """Refresh several symbols; errors on one symbol do not stop the others"""
+    added = {}
+    for symbol in symbols:
+        try:
+            added[symbol] = refresh_symbol(client, feature_set, symbol, full=full)
+            print(f"  Feature store {feature_set}/{symbol}: +{added[symbol]} rows")
+        except Exception as e:
+            print(f"  Feature store refresh failed for {symbol}: {e}")
+    return added
+
+
+def read_features(feature_set, symbols=None, columns=None, feature_group=None,
+                  start=None, end=None, years=None, version=None):
+    """
+    Read stored features with projection and filter pushdown.
+
+    columns / feature_group select the feature columns (key columns are always
+    included); symbols, years and start/end prune partitions and row groups.
+    """
+    spec = FEATURE_SETS[feature_set]
+    base = feature_set_dir(feature_set, version)
+    if not os.path.isdir(base):
+        return pd.DataFrame()
+
+    wanted = list(columns or [])
+    if feature_group:
+        wanted += spec['groups'][feature_group]
+    if wanted:
+        wanted = list(dict.fromkeys(KEY_COLUMNS + ['close'] + wanted))
+
+    filters = []
+    if symbols:
+        filters.append(('symbol_key', 'in', [symbol_key(s) for s in symbols]))
+    if years:
+        filters.append(('year', 'in', [int(y) for y in years]))
+    if start:
+        start_ts = _utc(start)
+        filters.append(('year', '>=', start_ts.year))
+        filters.append(('datetime', '>=', start_ts))
+    if end:
+        end_ts = _utc(end)
+        filters.append(('year', '<=', end_ts.year))
+        filters.append(('datetime', '<=', end_ts))
+
+    read_columns = None
+    if wanted:
+        # Only project columns the stored set actually has
+        import pyarrow.dataset as ds
+        schema = ds.dataset(base, format='parquet', partitioning='hive').schema
+        read_columns = [c for c in wanted if c in schema.names]
+
+    try:
+        df = pd.read_parquet(base, columns=read_columns, filters=filters or None)
+    except (FileNotFoundError, ValueError):
+        return pd.DataFrame()
+
+    df = df.drop(columns=['symbol_key'], errors='ignore')
+    if 'year' in df.columns:
+        df['year'] = df['year'].astype(int)
+    return df.sort_values(['symbol', 'datetime']).reset_index(drop=True)
+
+
+def load_features(client, feature_set, symbols, refresh=True, **read_kwargs):
+    """Refresh (incrementally) then read - the usual entry point for training scripts"""
+    if refresh and client is not None:
+        refresh_feature_set(client, feature_set, symbols)
+    return read_features(feature_set, symbols, **read_kwargs)
@@ -22,6 +22,8 @@ from datetime import datetime, timedelta
 import pickle
 import os
 
+from feature_store import load_features
+
 # Configuration
 PROJECT_ID = 'aialgotradehits'
 DATASET_ID = 'crypto_trading_data'
@@ -58,7 +60,18 @@ class HybridTradingModel:
         self.gemini_weight = 0.4  # Sentiment/qualitative weight
 
     def fetch_training_data(self, symbols: list = None, days: int = 365) -> pd.DataFrame:
-        """Fetch training data from BigQuery"""
+        """Fetch training data from the local feature store (or BigQuery for all symbols)"""
+
+        if symbols:
+            print(f"Loading training data for {self.asset_type} from feature store...")
+            df = load_features(
+                bq_client, f'indicators_daily_{self.asset_type}', symbols,
+                start=(datetime.now() - timedelta(days=days)).date().isoformat()
+            )
+            if not df.empty:
+                df = df.drop(columns=['year'], errors='ignore')
+                print(f"  Loaded {len(df):,} records for {df['symbol'].nunique()} symbols")
+                return df
 
         symbol_filter = ""
         if symbols:
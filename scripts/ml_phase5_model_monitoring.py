@@ -9,6 +9,14 @@ Continuously monitors ML model performance and detects:
 4. Concept drift (relationship changes)
 
 Alerts when accuracy falls below thresholds.
+
+One-off setup: creates the monitoring tables and dashboard view. Ongoing
+monitoring is done by the ml_ops function, which updates per-bar drift
+sketches (cloud_functions/ml_ops/drift_monitor.py), model_performance_daily
+and model_drift_alerts on every inference run. This script no longer
+recomputes metrics or raises alerts over the full history each day;
+--backfill seeds model_performance_daily from walk-forward validation
+predictions on a fresh table.
 """
 
 import sys
@@ -20,6 +28,8 @@ from google.cloud import bigquery
 from datetime import datetime, timedelta
 import json
 
+BACKFILL = '--backfill' in sys.argv
+
 PROJECT_ID = 'aialgotradehits'
 DATASET_ID = 'crypto_trading_data'
 ML_DATASET = 'ml_models'
@@ -130,9 +140,9 @@ except Exception as e:
     print(f"  Table exists or error: {e}")
 
 # =============================================================================
-# Step 4: Calculate Daily Performance Metrics
+# Step 4: Backfill Daily Performance Metrics (--backfill only)
 # =============================================================================
-print("\n[4] Calculating Daily Performance Metrics...")
+print("\n[4] Backfilling Daily Performance Metrics...")
 
 daily_performance_query = f"""
 INSERT INTO `{PROJECT_ID}.{ML_DATASET}.model_performance_daily`
@@ -233,30 +243,25 @@ WHERE date NOT IN (SELECT DISTINCT date FROM `{PROJECT_ID}.{ML_DATASET}.model_pe
 ORDER BY date DESC, asset_type
 """
 
-try:
-    result = bq_client.query(daily_performance_query).result()
-    print("  Inserted daily performance metrics")
-except Exception as e:
-    print(f"  Performance insert error: {e}")
+if BACKFILL:
+    try:
+        result = bq_client.query(daily_performance_query).result()
+        print("  Inserted daily performance metrics")
+    except Exception as e:
+        print(f"  Performance insert error: {e}")
+else:
+    print("  Skipped - maintained per bar by ml_ops daily inference (run with --backfill to seed)")
 
 # =============================================================================
-# Step 5: Calculate Rolling Accuracy and Detect Drift
+# Step 5: Backfill Rolling Accuracy (--backfill only)
 # =============================================================================
-print("\n[5] Calculating Rolling Accuracy & Detecting Drift...")
+print("\n[5] Backfilling Rolling Accuracy...")
 
 rolling_accuracy_query = f"""
 UPDATE `{PROJECT_ID}.{ML_DATASET}.model_performance_daily` t
 SET
     rolling_7d_accuracy = r.rolling_7d,
-    rolling_30d_accuracy = r.rolling_30d,
-    drift_detected = CASE
-        WHEN r.rolling_7d < (r.rolling_30d * 0.85) THEN TRUE  -- 15% drop
-        ELSE FALSE
-    END,
-    drift_type = CASE
-        WHEN r.rolling_7d < (r.rolling_30d * 0.85) THEN 'ACCURACY_DRIFT'
-        ELSE NULL
-    END
+    rolling_30d_accuracy = r.rolling_30d
 FROM (
     SELECT
         date,
@@ -276,62 +281,22 @@ FROM (
 WHERE t.date = r.date AND t.asset_type = r.asset_type
 """
 
-try:
-    bq_client.query(rolling_accuracy_query).result()
-    print("  Updated rolling accuracy metrics")
-except Exception as e:
-    print(f"  Rolling accuracy update error: {e}")
-
-# =============================================================================
-# Step 6: Generate Drift Alerts
-# =============================================================================
-print("\n[6] Generating Drift Alerts...")
-
-drift_alert_query = f"""
-INSERT INTO `{PROJECT_ID}.{ML_DATASET}.model_drift_alerts`
-(alert_id, alert_time, asset_type, alert_type, severity, metric_name,
- current_value, threshold_value, baseline_value, message)
+if BACKFILL:
+    try:
+        bq_client.query(rolling_accuracy_query).result()
+        print("  Updated rolling accuracy metrics")
+    except Exception as e:
+        print(f"  Rolling accuracy update error: {e}")
+else:
+    print("  Skipped - drift is detected by the ml_ops monitor sketches")
 
-SELECT
-    GENERATE_UUID() as alert_id,
-    CURRENT_TIMESTAMP() as alert_time,
-    asset_type,
-    'ACCURACY_DRIFT' as alert_type,
-    CASE
-        WHEN rolling_7d_accuracy < (rolling_30d_accuracy * 0.75) THEN 'CRITICAL'
-        ELSE 'WARNING'
-    END as severity,
-    'rolling_7d_accuracy' as metric_name,
-    rolling_7d_accuracy as current_value,
-    rolling_30d_accuracy * 0.85 as threshold_value,
-    rolling_30d_accuracy as baseline_value,
-    CONCAT(
-        'Model accuracy dropped for ', asset_type, ': ',
-        CAST(ROUND(rolling_7d_accuracy, 1) AS STRING), '% (7-day) vs ',
-        CAST(ROUND(rolling_30d_accuracy, 1) AS STRING), '% (30-day baseline)'
-    ) as message
-
-FROM `{PROJECT_ID}.{ML_DATASET}.model_performance_daily`
-WHERE date = DATE_SUB(CURRENT_DATE(), INTERVAL 1 DAY)
-  AND drift_detected = TRUE
-  AND NOT EXISTS (
-      SELECT 1 FROM `{PROJECT_ID}.{ML_DATASET}.model_drift_alerts`
-      WHERE DATE(alert_time) = CURRENT_DATE()
-        AND asset_type = model_performance_daily.asset_type
-        AND alert_type = 'ACCURACY_DRIFT'
-  )
-"""
-
-try:
-    bq_client.query(drift_alert_query).result()
-    print("  Generated drift alerts")
-except Exception as e:
-    print(f"  Alert generation error: {e}")
+# Drift alerts are raised by the ml_ops monitor (one per newly active condition,
+# re-armed when it clears); this script no longer inserts them from daily history.
 
 # =============================================================================
-# Step 7: Create Monitoring View
+# Step 6: Create Monitoring View
 # =============================================================================
-print("\n[7] Creating Monitoring Dashboard View...")
+print("\n[6] Creating Monitoring Dashboard View...")
 
 create_monitoring_view = f"""
 CREATE OR REPLACE VIEW `{PROJECT_ID}.{ML_DATASET}.v_model_monitoring_dashboard` AS
@@ -393,9 +358,9 @@ except Exception as e:
     print(f"  View creation error: {e}")
 
 # =============================================================================
-# Step 8: Display Current Model Health
+# Step 7: Display Current Model Health
 # =============================================================================
-print("\n[8] Current Model Health Status...")
+print("\n[7] Current Model Health Status...")
 print("-" * 70)
 
 health_query = f"""
@@ -422,9 +387,9 @@ except Exception as e:
     print(f"  Health query error: {e}")
 
 # =============================================================================
-# Step 9: Check Active Alerts
+# Step 8: Check Active Alerts
 # =============================================================================
-print("\n[9] Active Drift Alerts...")
+print("\n[8] Active Drift Alerts...")
 print("-" * 70)
 
 alerts_query = f"""
@@ -462,9 +427,9 @@ Created Tables:
 Created Views:
   - v_model_monitoring_dashboard: Unified monitoring view
 
-Drift Detection Rules:
-  - WARNING: 7-day accuracy < 85% of 30-day baseline
-  - CRITICAL: 7-day accuracy < 75% of 30-day baseline
+Drift Detection:
+  - ml_ops daily inference updates per-bar sketches (accuracy, calibration,
+    feature PSI) and writes model_drift_alerts when a condition becomes active
 
 Query Examples:
   -- Check model health
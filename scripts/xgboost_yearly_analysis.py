@@ -14,12 +14,15 @@ Improvements for better accuracy:
 
 import sys
 import io
+import os
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
 
 import pandas as pd
 import numpy as np
 from google.cloud import bigquery
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
 import json
 import warnings
 warnings.filterwarnings('ignore')
@@ -30,6 +33,8 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, confusion_matrix
 import xgboost as xgb
 
+from feature_store import load_features, add_lag_features, LAG_FEATURES
+
 # PDF generation
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
@@ -84,171 +89,29 @@ BEST_PARAMS = {
 }
 
 
+# Parallel grid: worker processes and XGBoost threads per (symbol, year) task
+MAX_WORKERS = int(os.environ.get('YEARLY_MAX_WORKERS', os.cpu_count() or 1))
+XGB_THREADS_PER_TASK = int(os.environ.get('YEARLY_XGB_THREADS', max(1, (os.cpu_count() or 1) // MAX_WORKERS)))
+
+# Completed (symbol, year) tasks, so a crashed run resumes where it stopped
+CHECKPOINT_FILE = "C:/1AITrading/Trading/xgboost_yearly_checkpoint.jsonl"
+
+
 def get_client():
     return bigquery.Client(project=PROJECT_ID)
 
 
 def fetch_all_data(client, symbol):
-    """Fetch all historical data for a symbol with deduplication"""
-
-    # Determine table
-    if symbol in ['SPY', 'QQQ', 'QQQI', 'IWM', 'DIA', 'VOO', 'VTI']:
-        table = 'etfs_daily_clean'
-        has_pivot = False
-    else:
-        table = 'stocks_daily_clean'
-        has_pivot = True
-
-    if has_pivot:
-        query = f"""
-        WITH deduplicated AS (
-            SELECT *,
-                   ROW_NUMBER() OVER (PARTITION BY symbol, DATE(datetime) ORDER BY datetime DESC) as rn
-            FROM `{PROJECT_ID}.{DATASET_ID}.{table}`
-            WHERE symbol = '{symbol}'
-                AND datetime >= '2006-01-01'
-                AND rsi IS NOT NULL
-                AND close IS NOT NULL
-        ),
-        unique_daily AS (
-            SELECT * EXCEPT(rn) FROM deduplicated WHERE rn = 1
-        ),
-        with_features AS (
-            SELECT
-                symbol,
-                datetime,
-                EXTRACT(YEAR FROM datetime) as year,
-                close,
-                volume,
-                rsi,
-                macd,
-                macd_signal,
-                macd_histogram,
-                mfi,
-                cci,
-                momentum,
-                awesome_osc,
-                COALESCE(rsi_slope, 0) as rsi_slope,
-                COALESCE(rsi_zscore, 0) as rsi_zscore,
-                COALESCE(rsi_overbought, CASE WHEN rsi > 70 THEN 1 ELSE 0 END) as rsi_overbought,
-                COALESCE(rsi_oversold, CASE WHEN rsi < 30 THEN 1 ELSE 0 END) as rsi_oversold,
-                COALESCE(macd_cross, 0) as macd_cross,
-                COALESCE(vwap_daily, (high+low+close)/3) as vwap_daily,
-                COALESCE(pivot_low_flag, 0) as pivot_low_flag,
-                COALESCE(pivot_high_flag, 0) as pivot_high_flag,
-                ema_12,
-                ema_26,
-                sma_50,
-                sma_200,
-                adx,
-                -- Target
-                CASE WHEN LEAD(close, 1) OVER (ORDER BY datetime) > close THEN 1 ELSE 0 END as target
-            FROM unique_daily
-        )
-        SELECT * FROM with_features WHERE target IS NOT NULL
-        ORDER BY datetime
-        """
-    else:
-        # ETF query without pivot flags
-        query = f"""
-        WITH deduplicated AS (
-            SELECT *,
-                   ROW_NUMBER() OVER (PARTITION BY symbol, DATE(datetime) ORDER BY datetime DESC) as rn
-            FROM `{PROJECT_ID}.{DATASET_ID}.{table}`
-            WHERE symbol = '{symbol}'
-                AND datetime >= '2006-01-01'
-                AND rsi IS NOT NULL
-                AND close IS NOT NULL
-        ),
-        unique_daily AS (
-            SELECT * EXCEPT(rn) FROM deduplicated WHERE rn = 1
-        ),
-        with_features AS (
-            SELECT
-                symbol,
-                datetime,
-                EXTRACT(YEAR FROM datetime) as year,
-                close,
-                volume,
-                rsi,
-                macd,
-                macd_signal,
-                macd_histogram,
-                mfi,
-                cci,
-                momentum,
-                COALESCE(ao, 0) as awesome_osc,
-                rsi - LAG(rsi, 1) OVER (ORDER BY datetime) as rsi_slope,
-                (rsi - AVG(rsi) OVER (ORDER BY datetime ROWS BETWEEN 19 PRECEDING AND CURRENT ROW)) /
-                    NULLIF(STDDEV(rsi) OVER (ORDER BY datetime ROWS BETWEEN 19 PRECEDING AND CURRENT ROW), 0) as rsi_zscore,
-                CASE WHEN rsi > 70 THEN 1 ELSE 0 END as rsi_overbought,
-                CASE WHEN rsi < 30 THEN 1 ELSE 0 END as rsi_oversold,
-                CASE
-                    WHEN macd > macd_signal AND LAG(macd, 1) OVER (ORDER BY datetime) <= LAG(macd_signal, 1) OVER (ORDER BY datetime) THEN 1
-                    WHEN macd < macd_signal AND LAG(macd, 1) OVER (ORDER BY datetime) >= LAG(macd_signal, 1) OVER (ORDER BY datetime) THEN -1
-                    ELSE 0
-                END as macd_cross,
-                (high + low + close) / 3 as vwap_daily,
-                -- Derive pivot flags
-                CASE WHEN low < LAG(low, 1) OVER (ORDER BY datetime) AND low < LAG(low, 2) OVER (ORDER BY datetime)
-                      AND low < LEAD(low, 1) OVER (ORDER BY datetime) AND low < LEAD(low, 2) OVER (ORDER BY datetime)
-                     THEN 1 ELSE 0 END as pivot_low_flag,
-                CASE WHEN high > LAG(high, 1) OVER (ORDER BY datetime) AND high > LAG(high, 2) OVER (ORDER BY datetime)
-                      AND high > LEAD(high, 1) OVER (ORDER BY datetime) AND high > LEAD(high, 2) OVER (ORDER BY datetime)
-                     THEN 1 ELSE 0 END as pivot_high_flag,
-                ema_12,
-                ema_26,
-                sma_50,
-                sma_200,
-                adx,
-                CASE WHEN LEAD(close, 1) OVER (ORDER BY datetime) > close THEN 1 ELSE 0 END as target
-            FROM unique_daily
-        )
-        SELECT * FROM with_features
-        WHERE target IS NOT NULL AND rsi_slope IS NOT NULL
-        ORDER BY datetime
-        """
-
+    """Fetch all historical data for a symbol from the local feature store (refreshed incrementally)"""
     try:
-        df = client.query(query).to_dataframe()
-        return df
+        df = load_features(client, 'walk_forward_daily', [symbol])
+        # Lag features are recomputed per training split below
+        return df.drop(columns=[c for c in LAG_FEATURES if c in df.columns])
     except Exception as e:
         print(f"  Error fetching {symbol}: {e}")
         return pd.DataFrame()
 
 
-def add_lag_features(df):
-    """Add lag features to improve prediction accuracy"""
-
-    # RSI lags
-    df['rsi_lag1'] = df['rsi'].shift(1)
-    df['rsi_lag2'] = df['rsi'].shift(2)
-    df['rsi_lag5'] = df['rsi'].shift(5)
-
-    # MACD lags
-    df['macd_hist_lag1'] = df['macd_histogram'].shift(1)
-    df['macd_hist_lag2'] = df['macd_histogram'].shift(2)
-
-    # Momentum lags
-    df['momentum_lag1'] = df['momentum'].shift(1)
-    df['momentum_lag2'] = df['momentum'].shift(2)
-
-    # Rolling features
-    df['rsi_ma5'] = df['rsi'].rolling(5).mean()
-    df['macd_ma5'] = df['macd_histogram'].rolling(5).mean()
-
-    # Price momentum
-    df['return_1d'] = df['close'].pct_change(1) * 100
-    df['return_5d'] = df['close'].pct_change(5) * 100
-    df['return_10d'] = df['close'].pct_change(10) * 100
-
-    # Volatility
-    df['volatility_5d'] = df['return_1d'].rolling(5).std()
-
-    # Only drop rows with nulls in new lag columns, keep from row 10 onwards
-    return df.iloc[10:].copy()
-
-
 def prepare_features(df, use_enhanced=True):
     """Prepare features for training"""
 
@@ -288,14 +151,17 @@ def prepare_features(df, use_enhanced=True):
     return X, y, available
 
 
-def train_yearly_model(df, test_year, use_enhanced=True):
-    """Train model on data before test_year, test on test_year"""
+def train_yearly_model(df, test_year, use_enhanced=True, lagged=False, n_jobs=None):
+    """Train model on data before test_year, test on test_year
+
+    Pass lagged=True when df already went through add_lag_features.
+    """
 
     # Add enhanced features BEFORE year splitting
-    if use_enhanced:
+    if use_enhanced and not lagged:
         df_enhanced = add_lag_features(df.copy())
     else:
-        df_enhanced = df.copy()
+        df_enhanced = df
 
     # Split by year - train on all years before test_year
     train_df = df_enhanced[df_enhanced['year'] < test_year]
@@ -321,7 +187,10 @@ def train_yearly_model(df, test_year, use_enhanced=True):
     X_test_scaled = scaler.transform(X_test)
 
     # Train with best params
-    model = xgb.XGBClassifier(**BEST_PARAMS)
+    params = dict(BEST_PARAMS)
+    if n_jobs:
+        params['n_jobs'] = n_jobs
+    model = xgb.XGBClassifier(**params)
     model.fit(X_train_scaled, y_train, eval_set=[(X_test_scaled, y_test)], verbose=False)
 
     # Predict
@@ -359,8 +228,41 @@ def train_yearly_model(df, test_year, use_enhanced=True):
     }
 
 
+def _year_status(result):
+    return "PASS" if result['up_accuracy'] >= 65 else ("OK" if result['up_accuracy'] >= 60 else "REVIEW")
+
+
+def summarize_symbol(symbol, yearly_results):
+    """Summary stats across a symbol's yearly results, or None when there are none"""
+
+    if not yearly_results:
+        return None
+
+    yearly_results = sorted(yearly_results, key=lambda r: r['year'])
+
+    # Calculate summary stats
+    avg_up = np.mean([r['up_accuracy'] for r in yearly_results])
+    avg_down = np.mean([r['down_accuracy'] for r in yearly_results])
+    best_year = max(yearly_results, key=lambda x: x['up_accuracy'])
+    worst_year = min(yearly_results, key=lambda x: x['up_accuracy'])
+
+    return {
+        'symbol': symbol,
+        'total_years': len(yearly_results),
+        'avg_up_accuracy': round(avg_up, 1),
+        'avg_down_accuracy': round(avg_down, 1),
+        'best_year': best_year['year'],
+        'best_up_accuracy': round(best_year['up_accuracy'], 1),
+        'worst_year': worst_year['year'],
+        'worst_up_accuracy': round(worst_year['up_accuracy'], 1),
+        'years_above_65': sum(1 for r in yearly_results if r['up_accuracy'] >= 65),
+        'years_above_60': sum(1 for r in yearly_results if r['up_accuracy'] >= 60),
+        'yearly_results': yearly_results
+    }
+
+
 def analyze_symbol_yearly(client, symbol):
-    """Analyze a symbol across all years"""
+    """Analyze a symbol across all years (sequential)"""
 
     print(f"\n{'='*60}")
     print(f"Analyzing {symbol} (2010-2025)")
@@ -376,6 +278,9 @@ def analyze_symbol_yearly(client, symbol):
     print(f"  Total records: {len(df)}")
     print(f"  Date range: {df['datetime'].min()} to {df['datetime'].max()}")
 
+    # Lag features depend only on the symbol's own history - compute once
+    df_enhanced = add_lag_features(df.copy())
+
     # Analyze each year
     yearly_results = []
 
@@ -383,35 +288,116 @@ def analyze_symbol_yearly(client, symbol):
         if year < 2011:  # Need at least 1 year of training data
             continue
 
-        result = train_yearly_model(df, year, use_enhanced=True)
+        result = train_yearly_model(df_enhanced, year, use_enhanced=True, lagged=True)
 
         if result:
             yearly_results.append(result)
-            status = "PASS" if result['up_accuracy'] >= 65 else ("OK" if result['up_accuracy'] >= 60 else "REVIEW")
-            print(f"  {year}: UP {result['up_accuracy']:.1f}% | DOWN {result['down_accuracy']:.1f}% | {status}")
-
-    if not yearly_results:
-        return None
-
-    # Calculate summary stats
-    avg_up = np.mean([r['up_accuracy'] for r in yearly_results])
-    avg_down = np.mean([r['down_accuracy'] for r in yearly_results])
-    best_year = max(yearly_results, key=lambda x: x['up_accuracy'])
-    worst_year = min(yearly_results, key=lambda x: x['up_accuracy'])
-
-    return {
-        'symbol': symbol,
-        'total_years': len(yearly_results),
-        'avg_up_accuracy': round(avg_up, 1),
-        'avg_down_accuracy': round(avg_down, 1),
-        'best_year': best_year['year'],
-        'best_up_accuracy': round(best_year['up_accuracy'], 1),
-        'worst_year': worst_year['year'],
-        'worst_up_accuracy': round(worst_year['up_accuracy'], 1),
-        'years_above_65': sum(1 for r in yearly_results if r['up_accuracy'] >= 65),
-        'years_above_60': sum(1 for r in yearly_results if r['up_accuracy'] >= 60),
-        'yearly_results': yearly_results
-    }
+            print(f"  {year}: UP {result['up_accuracy']:.1f}% | DOWN {result['down_accuracy']:.1f}% | {_year_status(result)}")
+
+    return summarize_symbol(symbol, yearly_results)
+
+
+def _cap_worker_threads(threads):
+    """
+    Cap native thread pools for worker processes so processes x threads fits the machine.
+    Must run before the pool starts: the variables are only read when numpy/xgboost
+    load in the (spawned) worker. XGBoost itself is also capped through n_jobs.
+    """
+    for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[var] = str(threads)
+
+
+def _init_worker():
+    warnings.filterwarnings('ignore')
+
+
+def _train_task(symbol, year, df_enhanced, n_jobs):
+    """Process-pool entry point for one (symbol, year) cell of the grid"""
+    return symbol, year, train_yearly_model(df_enhanced, year, use_enhanced=True, lagged=True, n_jobs=n_jobs)
+
+
+def load_checkpoint(path):
+    """
+    {(symbol, year): result} for tasks finished by a previous run.
+    Years that had too little data (null result) are not treated as done, so a
+    rerun after a data backfill trains them.
+    """
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Partially written last line of a crashed run
+                continue
+            if entry.get('result') is not None:
+                done[(entry['symbol'], entry['year'])] = entry['result']
+    return done
+
+
+def run_yearly_grid(client, symbols=SYMBOLS, years=YEARS, max_workers=MAX_WORKERS,
+                    checkpoint_file=CHECKPOINT_FILE):
+    """
+    Train every (symbol, test year) model in parallel.
+
+    Data is fetched and lag features computed once per symbol in this process;
+    training tasks fan out over a process pool. Each finished task is appended to
+    the checkpoint file, and tasks already in it are skipped on restart.
+    Returns per-symbol summaries in the same order as symbols.
+    """
+    done = load_checkpoint(checkpoint_file)
+    if done:
+        print(f"Resuming: {len(done)} (symbol, year) tasks already in checkpoint")
+
+    test_years = [year for year in years if year >= 2011]  # Need at least 1 year of training data
+    results_by_symbol = {symbol: {} for symbol in symbols}
+    for (symbol, year), result in done.items():
+        if symbol in results_by_symbol:
+            results_by_symbol[symbol][year] = result
+
+    os.makedirs(os.path.dirname(checkpoint_file) or '.', exist_ok=True)
+    # Spawned workers import numpy/xgboost fresh, after the thread caps are in the environment
+    _cap_worker_threads(XGB_THREADS_PER_TASK)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             mp_context=multiprocessing.get_context('spawn')) as executor, \
+            open(checkpoint_file, 'a') as checkpoint:
+        futures = []
+        for symbol in symbols:
+            pending = [year for year in test_years if (symbol, year) not in done]
+            if not pending:
+                continue
+
+            df = fetch_all_data(client, symbol)
+            if df.empty:
+                print(f"  No data found for {symbol}")
+                continue
+            print(f"  {symbol}: {len(df)} records, {len(pending)} years to train")
+            df_enhanced = add_lag_features(df.copy())
+
+            for year in pending:
+                futures.append(executor.submit(_train_task, symbol, year, df_enhanced, XGB_THREADS_PER_TASK))
+
+        for future in as_completed(futures):
+            try:
+                symbol, year, result = future.result()
+            except Exception as e:
+                print(f"  Task failed: {e}")
+                continue
+            results_by_symbol[symbol][year] = result
+            if result is None:
+                # Too little data for this year: not checkpointed, so a later run retries it
+                print(f"  {symbol} {year}: insufficient data")
+                continue
+            checkpoint.write(json.dumps({'symbol': symbol, 'year': year, 'result': result}, default=str) + '\n')
+            checkpoint.flush()
+            print(f"  {symbol} {year}: UP {result['up_accuracy']:.1f}% | DOWN {result['down_accuracy']:.1f}% | {_year_status(result)}")
+
+    return [
+        summarize_symbol(symbol, [r for r in results_by_symbol[symbol].values() if r])
+        for symbol in symbols
+    ]
 
 
 def generate_yearly_chart(all_results, filename):
@@ -578,12 +564,11 @@ def main():
     print(f"Symbols: {', '.join(SYMBOLS)}")
     print("="*70)
 
+    print(f"Workers: {MAX_WORKERS} x {XGB_THREADS_PER_TASK} XGBoost threads")
+
     client = get_client()
 
-    all_results = []
-    for symbol in SYMBOLS:
-        result = analyze_symbol_yearly(client, symbol)
-        all_results.append(result)
+    all_results = run_yearly_grid(client)
 
     # Summary
     print("\n" + "="*70)
@@ -619,6 +604,10 @@ def main():
         }, f, indent=2, default=str)
     print(f"JSON: {json_file}")
 
+    # Outputs are written - the next run starts a fresh grid
+    if os.path.exists(CHECKPOINT_FILE):
+        os.remove(CHECKPOINT_FILE)
+
     print("\n" + "="*70 + "\nCOMPLETE!\n" + "="*70)
 
     return all_results
@@ -4,10 +4,22 @@ Monitors and evaluates AI agent performance
 """
 
 import os
+import json
+import time
+import queue
+import atexit
+import threading
+from collections import deque
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Callable, Iterator
 from dataclasses import dataclass, field
-import json
+
+METRICS_TABLE = os.getenv("AGENT_METRICS_TABLE", "aialgotradehits.ml_models.agent_metrics")
+METRICS_HISTORY_SIZE = int(os.getenv("AGENT_METRICS_HISTORY_SIZE", "10000"))
+ERROR_LOG_SIZE = int(os.getenv("AGENT_ERROR_LOG_SIZE", "1000"))
+METRICS_QUEUE_SIZE = int(os.getenv("AGENT_METRICS_QUEUE_SIZE", "5000"))
+METRICS_FLUSH_BATCH = int(os.getenv("AGENT_METRICS_FLUSH_BATCH", "500"))
+METRICS_FLUSH_SECONDS = float(os.getenv("AGENT_METRICS_FLUSH_SECONDS", "5"))
 
 
 @dataclass
@@ -37,6 +49,196 @@ class EvaluationReport:
     recommendations: List[str]
 
 
+class MetricsHistory:
+    """
+    Fixed-size ring buffer of InteractionMetrics.
+
+    Alongside the entries it keeps a ring of running totals, so aggregates over
+    the last N interactions are a single subtraction regardless of N.
+    """
+
+    # success, response_time, tool_calls, tokens_used, satisfaction_sum, satisfaction_count
+    _ZERO = (0, 0.0, 0, 0, 0.0, 0)
+
+    def __init__(self, capacity: int = METRICS_HISTORY_SIZE):
+        self.capacity = max(1, capacity)
+        self.clear()
+
+    def clear(self):
+        self._items: List[Optional[InteractionMetrics]] = [None] * self.capacity
+        self._totals: List[tuple] = [self._ZERO] * (self.capacity + 1)
+        self._count = 0
+
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+
+    def __iter__(self) -> Iterator[InteractionMetrics]:
+        for i in range(self._count - len(self), self._count):
+            yield self._items[i % self.capacity]
+
+    def append(self, metrics: InteractionMetrics):
+        prev = self._totals[self._count % (self.capacity + 1)]
+        satisfied = metrics.user_satisfaction is not None
+        self._items[self._count % self.capacity] = metrics
+        self._count += 1
+        self._totals[self._count % (self.capacity + 1)] = (
+            prev[0] + int(bool(metrics.success)),
+            prev[1] + metrics.response_time,
+            prev[2] + metrics.tool_calls,
+            prev[3] + metrics.tokens_used,
+            prev[4] + (metrics.user_satisfaction if satisfied else 0.0),
+            prev[5] + int(satisfied)
+        )
+
+    def recent(self, n: int) -> List[InteractionMetrics]:
+        n = min(n, len(self))
+        return [self._items[i % self.capacity] for i in range(self._count - n, self._count)]
+
+    def window_totals(self, window: int) -> Dict[str, float]:
+        """Sums over the last `window` interactions in O(1)"""
+        n = min(window, len(self))
+        end = self._totals[self._count % (self.capacity + 1)]
+        start = self._totals[(self._count - n) % (self.capacity + 1)]
+        totals = [e - s for e, s in zip(end, start)]
+        return {
+            "count": n,
+            "successes": totals[0],
+            "response_time": totals[1],
+            "tool_calls": totals[2],
+            "tokens_used": totals[3],
+            "satisfaction_sum": totals[4],
+            "satisfaction_count": totals[5]
+        }
+
+
+class MetricsSink:
+    """
+    Background BigQuery writer for interaction metrics.
+
+    Rows go into a bounded queue and a daemon thread streams them with
+    insert_rows_json in batches of up to batch_size, or every flush_seconds.
+    When the queue is full new rows are dropped (and counted) so the agent
+    never blocks on metrics.
+    """
+
+    def __init__(
+        self,
+        client_fn: Callable[[], Any],
+        table_id: str = METRICS_TABLE,
+        max_queue: int = METRICS_QUEUE_SIZE,
+        batch_size: int = METRICS_FLUSH_BATCH,
+        flush_seconds: float = METRICS_FLUSH_SECONDS
+    ):
+        self.client_fn = client_fn
+        self.table_id = table_id
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        self.written = 0
+        self.dropped = 0
+        self.failed_batches = 0
+        self.last_flush: Optional[str] = None
+
+        atexit.register(self.close)
+
+    def submit(self, row: Dict) -> bool:
+        """Queue a row without blocking; returns False if it was dropped"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name="metrics-sink", daemon=True
+                )
+                self._thread.start()
+
+    def _drain(self, first: Optional[Dict] = None) -> List[Dict]:
+        batch = [first] if first is not None else []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_seconds)
+            except queue.Empty:
+                continue
+
+            # Give a partially filled batch a moment to grow before writing
+            deadline = time.monotonic() + self.flush_seconds
+            while self._queue.qsize() < self.batch_size - 1 and time.monotonic() < deadline:
+                if self._stop.wait(0.05):
+                    break
+            self._write(self._drain(first))
+
+    def _write(self, rows: List[Dict]) -> int:
+        if not rows:
+            return 0
+        client = self.client_fn()
+        if client is None:
+            self.dropped += len(rows)
+            return 0
+
+        try:
+            errors = client.insert_rows_json(self.table_id, rows)
+            if errors:
+                print(f"Failed to persist metrics: {errors}")
+                self.failed_batches += 1
+                return 0
+            self.written += len(rows)
+            self.last_flush = datetime.now().isoformat()
+            return len(rows)
+        except Exception as e:
+            # Don't break the agent for metrics
+            print(f"Metrics sink write error: {e}")
+            self.failed_batches += 1
+            return 0
+
+    def flush(self) -> int:
+        """Synchronously write everything currently queued"""
+        written = 0
+        while not self._queue.empty():
+            batch = self._drain()
+            if not batch:
+                break
+            written += self._write(batch)
+        return written
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=self.flush_seconds + 1)
+        self.flush()
+
+    def stats(self) -> Dict:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed_batches": self.failed_batches,
+            "last_flush": self.last_flush
+        }
+
+
 class AgentEvaluator:
     """
     Evaluates and monitors AI agent performance.
@@ -51,9 +253,10 @@ class AgentEvaluator:
 
     def __init__(self, agent_name: str = "default"):
         self.agent_name = agent_name
-        self.metrics_history: List[InteractionMetrics] = []
-        self.error_log: List[Dict] = []
+        self.metrics_history = MetricsHistory()
+        self.error_log: deque = deque(maxlen=ERROR_LOG_SIZE)
         self._bigquery = None
+        self.sink = MetricsSink(lambda: self.bigquery)
 
     @property
     def bigquery(self):
@@ -103,56 +306,38 @@ class AgentEvaluator:
         self._persist_metrics(metrics)
 
     def _persist_metrics(self, metrics: InteractionMetrics):
-        """Persist metrics to BigQuery"""
-        if not self.bigquery:
-            return
-
-        try:
-            table_id = "aialgotradehits.ml_models.agent_metrics"
-            rows = [{
-                "timestamp": metrics.timestamp,
-                "agent_name": metrics.agent_name,
-                "response_time": metrics.response_time,
-                "tool_calls": metrics.tool_calls,
-                "tokens_used": metrics.tokens_used,
-                "success": metrics.success,
-                "error": metrics.error,
-                "user_satisfaction": metrics.user_satisfaction
-            }]
-
-            errors = self.bigquery.insert_rows_json(table_id, rows)
-            if errors:
-                print(f"Failed to persist metrics: {errors}")
-
-        except Exception as e:
-            # Silently fail - don't break the agent for metrics
-            pass
+        """Queue metrics for the background BigQuery writer"""
+        self.sink.submit({
+            "timestamp": metrics.timestamp,
+            "agent_name": metrics.agent_name,
+            "response_time": metrics.response_time,
+            "tool_calls": metrics.tool_calls,
+            "tokens_used": metrics.tokens_used,
+            "success": metrics.success,
+            "error": metrics.error,
+            "user_satisfaction": metrics.user_satisfaction
+        })
 
     def analyze_performance(self, window: int = 100) -> Dict:
         """Analyze recent performance metrics"""
         if not self.metrics_history:
             return {"message": "No metrics available"}
 
-        recent = self.metrics_history[-window:]
-
-        # Calculate statistics
-        success_count = sum(1 for m in recent if m.success)
-        total_response_time = sum(m.response_time for m in recent)
-        total_tool_calls = sum(m.tool_calls for m in recent)
-        total_tokens = sum(m.tokens_used for m in recent)
-
-        # User satisfaction (where available)
-        satisfaction_scores = [m.user_satisfaction for m in recent if m.user_satisfaction is not None]
+        totals = self.metrics_history.window_totals(window)
+        n = totals["count"]
 
         return {
-            "period": f"Last {len(recent)} interactions",
-            "total_interactions": len(recent),
-            "success_rate": success_count / len(recent) if recent else 0,
-            "avg_response_time": total_response_time / len(recent) if recent else 0,
-            "avg_tool_calls": total_tool_calls / len(recent) if recent else 0,
-            "avg_tokens_used": total_tokens / len(recent) if recent else 0,
-            "avg_user_satisfaction": sum(satisfaction_scores) / len(satisfaction_scores) if satisfaction_scores else None,
-            "error_rate": (len(recent) - success_count) / len(recent) if recent else 0
+            "period": f"Last {n} interactions",
+            "total_interactions": n,
+            "success_rate": totals["successes"] / n,
+            "avg_response_time": totals["response_time"] / n,
+            "avg_tool_calls": totals["tool_calls"] / n,
+            "avg_tokens_used": totals["tokens_used"] / n,
+            "avg_user_satisfaction": (
+                totals["satisfaction_sum"] / totals["satisfaction_count"]
+                if totals["satisfaction_count"] else None
+            ),
+            "error_rate": (n - totals["successes"]) / n
         }
 
     def get_error_analysis(self) -> Dict:
@@ -318,7 +503,7 @@ class AgentEvaluator:
                 }
                 for m in self.metrics_history
             ],
-            "error_log": self.error_log,
+            "error_log": list(self.error_log),
             "summary": self.analyze_performance()
         }
 
@@ -331,8 +516,8 @@ class AgentEvaluator:
 
     def clear_metrics(self):
         """Clear all stored metrics (use with caution)"""
-        self.metrics_history = []
-        self.error_log = []
+        self.metrics_history.clear()
+        self.error_log.clear()
 
 
 class TradingAgentEvaluator(AgentEvaluator):
@@ -3,6 +3,7 @@ Agent Orchestrator for AIAlgoTradeHits.com
 Coordinates multiple agents and workflows
 """
 
+import time
 import asyncio
 from enum import Enum
 from typing import Dict, List, Any, Optional
@@ -20,11 +21,24 @@ class TaskStatus(Enum):
 
 @dataclass
 class WorkflowStep:
-    """Single step in a workflow"""
+    """
+    Single step in a workflow.
+
+    inputs lists the steps (by name, or by agent for the latest earlier step of
+    that agent) whose results this step needs. inputs=None keeps the classic
+    behaviour of depending on the previous step; inputs=[] means the step is
+    independent and starts as soon as the workflow does.
+    """
     agent: str
     action: str
     params: Dict = field(default_factory=dict)
     depends_on: Optional[str] = None
+    inputs: Optional[List[str]] = None
+    name: Optional[str] = None
+
+    def __post_init__(self):
+        if not self.name:
+            self.name = f"{self.agent}.{self.action}"
 
 
 @dataclass
@@ -44,14 +58,17 @@ class AgentOrchestrator:
     Features:
     - Agent registration and management
     - Workflow definition and execution
+    - Concurrent execution of independent steps
     - Agent-to-agent communication
     - Error handling and recovery
     """
 
-    def __init__(self):
+    def __init__(self, max_concurrency: int = 8):
         self.agents: Dict[str, Any] = {}
         self.workflows: Dict[str, List[WorkflowStep]] = {}
+        self.dependencies: Dict[str, List[List[int]]] = {}
         self.execution_history: List[Dict] = []
+        self.max_concurrency = max_concurrency
 
     def register_agent(self, name: str, agent_instance):
         """Register an agent for use in workflows"""
@@ -70,30 +87,77 @@ class AgentOrchestrator:
 
         Example:
         steps = [
-            {"agent": "scanner", "action": "scan_markets", "params": {}},
-            {"agent": "analyst", "action": "analyze", "params": {}},
-            {"agent": "reporter", "action": "generate_report", "params": {}}
+            {"agent": "scanner", "action": "scan_markets", "params": {}, "inputs": []},
+            {"agent": "cycles", "action": "detect_cycles", "params": {}, "inputs": []},
+            {"agent": "reporter", "action": "generate_report", "inputs": ["scanner", "cycles"]}
         ]
+
+        The first two steps run concurrently, the report waits for both.
+        Steps without "inputs" run after the step before them.
         """
         workflow_steps = [
             WorkflowStep(
                 agent=step["agent"],
                 action=step["action"],
                 params=step.get("params", {}),
-                depends_on=step.get("depends_on")
+                depends_on=step.get("depends_on"),
+                inputs=step.get("inputs"),
+                name=step.get("name")
             )
             for step in steps
         ]
+        self.dependencies[name] = self._resolve_dependencies(name, workflow_steps)
         self.workflows[name] = workflow_steps
         print(f"Defined workflow: {name} with {len(workflow_steps)} steps")
 
+    def _resolve_dependencies(self, workflow_name: str, steps: List[WorkflowStep]) -> List[List[int]]:
+        """Map each step's inputs to indexes of earlier steps (which also rules out cycles)"""
+        dependencies = []
+        for i, step in enumerate(steps):
+            if step.inputs is None:
+                refs = [steps[i - 1].name] if i > 0 else []
+            else:
+                refs = list(step.inputs)
+            if step.depends_on and step.depends_on not in refs:
+                refs.append(step.depends_on)
+
+            indexes = []
+            for ref in refs:
+                match = [j for j in range(i) if steps[j].name == ref or steps[j].agent == ref]
+                if not match:
+                    raise ValueError(
+                        f"Workflow '{workflow_name}': step {step.name} depends on "
+                        f"'{ref}', which is not an earlier step"
+                    )
+                if match[-1] not in indexes:
+                    indexes.append(match[-1])
+            dependencies.append(indexes)
+        return dependencies
+
+    async def _run_step(self, agent, step: WorkflowStep, params: Dict) -> Any:
+        """Run one step; synchronous handlers go to a worker thread"""
+        if hasattr(agent, 'execute'):
+            method, args = agent.execute, (step.action, params)
+        elif hasattr(agent, step.action):
+            method, args = getattr(agent, step.action), (params,)
+        else:
+            return {"error": f"Action '{step.action}' not found on agent"}
+
+        if asyncio.iscoroutinefunction(method):
+            return await method(*args)
+        result = await asyncio.to_thread(method, *args)
+        if asyncio.iscoroutine(result):
+            result = await result
+        return result
+
     async def execute_workflow(
         self,
         workflow_name: str,
         initial_params: Dict = None
     ) -> WorkflowResult:
-        """Execute a defined workflow"""
+        """Execute a defined workflow, running independent steps concurrently"""
         start_time = datetime.now()
+        started = time.perf_counter()
 
         if workflow_name not in self.workflows:
             return WorkflowResult(
@@ -102,59 +166,85 @@ class AgentOrchestrator:
             )
 
         steps = self.workflows[workflow_name]
+        dependencies = self.dependencies[workflow_name]
         context = initial_params.copy() if initial_params else {}
-        results = []
-        errors = []
-
-        for i, step in enumerate(steps):
-            step_name = f"{step.agent}.{step.action}"
-            print(f"Executing step {i+1}/{len(steps)}: {step_name}")
+        step_results: List[Optional[Dict]] = [None] * len(steps)
+        step_errors: List[Optional[str]] = [None] * len(steps)
+        timings: List[Dict] = [{} for _ in steps]
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        tasks: List[asyncio.Task] = []
+
+        async def run(i: int, step: WorkflowStep):
+            if dependencies[i]:
+                await asyncio.gather(*(tasks[j] for j in dependencies[i]))
+
+            timings[i] = {
+                "step": step.name,
+                "depends_on": [steps[j].name for j in dependencies[i]],
+                "start": round(time.perf_counter() - started, 4)
+            }
 
             agent = self.agents.get(step.agent)
             if not agent:
-                error_msg = f"Agent '{step.agent}' not found"
-                errors.append(error_msg)
-                print(f"Error: {error_msg}")
-                continue
-
-            # Merge step params with context
+                step_errors[i] = f"Agent '{step.agent}' not found"
+                timings[i].update({"status": "failed", "duration": 0.0})
+                print(f"Error: {step_errors[i]}")
+                return
+
+            # Context snapshot (all finished steps) + this step's own inputs.
+            # last_result comes only from the step's own last dependency (None if it failed),
+            # never from whichever unrelated step happened to finish last.
             params = {**context, **step.params}
+            if dependencies[i]:
+                upstream = step_results[dependencies[i][-1]]
+                params["last_result"] = upstream["result"] if upstream is not None else None
 
+            print(f"Executing step {i+1}/{len(steps)}: {step.name}")
+            step_start = time.perf_counter()
             try:
-                # Execute the step
-                if hasattr(agent, 'execute'):
-                    result = await agent.execute(step.action, params)
-                elif hasattr(agent, step.action):
-                    method = getattr(agent, step.action)
-                    if asyncio.iscoroutinefunction(method):
-                        result = await method(params)
-                    else:
-                        result = method(params)
-                else:
-                    result = {"error": f"Action '{step.action}' not found on agent"}
-
-                results.append({
-                    "step": step_name,
+                async with semaphore:
+                    result = await self._run_step(agent, step, params)
+
+                step_results[i] = {
+                    "step": step.name,
                     "result": result,
-                    "timestamp": datetime.now().isoformat()
-                })
+                    "timestamp": datetime.now().isoformat(),
+                    "duration": round(time.perf_counter() - step_start, 4)
+                }
+                timings[i]["status"] = "completed"
 
                 # Update context with result
                 context[f"{step.agent}_result"] = result
-                context["last_result"] = result
 
             except Exception as e:
-                error_msg = f"Step {step_name} failed: {str(e)}"
-                errors.append(error_msg)
-                print(f"Error: {error_msg}")
+                step_errors[i] = f"Step {step.name} failed: {str(e)}"
+                timings[i]["status"] = "failed"
+                print(f"Error: {step_errors[i]}")
 
-                # Continue to next step or abort based on configuration
-                # For now, we continue
+                # Dependent steps still run with whatever context exists
+
+            timings[i]["duration"] = round(time.perf_counter() - step_start, 4)
+
+        for i, step in enumerate(steps):
+            tasks.append(asyncio.ensure_future(run(i, step)))
+        await asyncio.gather(*tasks)
+
+        results = [r for r in step_results if r is not None]
+        errors = [e for e in step_errors if e is not None]
+        if results:
+            # Final context keeps the last completed step in workflow order
+            context["last_result"] = results[-1]["result"]
 
         # Calculate execution time
         end_time = datetime.now()
         execution_time = (end_time - start_time).total_seconds()
 
+        # Longest chain of dependent step durations
+        path_time = [0.0] * len(steps)
+        for i in range(len(steps)):
+            upstream = max((path_time[j] for j in dependencies[i]), default=0.0)
+            path_time[i] = upstream + timings[i].get("duration", 0.0)
+
         # Determine final status
         if errors and not results:
             status = TaskStatus.FAILED
@@ -170,6 +260,9 @@ class AgentOrchestrator:
             "steps_completed": len(results),
             "errors": len(errors),
             "execution_time": execution_time,
+            "critical_path_time": round(max(path_time, default=0.0), 4),
+            "serial_time": round(sum(t.get("duration", 0.0) for t in timings), 4),
+            "steps": timings,
             "timestamp": end_time.isoformat()
         })
 
@@ -228,13 +321,15 @@ class AgentOrchestrator:
         completed = sum(1 for e in self.execution_history if e["status"] == "completed")
         failed = sum(1 for e in self.execution_history if e["status"] == "failed")
         avg_time = sum(e["execution_time"] for e in self.execution_history) / total
+        avg_critical = sum(e.get("critical_path_time", e["execution_time"]) for e in self.execution_history) / total
 
         return {
             "total_executions": total,
             "completed": completed,
             "failed": failed,
             "success_rate": completed / total if total > 0 else 0,
-            "avg_execution_time": avg_time
+            "avg_execution_time": avg_time,
+            "avg_critical_path_time": avg_critical
         }
 
 
@@ -251,12 +346,16 @@ class TradingOrchestrator(AgentOrchestrator):
     def _define_trading_workflows(self):
         """Define standard trading workflows"""
 
-        # Full market analysis workflow
+        # Full market analysis workflow - technicals and risk both only need
+        # the scan, so they run side by side
         self.define_workflow("full_analysis", [
-            {"agent": "market_scanner", "action": "scan_markets", "params": {}},
-            {"agent": "technical_analyst", "action": "analyze_technicals", "params": {}},
-            {"agent": "risk_assessor", "action": "assess_risk", "params": {}},
-            {"agent": "signal_generator", "action": "generate_signals", "params": {}}
+            {"agent": "market_scanner", "action": "scan_markets", "params": {}, "inputs": []},
+            {"agent": "technical_analyst", "action": "analyze_technicals", "params": {},
+             "inputs": ["market_scanner"]},
+            {"agent": "risk_assessor", "action": "assess_risk", "params": {},
+             "inputs": ["market_scanner"]},
+            {"agent": "signal_generator", "action": "generate_signals", "params": {},
+             "inputs": ["technical_analyst", "risk_assessor"]}
         ])
 
         # Quick screening workflow